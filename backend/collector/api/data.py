@@ -1,7 +1,12 @@
 # 数据相关API路由
 
-from fastapi import APIRouter, HTTPException, Query, BackgroundTasks, Request, Depends
+from fastapi import APIRouter, HTTPException, Query, Request, Depends
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import StreamingResponse
 from typing import Optional, Dict, List, Any
+import json
+import numpy as np
+import pandas as pd
 from loguru import logger
 from sqlalchemy.orm import Session
 
@@ -21,7 +26,10 @@ from ..schemas.data import (
     TaskResponse
 )
 from ..data_loader import data_loader
-from ..utils.task_manager import task_manager
+from ..utils.task_manager import TERMINAL_STATUSES, task_manager
+from ..utils.task_executor import TaskCancelled
+from ..utils.symbol_cache import symbol_cache
+from ..utils.frame_response import ARROW, NDJSON, RECORDS, frame_response, negotiate_format, stream_response
 
 # 创建API路由实例
 router = APIRouter(prefix="/api/data", tags=["data-management"])
@@ -107,22 +115,51 @@ def get_data_info():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _calendar_dates(freq: str, start_time: Optional[str] = None, end_time: Optional[str] = None) -> np.ndarray:
+    """获取时间范围内的日历
+    
+    优先从二进制文件读取器的日历缓存中切片，没有对应频率的日历文件时通过D.calendar获取（可能需要重采样）
+    
+    Args:
+        freq: 频率
+        start_time: 可选，开始时间
+        end_time: 可选，结束时间
+    
+    Returns:
+        np.ndarray: datetime64[ns]数组
+    """
+    dates = data_loader.get_bin_reader().calendar(freq)
+    if len(dates) == 0:
+        from qlib.data import D
+        return np.asarray(D.calendar(freq=freq, start_time=start_time, end_time=end_time), dtype="datetime64[ns]")
+    
+    lo = 0 if start_time is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(start_time)), side="left")
+    hi = len(dates) if end_time is None else np.searchsorted(dates, np.datetime64(pd.Timestamp(end_time)), side="right")
+    return dates[lo:hi]
+
+
 @router.get("/calendars", response_model=ApiResponse)
 def get_calendars(
+    request: Request,
     freq: Optional[str] = Query(None, description="频率，如'day'、'1min'、'1m'等"),
     start_time: Optional[str] = Query(None, description="开始时间，格式YYYY-MM-DD HH:mm:SS"),
-    end_time: Optional[str] = Query(None, description="结束时间，格式YYYY-MM-DD HH:mm:SS")
+    end_time: Optional[str] = Query(None, description="结束时间，格式YYYY-MM-DD HH:mm:SS"),
+    format: Optional[str] = Query(None, description="响应格式，可选records、columnar、ndjson、arrow、parquet，默认根据Accept请求头确定")
 ):
     """获取交易日历信息
     
     Args:
+        request: HTTP请求对象，用于根据Accept请求头协商响应格式
         freq: 可选，指定频率，如'day'、'1min'、'1m'等
         start_time: 可选，开始时间，格式YYYY-MM-DD HH:mm:SS
         end_time: 可选，结束时间，格式YYYY-MM-DD HH:mm:SS
+        format: 可选，响应格式，columnar为列式JSON，ndjson为NDJSON流，arrow为Arrow IPC流，parquet为Parquet文件
         
     Returns:
-        ApiResponse: 包含交易日历信息的响应
+        ApiResponse: 包含交易日历信息的响应，ndjson和arrow格式分块流式返回
     """
+    fmt = negotiate_format(request, format)
+    
     try:
         logger.info(f"开始获取交易日历信息，频率: {freq}, 开始时间: {start_time}, 结束时间: {end_time}")
         
@@ -148,13 +185,28 @@ def get_calendars(
                     data={}
                 )
         
+        # 处理频率参数
+        target_freq = freq if freq else "1d"
+        
+        # 二进制和列式格式直接使用日历的datetime64数组，不逐个转换为字符串
+        if fmt != RECORDS:
+            dates = _calendar_dates(target_freq, start_time, end_time)
+            frame = pd.DataFrame(index=pd.DatetimeIndex(dates, name="date"))
+            meta = {"freq": target_freq, "count": len(dates)}
+            if fmt in (NDJSON, ARROW):
+                # 按时间范围切片后逐块编码发送，不生成完整的响应体
+                return stream_response([frame], fmt, message="获取交易日历成功", meta=meta)
+            return frame_response(
+                frame, fmt,
+                message="获取交易日历成功",
+                meta=meta,
+                data_key="dates"
+            )
+        
         # 获取已加载的日历数据
         calendars = data_loader.get_calendars()
         logger.info(f"从data_loader获取到的日历数据: {list(calendars.keys())}")
         
-        # 处理频率参数
-        target_freq = freq if freq else "1d"
-        
         # 如果请求的频率不在已加载的日历中，尝试获取
         if target_freq not in calendars:
             logger.info(f"请求的频率{target_freq}不在已加载的日历中，尝试获取")
@@ -384,6 +436,67 @@ def get_symbol_features(
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.get("/bars", response_model=ApiResponse)
+def get_bars(
+    symbols: str = Query(..., description="货币名称，多个用逗号分隔，如'BTCUSDT,ETHUSDT'"),
+    freq: str = Query("day", description="频率，如'day'、'1d'、'1h'、'1m'"),
+    start_time: Optional[str] = Query(None, description="开始时间，格式YYYY-MM-DD HH:mm:SS"),
+    end_time: Optional[str] = Query(None, description="结束时间，格式YYYY-MM-DD HH:mm:SS"),
+    fields: str = Query("open,high,low,close,volume", description="字段，多个用逗号分隔"),
+    limit: Optional[int] = Query(None, ge=1, description="每个货币最多返回的K线数量，取时间窗口内最后的K线")
+):
+    """获取多个货币的原始K线数据
+    
+    直接通过内存映射读取QLib二进制文件并按日历下标切片，不经过D.features和表达式缓存，
+    每个货币按列返回日期和各字段的值，缺失值为null
+    
+    Args:
+        symbols: 货币名称，多个用逗号分隔
+        freq: 频率
+        start_time: 可选，开始时间
+        end_time: 可选，结束时间
+        fields: 字段，多个用逗号分隔
+        limit: 可选，每个货币最多返回的K线数量
+    
+    Returns:
+        ApiResponse: 包含K线数据的响应
+    """
+    try:
+        symbol_list = [symbol.strip() for symbol in symbols.split(",") if symbol.strip()]
+        field_list = [field.strip() for field in fields.split(",") if field.strip()]
+        
+        qlib_dir = data_loader.get_qlib_dir()
+        if not qlib_dir:
+            from ..db import SystemConfigBusiness as SystemConfig
+            qlib_dir = SystemConfig.get("qlib_data_dir") or "data/crypto_data"
+        reader = data_loader.get_bin_reader(qlib_dir)
+        
+        bars = reader.read(symbol_list, field_list, freq=freq, start=start_time, end=end_time, limit=limit)
+        
+        result = {}
+        for symbol, values in bars.items():
+            item = {"dates": pd.DatetimeIndex(values["dates"]).strftime("%Y-%m-%d %H:%M:%S").tolist()}
+            for field in field_list:
+                column = values[field].astype("float64")
+                item[field] = np.where(np.isnan(column), None, column).tolist()
+            result[symbol] = item
+        
+        return ApiResponse(
+            code=0,
+            message="获取K线数据成功",
+            data={
+                "freq": freq,
+                "fields": field_list,
+                "bars": result,
+                "missing": [symbol for symbol in symbol_list if symbol.upper() not in bars]
+            }
+        )
+    except Exception as e:
+        logger.error(f"获取K线数据失败: {e}")
+        logger.exception(e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router.get("/status", response_model=ApiResponse)
 def get_data_status():
     """获取数据服务状态
@@ -507,6 +620,9 @@ def reload_qlib():
 def async_download_crypto(task_id: str, request: DownloadCryptoRequest):
     """异步下载加密货币数据
     
+    每个交易对在一个时间周期下载成功后记录检查点，整个时间周期下载或合成完成后记录"*"检查点；
+    任务恢复时跳过已完成的时间周期和交易对，进度从已完成的数量开始计算
+    
     Args:
         task_id: 任务ID
         request: 下载加密货币数据请求
@@ -523,6 +639,15 @@ def async_download_crypto(task_id: str, request: DownloadCryptoRequest):
         # 实例化GetData类
         get_data = GetData()
         
+        # 读取已完成的工作单元，新任务为空
+        checkpoints = task_manager.get_checkpoints(task_id)
+        if checkpoints:
+            summary = {interval: len(symbols) for interval, symbols in checkpoints.items()}
+            logger.info(f"从检查点恢复任务，任务ID: {task_id}, 各时间周期已完成数量: {summary}")
+        
+        # 当前时间周期之前已完成的交易对数量，恢复时计入进度
+        skipped = 0
+        
         # 定义进度回调函数
         def progress_callback(current, completed, total, failed):
             """进度回调函数
@@ -533,13 +658,11 @@ def async_download_crypto(task_id: str, request: DownloadCryptoRequest):
                 total: 总项目数
                 failed: 失败的项目数
             """
-            # 计算进度百分比
-            progress = 0
-            if total > 0:
-                progress = (completed / total) * 100
+            # 任务已被请求取消时抛出TaskCancelled，结束下载
+            task_manager.check_cancelled(task_id)
             
             # 更新任务进度
-            task_manager.update_progress(task_id, current, completed, total, failed)
+            task_manager.update_progress(task_id, current, completed + skipped, total + skipped, failed)
         
         # 处理保存目录：根据接口类型拼接路径
         save_dir = request.save_dir
@@ -557,9 +680,24 @@ def async_download_crypto(task_id: str, request: DownloadCryptoRequest):
         else:
             logger.info(f"从数据库中读取到qlib_data_dir: {qlib_dir}")
         
-        # 遍历所有时间周期
-        for interval in request.interval:
-            logger.info(f"开始处理时间周期: {interval}")
+        # 只下载最细的时间周期，其他能由其合成的周期在下载完成后合成，避免重复下载
+        from ..scripts.resample_bars import plan_intervals
+        download_intervals, derived_intervals = plan_intervals(request.interval)
+        logger.info(f"下载时间周期: {download_intervals}，合成时间周期: {derived_intervals}")
+        
+        # 遍历需要下载的时间周期
+        for interval in download_intervals:
+            task_manager.check_cancelled(task_id)
+            done = checkpoints.get(interval, set())
+            if "*" in done:
+                logger.info(f"时间周期 {interval} 已完成，跳过")
+                continue
+            
+            # 只下载未完成的交易对；交易对都已完成但时间周期未完成时（如转换QLib格式前中断）
+            # 仍处理全部交易对，增量下载只补充最后时间戳之后的数据，并重新转换
+            symbols = [symbol for symbol in request.symbols if symbol not in done] or request.symbols
+            skipped = len(request.symbols) - len(symbols)
+            logger.info(f"开始处理时间周期: {interval}，待下载交易对: {len(symbols)}，已完成: {skipped}")
             
             # 调用crypto方法下载数据
             get_data.crypto(
@@ -570,36 +708,67 @@ def async_download_crypto(task_id: str, request: DownloadCryptoRequest):
                 interval=interval,  # 使用当前时间周期
                 max_workers=request.max_workers,
                 candle_type=request.candle_type,
-                symbols=",".join(request.symbols),
+                symbols=",".join(symbols),
                 convert_to_qlib=True,
                 qlib_dir=qlib_dir,  # 传递从数据库读取的qlib_data_dir作为转换地址
-                progress_callback=progress_callback
+                progress_callback=progress_callback,
+                instrument_callback=lambda symbol, interval=interval: task_manager.add_checkpoint(task_id, interval, symbol),
+                incremental=request.incremental,
+                storage_format=request.storage_format
             )
+            task_manager.add_checkpoint(task_id, interval, "*")
             
             logger.info(f"时间周期 {interval} 数据下载成功")
         
+        # 由已下载的细粒度K线合成其他时间周期
+        for interval, base_interval in derived_intervals.items():
+            task_manager.check_cancelled(task_id)
+            if "*" in checkpoints.get(interval, set()):
+                logger.info(f"时间周期 {interval} 已合成，跳过")
+                continue
+            logger.info(f"开始由{base_interval}合成时间周期: {interval}")
+            get_data.resample(
+                save_dir=str(save_dir) if save_dir else None,
+                base_interval=base_interval,
+                interval=interval,
+                symbols=request.symbols,
+                start=request.start,
+                end=request.end,
+                convert_to_qlib=True,
+                qlib_dir=qlib_dir,
+                incremental=request.incremental,
+                storage_format=request.storage_format
+            )
+            task_manager.add_checkpoint(task_id, interval, "*")
+            logger.info(f"时间周期 {interval} 数据合成成功")
+        
         logger.info(f"所有时间周期数据下载成功，任务ID: {task_id}")
         
         # 更新任务状态为已完成
         task_manager.complete_task(task_id)
+    except TaskCancelled:
+        # 由任务管理器标记为已取消
+        logger.info(f"加密货币数据下载已取消，任务ID: {task_id}")
+        raise
     except Exception as e:
         logger.error(f"加密货币数据下载失败，任务ID: {task_id}, 错误: {e}")
         logger.exception(e)
         
         # 更新任务状态为失败
-        task_manager.fail_task(task_id, error=str(e))
+        task_manager.fail_task(task_id, error_message=str(e))
 
 
 @router.post("/download/crypto", response_model=ApiResponse)
-def download_crypto(request: DownloadCryptoRequest, background_tasks: BackgroundTasks):
+def download_crypto(request: DownloadCryptoRequest):
     """下载加密货币数据（异步）
     
+    任务提交到任务执行器排队，按全局、任务类型和交易所的并发限制依次执行
+    
     Args:
         request: 下载加密货币数据请求
-        background_tasks: FastAPI后台任务对象
         
     Returns:
-        ApiResponse: 包含任务ID的响应，用于查询下载进度
+        ApiResponse: 包含任务ID和队列位置的响应，用于查询下载进度
     """
     try:
         logger.info(f"收到加密货币数据下载请求，参数: {request.model_dump()}")
@@ -625,19 +794,27 @@ def download_crypto(request: DownloadCryptoRequest, background_tasks: Background
             max_workers=request.max_workers,
             candle_type=request.candle_type,
             symbols=request.symbols,
-            save_dir=request.save_dir
+            save_dir=request.save_dir,
+            incremental=request.incremental,
+            storage_format=request.storage_format,
+            priority=request.priority
         )
         
         logger.info(f"创建下载任务成功，任务ID: {task_id}")
         
-        # 将下载任务添加到后台任务
-        background_tasks.add_task(async_download_crypto, task_id, request)
+        # 将下载任务提交到任务执行器，同一交易所的任务共享并发限制
+        queue_position = task_manager.submit_task(
+            task_id, async_download_crypto, task_id, request,
+            priority=request.priority,
+            resource=request.exchange
+        )
         
         return ApiResponse(
             code=0,
             message="加密货币数据下载任务已创建",
             data={
                 "task_id": task_id,
+                "queue_position": queue_position,
                 "message": "下载任务已创建，可通过 /api/data/task/{task_id} 查询进度"
             }
         )
@@ -647,6 +824,31 @@ def download_crypto(request: DownloadCryptoRequest, background_tasks: Background
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _resume_download_crypto(task: Dict[str, Any]) -> int:
+    """从检查点恢复加密货币数据下载任务
+    
+    按任务参数重建下载请求并以增量模式重新提交，已完成的时间周期和交易对被跳过，
+    中断时正在下载的交易对从已保存数据的最后时间戳继续下载
+    
+    Args:
+        task: 任务信息
+        
+    Returns:
+        int: 任务在队列中的位置，0表示已开始执行
+    """
+    params = {key: value for key, value in task["params"].items() if key in DownloadCryptoRequest.model_fields}
+    request = DownloadCryptoRequest(**params)
+    request.incremental = True
+    return task_manager.submit_task(
+        task["task_id"], async_download_crypto, task["task_id"], request,
+        priority=request.priority,
+        resource=request.exchange
+    )
+
+
+task_manager.register_resume_handler("download_crypto", _resume_download_crypto)
+
+
 @router.get("/task/{task_id}", response_model=ApiResponse)
 def get_task_status(task_id: str):
     """查询任务状态
@@ -684,6 +886,228 @@ def get_task_status(task_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router.post("/task/{task_id}/cancel", response_model=ApiResponse)
+def cancel_task(task_id: str):
+    """取消任务
+    
+    排队中的任务立即取消；运行中的任务在处理完当前标的后结束
+    
+    Args:
+        task_id: 任务ID
+        
+    Returns:
+        ApiResponse: 包含取消结果的响应，state为cancelled（已取消）或cancelling（等待任务结束）
+    """
+    try:
+        logger.info(f"取消任务请求，任务ID: {task_id}")
+        
+        state = task_manager.cancel_task(task_id)
+        if state is None:
+            logger.warning(f"任务不存在或已结束，无法取消，任务ID: {task_id}")
+            return ApiResponse(
+                code=1,
+                message="任务不存在或已结束",
+                data={"task_id": task_id}
+            )
+        
+        return ApiResponse(
+            code=0,
+            message="任务已取消" if state == "cancelled" else "已请求取消任务，等待任务结束",
+            data={"task_id": task_id, "state": state}
+        )
+    except Exception as e:
+        logger.error(f"取消任务失败，任务ID: {task_id}, 错误: {e}")
+        logger.exception(e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.post("/task/{task_id}/resume", response_model=ApiResponse)
+def resume_task(task_id: str):
+    """从检查点恢复任务
+    
+    已中断、失败或已取消的任务重新提交到任务执行器，只执行未完成的部分
+    
+    Args:
+        task_id: 任务ID
+        
+    Returns:
+        ApiResponse: 包含任务ID、队列位置和已完成工作单元数量的响应
+    """
+    try:
+        logger.info(f"恢复任务请求，任务ID: {task_id}")
+        
+        queue_position = task_manager.resume_task(task_id)
+        if queue_position is None:
+            logger.warning(f"任务不存在或不可恢复，任务ID: {task_id}")
+            return ApiResponse(
+                code=1,
+                message="任务不存在或不可恢复",
+                data={"task_id": task_id}
+            )
+        
+        checkpoints = task_manager.get_checkpoints(task_id)
+        return ApiResponse(
+            code=0,
+            message="任务已恢复",
+            data={
+                "task_id": task_id,
+                "queue_position": queue_position,
+                "checkpoints": {interval: len(symbols) for interval, symbols in checkpoints.items()}
+            }
+        )
+    except Exception as e:
+        logger.error(f"恢复任务失败，任务ID: {task_id}, 错误: {e}")
+        logger.exception(e)
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/tasks/resumable", response_model=ApiResponse)
+def get_resumable_tasks():
+    """查询可以从检查点恢复的任务
+    
+    包括服务重启时被中断的任务，以及失败或已取消的任务
+    
+    Returns:
+        ApiResponse: 包含可恢复任务列表的响应
+    """
+    try:
+        tasks = task_manager.get_resumable_tasks()
+        return ApiResponse(
+            code=0,
+            message="查询可恢复任务成功",
+            data={"tasks": tasks, "total": len(tasks)}
+        )
+    except Exception as e:
+        logger.error(f"查询可恢复任务失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router.get("/tasks/executor", response_model=ApiResponse)
+def get_task_executor_status():
+    """查询任务执行器状态
+    
+    Returns:
+        ApiResponse: 包含并发限制、运行中和排队中任务的响应
+    """
+    try:
+        return ApiResponse(
+            code=0,
+            message="查询任务执行器状态成功",
+            data=task_manager.executor.stats()
+        )
+    except Exception as e:
+        logger.error(f"查询任务执行器状态失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+# 任务事件流的心跳间隔（秒），防止代理断开空闲连接
+TASK_EVENT_HEARTBEAT = 15
+
+
+def _sse_message(event: str, data: Any) -> str:
+    """编码一条Server-Sent Events消息"""
+    return f"event: {event}\ndata: {json.dumps(jsonable_encoder(data), ensure_ascii=False)}\n\n"
+
+
+async def _task_event_stream(request: Request, subscription, initial: List[Dict[str, Any]]):
+    """任务事件流，先发送当前快照，之后发送任务管理器推送的更新
+    
+    订阅单个任务时，任务结束或被删除后关闭连接
+    
+    Args:
+        request: HTTP请求对象，用于检测客户端断开
+        subscription: 任务事件订阅
+        initial: 订阅时的任务快照列表
+    """
+    try:
+        for task in initial:
+            yield _sse_message("task", task)
+            if subscription.task_id is not None and task["status"] in TERMINAL_STATUSES:
+                return
+        
+        while not await request.is_disconnected():
+            events = await subscription.get(timeout=TASK_EVENT_HEARTBEAT)
+            if not events:
+                yield ": keep-alive\n\n"
+                continue
+            for task_id, task in events.items():
+                if task is None:
+                    yield _sse_message("deleted", {"task_id": task_id})
+                else:
+                    yield _sse_message("task", task)
+            if subscription.task_id is not None:
+                task = events.get(subscription.task_id)
+                if task is None or task["status"] in TERMINAL_STATUSES:
+                    return
+    finally:
+        task_manager.unsubscribe(subscription)
+
+
+def _task_event_response(request: Request, subscription, initial: List[Dict[str, Any]]) -> StreamingResponse:
+    """构造任务事件流响应"""
+    return StreamingResponse(
+        _task_event_stream(request, subscription, initial),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+
+@router.get("/task/{task_id}/events")
+async def stream_task_events(task_id: str, request: Request):
+    """以Server-Sent Events推送任务状态和进度
+    
+    连接建立后立即发送一次task事件作为当前状态，之后每次状态或进度变化发送task事件，
+    任务结束或被删除（deleted事件）后关闭连接；推送直接来自任务管理器，不查询数据库
+    
+    Args:
+        task_id: 任务ID
+        request: HTTP请求对象
+        
+    Returns:
+        StreamingResponse: text/event-stream响应，任务不存在时返回ApiResponse
+    """
+    # 先订阅再读取快照，避免遗漏两者之间的更新
+    subscription = task_manager.subscribe(task_id)
+    task_info = task_manager.get_task(task_id)
+    if not task_info:
+        task_manager.unsubscribe(subscription)
+        logger.warning(f"任务不存在，任务ID: {task_id}")
+        return ApiResponse(
+            code=1,
+            message="任务不存在",
+            data={"task_id": task_id}
+        )
+    
+    logger.info(f"开始推送任务事件，任务ID: {task_id}")
+    return _task_event_response(request, subscription, [task_info])
+
+
+@router.get("/tasks/events")
+async def stream_all_task_events(
+    request: Request,
+    active_only: bool = Query(True, description="初始快照是否只包含未结束的任务")
+):
+    """以Server-Sent Events推送所有任务的状态和进度
+    
+    连接建立后为每个任务发送一次task事件，之后任意任务创建、状态或进度变化时发送task事件，
+    任务被删除时发送deleted事件；同一任务在发送前的多次更新合并为最新状态
+    
+    Args:
+        request: HTTP请求对象
+        active_only: 初始快照是否只包含未结束的任务
+        
+    Returns:
+        StreamingResponse: text/event-stream响应
+    """
+    subscription = task_manager.subscribe()
+    tasks = list(task_manager.get_all_tasks().values())
+    if active_only:
+        tasks = [task for task in tasks if task["status"] not in TERMINAL_STATUSES]
+    
+    logger.info(f"开始推送所有任务事件，初始任务数: {len(tasks)}")
+    return _task_event_response(request, subscription, tasks)
+
+
 @router.get("/crypto/symbols", response_model=ApiResponse)
 def get_crypto_symbols(
     request: Request,
@@ -707,48 +1131,69 @@ def get_crypto_symbols(
     try:
         logger.info(f"开始获取加密货币对列表，交易所: {exchange}, 过滤条件: {filter}, 限制: {limit}, 偏移: {offset}")
         
-        # 导入ccxt库
-        import ccxt
-        
         # 从应用上下文中读取代理配置
         configs = request.app.state.configs
         
-        # 读取代理配置
-        proxy_enabled = configs.get("proxy_enabled") == "true"
-        proxy_url = configs.get("proxy_url")
-        proxy_username = configs.get("proxy_username")
-        proxy_password = configs.get("proxy_password")
-        
-        logger.info(f"代理配置: enabled={proxy_enabled}, url={proxy_url}")
-        
-        # 创建交易所实例
-        exchange_instance = getattr(ccxt, exchange)()
-        # 添加超时设置
-        exchange_instance.timeout = 10000  # 10秒超时
-        
-        # 如果启用代理，设置代理参数
-        if proxy_enabled and proxy_url:
-            # 处理代理认证
-            if proxy_username and proxy_password:
-                # 构建带认证的代理URL
-                from urllib.parse import urlparse
-                parsed_url = urlparse(proxy_url)
-                proxy_with_auth = f"{parsed_url.scheme}://{proxy_username}:{proxy_password}@{parsed_url.netloc}{parsed_url.path}"
-                exchange_instance.proxy = proxy_with_auth
-                logger.info(f"使用带认证的代理: {proxy_with_auth}")
+        def fetch_markets():
+            """从交易所获取活跃的货币对列表，失败时抛出异常"""
+            # 导入ccxt库
+            import ccxt
+            
+            # 读取代理配置
+            proxy_enabled = configs.get("proxy_enabled") == "true"
+            proxy_url = configs.get("proxy_url")
+            proxy_username = configs.get("proxy_username")
+            proxy_password = configs.get("proxy_password")
+            
+            logger.info(f"代理配置: enabled={proxy_enabled}, url={proxy_url}")
+            
+            # 创建交易所实例
+            exchange_instance = getattr(ccxt, exchange)()
+            # 添加超时设置
+            exchange_instance.timeout = 10000  # 10秒超时
+            
+            # 如果启用代理，设置代理参数
+            if proxy_enabled and proxy_url:
+                # 处理代理认证
+                if proxy_username and proxy_password:
+                    # 构建带认证的代理URL
+                    from urllib.parse import urlparse
+                    parsed_url = urlparse(proxy_url)
+                    proxy_with_auth = f"{parsed_url.scheme}://{proxy_username}:{proxy_password}@{parsed_url.netloc}{parsed_url.path}"
+                    exchange_instance.proxy = proxy_with_auth
+                    logger.info(f"使用带认证的代理: {proxy_with_auth}")
+                else:
+                    # 使用不带认证的代理
+                    exchange_instance.proxy = proxy_url
+                    logger.info(f"使用不带认证的代理: {proxy_url}")
             else:
-                # 使用不带认证的代理
-                exchange_instance.proxy = proxy_url
-                logger.info(f"使用不带认证的代理: {proxy_url}")
-        else:
-            logger.info("未启用代理")
-        
-        logger.info(f"成功创建{exchange}交易所实例")
-        
-        # 获取货币对列表，添加错误处理
-        try:
+                logger.info("未启用代理")
+            
+            logger.info(f"成功创建{exchange}交易所实例")
+            
             markets = exchange_instance.fetch_markets()
             logger.info(f"成功获取{exchange}交易所的货币对列表，共{len(markets)}个货币对")
+            
+            # 过滤无效或不活跃的货币对，只保留必要的信息
+            return [
+                {
+                    "symbol": market.get("symbol"),
+                    "base": market.get("base"),
+                    "quote": market.get("quote"),
+                    "active": market.get("active"),
+                    "precision": market.get("precision"),
+                    "limits": market.get("limits"),
+                    "type": market.get("type")
+                }
+                for market in markets
+                if market.get("active", True)
+            ]
+        
+        # 货币对列表由交易对缓存提供，过期时在后台刷新，分页和过滤在内存中完成
+        try:
+            paginated_symbols, total = symbol_cache.query(
+                f"ccxt_{exchange}", fetch_markets, filter=filter, offset=offset, limit=limit
+            )
         except Exception as e:
             logger.error(f"调用{exchange}.fetch_markets()失败: {e}")
             # 返回友好的错误信息给客户端
@@ -761,40 +1206,12 @@ def get_crypto_symbols(
                 }
             )
         
-        # 处理货币对列表
-        symbols = []
-        for market in markets:
-            # 过滤无效或不活跃的货币对
-            if not market.get("active", True):
-                continue
-            
-            # 提取必要的信息
-            symbol_info = {
-                "symbol": market.get("symbol"),
-                "base": market.get("base"),
-                "quote": market.get("quote"),
-                "active": market.get("active"),
-                "precision": market.get("precision"),
-                "limits": market.get("limits"),
-                "type": market.get("type")
-            }
-            
-            # 应用过滤条件
-            if filter:
-                if filter not in symbol_info["symbol"]:
-                    continue
-            
-            symbols.append(symbol_info)
-        
-        # 实现分页
-        paginated_symbols = symbols[offset:offset+limit]
-        
-        logger.info(f"处理完成，共{len(symbols)}个符合条件的货币对，返回{len(paginated_symbols)}个货币对")
+        logger.info(f"处理完成，共{total}个符合条件的货币对，返回{len(paginated_symbols)}个货币对")
         
         # 构建响应
         response_data = {
             "symbols": paginated_symbols,
-            "total": len(symbols),
+            "total": total,
             "offset": offset,
             "limit": limit,
             "exchange": exchange
@@ -913,7 +1330,7 @@ def get_all_tasks(
         
         # 构建响应数据
         # 转换SQLAlchemy模型为字典格式
-        import json
+        live_tasks = task_manager.get_all_tasks()
         task_list = []
         for task in tasks:
             task_dict = {
@@ -934,6 +1351,10 @@ def get_all_tasks(
                 "created_at": task.created_at,
                 "updated_at": task.updated_at
             }
+            # 进度由任务管理器定时批量写入数据库，运行中的任务以内存中的最新进度为准
+            live_task = live_tasks.get(task.task_id)
+            if live_task:
+                task_dict["progress"] = dict(live_task["progress"])
             task_list.append(task_dict)
         
         result = {
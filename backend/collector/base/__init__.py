@@ -1,22 +1,33 @@
 # 导出基础类和工具函数
 from .base_collector import BaseCollector
+from .storage import CsvInstrumentStorage, ParquetInstrumentStorage, QlibBinStorage, get_instrument_storage
 from .utils import (
     deco_retry,
     get_date_range,
     async_deco_retry,
     str_to_timestamp,
+    timestamps_to_datetime,
     get_interval_minutes,
     get_interval_ms,
+    TokenBucket,
+    shared_token_bucket,
     ProgressBar
 )
 
 __all__ = [
     "BaseCollector",
+    "CsvInstrumentStorage",
+    "ParquetInstrumentStorage",
+    "QlibBinStorage",
+    "get_instrument_storage",
     "deco_retry",
     "get_date_range",
     "async_deco_retry",
     "str_to_timestamp",
+    "timestamps_to_datetime",
     "get_interval_minutes",
     "get_interval_ms",
+    "TokenBucket",
+    "shared_token_bucket",
     "ProgressBar"
 ]
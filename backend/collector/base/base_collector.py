@@ -1,7 +1,9 @@
 # 基础收集器类
 import abc
 import time
+import asyncio
 import datetime
+import contextlib
 from pathlib import Path
 from typing import Type, Iterable, Union, Optional
 
@@ -10,6 +12,9 @@ from loguru import logger
 from tqdm import tqdm
 from joblib import Parallel, delayed
 
+from .storage import QlibBinStorage, get_instrument_storage
+from ..scripts.qlib_bin import qlib_freq_name
+
 
 class BaseCollector(abc.ABC):
     """基础收集器类，定义数据收集的通用接口和功能"""
@@ -41,6 +46,11 @@ class BaseCollector(abc.ABC):
         delay=0,
         check_data_length: Optional[int] = None,
         limit_nums: Optional[int] = None,
+        async_mode: bool = False,
+        incremental: bool = False,
+        qlib_sink_dir: Optional[Union[str, Path]] = None,
+        save_csv: bool = True,
+        storage_format: str = "csv",
     ):
         """
         初始化收集器
@@ -54,13 +64,26 @@ class BaseCollector(abc.ABC):
         :param delay: 请求延迟时间（秒）
         :param check_data_length: 数据长度检查阈值
         :param limit_nums: 限制收集的标的数量，用于调试
+        :param async_mode: 是否使用异步收集模式，所有标的在同一个事件循环中收集
+        :param incremental: 是否增量收集，从已保存数据的最后时间戳开始获取
+        :param qlib_sink_dir: QLib数据目录，提供时每个标的收集完成后直接写入QLib二进制格式，无需再转换
+        :param save_csv: 是否同时保存原始数据文件（CSV或Parquet），仅在提供qlib_sink_dir时可以关闭
+        :param storage_format: 原始数据存储格式，可选"csv"（每个标的一个CSV文件）或"parquet"（按标的和月份分区）
         """
         self.save_dir = Path(save_dir).expanduser().resolve()
         self.save_dir.mkdir(parents=True, exist_ok=True)
+        self.storage_format = storage_format
+        self.storage = get_instrument_storage(storage_format, self.save_dir)
+        self.qlib_storage = (
+            QlibBinStorage(qlib_sink_dir, freq=self.get_qlib_freq(interval)) if qlib_sink_dir is not None else None
+        )
+        self.save_csv = save_csv or self.qlib_storage is None
         
         self.delay = delay
         self.max_workers = max_workers
         self.max_collector_count = max_collector_count
+        self.async_mode = async_mode
+        self.incremental = incremental
         self.mini_symbol_map: dict = {}
         self.interval = interval
         self.check_data_length = max(int(check_data_length) if check_data_length is not None else 0, 0)
@@ -76,6 +99,11 @@ class BaseCollector(abc.ABC):
             except Exception as e:
                 logger.warning(f"无法使用limit_nums={limit_nums}，该参数将被忽略")
     
+    @staticmethod
+    def get_qlib_freq(interval: str) -> str:
+        """将时间间隔转换为QLib频率名称，如'1d'转换为'day'、'1min'转换为'1m'"""
+        return qlib_freq_name(interval)
+    
     def normalize_start_datetime(self, start_datetime: Optional[Union[str, pd.Timestamp]] = None):
         """标准化开始时间"""
         return (
@@ -116,14 +144,35 @@ class BaseCollector(abc.ABC):
         """
         raise NotImplementedError("请重写get_data方法")
     
+    async def async_get_data(
+        self, symbol: str, interval: str, start_datetime: pd.Timestamp, end_datetime: pd.Timestamp
+    ) -> pd.DataFrame:
+        """异步获取标的数据
+        
+        默认在线程池中执行同步的get_data，子类可重写为原生异步实现
+        
+        :param symbol: 标的代码
+        :param interval: 时间间隔
+        :param start_datetime: 开始时间
+        :param end_datetime: 结束时间
+        :return: 标的数据DataFrame
+        """
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(
+            None, self.get_data, symbol, interval, start_datetime, end_datetime
+        )
+    
     def sleep(self):
         """休眠指定时间，用于控制请求频率"""
         time.sleep(self.delay)
     
-    def _simple_collector(self, symbol: str):
-        """简单收集器，用于单个标的的数据收集"""
-        self.sleep()
-        df = self.get_data(symbol, self.interval, self.start_datetime, self.end_datetime)
+    def _handle_data(self, symbol: str, df: pd.DataFrame):
+        """处理单个标的获取到的数据，数据量足够时保存，否则缓存
+        
+        :param symbol: 标的代码
+        :param df: 标的数据DataFrame
+        :return: 缓存标志或正常标志
+        """
         _result = self.NORMAL_FLAG
         if self.check_data_length > 0:
             _result = self.cache_small_data(symbol, df)
@@ -131,9 +180,57 @@ class BaseCollector(abc.ABC):
             self.save_instrument(symbol, df)
         return _result
     
+    def get_start_datetime(self, symbol: str) -> Optional[pd.Timestamp]:
+        """获取标的本次收集的开始时间
+        
+        增量模式下从索引文件（或文件末尾）读取已保存数据的最后时间戳，
+        并将开始时间前移到该时间戳；最后时间戳所在的K线会被重新获取，
+        重复的行在保存时跳过
+        
+        :param symbol: 标的代码
+        :return: 开始时间，已保存的数据覆盖到结束时间时返回None
+        """
+        if not self.incremental:
+            return self.start_datetime
+        
+        storage = self.storage if self.save_csv else self.qlib_storage
+        last_timestamp = storage.last_timestamp(self.normalize_symbol(symbol))
+        if last_timestamp is None or last_timestamp < self.start_datetime:
+            return self.start_datetime
+        if last_timestamp >= self.end_datetime:
+            logger.info(f"{symbol} 已保存的数据截至 {last_timestamp}，无需更新")
+            return None
+        logger.info(f"{symbol} 增量收集，开始时间从 {self.start_datetime} 调整为 {last_timestamp}")
+        return last_timestamp
+    
+    def _simple_collector(self, symbol: str):
+        """简单收集器，用于单个标的的数据收集"""
+        start_datetime = self.get_start_datetime(symbol)
+        if start_datetime is None:
+            return self.NORMAL_FLAG
+        self.sleep()
+        df = self.get_data(symbol, self.interval, start_datetime, self.end_datetime)
+        return self._handle_data(symbol, df)
+    
+    async def _async_simple_collector(self, symbol: str):
+        """异步简单收集器，用于单个标的的数据收集
+        
+        读取已保存数据的最后时间戳和保存数据都是磁盘操作，在线程中执行以免阻塞事件循环
+        """
+        start_datetime = await asyncio.to_thread(self.get_start_datetime, symbol)
+        if start_datetime is None:
+            return self.NORMAL_FLAG
+        if self.delay:
+            await asyncio.sleep(self.delay)
+        df = await self.async_get_data(symbol, self.interval, start_datetime, self.end_datetime)
+        return await asyncio.to_thread(self._handle_data, symbol, df)
+    
     def save_instrument(self, symbol, df: pd.DataFrame):
         """保存标的数据到文件
         
+        只追加晚于已保存数据的行，已保存的数据不会被读取或重写，
+        需要去重排序时调用compact_instruments；提供qlib_sink_dir时同时写入QLib二进制格式
+        
         :param symbol: 标的代码
         :param df: 标的数据DataFrame
         """
@@ -142,12 +239,24 @@ class BaseCollector(abc.ABC):
             return
         
         symbol = self.normalize_symbol(symbol)
-        instrument_path = self.save_dir.joinpath(f"{symbol}.csv")
         df["symbol"] = symbol
-        if instrument_path.exists():
-            _old_df = pd.read_csv(instrument_path)
-            df = pd.concat([_old_df, df], sort=False)
-        df.to_csv(instrument_path, index=False)
+        if self.save_csv:
+            self.storage.save(symbol, df)
+        if self.qlib_storage is not None:
+            self.qlib_storage.save(symbol, df)
+    
+    def compact_instruments(self, symbols: Optional[Iterable[str]] = None) -> dict:
+        """整理已保存的标的数据文件，按日期去重并排序
+        
+        :param symbols: 需要整理的标的列表，为None时整理保存目录下所有标的
+        :return: 标的代码到整理后行数的字典
+        """
+        if symbols is None:
+            return self.storage.compact_all()
+        return {
+            self.normalize_symbol(symbol): self.storage.compact(self.normalize_symbol(symbol))
+            for symbol in symbols
+        }
     
     def cache_small_data(self, symbol, df):
         """缓存数据量较小的标的数据
@@ -166,13 +275,14 @@ class BaseCollector(abc.ABC):
                 self.mini_symbol_map.pop(symbol)
             return self.NORMAL_FLAG
     
-    def _collector(self, instrument_list, progress_callback=None, completed=0, total=0):
+    def _collector(self, instrument_list, progress_callback=None, completed=0, total=0, instrument_callback=None):
         """批量收集标的数据
         
         :param instrument_list: 标的列表
         :param progress_callback: 进度回调函数，格式为 callback(current, completed, total, failed)
         :param completed: 已完成的标的数量
         :param total: 总标的数量
+        :param instrument_callback: 标的收集成功后的回调函数，格式为 callback(symbol)
         :return: 收集失败的标的列表
         """
         error_symbol = []
@@ -192,6 +302,8 @@ class BaseCollector(abc.ABC):
             if result != self.NORMAL_FLAG:
                 error_symbol.append(_inst)
                 failed += 1
+            elif instrument_callback:
+                instrument_callback(_inst)
             
             # 再次调用回调函数更新进度
             if progress_callback:
@@ -199,8 +311,8 @@ class BaseCollector(abc.ABC):
             
             return result
         
-        # 执行并行收集
-        res = Parallel(n_jobs=self.max_workers)(
+        # 执行并行收集，收集以网络IO为主，使用线程以便共享连接池、限流器和进度状态
+        res = Parallel(n_jobs=self.max_workers, prefer="threads")(
             delayed(collect_with_progress)(_inst, idx) for idx, _inst in enumerate(instrument_list)
         )
         
@@ -209,10 +321,86 @@ class BaseCollector(abc.ABC):
         error_symbol.extend(self.mini_symbol_map.keys())
         return sorted(set(error_symbol))
     
-    def collect_data(self, progress_callback=None):
+    async def _async_collector(self, instrument_list, progress_callback=None, completed=0, total=0, instrument_callback=None):
+        """在当前事件循环中批量收集标的数据
+        
+        同时收集的标的数量不超过max_workers，标的内部的并发由async_get_data自行控制
+        
+        :param instrument_list: 标的列表
+        :param progress_callback: 进度回调函数，格式为 callback(current, completed, total, failed)
+        :param completed: 已完成的标的数量
+        :param total: 总标的数量
+        :param instrument_callback: 标的收集成功后的回调函数，格式为 callback(symbol)
+        :return: 收集失败的标的列表
+        """
+        error_symbol = []
+        failed = 0
+        semaphore = asyncio.Semaphore(max(int(self.max_workers), 1))
+        
+        async def collect_with_progress(_inst):
+            nonlocal completed, failed
+            
+            async with semaphore:
+                if progress_callback:
+                    progress_callback(_inst, completed, total, failed)
+                
+                try:
+                    result = await self._async_simple_collector(_inst)
+                except Exception as e:
+                    logger.error(f"收集 {_inst} 数据失败: {e}")
+                    result = None
+                completed += 1
+                
+                if result != self.NORMAL_FLAG:
+                    error_symbol.append(_inst)
+                    failed += 1
+                elif instrument_callback:
+                    instrument_callback(_inst)
+                
+                if progress_callback:
+                    progress_callback(_inst, completed, total, failed)
+                
+                return result
+        
+        await asyncio.gather(*(collect_with_progress(_inst) for _inst in instrument_list))
+        
+        logger.info(f"收集失败的标的数量: {len(error_symbol)}")
+        logger.info(f"当前收集的标的数量: {len(instrument_list)}")
+        error_symbol.extend(self.mini_symbol_map.keys())
+        return sorted(set(error_symbol))
+    
+    @contextlib.asynccontextmanager
+    async def async_context(self):
+        """异步收集期间共享资源的上下文，子类可重写以创建连接池、进程池等资源"""
+        yield
+    
+    async def async_collect_data(self, progress_callback=None, instrument_callback=None):
+        """在单个事件循环中执行数据收集，包括max_collector_count次重试
+        
+        :param progress_callback: 进度回调函数，格式为 callback(current, completed, total, failed)
+        :param instrument_callback: 标的收集成功后的回调函数，格式为 callback(symbol)
+        :return: 最终仍收集失败的标的列表
+        """
+        instrument_list = self.instrument_list
+        total_instruments = len(instrument_list)
+        completed = 0
+        
+        async with self.async_context():
+            for i in range(self.max_collector_count):
+                if not instrument_list:
+                    break
+                logger.info(f"第 {i+1} 次获取数据")
+                instrument_list = await self._async_collector(
+                    instrument_list, progress_callback, completed, total_instruments, instrument_callback
+                )
+                logger.info(f"第 {i+1} 次收集完成")
+        return instrument_list
+    
+    def collect_data(self, progress_callback=None, instrument_callback=None):
         """执行数据收集
         
         :param progress_callback: 进度回调函数，格式为 callback(current, completed, total, failed)
+        :param instrument_callback: 标的收集成功后的回调函数，格式为 callback(symbol)，可用于记录检查点
         """
         logger.info("开始收集数据......")
         instrument_list = self.instrument_list
@@ -220,12 +408,17 @@ class BaseCollector(abc.ABC):
         completed = 0
         failed = 0
         
-        for i in range(self.max_collector_count):
-            if not instrument_list:
-                break
-            logger.info(f"第 {i+1} 次获取数据")
-            instrument_list = self._collector(instrument_list, progress_callback, completed, total_instruments)
-            logger.info(f"第 {i+1} 次收集完成")
+        if self.async_mode:
+            instrument_list = asyncio.run(self.async_collect_data(progress_callback, instrument_callback))
+        else:
+            for i in range(self.max_collector_count):
+                if not instrument_list:
+                    break
+                logger.info(f"第 {i+1} 次获取数据")
+                instrument_list = self._collector(
+                    instrument_list, progress_callback, completed, total_instruments, instrument_callback
+                )
+                logger.info(f"第 {i+1} 次收集完成")
         
         # 处理缓存的小数据量标的
         for _symbol, _df_list in self.mini_symbol_map.items():
@@ -233,6 +426,10 @@ class BaseCollector(abc.ABC):
             if not _df.empty:
                 self.save_instrument(_symbol, _df.drop_duplicates(["date"]).sort_values(["date"]))
         
+        # 写入缓存的需要在日历中插入较早时间的标的
+        if self.qlib_storage is not None:
+            self.qlib_storage.flush()
+        
         if self.mini_symbol_map:
             logger.warning(f"数据长度小于 {self.check_data_length} 的标的列表: {list(self.mini_symbol_map.keys())}")
         
@@ -0,0 +1,632 @@
+# 标的数据存储
+import os
+import json
+import threading
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Sequence, Union
+
+import pandas as pd
+from loguru import logger
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow为可选依赖
+    pa = None
+    pq = None
+
+from ..scripts.qlib_bin import QlibBinWriter
+
+
+class CsvInstrumentStorage:
+    """按标的保存CSV数据的存储类
+    
+    每个标的对应一个{symbol}.csv文件，并维护一个{symbol}.index.json索引文件，
+    记录首尾时间戳、行数和列顺序。新数据只追加晚于最后时间戳的行，无需读取已有文件；
+    重复或乱序的数据通过compact显式整理
+    """
+    
+    FILE_SUFFIX = ".csv"
+    INDEX_SUFFIX = ".index.json"
+    
+    def __init__(self, save_dir: Union[str, Path], date_field_name: str = "date", file_suffix: str = FILE_SUFFIX):
+        """
+        初始化存储
+        
+        :param save_dir: 数据保存目录
+        :param date_field_name: 日期字段名称
+        :param file_suffix: 数据文件后缀
+        """
+        self.save_dir = Path(save_dir).expanduser().resolve()
+        self.date_field_name = date_field_name
+        self.file_suffix = file_suffix
+    
+    def get_path(self, symbol: str) -> Path:
+        """获取标的数据文件路径"""
+        return self.save_dir.joinpath(f"{symbol}{self.file_suffix}")
+    
+    def get_index_path(self, symbol: str) -> Path:
+        """获取标的索引文件路径"""
+        return self.save_dir.joinpath(f"{symbol}{self.INDEX_SUFFIX}")
+    
+    def read_index(self, symbol: str) -> Optional[dict]:
+        """读取标的索引，索引不存在或与数据文件不一致时根据文件头尾重建
+        
+        :param symbol: 标的代码
+        :return: 索引字典，包含first_date、last_date、rows、columns、size；数据文件不存在时返回None
+        """
+        path = self.get_path(symbol)
+        if not path.exists():
+            return None
+        
+        index_path = self.get_index_path(symbol)
+        if index_path.exists():
+            try:
+                with open(index_path, "r", encoding="utf-8") as f:
+                    index = json.load(f)
+                # 文件大小不一致说明数据文件被外部修改过，需要重建索引
+                if index.get("size") == path.stat().st_size:
+                    return index
+            except Exception as e:
+                logger.warning(f"读取索引文件失败: {index_path}, 错误: {e}")
+        
+        index = self._build_index_from_file(path)
+        if index is not None:
+            self._write_index(symbol, index)
+        return index
+    
+    def first_timestamp(self, symbol: str) -> Optional[pd.Timestamp]:
+        """获取标的已保存数据的首个时间戳
+        
+        :param symbol: 标的代码
+        :return: 首个时间戳，没有数据时返回None
+        """
+        index = self.read_index(symbol)
+        if not index or not index.get("first_date"):
+            return None
+        return pd.Timestamp(index["first_date"])
+    
+    def last_timestamp(self, symbol: str) -> Optional[pd.Timestamp]:
+        """获取标的已保存数据的最后时间戳
+        
+        :param symbol: 标的代码
+        :return: 最后时间戳，没有数据时返回None
+        """
+        index = self.read_index(symbol)
+        if not index or not index.get("last_date"):
+            return None
+        return pd.Timestamp(index["last_date"])
+    
+    def save(self, symbol: str, df: pd.DataFrame):
+        """保存标的数据
+        
+        晚于已保存最后时间戳的行以追加方式写入；落在已保存时间范围内的行视为重复并跳过；
+        早于已保存首个时间戳的行（向前补数据）或列发生变化时，回退为读取、合并并重写整个文件
+        
+        :param symbol: 标的代码
+        :param df: 标的数据DataFrame，需包含日期字段
+        """
+        if df is None or df.empty:
+            return
+        
+        path = self.get_path(symbol)
+        index = self.read_index(symbol)
+        if index is None or self.date_field_name not in df.columns:
+            self._rewrite(symbol, df, index)
+            return
+        
+        dates = pd.to_datetime(df[self.date_field_name], errors="coerce")
+        first_date = pd.Timestamp(index["first_date"]) if index.get("first_date") else None
+        last_date = pd.Timestamp(index["last_date"]) if index.get("last_date") else None
+        
+        if set(df.columns) != set(index["columns"]):
+            logger.info(f"{symbol} 数据列发生变化，重写数据文件")
+            self._rewrite(symbol, df, index)
+            return
+        
+        if first_date is not None and (dates < first_date).any():
+            logger.info(f"{symbol} 存在早于 {first_date} 的数据，重写数据文件")
+            self._rewrite(symbol, df, index)
+            return
+        
+        new_mask = dates > last_date if last_date is not None else dates.notna()
+        skipped = len(df) - int(new_mask.sum())
+        if skipped:
+            logger.debug(f"{symbol} 跳过 {skipped} 行已保存的数据")
+        
+        new_df = df.loc[new_mask, index["columns"]]
+        if new_df.empty:
+            return
+        
+        new_dates = dates[new_mask]
+        new_df = new_df.assign(_sort_key=new_dates.values) \
+            .drop_duplicates("_sort_key", keep="last") \
+            .sort_values("_sort_key") \
+            .drop(columns="_sort_key")
+        new_df.to_csv(path, mode="a", header=False, index=False)
+        
+        index.update({
+            "first_date": index.get("first_date") or str(new_dates.min()),
+            "last_date": str(new_dates.max()),
+            "rows": index["rows"] + len(new_df),
+            "size": path.stat().st_size,
+        })
+        self._write_index(symbol, index)
+    
+    def symbols(self) -> List[str]:
+        """获取保存目录下所有标的代码"""
+        return sorted(path.stem for path in self.save_dir.glob(f"*{self.file_suffix}"))
+    
+    def read(
+        self,
+        symbol: str,
+        columns: Optional[Sequence[str]] = None,
+        start: Optional[Union[str, pd.Timestamp]] = None,
+        end: Optional[Union[str, pd.Timestamp]] = None,
+    ) -> pd.DataFrame:
+        """读取标的数据
+        
+        只在解析时跳过不需要的列；指定开始时间时根据索引中的列顺序从文件末尾向前查找开始行，
+        只解析之后的部分，读取新增数据的耗时与已保存的数据量无关。日期范围在解析后过滤
+        
+        :param symbol: 标的代码
+        :param columns: 需要读取的列，为None时读取全部列，文件中不存在的列会被忽略
+        :param start: 开始时间（包含），为None时不限制
+        :param end: 结束时间（包含），为None时不限制
+        :return: 标的数据DataFrame，文件不存在时返回空DataFrame
+        """
+        path = self.get_path(symbol)
+        if not path.exists():
+            return pd.DataFrame()
+        wanted = set(columns) | {self.date_field_name} if columns is not None else None
+        usecols = (lambda column: column in wanted) if wanted is not None else None
+        index = self.read_index(symbol) if start is not None else None
+        if (
+            index is not None
+            and self.date_field_name in index["columns"]
+            and index.get("first_date") is not None
+            and pd.Timestamp(start) > pd.Timestamp(index["first_date"])
+        ):
+            with open(path, "rb") as f:
+                f.seek(self._tail_offset(f, index["columns"].index(self.date_field_name), pd.Timestamp(start)))
+                if not f.read(1):
+                    return pd.DataFrame(columns=[column for column in index["columns"] if usecols is None or usecols(column)])
+                f.seek(-1, os.SEEK_CUR)
+                df = pd.read_csv(f, header=None, names=index["columns"], usecols=usecols)
+        else:
+            df = pd.read_csv(path, usecols=usecols)
+        if (start is not None or end is not None) and self.date_field_name in df.columns:
+            dates = pd.to_datetime(df[self.date_field_name], errors="coerce")
+            mask = pd.Series(True, index=df.index)
+            if start is not None:
+                mask &= dates >= pd.Timestamp(start)
+            if end is not None:
+                mask &= dates <= pd.Timestamp(end)
+            df = df[mask].reset_index(drop=True)
+        return df
+    
+    def compact(self, symbol: str) -> int:
+        """整理标的数据文件：按日期去重（保留最后一条）并排序后重写
+        
+        :param symbol: 标的代码
+        :return: 整理后的行数，数据文件不存在时返回0
+        """
+        path = self.get_path(symbol)
+        if not path.exists():
+            return 0
+        
+        df = pd.read_csv(path)
+        before = len(df)
+        if self.date_field_name in df.columns:
+            df = self._dedupe_sort(df)
+        df.to_csv(path, index=False)
+        self._write_index(symbol, self._build_index(df, path))
+        logger.info(f"{symbol} 整理完成: {before} -> {len(df)} 行")
+        return len(df)
+    
+    def compact_all(self) -> dict:
+        """整理保存目录下所有标的的数据文件
+        
+        :return: 标的代码到整理后行数的字典
+        """
+        return {symbol: self.compact(symbol) for symbol in self.symbols()}
+    
+    def _dedupe_sort(self, df: pd.DataFrame) -> pd.DataFrame:
+        """按日期去重并排序"""
+        sort_key = pd.to_datetime(df[self.date_field_name], errors="coerce")
+        return df.assign(_sort_key=sort_key) \
+            .drop_duplicates("_sort_key", keep="last") \
+            .sort_values("_sort_key") \
+            .drop(columns="_sort_key") \
+            .reset_index(drop=True)
+    
+    def _rewrite(self, symbol: str, df: pd.DataFrame, index: Optional[dict]):
+        """读取已有数据与新数据合并后重写整个文件"""
+        path = self.get_path(symbol)
+        self.save_dir.mkdir(parents=True, exist_ok=True)
+        if index is not None:
+            df = pd.concat([pd.read_csv(path), df], sort=False)
+        if self.date_field_name in df.columns:
+            df = self._dedupe_sort(df)
+        df.to_csv(path, index=False)
+        self._write_index(symbol, self._build_index(df, path))
+    
+    def _build_index(self, df: pd.DataFrame, path: Path) -> dict:
+        """根据内存中的数据构建索引"""
+        first_date = last_date = None
+        if self.date_field_name in df.columns and not df.empty:
+            dates = pd.to_datetime(df[self.date_field_name], errors="coerce")
+            first_date, last_date = str(dates.min()), str(dates.max())
+        return {
+            "first_date": first_date,
+            "last_date": last_date,
+            "rows": len(df),
+            "columns": list(df.columns),
+            "size": path.stat().st_size,
+        }
+    
+    def _build_index_from_file(self, path: Path) -> Optional[dict]:
+        """只读取文件头尾构建索引，不解析整个文件
+        
+        假定文件按日期升序排列（由本类写入或compact后的文件均满足）
+        """
+        try:
+            with open(path, "rb") as f:
+                header = f.readline().decode("utf-8").strip()
+                if not header:
+                    return None
+                first_line = f.readline().decode("utf-8").strip()
+                last_line = self._read_last_line(f)
+                # 统计换行符数量得到行数，无需解析CSV
+                f.seek(0)
+                newlines = sum(chunk.count(b"\n") for chunk in iter(lambda: f.read(1 << 20), b""))
+                f.seek(-1, os.SEEK_END)
+                if f.read(1) != b"\n":
+                    newlines += 1
+        except Exception as e:
+            logger.warning(f"读取数据文件头尾失败: {path}, 错误: {e}")
+            return None
+        
+        columns = header.split(",")
+        first_date = last_date = None
+        if self.date_field_name in columns and first_line:
+            pos = columns.index(self.date_field_name)
+            first_date = str(pd.Timestamp(first_line.split(",")[pos]))
+            last_date = str(pd.Timestamp(last_line.split(",")[pos]))
+        return {
+            "first_date": first_date,
+            "last_date": last_date,
+            "rows": newlines - 1,
+            "columns": columns,
+            "size": path.stat().st_size,
+        }
+    
+    @staticmethod
+    def _read_last_line(f) -> str:
+        """从文件末尾向前读取最后一个非空行"""
+        f.seek(0, os.SEEK_END)
+        pos = f.tell()
+        data = b""
+        while pos > 0:
+            read_size = min(4096, pos)
+            pos -= read_size
+            f.seek(pos)
+            data = f.read(read_size) + data
+            lines = data.strip().split(b"\n")
+            if len(lines) > 1 or pos == 0:
+                return lines[-1].decode("utf-8").strip()
+        return ""
+    
+    @staticmethod
+    def _tail_offset(f, date_pos: int, start: pd.Timestamp) -> int:
+        """从文件末尾向前查找第一个日期不早于start的行，返回该行的字节偏移
+        
+        假定文件按日期升序排列，只解析晚于start的行和它之前的一行
+        
+        :param f: 以二进制模式打开的数据文件
+        :param date_pos: 日期字段所在的列下标
+        :param start: 开始时间
+        :return: 字节偏移，所有行都早于start时为文件末尾
+        """
+        f.seek(0)
+        header_end = len(f.readline())
+        pos = f.seek(0, os.SEEK_END)
+        data = b""
+        while pos > header_end:
+            read_size = min(1 << 16, pos - header_end)
+            pos -= read_size
+            f.seek(pos)
+            data = f.read(read_size) + data
+            lines = data.split(b"\n")
+            # 未读到表头时第一段可能是不完整的行，留到下一次读取
+            head = lines.pop(0) if pos > header_end else b""
+            offset = pos + len(head) + 1 if pos > header_end else pos
+            offsets = []
+            for line in lines:
+                offsets.append(offset)
+                offset += len(line) + 1
+            for line, line_offset in zip(reversed(lines), reversed(offsets)):
+                if line.strip() and pd.Timestamp(line.split(b",")[date_pos].decode("utf-8")) < start:
+                    return line_offset + len(line) + 1
+            data = head
+        return header_end
+    
+    def _write_index(self, symbol: str, index: dict):
+        """原子写入索引文件"""
+        index_path = self.get_index_path(symbol)
+        tmp_path = index_path.with_suffix(".tmp")
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, index_path)
+
+
+class ParquetInstrumentStorage:
+    """按标的和月份分区保存Parquet数据的存储类
+    
+    目录结构为{save_dir}/{symbol}/{YYYY-MM}.parquet（save_dir通常已按时间间隔划分），
+    日期保存为时间戳类型，数值列保存为浮点类型。读取时先按月份文件、再按行组的日期统计信息过滤，
+    只读取需要的列和日期范围；新数据只会重写其所在月份的文件
+    """
+    
+    FILE_SUFFIX = ".parquet"
+    MONTH_FORMAT = "%Y-%m"
+    ROW_GROUP_SIZE = 10000
+    COMPRESSION = "zstd"
+    
+    def __init__(self, save_dir: Union[str, Path], date_field_name: str = "date"):
+        """
+        初始化存储
+        
+        :param save_dir: 数据保存目录
+        :param date_field_name: 日期字段名称
+        """
+        if pq is None:
+            raise ImportError("使用Parquet存储需要安装pyarrow")
+        self.save_dir = Path(save_dir).expanduser().resolve()
+        self.date_field_name = date_field_name
+    
+    def get_symbol_dir(self, symbol: str) -> Path:
+        """获取标的数据目录"""
+        return self.save_dir.joinpath(symbol)
+    
+    def get_path(self, symbol: str, month: str) -> Path:
+        """获取标的某个月份的数据文件路径"""
+        return self.get_symbol_dir(symbol).joinpath(f"{month}{self.FILE_SUFFIX}")
+    
+    def get_month_files(
+        self,
+        symbol: str,
+        start: Optional[Union[str, pd.Timestamp]] = None,
+        end: Optional[Union[str, pd.Timestamp]] = None,
+    ) -> List[Path]:
+        """获取标的在日期范围内的月份文件，按月份升序排列"""
+        files = sorted(self.get_symbol_dir(symbol).glob(f"*{self.FILE_SUFFIX}"))
+        if start is not None:
+            files = [path for path in files if path.stem >= pd.Timestamp(start).strftime(self.MONTH_FORMAT)]
+        if end is not None:
+            files = [path for path in files if path.stem <= pd.Timestamp(end).strftime(self.MONTH_FORMAT)]
+        return files
+    
+    def symbols(self) -> List[str]:
+        """获取保存目录下所有标的代码"""
+        if not self.save_dir.exists():
+            return []
+        return sorted(
+            path.name for path in self.save_dir.iterdir()
+            if path.is_dir() and any(path.glob(f"*{self.FILE_SUFFIX}"))
+        )
+    
+    def first_timestamp(self, symbol: str) -> Optional[pd.Timestamp]:
+        """获取标的已保存数据的首个时间戳，只读取第一个月份文件的日期列
+        
+        :param symbol: 标的代码
+        :return: 首个时间戳，没有数据时返回None
+        """
+        files = self.get_month_files(symbol)
+        if not files:
+            return None
+        dates = pq.read_table(files[0], columns=[self.date_field_name]).column(0).to_pandas()
+        return pd.Timestamp(dates.min()) if not dates.empty else None
+    
+    def last_timestamp(self, symbol: str) -> Optional[pd.Timestamp]:
+        """获取标的已保存数据的最后时间戳，只读取最后一个月份文件的日期列
+        
+        :param symbol: 标的代码
+        :return: 最后时间戳，没有数据时返回None
+        """
+        files = self.get_month_files(symbol)
+        if not files:
+            return None
+        dates = pq.read_table(files[-1], columns=[self.date_field_name]).column(0).to_pandas()
+        return pd.Timestamp(dates.max()) if not dates.empty else None
+    
+    def save(self, symbol: str, df: pd.DataFrame):
+        """保存标的数据
+        
+        数据按月份拆分，每个月份与已保存的文件合并、按日期去重（保留最后一条）并排序后重写
+        
+        :param symbol: 标的代码
+        :param df: 标的数据DataFrame，需包含日期字段
+        """
+        if df is None or df.empty:
+            return
+        
+        df = self._typed(df).dropna(subset=[self.date_field_name])
+        self.get_symbol_dir(symbol).mkdir(parents=True, exist_ok=True)
+        for month, part in df.groupby(df[self.date_field_name].dt.strftime(self.MONTH_FORMAT)):
+            path = self.get_path(symbol, month)
+            if path.exists():
+                part = pd.concat([pq.read_table(path).to_pandas(), part], sort=False)
+            part = part.drop_duplicates(self.date_field_name, keep="last").sort_values(self.date_field_name)
+            self._write(path, part)
+    
+    def read(
+        self,
+        symbol: str,
+        columns: Optional[Sequence[str]] = None,
+        start: Optional[Union[str, pd.Timestamp]] = None,
+        end: Optional[Union[str, pd.Timestamp]] = None,
+    ) -> pd.DataFrame:
+        """读取标的数据，只读取需要的列，日期范围下推到月份文件和行组过滤
+        
+        :param symbol: 标的代码
+        :param columns: 需要读取的列，为None时读取全部列，文件中不存在的列会被忽略
+        :param start: 开始时间（包含），为None时不限制
+        :param end: 结束时间（包含），为None时不限制
+        :return: 标的数据DataFrame，没有数据时返回空DataFrame
+        """
+        files = self.get_month_files(symbol, start, end)
+        if not files:
+            return pd.DataFrame()
+        
+        filters = []
+        if start is not None:
+            filters.append((self.date_field_name, ">=", pd.Timestamp(start)))
+        if end is not None:
+            filters.append((self.date_field_name, "<=", pd.Timestamp(end)))
+        dataset = pq.ParquetDataset([str(path) for path in files], filters=filters or None)
+        if columns is not None:
+            wanted = set(columns) | {self.date_field_name}
+            columns = [name for name in dataset.schema.names if name in wanted]
+        return dataset.read(columns=columns).to_pandas()
+    
+    def compact(self, symbol: str) -> int:
+        """Parquet数据在保存时已按月份去重排序，只统计行数
+        
+        :param symbol: 标的代码
+        :return: 行数，没有数据时返回0
+        """
+        return sum(pq.ParquetFile(path).metadata.num_rows for path in self.get_month_files(symbol))
+    
+    def compact_all(self) -> dict:
+        """统计保存目录下所有标的的行数
+        
+        :return: 标的代码到行数的字典
+        """
+        return {symbol: self.compact(symbol) for symbol in self.symbols()}
+    
+    def _typed(self, df: pd.DataFrame) -> pd.DataFrame:
+        """将日期转换为时间戳类型、数值字符串转换为浮点类型"""
+        df = df.copy()
+        df[self.date_field_name] = pd.to_datetime(df[self.date_field_name], errors="coerce")
+        for column in df.columns:
+            if column == self.date_field_name:
+                continue
+            if pd.api.types.is_numeric_dtype(df[column]):
+                df[column] = df[column].astype("float64")
+            elif pd.api.types.is_object_dtype(df[column]) or pd.api.types.is_string_dtype(df[column]):
+                # pandas 3默认使用字符串类型保存文本列，与object类型同样需要转换
+                converted = pd.to_numeric(df[column], errors="coerce")
+                # 只有全部非空值都能转换时才视为数值列，交易对代码等保持字符串
+                if converted.notna().sum() == df[column].notna().sum():
+                    df[column] = converted.astype("float64")
+        return df
+    
+    def _write(self, path: Path, df: pd.DataFrame):
+        """原子写入月份文件"""
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        tmp_path = path.with_name(f"{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        pq.write_table(table, tmp_path, row_group_size=self.ROW_GROUP_SIZE, compression=self.COMPRESSION)
+        os.replace(tmp_path, path)
+
+
+# 原始数据存储格式到存储类的映射
+INSTRUMENT_STORAGES = {
+    "csv": CsvInstrumentStorage,
+    "parquet": ParquetInstrumentStorage,
+}
+
+
+def get_instrument_storage(
+    storage_format: str, save_dir: Union[str, Path], date_field_name: str = "date"
+) -> Union[CsvInstrumentStorage, ParquetInstrumentStorage]:
+    """
+    根据存储格式创建原始数据存储
+    
+    :param storage_format: 存储格式，可选"csv"或"parquet"
+    :param save_dir: 数据保存目录
+    :param date_field_name: 日期字段名称
+    :return: 存储实例
+    """
+    if storage_format not in INSTRUMENT_STORAGES:
+        raise ValueError(f"不支持的存储格式: {storage_format}，可选: {list(INSTRUMENT_STORAGES)}")
+    return INSTRUMENT_STORAGES[storage_format](save_dir, date_field_name=date_field_name)
+
+
+class QlibBinStorage:
+    """将标的数据直接写入QLib二进制格式的存储类
+    
+    每个标的下载完成后立即写入features目录下的二进制文件，并更新日历和标的列表，
+    无需先保存CSV再转换。只在日历末尾追加时间的标的立即写入；需要在日历中插入较早时间的标的先缓存，
+    由flush一次性插入日历并重新对齐已写入的标的，避免每个标的都重写全部文件
+    """
+    
+    # 缓存的标的数量达到该值时自动写入
+    MAX_PENDING = 64
+    
+    def __init__(
+        self,
+        qlib_dir: Union[str, Path],
+        freq: str = "day",
+        fields: Iterable[str] = ("open", "high", "low", "close", "volume"),
+        date_field_name: str = "date",
+    ):
+        """
+        初始化存储
+        
+        :param qlib_dir: QLib数据目录
+        :param freq: QLib频率，如"day"、"1h"
+        :param fields: 需要写入的字段
+        :param date_field_name: 日期字段名称
+        """
+        self.writer = QlibBinWriter(qlib_dir, freq=freq, fields=fields, date_field_name=date_field_name)
+        self.qlib_dir = self.writer.qlib_dir
+        self.date_field_name = date_field_name
+        # 日历和标的列表由所有标的共用，多线程收集时串行写入
+        self._lock = threading.Lock()
+        self._pending: Dict[str, pd.DataFrame] = {}
+    
+    def last_timestamp(self, symbol: str) -> Optional[pd.Timestamp]:
+        """获取标的已写入数据的最后时间戳，包括缓存中尚未写入的数据
+        
+        :param symbol: 标的代码
+        :return: 最后时间戳，没有数据时返回None
+        """
+        with self._lock:
+            instruments = self.writer.read_instruments()
+            pending = self._pending.get(symbol.upper())
+        timestamps = [instruments[symbol.upper()][1]] if symbol.upper() in instruments else []
+        if pending is not None:
+            timestamps.append(pd.to_datetime(pending[self.date_field_name]).max())
+        return max(timestamps) if timestamps else None
+    
+    def save(self, symbol: str, df: pd.DataFrame):
+        """写入标的数据，已写入的数据保留，只追加新的K线
+        
+        数据需要在日历中插入较早的时间时先缓存，缓存达到MAX_PENDING个标的或调用flush时统一写入
+        
+        :param symbol: 标的代码
+        :param df: 标的数据DataFrame，需包含日期字段
+        """
+        if df is None or df.empty:
+            return
+        symbol = symbol.upper()
+        with self._lock:
+            if symbol in self._pending:
+                self._pending[symbol] = pd.concat([self._pending[symbol], df], ignore_index=True)
+            elif self.writer.update({symbol: df}, partial=True) is None:
+                self._pending[symbol] = df
+            if len(self._pending) >= self.MAX_PENDING:
+                self._flush()
+    
+    def flush(self):
+        """将缓存的标的写入，日历中一次性插入所有较早的时间并重新对齐已写入的标的"""
+        with self._lock:
+            self._flush()
+    
+    def _flush(self):
+        """写入缓存的标的，调用方需持有锁"""
+        if not self._pending:
+            return
+        pending, self._pending = self._pending, {}
+        self.writer.update(pending, rebase=True, partial=True)
@@ -1,9 +1,11 @@
 # 通用工具函数
 import time
 import asyncio
+import threading
 from functools import wraps
 from datetime import datetime, timedelta
 
+import numpy as np
 import pandas as pd
 from loguru import logger
 
@@ -103,6 +105,51 @@ def str_to_timestamp(date_str, unit='ms'):
         raise ValueError(f"不支持的时间戳单位: {unit}")
 
 
+# 各时间戳单位的取值范围[下限, 上限)及换算为纳秒的倍数，上限保证换算后不超出int64
+TIMESTAMP_UNITS = [
+    ('s', 10 ** 8, 9 * 10 ** 9, 10 ** 9),
+    ('ms', 10 ** 11, 9 * 10 ** 12, 10 ** 6),
+    ('us', 10 ** 14, 9 * 10 ** 15, 10 ** 3),
+    ('ns', 10 ** 17, np.iinfo(np.int64).max, 1),
+]
+
+
+def classify_timestamp_units(values):
+    """
+    按数量级逐行判断时间戳单位
+    
+    :param values: int64时间戳数组
+    :return: 每行换算为纳秒的倍数数组，无法识别的行为0
+    """
+    magnitude = np.abs(values)
+    return np.select(
+        [(magnitude >= low) & (magnitude < high) for _, low, high, _ in TIMESTAMP_UNITS],
+        [factor for _, _, _, factor in TIMESTAMP_UNITS],
+        default=0,
+    )
+
+
+def timestamps_to_datetime(values):
+    """
+    将时间戳向量化转换为datetime64[ns]数组，同一列中可以混合秒、毫秒、微秒和纳秒
+    
+    :param values: 时间戳序列，可以是数值或数值字符串
+    :return: datetime64[ns]数组，无效时间戳为NaT
+    """
+    numeric = pd.to_numeric(pd.Series(values), errors='coerce')
+    if pd.api.types.is_integer_dtype(numeric):
+        raw = numeric.to_numpy(dtype='int64')
+        valid = np.ones(len(raw), dtype=bool)
+    else:
+        valid = np.isfinite(numeric.to_numpy(dtype='float64'))
+        raw = numeric.where(valid, 0).to_numpy(dtype='float64').astype('int64')
+    
+    factors = classify_timestamp_units(raw)
+    valid &= factors > 0
+    ns = np.where(valid, raw * factors, np.iinfo(np.int64).min)
+    return ns.view('datetime64[ns]')
+
+
 def get_interval_minutes(interval):
     """
     获取时间间隔对应的分钟数
@@ -157,6 +204,70 @@ def get_interval_ms(interval):
     return interval_map.get(interval, 60 * 1000)  # 默认1分钟
 
 
+class TokenBucket:
+    """令牌桶限流器，线程安全，用于遵守交易所接口的频率限制"""
+    
+    def __init__(self, rate, per=1.0, capacity=None):
+        """
+        初始化令牌桶
+        
+        :param rate: 每个时间窗口内允许的请求数
+        :param per: 时间窗口长度（秒），如OKX的20次/2秒对应rate=20, per=2.0
+        :param capacity: 桶容量，即允许的最大突发请求数，默认等于rate
+        """
+        self.fill_rate = float(rate) / float(per)
+        self.capacity = float(capacity if capacity is not None else rate)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+    
+    def _refill(self):
+        """按经过的时间补充令牌"""
+        now = time.monotonic()
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated) * self.fill_rate)
+        self._updated = now
+    
+    def acquire(self, tokens=1):
+        """
+        获取令牌，令牌不足时阻塞等待
+        
+        :param tokens: 需要的令牌数
+        """
+        while True:
+            with self._lock:
+                self._refill()
+                if self._tokens >= tokens:
+                    self._tokens -= tokens
+                    return
+                wait = (tokens - self._tokens) / self.fill_rate
+            time.sleep(wait)
+
+
+# 进程内共享的令牌桶，键为限流对象（如交易所接口）和限制参数
+_shared_token_buckets = {}
+_shared_token_buckets_lock = threading.Lock()
+
+
+def shared_token_bucket(key, rate, per=1.0, capacity=None):
+    """
+    获取进程内共享的令牌桶
+    
+    同一交易所的多个下载器（如并发运行的多个下载任务）使用同一个令牌桶，总请求频率不超过交易所的限制
+    
+    :param key: 限流对象的标识，如交易所接口地址
+    :param rate: 每个时间窗口内允许的请求数
+    :param per: 时间窗口长度（秒）
+    :param capacity: 桶容量，默认等于rate
+    :return: TokenBucket实例
+    """
+    bucket_key = (key, rate, per, capacity)
+    with _shared_token_buckets_lock:
+        bucket = _shared_token_buckets.get(bucket_key)
+        if bucket is None:
+            bucket = _shared_token_buckets[bucket_key] = TokenBucket(rate, per, capacity)
+        return bucket
+
+
 class ProgressBar:
     """进度条工具类"""
     
@@ -1,5 +1,7 @@
 # 加密货币基础类
 import abc
+import contextlib
+from concurrent.futures import ProcessPoolExecutor
 from pathlib import Path
 
 import pandas as pd
@@ -22,6 +24,11 @@ class CryptoBaseCollector(BaseCollector):
         delay=0,
         check_data_length: int = None,
         limit_nums: int = None,
+        async_mode: bool = False,
+        incremental: bool = False,
+        qlib_sink_dir=None,
+        save_csv: bool = True,
+        storage_format: str = "csv",
     ):
         """
         初始化加密货币收集器
@@ -35,7 +42,15 @@ class CryptoBaseCollector(BaseCollector):
         :param delay: 请求延迟时间（秒）
         :param check_data_length: 数据长度检查阈值
         :param limit_nums: 限制收集的标的数量，用于调试
+        :param async_mode: 是否使用异步收集模式
+        :param incremental: 是否增量收集，从已保存数据的最后时间戳开始下载
+        :param qlib_sink_dir: QLib数据目录，提供时每个交易对下载完成后直接写入QLib二进制格式，无需再转换
+        :param save_csv: 是否同时保存原始数据文件，仅在提供qlib_sink_dir时可以关闭
+        :param storage_format: 原始数据存储格式，可选'csv'或'parquet'（按交易对和月份分区）
         """
+        # 异步收集期间用于解析CSV的进程池，仅在async_context内有效
+        self.parse_executor = None
+        
         super().__init__(
             save_dir=save_dir,
             start=start,
@@ -46,6 +61,11 @@ class CryptoBaseCollector(BaseCollector):
             delay=delay,
             check_data_length=check_data_length,
             limit_nums=limit_nums,
+            async_mode=async_mode,
+            incremental=incremental,
+            qlib_sink_dir=qlib_sink_dir,
+            save_csv=save_csv,
+            storage_format=storage_format,
         )
         
         # 初始化加密货币相关配置
@@ -55,6 +75,17 @@ class CryptoBaseCollector(BaseCollector):
             'taker_buy_quote_volume', 'ignore'
         ]
     
+    @contextlib.asynccontextmanager
+    async def async_context(self):
+        """异步收集期间创建解析CSV使用的进程池，收集结束后关闭"""
+        self.parse_executor = ProcessPoolExecutor(max_workers=max(int(self.max_workers), 1))
+        try:
+            async with super().async_context():
+                yield
+        finally:
+            self.parse_executor.shutdown(wait=True)
+            self.parse_executor = None
+    
     @property
     @abc.abstractmethod
     def _timezone(self):
@@ -1,8 +1,10 @@
 # 币安数据收集模块
 from .collector import BinanceCollector
 from .downloader import BinanceDownloader
+from .cache import ArchiveCache
 
 __all__ = [
     "BinanceCollector",
-    "BinanceDownloader"
+    "BinanceDownloader",
+    "ArchiveCache"
 ]
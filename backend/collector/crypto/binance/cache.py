@@ -0,0 +1,140 @@
+# 币安归档文件本地缓存
+import hashlib
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Optional, Union
+
+from loguru import logger
+
+
+class ArchiveCache:
+    """币安归档压缩包的本地磁盘缓存
+    
+    data.binance.vision上已发布的归档文件不会再变化，因此下载过的压缩包可以直接从磁盘读取。
+    压缩包按内容的SHA256存储在objects目录下（内容寻址），urls目录记录URL到内容哈希的映射；
+    读取时校验内容哈希，缓存总大小超过max_size时按最近访问时间淘汰最久未使用的文件
+    """
+    
+    OBJECT_SUFFIX = ".zip"
+    
+    def __init__(self, cache_dir: Union[str, Path], max_size: int = 5 * 1024 ** 3):
+        """
+        初始化缓存
+        
+        :param cache_dir: 缓存目录
+        :param max_size: 缓存总大小上限（字节），默认5GB
+        """
+        self.cache_dir = Path(cache_dir).expanduser().resolve()
+        self.objects_dir = self.cache_dir / "objects"
+        self.urls_dir = self.cache_dir / "urls"
+        self.objects_dir.mkdir(parents=True, exist_ok=True)
+        self.urls_dir.mkdir(parents=True, exist_ok=True)
+        self.max_size = int(max_size)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._size = sum(path.stat().st_size for path in self._iter_objects())
+    
+    @staticmethod
+    def sha256(content: bytes) -> str:
+        """计算内容的SHA256哈希"""
+        return hashlib.sha256(content).hexdigest()
+    
+    @property
+    def size(self) -> int:
+        """缓存中压缩包的总大小（字节）"""
+        return self._size
+    
+    def _url_path(self, url: str) -> Path:
+        """获取URL映射文件路径"""
+        return self.urls_dir / hashlib.sha256(url.encode("utf-8")).hexdigest()
+    
+    def _object_path(self, digest: str) -> Path:
+        """获取内容文件路径"""
+        return self.objects_dir / f"{digest}{self.OBJECT_SUFFIX}"
+    
+    def _iter_objects(self):
+        """遍历缓存中的所有内容文件"""
+        return self.objects_dir.glob(f"*{self.OBJECT_SUFFIX}")
+    
+    def get(self, url: str) -> Optional[bytes]:
+        """
+        读取URL对应的缓存内容
+        
+        :param url: 归档文件URL
+        :return: 压缩包字节内容，未命中或校验失败时返回None
+        """
+        url_path = self._url_path(url)
+        try:
+            digest = url_path.read_text(encoding="utf-8").strip()
+            object_path = self._object_path(digest)
+            content = object_path.read_bytes()
+        except (FileNotFoundError, OSError):
+            self.misses += 1
+            return None
+        
+        if self.sha256(content) != digest:
+            logger.warning(f"缓存文件校验失败，已删除: {object_path}")
+            self._remove_object(object_path)
+            url_path.unlink(missing_ok=True)
+            self.misses += 1
+            return None
+        
+        # 以修改时间记录最近访问时间，用于LRU淘汰
+        now = time.time()
+        os.utime(object_path, (now, now))
+        self.hits += 1
+        return content
+    
+    def put(self, url: str, content: bytes) -> str:
+        """
+        写入URL对应的内容，写入后超过大小上限时淘汰最久未使用的文件
+        
+        :param url: 归档文件URL
+        :param content: 压缩包字节内容
+        :return: 内容的SHA256哈希
+        """
+        digest = self.sha256(content)
+        object_path = self._object_path(digest)
+        with self._lock:
+            if not object_path.exists():
+                tmp_path = object_path.with_name(f"{object_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+                tmp_path.write_bytes(content)
+                os.replace(tmp_path, object_path)
+                self._size += len(content)
+            tmp_path = self._url_path(url).with_suffix(".tmp")
+            tmp_path.write_text(digest, encoding="utf-8")
+            os.replace(tmp_path, self._url_path(url))
+            if self._size > self.max_size:
+                self._evict(keep=object_path)
+        return digest
+    
+    def _remove_object(self, object_path: Path):
+        """删除内容文件并更新缓存大小"""
+        try:
+            size = object_path.stat().st_size
+            object_path.unlink()
+        except FileNotFoundError:
+            return
+        self._size -= size
+    
+    def _evict(self, keep: Optional[Path] = None):
+        """按最近访问时间淘汰文件，直到缓存大小不超过上限
+        
+        URL映射文件不会随之删除，指向已淘汰内容的映射在读取时视为未命中
+        
+        :param keep: 不淘汰的文件，通常为刚写入的文件
+        """
+        objects = sorted(
+            (path.stat().st_mtime, path) for path in self._iter_objects() if path != keep
+        )
+        evicted = 0
+        for _, path in objects:
+            if self._size <= self.max_size:
+                break
+            self._remove_object(path)
+            evicted += 1
+        if evicted:
+            logger.debug(f"归档缓存淘汰 {evicted} 个文件，当前大小: {self._size} 字节")
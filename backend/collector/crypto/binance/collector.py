@@ -1,10 +1,15 @@
 # 币安数据收集器
+import asyncio
+import contextlib
+
+import numpy as np
 import pandas as pd
 import requests
 from loguru import logger
 
 from ...base import BaseCollector
-from ...base.utils import deco_retry
+from ...base.utils import deco_retry, timestamps_to_datetime
+from ...utils.symbol_cache import symbol_cache
 from ..base import CryptoBaseCollector
 from .downloader import BinanceDownloader
 
@@ -25,6 +30,15 @@ class BinanceCollector(CryptoBaseCollector):
         limit_nums=None,
         candle_type='spot',
         symbols=None,
+        max_concurrency=8,
+        use_monthly_archive=False,
+        async_mode=False,
+        incremental=False,
+        cache_dir=None,
+        debug=False,
+        qlib_sink_dir=None,
+        save_csv=True,
+        storage_format="csv",
     ):
         """
         初始化币安数据收集器
@@ -40,10 +54,21 @@ class BinanceCollector(CryptoBaseCollector):
         :param limit_nums: 限制收集的标的数量，用于调试
         :param candle_type: 蜡烛图类型，可选'spot'（现货）、'futures'（期货）或'option'（期权）
         :param symbols: 交易对列表，如['BTCUSDT', 'ETHUSDT']，如果为None则获取全量交易对
+        :param max_concurrency: 单个交易对按日下载归档文件时的最大并发数
+        :param use_monthly_archive: 是否优先使用月归档下载完整月份，不完整月份仍使用日归档
+        :param async_mode: 是否使用异步收集模式，所有交易对共用一个会话和全局并发上限max_concurrency
+        :param incremental: 是否增量收集，从已保存数据的最后时间戳开始下载
+        :param cache_dir: 归档文件本地缓存目录，为None时不使用缓存
+        :param debug: 是否输出每个交易对时间戳的统计信息，用于排查数据问题
+        :param qlib_sink_dir: QLib数据目录，提供时每个交易对下载完成后直接写入QLib二进制格式，无需再转换
+        :param save_csv: 是否同时保存原始数据文件，仅在提供qlib_sink_dir时可以关闭
+        :param storage_format: 原始数据存储格式，可选'csv'或'parquet'（按交易对和月份分区）
         """
         # 先设置必要的属性，再调用父类的__init__方法
         self.candle_type = candle_type
         self.symbols = symbols
+        self.use_monthly_archive = use_monthly_archive
+        self.debug = debug
         
         super().__init__(
             save_dir=save_dir,
@@ -55,9 +80,26 @@ class BinanceCollector(CryptoBaseCollector):
             delay=delay,
             check_data_length=check_data_length,
             limit_nums=limit_nums,
+            async_mode=async_mode,
+            incremental=incremental,
+            qlib_sink_dir=qlib_sink_dir,
+            save_csv=save_csv,
+            storage_format=storage_format,
         )
         
-        self.downloader = BinanceDownloader(candle_type=candle_type)
+        # 异步收集期间共享的下载会话和全局并发信号量，仅在async_context内有效
+        self._download_session = None
+        self._download_semaphore = None
+        # 本次收集中每个交易对使用的月归档/日归档数量，由下载结果的attrs['archive_plan']记录
+        self.archive_plans = {}
+        
+        # 收集器只使用OHLCV，下载器只解析这几列
+        self.downloader = BinanceDownloader(
+            candle_type=candle_type,
+            max_concurrency=max_concurrency,
+            cache_dir=cache_dir,
+            columns=BinanceDownloader.OHLCV_COLUMNS,
+        )
         self.candle_names = [
             'open_time', 'open', 'high', 'low', 'close', 'volume',
             'close_time', 'quote_volume', 'count', 'taker_buy_volume',
@@ -69,33 +111,41 @@ class BinanceCollector(CryptoBaseCollector):
         """获取时区"""
         return "UTC"
     
+    # 各交易类型的交易对信息接口
+    EXCHANGE_INFO_URLS = {
+        'spot': 'https://api.binance.com/api/v3/exchangeInfo',
+        'futures': 'https://fapi.binance.com/fapi/v1/exchangeInfo',
+    }
+    
     @deco_retry(max_retry=3, delay=1.0)
+    def fetch_all_symbols(self):
+        """
+        从Binance API获取全量交易对列表，失败时抛出异常
+        
+        :return: 交易对列表
+        """
+        response = requests.get(self.EXCHANGE_INFO_URLS[self.candle_type], timeout=30)
+        response.raise_for_status()
+        data = response.json()
+        
+        # 提取交易对列表
+        symbols = [symbol['symbol'] for symbol in data['symbols'] if symbol['status'] == 'TRADING']
+        logger.info(f"成功获取{len(symbols)}个{self.candle_type}交易对")
+        return symbols
+    
     def get_all_symbols(self):
         """
-        从Binance API获取全量交易对列表
+        获取全量交易对列表，优先使用交易对缓存，缓存过期时在后台刷新
         
         :return: 交易对列表
         """
+        if self.candle_type not in self.EXCHANGE_INFO_URLS:
+            # 其他类型暂不支持
+            logger.warning(f"暂不支持获取{self.candle_type}类型的交易对列表")
+            return []
+        
         try:
-            if self.candle_type == 'spot':
-                # 现货交易对
-                url = 'https://api.binance.com/api/v3/exchangeInfo'
-            elif self.candle_type == 'futures':
-                # 合约交易对
-                url = 'https://fapi.binance.com/fapi/v1/exchangeInfo'
-            else:
-                # 其他类型暂不支持
-                logger.warning(f"暂不支持获取{self.candle_type}类型的交易对列表")
-                return []
-            
-            response = requests.get(url)
-            response.raise_for_status()
-            data = response.json()
-            
-            # 提取交易对列表
-            symbols = [symbol['symbol'] for symbol in data['symbols'] if symbol['status'] == 'TRADING']
-            logger.info(f"成功获取{len(symbols)}个{self.candle_type}交易对")
-            return symbols
+            return symbol_cache.get(f"binance_{self.candle_type}", self.fetch_all_symbols)
         except Exception as e:
             logger.error(f"获取交易对列表失败: {e}")
             return []
@@ -123,7 +173,12 @@ class BinanceCollector(CryptoBaseCollector):
         return symbol.replace('/', '')
     
     def get_data(
-        self, symbol: str, interval: str, start_datetime: pd.Timestamp, end_datetime: pd.Timestamp
+        self,
+        symbol: str,
+        interval: str,
+        start_datetime: pd.Timestamp,
+        end_datetime: pd.Timestamp,
+        use_monthly_archive: bool = None,
     ) -> pd.DataFrame:
         """
         获取指定交易对的K线数据
@@ -132,8 +187,12 @@ class BinanceCollector(CryptoBaseCollector):
         :param interval: 时间间隔
         :param start_datetime: 开始时间
         :param end_datetime: 结束时间
-        :return: K线数据DataFrame
+        :param use_monthly_archive: 是否优先使用月归档，为None时使用收集器的配置
+        :return: K线数据DataFrame，下载使用的月归档/日归档数量记录在attrs['archive_plan']中
         """
+        if use_monthly_archive is None:
+            use_monthly_archive = self.use_monthly_archive
+        
         try:
             # 将时间转换为字符串格式
             start_date = start_datetime.strftime('%Y-%m-%d')
@@ -142,115 +201,116 @@ class BinanceCollector(CryptoBaseCollector):
             logger.info(f"开始下载 {symbol} {interval} 数据，时间范围: {start_date} 至 {end_date}")
             
             # 使用下载器下载数据
-            df = self.downloader.download(symbol, interval, start_date, end_date)
-            
-            if df.empty:
-                logger.warning(f"{symbol} {interval} 数据为空")
-                return df
-            
-            # 数据处理
-            logger.info(f"原始数据行数: {len(df)}")
-            logger.info(f"原始数据类型: {df.dtypes}")
-            
-            # 1. 确保open_time列是数值类型
-            logger.info("开始处理open_time列...")
-            
-            # 转换open_time列为数值类型，无法转换的值设为NaN
-            df['open_time'] = pd.to_numeric(df['open_time'], errors='coerce')
-            
-            # 过滤掉open_time为NaN的行
-            df = df.dropna(subset=['open_time'])
-            logger.info(f"转换为数值类型后的数据行数: {len(df)}")
-            
-            if df.empty:
-                logger.warning(f"{symbol} {interval} 数据在转换为数值类型后为空")
-                return df
-            
-            # 2. 记录open_time列的统计信息
-            logger.info(f"open_time列的统计信息:")
-            logger.info(f"  最小值: {df['open_time'].min()}")
-            logger.info(f"  最大值: {df['open_time'].max()}")
-            logger.info(f"  平均值: {df['open_time'].mean()}")
-            
-            # 3. 转换为datetime，处理无效时间戳
-            logger.info("开始转换时间戳...")
-            
-            # 自动检测时间戳单位
-            # 13位数字: 毫秒级 (ms)
-            # 16位数字: 微秒级 (us)
-            # 19位数字: 纳秒级 (ns)
-            first_open_time = df['open_time'].iloc[0]
-            timestamp_length = len(str(int(first_open_time)))
-            
-            logger.info(f"第一个时间戳: {first_open_time}，长度: {timestamp_length}")
-            
-            # 根据时间戳长度直接计算正确的单位和转换值
-            df['date'] = pd.Series(dtype='datetime64[ns]')
-            valid_count = 0
-            
-            # 方法1：根据长度直接转换
-            try:
-                if timestamp_length == 13:  # 毫秒
-                    df['date'] = pd.to_datetime(df['open_time'], unit='ms', errors='coerce')
-                elif timestamp_length == 16:  # 微秒
-                    # 先将微秒转换为秒，再转换为datetime
-                    df['date'] = pd.to_datetime(df['open_time'] / 1000000, unit='s', errors='coerce')
-                elif timestamp_length == 19:  # 纳秒
-                    df['date'] = pd.to_datetime(df['open_time'], unit='ns', errors='coerce')
-                else:  # 其他长度，尝试多种单位
-                    logger.warning(f"时间戳长度 {timestamp_length} 不常见，尝试多种转换方法...")
-                    
-                    # 尝试直接转换（适用于已格式化的字符串）
-                    df['date'] = pd.to_datetime(df['open_time'], errors='coerce')
-                    valid_count = df['date'].notna().sum()
-                    
-                    if valid_count == 0:
-                        # 尝试除以不同的系数转换为秒
-                        for divisor in [1000, 1000000, 1000000000]:
-                            df['date'] = pd.to_datetime(df['open_time'] / divisor, unit='s', errors='coerce')
-                            valid_count = df['date'].notna().sum()
-                            if valid_count > 0:
-                                logger.info(f"通过除以 {divisor} 转换成功，有效日期数量: {valid_count}")
-                                break
-                
-                valid_count = df['date'].notna().sum()
-                logger.info(f"时间戳转换结果: 有效日期 {valid_count} 个，无效日期 {len(df) - valid_count} 个")
-            except Exception as e:
-                logger.error(f"时间戳转换异常: {e}")
-                df['date'] = pd.to_datetime(df['open_time'], errors='coerce')
-                valid_count = df['date'].notna().sum()
-            
-            # 记录转换结果
-            valid_dates = df['date'].notna().sum()
-            invalid_dates = df['date'].isna().sum()
-            logger.info(f"时间戳转换结果: 有效日期 {valid_dates} 个，无效日期 {invalid_dates} 个")
-            
-            # 4. 记录无效时间戳的具体值
-            if invalid_dates > 0:
-                invalid_times = df[df['date'].isna()]['open_time'].tolist()
-                logger.warning(f"无效时间戳值: {invalid_times}")
-            
-            # 5. 过滤掉无效时间戳的行
-            filtered_df = df.dropna(subset=['date'])
-            
-            # 6. 记录过滤掉的无效行数量
-            if len(filtered_df) < len(df):
-                logger.warning(f"过滤掉了 {len(df) - len(filtered_df)} 行无效时间戳数据")
+            df = self.downloader.download(
+                symbol, interval, start_date, end_date, use_monthly=use_monthly_archive
+            )
             
-            # 7. 只保留需要的列
-            filtered_df = filtered_df[['date', 'open', 'high', 'low', 'close', 'volume']]
-            filtered_df.columns = ['date', 'open', 'high', 'low', 'close', 'volume']
+            self.archive_plans[symbol] = df.attrs.get('archive_plan')
+            return self.process_klines(df, symbol, interval, start_datetime, end_datetime)
+        except Exception as e:
+            logger.error(f"下载 {symbol} {interval} 数据失败: {e}")
+            logger.exception(e)  # 记录完整的异常堆栈
+            return pd.DataFrame()
+    
+    def process_klines(
+        self, df: pd.DataFrame, symbol: str, interval: str, start_datetime: pd.Timestamp, end_datetime: pd.Timestamp
+    ) -> pd.DataFrame:
+        """
+        将下载的原始K线数据处理为date/open/high/low/close/volume格式
+        
+        :param df: 下载器返回的原始K线数据
+        :param symbol: 交易对符号
+        :param interval: 时间间隔
+        :param start_datetime: 开始时间
+        :param end_datetime: 结束时间
+        :return: 处理后的K线数据DataFrame
+        """
+        if df.empty:
+            logger.warning(f"{symbol} {interval} 数据为空")
+            return df
+        
+        # 逐行按数量级识别时间戳单位（币安2025年起现货归档改为微秒），一次转换为datetime64[ns]
+        dates = timestamps_to_datetime(df['open_time'])
+        valid = ~np.isnat(dates)
+        invalid_count = len(df) - int(valid.sum())
+        
+        if self.debug:
+            raw = pd.to_numeric(df['open_time'], errors='coerce')
+            digits = raw.dropna().abs().astype('int64').astype(str).str.len().value_counts().to_dict()
+            logger.debug(
+                f"{symbol} {interval} 原始数据行数: {len(df)}, open_time最小值: {raw.min()}, "
+                f"最大值: {raw.max()}, 时间戳位数分布: {digits}"
+            )
+            if invalid_count:
+                logger.debug(f"{symbol} {interval} 无效时间戳值: {df['open_time'][~valid].tolist()}")
+        
+        if invalid_count:
+            logger.warning(f"{symbol} {interval} 过滤掉了 {invalid_count} 行无效时间戳数据")
+        
+        # 只保留需要的列并过滤时间范围
+        filtered_df = df.loc[valid, ['open', 'high', 'low', 'close', 'volume']]
+        filtered_df.insert(0, 'date', dates[valid])
+        filtered_df = filtered_df[(filtered_df['date'] >= start_datetime) & (filtered_df['date'] <= end_datetime)]
+        filtered_df.attrs = dict(df.attrs)
+        
+        logger.info(f"成功下载 {symbol} {interval} 数据，共 {len(filtered_df)} 条")
+        return filtered_df
+    
+    async def async_get_data(
+        self,
+        symbol: str,
+        interval: str,
+        start_datetime: pd.Timestamp,
+        end_datetime: pd.Timestamp,
+        use_monthly_archive: bool = None,
+    ) -> pd.DataFrame:
+        """
+        异步获取指定交易对的K线数据，使用async_context中共享的会话和全局并发信号量
+        
+        :param symbol: 交易对符号
+        :param interval: 时间间隔
+        :param start_datetime: 开始时间
+        :param end_datetime: 结束时间
+        :param use_monthly_archive: 是否优先使用月归档，为None时使用收集器的配置
+        :return: K线数据DataFrame，下载使用的月归档/日归档数量记录在attrs['archive_plan']中
+        """
+        if use_monthly_archive is None:
+            use_monthly_archive = self.use_monthly_archive
+        
+        try:
+            start_date = start_datetime.strftime('%Y-%m-%d')
+            end_date = end_datetime.strftime('%Y-%m-%d')
             
-            # 8. 过滤时间范围
-            filtered_df = filtered_df[(filtered_df['date'] >= start_datetime) & (filtered_df['date'] <= end_datetime)]
+            logger.info(f"开始下载 {symbol} {interval} 数据，时间范围: {start_date} 至 {end_date}")
             
-            logger.info(f"成功下载 {symbol} {interval} 数据，共 {len(filtered_df)} 条")
-            return filtered_df
+            df = await self.downloader.download_archive_klines(
+                symbol, interval, start_date, end_date,
+                session=self._download_session,
+                use_monthly=use_monthly_archive,
+                semaphore=self._download_semaphore,
+            )
+            self.archive_plans[symbol] = df.attrs.get('archive_plan')
+            return self.process_klines(df, symbol, interval, start_datetime, end_datetime)
         except Exception as e:
             logger.error(f"下载 {symbol} {interval} 数据失败: {e}")
-            logger.exception(e)  # 记录完整的异常堆栈
+            logger.exception(e)
             return pd.DataFrame()
     
+    @contextlib.asynccontextmanager
+    async def async_context(self):
+        """异步收集期间创建共享的下载会话和全局并发信号量，并让下载器使用进程池解析归档文件"""
+        async with super().async_context():
+            self._download_semaphore = asyncio.Semaphore(self.downloader.max_concurrency)
+            self.downloader.executor = self.parse_executor
+            try:
+                async with self.downloader.create_session() as session:
+                    self._download_session = session
+                    yield
+            finally:
+                self._download_session = None
+                self._download_semaphore = None
+                self.downloader.executor = None
+    
     def download_from_archive(self, symbol, timeframe, start_date, end_date):
         """
         从Binance Data Archive下载历史数据
@@ -288,8 +348,8 @@ class BinanceCollector(CryptoBaseCollector):
             if interval is None:
                 interval = self.interval
             
-            # 转换频率格式，QLib使用'day'而不是'1d'
-            qlib_freq = "day" if interval == "1d" else interval
+            # 转换为QLib频率名称，与直接写入、合成和读取时的日历和特征文件名一致
+            qlib_freq = self.get_qlib_freq(interval)
             
             # 调用转换脚本
             result = convert_crypto_to_qlib(
@@ -300,7 +360,10 @@ class BinanceCollector(CryptoBaseCollector):
                 file_suffix=".csv",
                 symbol_field_name="symbol",
                 include_fields="date,open,high,low,close,volume",
-                max_workers=self.max_workers
+                max_workers=self.max_workers,
+                # 增量收集时只追加新增的K线，不重建全部二进制文件
+                incremental=self.incremental,
+                storage_format=self.storage_format
             )
             
             if result:
@@ -313,20 +376,25 @@ class BinanceCollector(CryptoBaseCollector):
             logger.error(f"数据转换失败: {e}")
             return False
     
-    def collect_data(self, convert_to_qlib=False, qlib_dir=None, progress_callback=None):
+    def collect_data(self, convert_to_qlib=False, qlib_dir=None, progress_callback=None, instrument_callback=None):
         """
         执行数据收集，并可选转换为QLib格式
         
         :param convert_to_qlib: 是否将数据转换为QLib格式
         :param qlib_dir: QLib数据保存目录，如果为None则自动生成
         :param progress_callback: 进度回调函数，格式为 callback(current, completed, total, failed)
+        :param instrument_callback: 交易对收集成功后的回调函数，格式为 callback(symbol)
         :return: 收集结果
         """
+        self.archive_plans = {}
+        
         # 执行数据收集
-        result = super().collect_data(progress_callback=progress_callback)
+        result = super().collect_data(progress_callback=progress_callback, instrument_callback=instrument_callback)
         
-        # 如果需要转换为QLib格式
-        if convert_to_qlib:
+        # 如果需要转换为QLib格式，已直接写入QLib二进制格式时无需再转换
+        if convert_to_qlib and self.qlib_storage is not None:
+            logger.info(f"数据已在下载时写入QLib目录: {self.qlib_storage.qlib_dir}，跳过转换")
+        elif convert_to_qlib:
             if qlib_dir is None:
                 # 自动生成QLib数据目录
                 qlib_dir = self.save_dir.parent.parent / "qlib_data"
@@ -2,6 +2,7 @@
 import asyncio
 import ssl
 import zipfile
+from datetime import datetime, timedelta
 from io import BytesIO
 from pathlib import Path
 
@@ -10,19 +11,90 @@ import certifi
 import pandas as pd
 from loguru import logger
 
+try:
+    import pyarrow.csv as pa_csv
+except ImportError:
+    pa_csv = None
+
 from ...base.utils import get_date_range, async_deco_retry
+from .cache import ArchiveCache
+
+
+# 时间类和计数类字段使用int64，价格和成交量使用float64，避免默认推断出object类型
+KLINE_DTYPES = {
+    'open_time': 'int64',
+    'close_time': 'int64',
+    'count': 'int64',
+}
+
+
+def parse_kline_zip(content, candle_names, columns=None):
+    """
+    解析币安归档压缩包内容为K线数据
+    
+    直接从压缩包成员流式解析，只解析columns指定的列并使用明确的数据类型；
+    安装了pyarrow时使用pyarrow的CSV解析器，否则使用pandas。
+    定义为模块级函数，以便提交到进程池中执行
+    
+    :param content: 压缩包字节内容
+    :param candle_names: K线列名列表
+    :param columns: 需要保留的列，为None时保留全部列
+    :return: K线数据DataFrame
+    """
+    columns = list(columns) if columns else list(candle_names)
+    dtypes = {name: KLINE_DTYPES.get(name, 'float64') for name in columns}
+    
+    # BytesIO基于bytes创建时不会复制数据
+    with zipfile.ZipFile(BytesIO(content)) as zipf:
+        with zipf.open(zipf.namelist()[0]) as csvf:
+            # 预读首字节判断是否有表头（数字开头为无表头），不移动读取位置
+            has_header = not csvf.peek(1)[:1].isdigit()
+            skip_rows = 1 if has_header else 0
+            
+            if pa_csv is not None:
+                table = pa_csv.read_csv(
+                    csvf,
+                    read_options=pa_csv.ReadOptions(column_names=list(candle_names), skip_rows=skip_rows),
+                    convert_options=pa_csv.ConvertOptions(include_columns=columns, column_types=dtypes),
+                )
+                return table.to_pandas()
+            
+            return pd.read_csv(
+                csvf,
+                header=None,
+                names=list(candle_names),
+                skiprows=skip_rows,
+                usecols=columns,
+                dtype=dtypes,
+            )[columns]
 
 
 class BinanceDownloader:
     """币安数据下载器，用于从Binance API和Binance Data Archive下载K线数据"""
     
-    def __init__(self, candle_type='spot'):
+    # 只需要OHLCV时解析的列
+    OHLCV_COLUMNS = ['open_time', 'open', 'high', 'low', 'close', 'volume']
+    
+    def __init__(
+        self, candle_type='spot', max_concurrency=8, cache_dir=None, cache_max_size=5 * 1024 ** 3, columns=None
+    ):
         """
         初始化币安数据下载器
         
         :param candle_type: 蜡烛图类型，可选'spot'（现货）、'futures'（期货）或'option'（期权）
+        :param max_concurrency: 同时进行的归档文件下载数量上限，同时也是连接池大小
+        :param cache_dir: 归档文件本地缓存目录，为None时不使用缓存
+        :param cache_max_size: 本地缓存大小上限（字节），超出后淘汰最久未使用的文件
+        :param columns: 解析归档文件时保留的列，为None时保留全部12列
         """
         self.candle_type = candle_type
+        self.columns = columns
+        self.max_concurrency = max(int(max_concurrency), 1)
+        # 已发布的归档文件不会变化，下载并通过CHECKSUM校验后缓存到本地
+        self.cache = ArchiveCache(cache_dir, max_size=cache_max_size) if cache_dir else None
+        self._ssl_context = None
+        # 解析归档文件使用的执行器（如进程池），为None时在事件循环中直接解析
+        self.executor = None
         self.candle_names = [
             'open_time', 'open', 'high', 'low', 'close', 'volume',
             'close_time', 'quote_volume', 'count', 'taker_buy_volume',
@@ -61,108 +133,324 @@ class BinanceDownloader:
         """
         return f"{symbol}-{timeframe}-{date}.zip"
     
-    def get_zip_url(self, symbol, timeframe, date):
+    def get_zip_url(self, symbol, timeframe, date, period='daily'):
         """
         获取压缩文件下载地址
         
         :param symbol: 交易对，如'BTCUSDT'
         :param timeframe: 时间间隔，如'1m'、'1h'、'1d'等
-        :param date: 日期，格式为'YYYY-MM-DD'
+        :param date: 日期，日归档格式为'YYYY-MM-DD'，月归档格式为'YYYY-MM'
+        :param period: 归档类型，可选'daily'（日归档）或'monthly'（月归档）
         :return: 压缩文件下载URL
         """
+        if period not in ('daily', 'monthly'):
+            raise ValueError(f'无效的归档类型: {period}')
         symbol = symbol.replace('/', '')
         asset_type = self.get_url_by_candle_type(self.candle_type)
         zip_name = self.get_zip_name(symbol, timeframe, date)
         url = (
-            f"https://data.binance.vision/data/{asset_type}/daily/klines/{symbol}"
+            f"https://data.binance.vision/data/{asset_type}/{period}/klines/{symbol}"
             f"/{timeframe}/{zip_name}"
         )
         return url
     
-    @async_deco_retry(max_retry=3, delay=1.0)
-    async def get_daily_klines(self, symbol, timeframe, date):
+    @staticmethod
+    def plan_archive_files(start_date, end_date, use_monthly=True, today=None):
         """
-        异步获取指定日期的K线数据
+        规划覆盖日期范围所需的归档文件
+        
+        完整落在范围内且已经结束的自然月使用月归档，其余日期（范围首尾的不完整月份、
+        当前月份）使用日归档
+        
+        :param start_date: 开始日期，格式为'YYYY-MM-DD'
+        :param end_date: 结束日期，格式为'YYYY-MM-DD'
+        :param use_monthly: 是否使用月归档，为False时全部使用日归档
+        :param today: 当前日期，用于判断月份是否已结束，默认为系统当前日期
+        :return: 按时间顺序排列的(period, date)列表，period为'monthly'或'daily'
+        """
+        if not use_monthly:
+            return [('daily', date) for date in get_date_range(start_date, end_date)]
         
+        start = datetime.strptime(start_date, '%Y-%m-%d')
+        end = datetime.strptime(end_date, '%Y-%m-%d')
+        today = datetime.strptime(today, '%Y-%m-%d') if today else datetime.now()
+        current_month = (today.year, today.month)
+        
+        plan = []
+        day = start
+        while day <= end:
+            month_start = day.replace(day=1)
+            next_month = (month_start + timedelta(days=32)).replace(day=1)
+            month_end = next_month - timedelta(days=1)
+            if (
+                day == month_start
+                and month_end <= end
+                and (month_start.year, month_start.month) < current_month
+            ):
+                plan.append(('monthly', month_start.strftime('%Y-%m')))
+            else:
+                last_day = min(month_end, end)
+                plan.extend(
+                    ('daily', date)
+                    for date in get_date_range(day.strftime('%Y-%m-%d'), last_day.strftime('%Y-%m-%d'))
+                )
+            day = next_month
+        return plan
+    
+    @property
+    def ssl_context(self):
+        """
+        获取SSL上下文，首次访问时创建，之后在所有会话间复用
+        
+        :return: SSL上下文
+        """
+        if self._ssl_context is None:
+            self._ssl_context = ssl.create_default_context(cafile=certifi.where())
+        return self._ssl_context
+    
+    def create_session(self):
+        """
+        创建带连接池的HTTP会话，连接池大小与并发上限一致
+        
+        :return: aiohttp.ClientSession实例，调用方负责关闭
+        """
+        connector = aiohttp.TCPConnector(
+            ssl=self.ssl_context,
+            limit=self.max_concurrency
+        )
+        return aiohttp.ClientSession(connector=connector)
+    
+    def parse_zip_content(self, content, symbol, timeframe, date):
+        """
+        解析归档压缩包内容为K线数据
+        
+        :param content: 压缩包字节内容
         :param symbol: 交易对，如'BTCUSDT'
         :param timeframe: 时间间隔，如'1m'、'1h'、'1d'等
         :param date: 日期，格式为'YYYY-MM-DD'
         :return: K线数据DataFrame
         """
-        url = self.get_zip_url(symbol, timeframe, date)
-        connector = aiohttp.TCPConnector(
-            ssl=ssl.create_default_context(cafile=certifi.where())
-        )
+        df = parse_kline_zip(content, self.candle_names, self.columns)
+        logger.debug(f"处理{self.candle_type}数据: {symbol}-{timeframe}-{date}, 行数: {len(df)}")
+        return df
+    
+    async def _fetch_klines(self, session, url, symbol, timeframe, date):
+        """
+        使用给定会话下载并解析单个归档文件
         
-        async with aiohttp.ClientSession(connector=connector) as session:
+        :param session: aiohttp.ClientSession实例
+        :param url: 归档文件URL
+        :param symbol: 交易对，如'BTCUSDT'
+        :param timeframe: 时间间隔，如'1m'、'1h'、'1d'等
+        :param date: 日期，格式为'YYYY-MM-DD'
+        :return: K线数据DataFrame，下载失败返回None
+        """
+        # 缓存的读写和哈希校验是磁盘和CPU操作，在线程中执行以免阻塞事件循环
+        content = await asyncio.to_thread(self.cache.get, url) if self.cache is not None else None
+        if content is not None:
+            logger.debug(f"命中本地缓存 {url}")
+        else:
             async with session.get(url) as resp:
                 if resp.status == 200:
                     content = await resp.read()
                     logger.debug(f"成功下载 {url}")
-                    
-                    with zipfile.ZipFile(BytesIO(content)) as zipf:
-                        with zipf.open(zipf.namelist()[0]) as csvf:
-                            # 检查CSV文件是否有表头
-                            first_line = csvf.readline().decode('utf-8')
-                            csvf.seek(0)
-                            
-                            # 判断第一行是否为数字开头（无表头）
-                            has_header = not first_line.strip()[0].isdigit()
-                            
-                            # 根据是否有表头设置header参数
-                            header = 0 if has_header else None
-                            
-                            # 读取CSV文件
-                            df = pd.read_csv(
-                                csvf,
-                                usecols=list(range(12)),
-                                names=self.candle_names,
-                                header=header
-                            )
-                            
-                            # 确保列名与预期一致
-                            df.columns = self.candle_names
-                            
-                            logger.debug(f"处理{self.candle_type}数据: {symbol}-{timeframe}-{date}, 行数: {len(df)}, 表头: {'有' if has_header else '无'}")
-                            return df
                 else:
                     logger.warning(f"下载失败 {url}，状态码: {resp.status}")
                     return None
+            if self.cache is not None:
+                await self._cache_content(session, url, content)
+        
+        if self.executor is None:
+            return self.parse_zip_content(content, symbol, timeframe, date)
+        
+        # 解压和CSV解析是CPU密集型操作，交给执行器处理以免阻塞事件循环
+        loop = asyncio.get_running_loop()
+        df = await loop.run_in_executor(
+            self.executor, parse_kline_zip, content, self.candle_names, self.columns
+        )
+        logger.debug(f"处理{self.candle_type}数据: {symbol}-{timeframe}-{date}, 行数: {len(df)}")
+        return df
+    
+    async def _fetch_checksum(self, session, url):
+        """
+        获取归档文件对应的CHECKSUM文件中记录的SHA256
+        
+        :param session: aiohttp.ClientSession实例
+        :param url: 归档文件URL
+        :return: SHA256十六进制字符串，CHECKSUM文件不存在时返回None
+        """
+        async with session.get(f"{url}.CHECKSUM") as resp:
+            if resp.status != 200:
+                logger.warning(f"获取校验文件失败 {url}.CHECKSUM，状态码: {resp.status}")
+                return None
+            text = (await resp.read()).decode('utf-8').strip()
+        # 格式为"<sha256>  <文件名>"
+        return text.split()[0].lower() if text else None
+    
+    async def _cache_content(self, session, url, content):
+        """
+        通过CHECKSUM校验下载的内容后写入本地缓存
+        
+        校验不一致时抛出异常，由重试装饰器重新下载；没有CHECKSUM文件时不写入缓存
+        
+        :param session: aiohttp.ClientSession实例
+        :param url: 归档文件URL
+        :param content: 压缩包字节内容
+        """
+        expected = await self._fetch_checksum(session, url)
+        if expected is None:
+            return
+        digest = await asyncio.to_thread(ArchiveCache.sha256, content)
+        if digest != expected:
+            raise ValueError(f"校验失败 {url}，期望SHA256: {expected}，实际: {digest}")
+        await asyncio.to_thread(self.cache.put, url, content)
+    
+    @async_deco_retry(max_retry=3, delay=1.0)
+    async def get_daily_klines(self, symbol, timeframe, date, session=None):
+        """
+        异步获取指定日期的K线数据
+        
+        :param symbol: 交易对，如'BTCUSDT'
+        :param timeframe: 时间间隔，如'1m'、'1h'、'1d'等
+        :param date: 日期，格式为'YYYY-MM-DD'
+        :param session: 复用的aiohttp.ClientSession，为None时临时创建一个会话
+        :return: K线数据DataFrame
+        """
+        url = self.get_zip_url(symbol, timeframe, date)
+        if session is None:
+            async with self.create_session() as own_session:
+                return await self._fetch_klines(own_session, url, symbol, timeframe, date)
+        return await self._fetch_klines(session, url, symbol, timeframe, date)
     
-    async def download_daily_klines(self, symbol, timeframe, start_date, end_date):
+    @async_deco_retry(max_retry=3, delay=1.0)
+    async def get_monthly_klines(self, symbol, timeframe, month, session=None):
+        """
+        异步获取指定月份的K线数据
+        
+        :param symbol: 交易对，如'BTCUSDT'
+        :param timeframe: 时间间隔，如'1m'、'1h'、'1d'等
+        :param month: 月份，格式为'YYYY-MM'
+        :param session: 复用的aiohttp.ClientSession，为None时临时创建一个会话
+        :return: K线数据DataFrame，月归档尚未发布时返回None
+        """
+        url = self.get_zip_url(symbol, timeframe, month, period='monthly')
+        if session is None:
+            async with self.create_session() as own_session:
+                return await self._fetch_klines(own_session, url, symbol, timeframe, month)
+        return await self._fetch_klines(session, url, symbol, timeframe, month)
+    
+    async def download_archive_klines(
+        self, symbol, timeframe, start_date, end_date, session=None, use_monthly=False, semaphore=None
+    ):
         """
         异步下载指定日期范围内的K线数据
         
+        按plan_archive_files的规划下载归档文件，各文件在信号量限制下并发下载，
+        结果按时间顺序拼接。月归档尚未发布时，该月回退为逐日下载
+        
         :param symbol: 交易对，如'BTCUSDT'
         :param timeframe: 时间间隔，如'1m'、'1h'、'1d'等
         :param start_date: 开始日期，格式为'YYYY-MM-DD'
         :param end_date: 结束日期，格式为'YYYY-MM-DD'
-        :return: K线数据DataFrame
+        :param session: 复用的aiohttp.ClientSession，为None时为本次下载创建一个会话
+        :param use_monthly: 是否优先使用月归档
+        :param semaphore: 共享的并发信号量，用于多个交易对共用全局并发上限，为None时按max_concurrency创建
+        :return: K线数据DataFrame，本次使用的月归档/日归档数量记录在attrs['archive_plan']中
         """
-        date_range = get_date_range(start_date, end_date)
+        if session is None:
+            async with self.create_session() as own_session:
+                return await self.download_archive_klines(
+                    symbol, timeframe, start_date, end_date,
+                    session=own_session, use_monthly=use_monthly, semaphore=semaphore
+                )
+        
+        plan = self.plan_archive_files(start_date, end_date, use_monthly=use_monthly)
+        if semaphore is None:
+            semaphore = asyncio.Semaphore(self.max_concurrency)
+        
+        async def fetch(period, date):
+            async with semaphore:
+                if period == 'monthly':
+                    return await self.get_monthly_klines(symbol, timeframe, date, session=session)
+                return await self.get_daily_klines(symbol, timeframe, date, session=session)
+        
+        async def fetch_all(items):
+            # 等待所有文件完成后再处理异常，避免会话在仍有请求时被关闭
+            results = await asyncio.gather(
+                *(fetch(period, date) for period, date in items), return_exceptions=True
+            )
+            for result in results:
+                if isinstance(result, BaseException):
+                    raise result
+            return results
+        
+        results = await fetch_all(plan)
+        
+        # 月归档通常在次月初才发布，缺失的月份回退为逐日下载
+        fallback = {}
+        for (period, date), df in zip(plan, results):
+            if period == 'monthly' and df is None:
+                month_start = datetime.strptime(date, '%Y-%m')
+                month_end = (month_start + timedelta(days=32)).replace(day=1) - timedelta(days=1)
+                fallback[date] = [
+                    ('daily', day)
+                    for day in get_date_range(month_start.strftime('%Y-%m-%d'), month_end.strftime('%Y-%m-%d'))
+                ]
+        fallback_items = [item for items in fallback.values() for item in items]
+        fallback_results = dict(zip(fallback_items, await fetch_all(fallback_items))) if fallback_items else {}
+        
+        # 按规划顺序拼接，回退月份的日数据放在原月份的位置
         all_data = []
+        summary = {'monthly': 0, 'daily': 0, 'monthly_fallback': len(fallback)}
+        for (period, date), df in zip(plan, results):
+            if period == 'monthly' and date in fallback:
+                frames = [fallback_results[item] for item in fallback[date]]
+                summary['daily'] += len(frames)
+            else:
+                frames = [df]
+                summary[period] += 1
+            all_data.extend(frame for frame in frames if frame is not None and not frame.empty)
         
-        for date in date_range:
-            df = await self.get_daily_klines(symbol, timeframe, date)
-            if df is not None and not df.empty:
-                all_data.append(df)
+        logger.info(
+            f"{symbol} {timeframe} 下载计划: 月归档 {summary['monthly']} 个，日归档 {summary['daily']} 个，"
+            f"月归档回退 {summary['monthly_fallback']} 个"
+        )
         
-        if all_data:
-            return pd.concat(all_data, ignore_index=True)
-        else:
-            return pd.DataFrame()
+        df = pd.concat(all_data, ignore_index=True) if all_data else pd.DataFrame()
+        df.attrs['archive_plan'] = summary
+        return df
     
-    def download(self, symbol, timeframe, start_date, end_date):
+    async def download_daily_klines(self, symbol, timeframe, start_date, end_date, session=None):
         """
-        下载指定日期范围内的K线数据（同步接口）
+        异步下载指定日期范围内的K线数据，仅使用日归档
         
         :param symbol: 交易对，如'BTCUSDT'
         :param timeframe: 时间间隔，如'1m'、'1h'、'1d'等
         :param start_date: 开始日期，格式为'YYYY-MM-DD'
         :param end_date: 结束日期，格式为'YYYY-MM-DD'
+        :param session: 复用的aiohttp.ClientSession，为None时为本次下载创建一个会话
         :return: K线数据DataFrame
         """
-        return asyncio.run(self.download_daily_klines(symbol, timeframe, start_date, end_date))
+        return await self.download_archive_klines(
+            symbol, timeframe, start_date, end_date, session=session, use_monthly=False
+        )
+    
+    def download(self, symbol, timeframe, start_date, end_date, use_monthly=False):
+        """
+        下载指定日期范围内的K线数据（同步接口）
+        
+        :param symbol: 交易对，如'BTCUSDT'
+        :param timeframe: 时间间隔，如'1m'、'1h'、'1d'等
+        :param start_date: 开始日期，格式为'YYYY-MM-DD'
+        :param end_date: 结束日期，格式为'YYYY-MM-DD'
+        :param use_monthly: 是否优先使用月归档，完整月份用月归档、其余日期用日归档
+        :return: K线数据DataFrame，本次使用的月归档/日归档数量记录在attrs['archive_plan']中
+        """
+        return asyncio.run(
+            self.download_archive_klines(
+                symbol, timeframe, start_date, end_date, use_monthly=use_monthly
+            )
+        )
     
     def save_data(self, df, save_path):
         """
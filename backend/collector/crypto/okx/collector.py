@@ -6,6 +6,7 @@ from loguru import logger
 from ...base import BaseCollector
 from ...base.utils import deco_retry
 from ..base import CryptoBaseCollector
+from ...utils.symbol_cache import symbol_cache
 from .downloader import OKXDownloader
 
 
@@ -27,6 +28,11 @@ class OKXCollector(CryptoBaseCollector):
         limit_nums=None,
         candle_type='spot',
         symbols=None,
+        async_mode=False,
+        incremental=False,
+        qlib_sink_dir=None,
+        save_csv=True,
+        storage_format="csv",
     ):
         """
         初始化OKX数据收集器
@@ -42,6 +48,11 @@ class OKXCollector(CryptoBaseCollector):
         :param limit_nums: 限制收集的标的数量，用于调试
         :param candle_type: 蜡烛图类型，可选'spot'（现货）、'futures'（期货）或'option'（期权）
         :param symbols: 交易对列表，如['BTC-USDT', 'ETH-USDT']，如果为None则获取全量交易对
+        :param async_mode: 是否使用异步收集模式
+        :param incremental: 是否增量收集，从已保存数据的最后时间戳开始下载
+        :param qlib_sink_dir: QLib数据目录，提供时每个交易对下载完成后直接写入QLib二进制格式，无需再转换
+        :param save_csv: 是否同时保存原始数据文件，仅在提供qlib_sink_dir时可以关闭
+        :param storage_format: 原始数据存储格式，可选'csv'或'parquet'（按交易对和月份分区）
         """
         # 先设置必要的属性，再调用父类的__init__方法
         self.candle_type = candle_type
@@ -57,44 +68,58 @@ class OKXCollector(CryptoBaseCollector):
             delay=delay,
             check_data_length=check_data_length,
             limit_nums=limit_nums,
+            async_mode=async_mode,
+            incremental=incremental,
+            qlib_sink_dir=qlib_sink_dir,
+            save_csv=save_csv,
+            storage_format=storage_format,
         )
         
-        self.downloader = OKXDownloader(candle_type=candle_type)
+        # 下载器的连接池和令牌桶在所有并发收集的交易对之间共享
+        self.downloader = OKXDownloader(candle_type=candle_type, max_workers=max_workers)
     
     @property
     def _timezone(self):
         """获取时区"""
         return "UTC"
     
+    # 各交易类型对应的OKX产品类型
+    INST_TYPES = {
+        'spot': 'SPOT',
+        'futures': 'SWAP',
+    }
+    
     @deco_retry(max_retry=3, delay=1.0)
+    def fetch_all_symbols(self):
+        """
+        从OKX API获取全量交易对列表，失败时抛出异常
+        
+        :return: 交易对列表
+        """
+        url = 'https://www.okx.com/api/v5/public/instruments'
+        params = {'instType': self.INST_TYPES[self.candle_type]}
+        response = requests.get(url, params=params, timeout=30)
+        response.raise_for_status()
+        data = response.json()
+        
+        # 提取交易对列表
+        symbols = [symbol['instId'] for symbol in data['data'] if symbol['state'] == 'live']
+        logger.info(f"成功获取{len(symbols)}个{self.candle_type}交易对")
+        return symbols
+    
     def get_all_symbols(self):
         """
-        从OKX API获取全量交易对列表
+        获取全量交易对列表，优先使用交易对缓存，缓存过期时在后台刷新
         
         :return: 交易对列表
         """
+        if self.candle_type not in self.INST_TYPES:
+            # 其他类型暂不支持
+            logger.warning(f"暂不支持获取{self.candle_type}类型的交易对列表")
+            return []
+        
         try:
-            if self.candle_type == 'spot':
-                # 现货交易对
-                url = 'https://www.okx.com/api/v5/public/instruments'
-                params = {'instType': 'SPOT'}
-            elif self.candle_type == 'futures':
-                # 合约交易对
-                url = 'https://www.okx.com/api/v5/public/instruments'
-                params = {'instType': 'SWAP'}
-            else:
-                # 其他类型暂不支持
-                logger.warning(f"暂不支持获取{self.candle_type}类型的交易对列表")
-                return []
-            
-            response = requests.get(url, params=params)
-            response.raise_for_status()
-            data = response.json()
-            
-            # 提取交易对列表
-            symbols = [symbol['instId'] for symbol in data['data'] if symbol['state'] == 'live']
-            logger.info(f"成功获取{len(symbols)}个{self.candle_type}交易对")
-            return symbols
+            return symbol_cache.get(f"okx_{self.candle_type}", self.fetch_all_symbols)
         except Exception as e:
             logger.error(f"获取交易对列表失败: {e}")
             return []
@@ -198,8 +223,8 @@ class OKXCollector(CryptoBaseCollector):
             if interval is None:
                 interval = self.interval
             
-            # 转换频率格式，QLib使用'day'而不是'1d'
-            qlib_freq = "day" if interval == "1d" else interval
+            # 转换为QLib频率名称，与直接写入、合成和读取时的日历和特征文件名一致
+            qlib_freq = self.get_qlib_freq(interval)
             
             # 调用转换脚本
             result = convert_crypto_to_qlib(
@@ -210,7 +235,10 @@ class OKXCollector(CryptoBaseCollector):
                 file_suffix=".csv",
                 symbol_field_name="symbol",
                 include_fields="date,open,high,low,close,volume",
-                max_workers=self.max_workers
+                max_workers=self.max_workers,
+                # 增量收集时只追加新增的K线，不重建全部二进制文件
+                incremental=self.incremental,
+                storage_format=self.storage_format
             )
             
             if result:
@@ -223,20 +251,23 @@ class OKXCollector(CryptoBaseCollector):
             logger.error(f"数据转换失败: {e}")
             return False
     
-    def collect_data(self, convert_to_qlib=False, qlib_dir=None, progress_callback=None):
+    def collect_data(self, convert_to_qlib=False, qlib_dir=None, progress_callback=None, instrument_callback=None):
         """
         执行数据收集，并可选转换为QLib格式
         
         :param convert_to_qlib: 是否将数据转换为QLib格式
         :param qlib_dir: QLib数据保存目录，如果为None则自动生成
         :param progress_callback: 进度回调函数，格式为 callback(current, completed, total, failed)
+        :param instrument_callback: 交易对收集成功后的回调函数，格式为 callback(symbol)
         :return: 收集结果
         """
         # 执行数据收集
-        result = super().collect_data(progress_callback=progress_callback)
+        result = super().collect_data(progress_callback=progress_callback, instrument_callback=instrument_callback)
         
-        # 如果需要转换为QLib格式
-        if convert_to_qlib:
+        # 如果需要转换为QLib格式，已直接写入QLib二进制格式时无需再转换
+        if convert_to_qlib and self.qlib_storage is not None:
+            logger.info(f"数据已在下载时写入QLib目录: {self.qlib_storage.qlib_dir}，跳过转换")
+        elif convert_to_qlib:
             if qlib_dir is None:
                 # 自动生成QLib数据目录
                 qlib_dir = self.save_dir.parent.parent / "qlib_data"
@@ -3,6 +3,9 @@ import requests
 import pandas as pd
 from loguru import logger
 from pathlib import Path
+from requests.adapters import HTTPAdapter
+
+from ...base.utils import deco_retry, shared_token_bucket
 
 
 class OKXDownloader:
@@ -10,26 +13,86 @@ class OKXDownloader:
     OKX数据下载器，用于从OKX交易所下载K线数据
     """
     
-    def __init__(self, candle_type='spot'):
+    # 历史K线接口单次最多返回的数量
+    PAGE_LIMIT = 100
+    # 历史K线接口频率限制：每2秒20次
+    RATE_LIMIT = (20, 2.0)
+    
+    # OKX的bar参数中小时及以上周期使用大写
+    BAR_MAP = {
+        '1h': '1H', '2h': '2H', '4h': '4H', '6h': '6H', '12h': '12H',
+        '1d': '1D', '2d': '2D', '3d': '3D', '1w': '1W', '1M': '1M',
+    }
+    
+    def __init__(self, candle_type='spot', max_workers=4, rate_limit=None, base_url=None):
         """
         初始化OKX下载器
         
         :param candle_type: 蜡烛图类型，可选'spot'（现货）、'futures'（期货）或'option'（期权）
+        :param max_workers: 收集器同时下载的交易对数量，用作连接池大小
+        :param rate_limit: 频率限制(请求数, 秒数)，默认使用历史K线接口的限制(20, 2.0)
+        :param base_url: 行情接口地址，默认'https://www.okx.com/api/v5/market'
         """
         self.candle_type = candle_type
+        self.max_workers = max(int(max_workers), 1)
         
         # 设置API端点
-        if candle_type == 'spot':
-            self.base_url = 'https://www.okx.com/api/v5/market'
-        elif candle_type == 'futures':
-            self.base_url = 'https://www.okx.com/api/v5/market'
-        else:
-            self.base_url = 'https://www.okx.com/api/v5/market'
+        self.base_url = base_url or 'https://www.okx.com/api/v5/market'
+        
+        # 所有请求共用一个连接池，令牌桶在进程内按接口地址共享，多个下载任务并发时也不会超过频率限制
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.max_workers)
+        self.session.mount('https://', adapter)
+        self.session.mount('http://', adapter)
+        rate, per = rate_limit or self.RATE_LIMIT
+        self.rate_limiter = shared_token_bucket(self.base_url, rate, per)
+    
+    def get_bar(self, interval):
+        """
+        将时间间隔转换为OKX的bar参数
+        
+        :param interval: 时间间隔，如'1m', '1h', '1d'等
+        :return: OKX的bar参数，如'1m', '1H', '1D'
+        """
+        return self.BAR_MAP.get(interval, interval)
+    
+    @deco_retry(max_retry=3, delay=1.0)
+    def fetch_page(self, symbol, interval, after=None, before=None):
+        """
+        请求一页历史K线数据
+        
+        OKX返回的数据按时间倒序排列，after表示返回早于该时间戳的数据，before表示返回晚于该时间戳的数据
+        
+        :param symbol: 交易对符号，如'BTC-USDT'
+        :param interval: 时间间隔，如'1m', '1h', '1d'等
+        :param after: 毫秒时间戳游标，返回早于该时间的数据
+        :param before: 毫秒时间戳游标，返回晚于该时间的数据
+        :return: K线数据列表，每条为[ts, o, h, l, c, vol, ...]
+        """
+        params = {
+            'instId': symbol,
+            'bar': self.get_bar(interval),
+            'limit': str(self.PAGE_LIMIT),
+        }
+        if after is not None:
+            params['after'] = str(after)
+        if before is not None:
+            params['before'] = str(before)
+        
+        self.rate_limiter.acquire()
+        response = self.session.get(f'{self.base_url}/history-candles', params=params, timeout=30)
+        response.raise_for_status()
+        result = response.json()
+        if str(result.get('code', '0')) != '0':
+            raise ValueError(f"OKX接口返回错误: {result.get('code')} {result.get('msg')}")
+        return result.get('data', [])
     
     def download(self, symbol, interval, start_date, end_date):
         """
         下载指定交易对的K线数据
         
+        从结束时间开始沿after游标向前翻页，直到覆盖开始时间或没有更多数据
+        
         :param symbol: 交易对符号，如'BTC-USDT'
         :param interval: 时间间隔，如'1m', '1h', '1d'等
         :param start_date: 开始日期，格式为'YYYY-MM-DD'
@@ -41,41 +104,40 @@ class OKXDownloader:
             start_ts = int(pd.Timestamp(start_date).timestamp() * 1000)
             end_ts = int(pd.Timestamp(end_date).timestamp() * 1000)
             
-            # 设置请求参数
-            params = {
-                'instId': symbol,
-                'bar': interval,
-                'after': str(start_ts),
-                'before': str(end_ts),
-                'limit': '100'
-            }
-            
-            # 发送请求
-            response = requests.get(f'{self.base_url}/candles', params=params)
-            response.raise_for_status()
+            rows = []
+            pages = 0
+            # after不包含游标本身，加1以包含结束时间的K线
+            cursor = end_ts + 1
+            while True:
+                page = self.fetch_page(symbol, interval, after=cursor)
+                pages += 1
+                if not page:
+                    break
+                rows.extend(row[:6] for row in page)
+                oldest = min(int(row[0]) for row in page)
+                if oldest <= start_ts or oldest >= cursor:
+                    break
+                cursor = oldest
             
-            # 解析响应
-            data = response.json()['data']
+            logger.debug(f"{symbol} {interval} 共请求 {pages} 页，获取 {len(rows)} 条数据")
             
-            if not data:
+            if not rows:
                 return pd.DataFrame()
             
             # 转换为DataFrame
-            df = pd.DataFrame(
-                data, 
-                columns=['open_time', 'open', 'high', 'low', 'close', 'volume', 'volume_currency', 'unknown']
-            )
+            df = pd.DataFrame(rows, columns=['open_time', 'open', 'high', 'low', 'close', 'volume'])
             
             # 转换数据类型
-            df['open_time'] = pd.to_datetime(df['open_time'], unit='ms')
+            df['open_time'] = pd.to_datetime(pd.to_numeric(df['open_time']), unit='ms')
             df['open'] = pd.to_numeric(df['open'])
             df['high'] = pd.to_numeric(df['high'])
             df['low'] = pd.to_numeric(df['low'])
             df['close'] = pd.to_numeric(df['close'])
             df['volume'] = pd.to_numeric(df['volume'])
             
-            # 按时间排序
-            df = df.sort_values('open_time')
+            # 过滤时间范围并按时间排序
+            df = df[df['open_time'] >= pd.Timestamp(start_ts, unit='ms')]
+            df = df.drop_duplicates('open_time').sort_values('open_time').reset_index(drop=True)
             
             return df
             
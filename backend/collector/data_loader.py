@@ -33,6 +33,9 @@ except Exception as e:
     logger.error(f"导入QLib模块失败: {e}")
     raise
 
+from backend.collector.scripts.qlib_bin import QlibBinReader
+from backend.config import get_config
+
 
 class QLibDataLoader:
     """QLib数据加载器，用于加载和管理QLib格式的数据
@@ -56,6 +59,7 @@ class QLibDataLoader:
             cls._instance._instruments = None
             cls._instance._calendars = None
             cls._instance._features = None
+            cls._instance._bin_reader = None
         return cls._instance
     
     def __init__(self):
@@ -321,6 +325,29 @@ class QLibDataLoader:
         """
         return self._data_loaded
     
+    def get_bin_reader(self, qlib_dir: Optional[str] = None) -> QlibBinReader:
+        """获取直接读取QLib二进制文件的读取器，同一个数据目录复用同一个读取器及其缓存
+        
+        Args:
+            qlib_dir: QLib数据目录，为None时使用已初始化的数据目录，相对路径基于backend目录
+        
+        Returns:
+            QlibBinReader: 二进制文件读取器
+        """
+        qlib_dir_path = Path(qlib_dir) if qlib_dir else self._qlib_dir
+        if qlib_dir_path is None:
+            raise ValueError("QLib数据目录未设置")
+        if not qlib_dir_path.is_absolute():
+            qlib_dir_path = backend_root / qlib_dir_path
+        qlib_dir_path = qlib_dir_path.expanduser().resolve()
+        
+        if self._bin_reader is None or self._bin_reader.qlib_dir != qlib_dir_path:
+            self._bin_reader = QlibBinReader(
+                qlib_dir_path,
+                max_open_files=int(get_config("quant.bin_reader_max_open_files", QlibBinReader.MAX_OPEN_FILES))
+            )
+        return self._bin_reader
+    
     def get_qlib_dir(self) -> Optional[str]:
         """获取QLib数据目录
         
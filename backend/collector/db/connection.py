@@ -1,26 +1,22 @@
 # 数据库连接管理
 
 import sqlite3
-import os
 import threading
-from pathlib import Path
 from loguru import logger
+from sqlalchemy.pool import NullPool
 
-# 导入配置管理器
-from backend.config import get_config
+from .database import create_db_engine, db_connection, db_path, db_type, engine
 
-# 数据库文件路径
-default_db_path = Path(__file__).parent.parent.parent / "data" / "system.db"
-
-# 确保数据库目录存在
-default_db_path.parent.mkdir(parents=True, exist_ok=True)
+# 旧代码持有的连接使用不带连接池的独立引擎，不占用共享连接池中的连接
+legacy_engine = create_db_engine(db_path, db_type, poolclass=NullPool)
 
 
 class DBConnection:
     """数据库连接管理类
     
-    实现单例模式，使用线程本地存储为每个线程创建独立的数据库连接
-    支持SQLite和DuckDB数据库
+    实现单例模式，兼容直接获取连接的旧代码：每个线程打开一个独立的连接并一直持有，直到调用close关闭；
+    连接不来自共享连接池，SQLite查询结果与db_connection一致为sqlite3.Row。
+    新代码应使用db_connection或db_transaction，用完即归还连接池
     """
     _instance = None
     
@@ -32,81 +28,33 @@ class DBConnection:
         """
         if cls._instance is None:
             cls._instance = super(DBConnection, cls).__new__(cls)
-            # 使用线程本地存储，为每个线程创建独立的连接
+            # 使用线程本地存储，为每个线程保存借用的连接
             cls._instance._local = threading.local()
         return cls._instance
     
     def connect(self):
-        """建立数据库连接
+        """获取当前线程持有的数据库连接
         
         Returns:
             数据库连接对象
         """
         # 检查当前线程是否已有连接
-        if not hasattr(self._local, '_conn') or self._local._conn is None:
-            # 从配置获取数据库类型和文件路径
-            db_type = get_config("database.type", "sqlite")
-            db_file = get_config("database.file", str(default_db_path))
-            
-            logger.info(f"从配置读取数据库信息: type={db_type}, file={db_file}")
-            logger.info(f"默认数据库路径: {default_db_path}")
-            
-            # 解析数据库文件路径
-            db_path = Path(db_file).expanduser()
-            if not db_path.is_absolute():
-                # 相对路径相对于backend目录
-                db_path = Path(__file__).parent.parent.parent / db_path
-            
-            # 确保数据库目录存在
-            db_path.parent.mkdir(parents=True, exist_ok=True)
-            
-            logger.info(f"最终数据库路径: {db_path}")
-            logger.info(f"正在连接{db_type}数据库: {db_path}")
-            
-            if db_type == "sqlite":
-                # SQLite连接
-                # 设置check_same_thread=False允许连接在不同线程中使用
-                # 设置timeout=30，遇到锁定时等待30秒
-                # 设置autocommit=True自动提交事务，减少锁争用
-                conn = sqlite3.connect(
-                    str(db_path), 
-                    check_same_thread=False,
-                    timeout=30  # 遇到锁定时等待30秒
-                )
-                # 设置返回字典格式
-                conn.row_factory = sqlite3.Row
-                # 启用自动提交模式，减少锁争用
-                conn.isolation_level = None
-            elif db_type == "duckdb":
-                # DuckDB连接
-                import duckdb
-                conn = duckdb.connect(str(db_path))
-            else:
-                # 默认使用SQLite
-                logger.warning(f"未知的数据库类型: {db_type}，使用SQLite")
-                conn = sqlite3.connect(str(db_path))
-                conn.row_factory = sqlite3.Row
-            
-            # 存储连接到线程本地存储
+        if getattr(self._local, '_conn', None) is None:
+            conn = legacy_engine.raw_connection()
+            if legacy_engine.dialect.name == "sqlite":
+                conn.driver_connection.row_factory = sqlite3.Row
             self._local._conn = conn
-            self._local._db_type = db_type
-            self._local._db_path = db_path
-            
-            logger.info(f"{db_type}数据库连接成功: {db_path}")
+            logger.debug(f"打开{db_type}数据库连接: {db_path}")
         
         return self._local._conn
     
     def close(self):
-        """关闭数据库连接
+        """关闭当前线程持有的数据库连接
         """
-        # 关闭当前线程的连接
-        if hasattr(self._local, '_conn') and self._local._conn is not None:
-            logger.info(f"正在关闭{self._local._db_type}数据库连接: {self._local._db_path}")
+        if getattr(self._local, '_conn', None) is not None:
             self._local._conn.close()
             self._local._conn = None
-            self._local._db_type = None
-            self._local._db_path = None
-            logger.info(f"数据库连接已关闭")
+            logger.debug(f"{db_type}数据库连接已关闭: {db_path}")
 
 
 # 创建全局数据库连接实例
@@ -114,7 +62,7 @@ db_instance = DBConnection()
 
 
 def get_db_connection():
-    """获取数据库连接
+    """获取当前线程持有的数据库连接，兼容旧代码，新代码应使用db_connection
     
     Returns:
         数据库连接对象
@@ -134,7 +82,7 @@ def init_db():
         logger.info("开始初始化数据库...")
         
         # 使用SQLAlchemy创建表
-        from .database import Base, engine
+        from .database import Base
         from . import models
         
         logger.info("使用SQLAlchemy创建数据库表...")
@@ -144,66 +92,65 @@ def init_db():
         
         # 验证表是否存在
         logger.info("验证表是否存在...")
-        conn = get_db_connection()
-        
-        # 检查system_config表
-        system_config_exists = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='system_config'").fetchone()
-        logger.info(f"system_config表存在: {system_config_exists is not None}")
-        
-        # 检查tasks表
-        tasks_exists = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='tasks'").fetchone()
-        logger.info(f"tasks表存在: {tasks_exists is not None}")
-        
-        if not system_config_exists or not tasks_exists:
-            logger.error("表创建失败，数据库初始化失败")
-            raise Exception("表创建失败，数据库初始化失败")
-        
-        # 插入默认配置（保留原有逻辑）
-        logger.info("插入默认配置...")
-        # 先从配置文件读取相关配置
-        from backend.config import get_config
-        
-        # 配置映射：配置文件key -> (system_config_key, 默认值, 描述)
-        config_mapping = {
-            "quant.qlib_data_dir": ("qlib_data_dir", "data/source", "QLib数据目录"),
-            "app.max_workers": ("max_workers", "4", "最大工作线程数"),
-        }
-        
-        # 构建默认配置列表
-        default_configs = []
-        
-        # 1. 处理从配置文件映射的配置
-        for config_key, (db_key, default_value, description) in config_mapping.items():
-            # 从配置文件读取值，如果没有则使用默认值
-            value = get_config(config_key, default_value)
-            default_configs.append((db_key, str(value), description))
-        
-        # 2. 添加固定默认配置（没有在配置文件中定义的）
-        fixed_defaults = [
-            ("data_download_dir", "data/source", "数据下载目录"),
-            ("current_market_type", "crypto", "当前交易模式: crypto(加密货币) 或 stock(股票)"),
-            ("crypto_candle_type", "spot", "加密货币蜡烛图类型: spot(现货) 或 futures(期货)"),
-            ("default_exchange", "binance", "默认交易所"),
-            ("default_interval", "1d", "默认时间间隔"),
-        ]
-        default_configs.extend(fixed_defaults)
-        
-        # 使用UPSERT插入默认配置
-        inserted_count = 0
-        for key, value, description in default_configs:
-            result = conn.execute("""
-            INSERT INTO system_config (key, value, description)
-            VALUES (?, ?, ?)
-            ON CONFLICT (key) DO NOTHING
-            """, (key, value, description))
-            if result.rowcount > 0:
-                inserted_count += 1
-        
-        logger.info(f"默认配置插入完成，新增配置数: {inserted_count}")
-        
-        # 验证默认配置是否插入成功
-        config_count = conn.execute("SELECT COUNT(*) FROM system_config").fetchone()[0]
-        logger.info(f"系统配置表中配置数量: {config_count}")
+        with db_connection() as conn:
+            # 检查system_config表
+            system_config_exists = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='system_config'").fetchone()
+            logger.info(f"system_config表存在: {system_config_exists is not None}")
+            
+            # 检查tasks表
+            tasks_exists = conn.execute("SELECT name FROM sqlite_master WHERE type='table' AND name='tasks'").fetchone()
+            logger.info(f"tasks表存在: {tasks_exists is not None}")
+            
+            if not system_config_exists or not tasks_exists:
+                logger.error("表创建失败，数据库初始化失败")
+                raise Exception("表创建失败，数据库初始化失败")
+            
+            # 插入默认配置（保留原有逻辑）
+            logger.info("插入默认配置...")
+            # 先从配置文件读取相关配置
+            from backend.config import get_config
+            
+            # 配置映射：配置文件key -> (system_config_key, 默认值, 描述)
+            config_mapping = {
+                "quant.qlib_data_dir": ("qlib_data_dir", "data/source", "QLib数据目录"),
+                "app.max_workers": ("max_workers", "4", "最大工作线程数"),
+            }
+            
+            # 构建默认配置列表
+            default_configs = []
+            
+            # 1. 处理从配置文件映射的配置
+            for config_key, (db_key, default_value, description) in config_mapping.items():
+                # 从配置文件读取值，如果没有则使用默认值
+                value = get_config(config_key, default_value)
+                default_configs.append((db_key, str(value), description))
+            
+            # 2. 添加固定默认配置（没有在配置文件中定义的）
+            fixed_defaults = [
+                ("data_download_dir", "data/source", "数据下载目录"),
+                ("current_market_type", "crypto", "当前交易模式: crypto(加密货币) 或 stock(股票)"),
+                ("crypto_candle_type", "spot", "加密货币蜡烛图类型: spot(现货) 或 futures(期货)"),
+                ("default_exchange", "binance", "默认交易所"),
+                ("default_interval", "1d", "默认时间间隔"),
+            ]
+            default_configs.extend(fixed_defaults)
+            
+            # 使用UPSERT插入默认配置
+            inserted_count = 0
+            for key, value, description in default_configs:
+                result = conn.execute("""
+                INSERT INTO system_config (key, value, description)
+                VALUES (?, ?, ?)
+                ON CONFLICT (key) DO NOTHING
+                """, (key, value, description))
+                if result.rowcount > 0:
+                    inserted_count += 1
+            
+            logger.info(f"默认配置插入完成，新增配置数: {inserted_count}")
+            
+            # 验证默认配置是否插入成功
+            config_count = conn.execute("SELECT COUNT(*) FROM system_config").fetchone()[0]
+            logger.info(f"系统配置表中配置数量: {config_count}")
         
         logger.info("数据库初始化完成")
     except Exception as e:
@@ -1,41 +1,118 @@
 """SQLAlchemy数据库连接配置
 
 按照FastAPI官方文档标准结构，配置SQLAlchemy数据库连接
+
+应用中所有数据库访问共用这里创建的引擎和连接池：ORM会话（SessionLocal、get_db、crud）
+直接使用引擎，业务类中的SQL语句通过db_connection从同一个连接池借用底层连接。
+SQLite连接在创建时启用WAL日志模式、synchronous=NORMAL和忙等待超时，读操作不再被写入事务阻塞，
+每个连接缓存已编译的SQL语句，重复执行的参数化语句无需再次编译
 """
 
-from sqlalchemy import create_engine
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+from sqlalchemy import create_engine, event
 from sqlalchemy.ext.declarative import declarative_base
 from sqlalchemy.orm import sessionmaker
 from backend.config import get_config
-from pathlib import Path
+
+# backend目录，数据库文件的相对路径基于该目录
+backend_dir = Path(__file__).parent.parent.parent
 
 # 数据库文件默认路径
-default_db_path = Path(__file__).parent.parent.parent / "data" / "qbot.db"
+default_db_path = backend_dir / "data" / "qbot.db"
+
+
+def resolve_db_path() -> Path:
+    """解析数据库文件路径
+    
+    Returns:
+        Path: 配置database.file的绝对路径，相对路径基于backend目录，与启动时的工作目录无关
+    """
+    db_path = Path(get_config("database.file", str(default_db_path))).expanduser()
+    if not db_path.is_absolute():
+        db_path = backend_dir / db_path
+    # 确保数据库目录存在
+    db_path.parent.mkdir(parents=True, exist_ok=True)
+    return db_path
 
-# 确保数据库目录存在
-default_db_path.parent.mkdir(parents=True, exist_ok=True)
 
 # 从配置获取数据库信息
 db_type = get_config("database.type", "sqlite")
-db_file = get_config("database.file", str(default_db_path))
+db_path = resolve_db_path()
+
+# 连接池和SQLite连接参数
+pool_size = int(get_config("database.pool_size", 5))
+max_overflow = int(get_config("database.max_overflow", 10))
+pool_timeout = float(get_config("database.pool_timeout", 30))
+busy_timeout = int(get_config("database.busy_timeout", 30000))  # 毫秒
+cached_statements = int(get_config("database.cached_statements", 256))
 
-# 构建数据库URL
-if db_type == "sqlite":
+
+def _configure_sqlite(dbapi_connection, connection_record):
+    """新建SQLite连接时设置日志模式、同步级别和忙等待超时
+    
+    关闭sqlite3模块的隐式事务，由SQLAlchemy在_begin_sqlite中显式开始事务，
+    业务类的单条语句按自动提交执行，需要事务时通过db_transaction显式开始
+    """
+    dbapi_connection.isolation_level = None
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA journal_mode=WAL")
+    cursor.execute("PRAGMA synchronous=NORMAL")
+    cursor.execute(f"PRAGMA busy_timeout={busy_timeout}")
+    cursor.close()
+
+
+def _begin_sqlite(connection):
+    """ORM会话开始事务时显式执行BEGIN"""
+    connection.exec_driver_sql("BEGIN")
+
+
+def create_db_engine(path, type_: str = "sqlite", poolclass=None):
+    """按数据库配置创建引擎和连接池
+    
+    Args:
+        path: 数据库文件路径
+        type_: 数据库类型，sqlite或duckdb，未知类型使用sqlite
+        poolclass: 连接池类型，如NullPool，为None时使用按配置大小创建的默认连接池
+        
+    Returns:
+        Engine: SQLAlchemy引擎
+    """
+    if poolclass is not None:
+        pool_args = {"poolclass": poolclass}
+    else:
+        pool_args = {"pool_size": pool_size, "max_overflow": max_overflow, "pool_timeout": pool_timeout}
+    
+    if type_ == "duckdb":
+        # DuckDB数据库URL格式
+        return create_engine(f"duckdb:///{path}", **pool_args)
+    
     # SQLite数据库URL格式
-    db_url = f"sqlite:///{db_file}"
-elif db_type == "duckdb":
-    # DuckDB数据库URL格式
-    db_url = f"duckdb:///{db_file}"
-else:
-    # 默认使用SQLite
-    db_url = f"sqlite:///{db_file}"
-
-# 创建SQLAlchemy引擎
-# connect_args仅SQLite需要，用于允许同一连接在不同线程中使用
-engine = create_engine(
-    db_url,
-    connect_args={"check_same_thread": False}  # 仅SQLite需要
-)
+    # check_same_thread=False: 连接由连接池在线程间复用
+    # timeout: 遇到锁时等待的秒数
+    # cached_statements: 每个连接缓存的已编译语句数量
+    # pool_size: 连接池保持的连接数
+    # max_overflow: 连接池已满时允许额外创建的连接数
+    # pool_timeout: 所有连接都被占用时等待的秒数
+    sqlite_engine = create_engine(
+        f"sqlite:///{path}",
+        connect_args={
+            "check_same_thread": False,
+            "timeout": busy_timeout / 1000,
+            "cached_statements": cached_statements,
+        },
+        **pool_args,
+    )
+    event.listen(sqlite_engine, "connect", _configure_sqlite)
+    event.listen(sqlite_engine, "begin", _begin_sqlite)
+    return sqlite_engine
+
+
+# 创建SQLAlchemy引擎，未知类型默认使用SQLite
+if db_type != "duckdb":
+    db_type = "sqlite"
+engine = create_db_engine(db_path, db_type)
 
 # 创建会话工厂
 # autocommit=False: 不自动提交事务
@@ -61,3 +138,53 @@ def get_db():
         yield db
     finally:
         db.close()
+
+
+@contextmanager
+def db_connection(bind=None):
+    """从连接池借用一个底层数据库连接，用于执行SQL语句
+    
+    单条语句自动提交，SQLite查询结果为sqlite3.Row，可以按列名或下标访问；
+    退出时连接归还连接池
+    
+    Args:
+        bind: 使用的引擎，默认为按配置创建的全局引擎
+        
+    Yields:
+        底层数据库连接
+    """
+    bind = bind or engine
+    is_sqlite = bind.dialect.name == "sqlite"
+    conn = bind.raw_connection()
+    try:
+        if is_sqlite:
+            conn.driver_connection.row_factory = sqlite3.Row
+        yield conn
+    finally:
+        if is_sqlite:
+            conn.driver_connection.row_factory = None
+        conn.close()
+
+
+@contextmanager
+def db_transaction(bind=None):
+    """从连接池借用一个底层数据库连接，并在一个写事务中执行SQL语句
+    
+    正常退出时提交，抛出异常时回滚；SQLite事务以BEGIN IMMEDIATE开始，
+    写入之间的冲突在开始时按忙等待超时等待，而不是在提交时失败
+    
+    Args:
+        bind: 使用的引擎，默认为按配置创建的全局引擎
+        
+    Yields:
+        底层数据库连接
+    """
+    bind = bind or engine
+    with db_connection(bind) as conn:
+        conn.execute("BEGIN IMMEDIATE" if bind.dialect.name == "sqlite" else "BEGIN TRANSACTION")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
@@ -1,8 +1,8 @@
 # 数据库模型定义
 
 from datetime import datetime
-from typing import Optional, Dict, Any
-from .connection import get_db_connection
+from typing import Optional, Dict, Any, List, Tuple
+from .database import db_connection, db_transaction
 from loguru import logger
 
 # SQLAlchemy模型定义
@@ -49,6 +49,20 @@ class Task(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now(), index=True)
 
 
+class TaskCheckpoint(Base):
+    """任务检查点SQLAlchemy模型
+    
+    对应task_checkpoints表的SQLAlchemy模型定义，记录任务中已完成的工作单元，
+    如下载任务中已下载完成的(时间周期, 交易对)，用于任务中断后只恢复未完成的部分
+    """
+    __tablename__ = "task_checkpoints"
+    
+    task_id = Column(String, primary_key=True, index=True)
+    interval = Column(String, primary_key=True)
+    symbol = Column(String, primary_key=True)
+    created_at = Column(DateTime(timezone=True), server_default=func.now())
+
+
 class Feature(Base):
     """特征信息SQLAlchemy模型
     
@@ -64,10 +78,6 @@ class Feature(Base):
     updated_at = Column(DateTime(timezone=True), onupdate=func.now(), server_default=func.now())
 
 
-# 从database.py导入SessionLocal和相关依赖
-from .database import SessionLocal
-from sqlalchemy.orm import Session
-
 # 保留现有的业务逻辑类，确保向后兼容
 class SystemConfigBusiness:
     """系统配置模型类
@@ -85,15 +95,13 @@ class SystemConfigBusiness:
         Returns:
             Optional[str]: 配置值，如果不存在则返回None
         """
-        db: Session = SessionLocal()
         try:
-            config = db.query(SystemConfig).filter_by(key=key).first()
-            return config.value if config else None
+            with db_connection() as conn:
+                result = conn.execute("SELECT value FROM system_config WHERE key = ?", (key,)).fetchone()
+                return result[0] if result else None
         except Exception as e:
             logger.error(f"获取配置失败: key={key}, error={e}")
             return None
-        finally:
-            db.close()
     
     @staticmethod
     def get_all() -> Dict[str, str]:
@@ -102,15 +110,13 @@ class SystemConfigBusiness:
         Returns:
             Dict[str, str]: 所有配置的字典，键为配置名，值为配置值
         """
-        db: Session = SessionLocal()
         try:
-            configs = db.query(SystemConfig).order_by(SystemConfig.key).all()
-            return {config.key: config.value for config in configs}
+            with db_connection() as conn:
+                results = conn.execute("SELECT key, value FROM system_config ORDER BY key").fetchall()
+                return {row[0]: row[1] for row in results}
         except Exception as e:
             logger.error(f"获取所有配置失败: error={e}")
             return {}
-        finally:
-            db.close()
     
     @staticmethod
     def set(key: str, value: str, description: Optional[str] = None) -> bool:
@@ -119,37 +125,28 @@ class SystemConfigBusiness:
         Args:
             key: 配置键名
             value: 配置值
-            description: 配置描述，可选
+            description: 配置描述，可选，为None时保留原有描述
             
         Returns:
             bool: 设置成功返回True，失败返回False
         """
-        db: Session = SessionLocal()
         try:
-            # 查询是否存在该配置
-            config = db.query(SystemConfig).filter_by(key=key).first()
-            
-            if config:
-                # 如果存在，更新配置
-                config.value = value
-                if description is not None:
-                    config.description = description
-            else:
-                # 如果不存在，创建新配置
-                config = SystemConfig(key=key, value=value, description=description)
-                db.add(config)
+            with db_connection() as conn:
+                # 不存在时创建新配置，存在时更新配置
+                conn.execute("""
+                INSERT INTO system_config (key, value, description)
+                VALUES (?, ?, ?)
+                ON CONFLICT (key) DO UPDATE SET
+                    value = excluded.value,
+                    description = COALESCE(excluded.description, system_config.description),
+                    updated_at = CURRENT_TIMESTAMP
+                """, (key, value, description))
             
-            # 提交更改
-            db.commit()
             logger.info(f"配置已更新: key={key}, value={value}")
             return True
         except Exception as e:
-            # 回滚事务
-            db.rollback()
             logger.error(f"设置配置失败: key={key}, value={value}, error={e}")
             return False
-        finally:
-            db.close()
     
     @staticmethod
     def delete(key: str) -> bool:
@@ -161,28 +158,19 @@ class SystemConfigBusiness:
         Returns:
             bool: 删除成功返回True，失败返回False
         """
-        db: Session = SessionLocal()
         try:
-            # 查询是否存在该配置
-            config = db.query(SystemConfig).filter_by(key=key).first()
+            with db_connection() as conn:
+                result = conn.execute("DELETE FROM system_config WHERE key = ?", (key,))
             
-            if config:
-                # 如果存在，删除配置
-                db.delete(config)
-                db.commit()
+            if result.rowcount > 0:
                 logger.info(f"配置已删除: key={key}")
-                return True
             else:
                 # 如果不存在，返回True表示操作成功
                 logger.info(f"配置不存在，无需删除: key={key}")
-                return True
+            return True
         except Exception as e:
-            # 回滚事务
-            db.rollback()
             logger.error(f"删除配置失败: key={key}, error={e}")
             return False
-        finally:
-            db.close()
     
     @staticmethod
     def get_with_details(key: str) -> Optional[Dict[str, Any]]:
@@ -194,23 +182,24 @@ class SystemConfigBusiness:
         Returns:
             Optional[Dict[str, Any]]: 配置的详细信息，包括键、值、描述、创建时间和更新时间
         """
-        db: Session = SessionLocal()
         try:
-            config = db.query(SystemConfig).filter_by(key=key).first()
-            if config:
+            with db_connection() as conn:
+                row = conn.execute(
+                    "SELECT key, value, description, created_at, updated_at FROM system_config WHERE key = ?",
+                    (key,)
+                ).fetchone()
+            if row:
                 return {
-                    "key": config.key,
-                    "value": config.value,
-                    "description": config.description,
-                    "created_at": config.created_at,
-                    "updated_at": config.updated_at
+                    "key": row[0],
+                    "value": row[1],
+                    "description": row[2],
+                    "created_at": row[3],
+                    "updated_at": row[4]
                 }
             return None
         except Exception as e:
             logger.error(f"获取配置详情失败: key={key}, error={e}")
             return None
-        finally:
-            db.close()
     
     @staticmethod
     def get_all_with_details() -> Dict[str, Dict[str, Any]]:
@@ -220,20 +209,20 @@ class SystemConfigBusiness:
             Dict[str, Dict[str, Any]]: 所有配置的详细信息，键为配置名，值为配置详情字典
         """
         try:
-            conn = get_db_connection()
-            results = conn.execute(
-                "SELECT key, value, description, created_at, updated_at FROM system_config ORDER BY key"
-            ).fetchall()
-            return {
-                row[0]: {
-                    "key": row[0],
-                    "value": row[1],
-                    "description": row[2],
-                    "created_at": row[3],
-                    "updated_at": row[4]
+            with db_connection() as conn:
+                results = conn.execute(
+                    "SELECT key, value, description, created_at, updated_at FROM system_config ORDER BY key"
+                ).fetchall()
+                return {
+                    row[0]: {
+                        "key": row[0],
+                        "value": row[1],
+                        "description": row[2],
+                        "created_at": row[3],
+                        "updated_at": row[4]
+                    }
+                    for row in results
                 }
-                for row in results
-            }
         except Exception as e:
             logger.error(f"获取所有配置详情失败: error={e}")
             return {}
@@ -260,17 +249,17 @@ class TaskBusiness:
         """
         try:
             import json
-            conn = get_db_connection()
-            # 序列化参数为JSON字符串
-            params_json = json.dumps(params)
-            
-            conn.execute("""
-            INSERT INTO tasks (task_id, task_type, status, params)
-            VALUES (?, ?, ?, ?)
-            """, (task_id, task_type, "pending", params_json))
-            
-            logger.info(f"任务已创建: task_id={task_id}, task_type={task_type}")
-            return True
+            with db_connection() as conn:
+                # 序列化参数为JSON字符串
+                params_json = json.dumps(params)
+                
+                conn.execute("""
+                INSERT INTO tasks (task_id, task_type, status, params)
+                VALUES (?, ?, ?, ?)
+                """, (task_id, task_type, "pending", params_json))
+                
+                logger.info(f"任务已创建: task_id={task_id}, task_type={task_type}")
+                return True
         except Exception as e:
             logger.error(f"创建任务失败: task_id={task_id}, error={e}")
             return False
@@ -286,15 +275,15 @@ class TaskBusiness:
             bool: 操作成功返回True，失败返回False
         """
         try:
-            conn = get_db_connection()
-            conn.execute("""
-            UPDATE tasks 
-            SET status = ?, start_time = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
-            WHERE task_id = ?
-            """, ("running", task_id))
-            
-            logger.info(f"任务已开始: task_id={task_id}")
-            return True
+            with db_connection() as conn:
+                conn.execute("""
+                UPDATE tasks 
+                SET status = ?, start_time = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                WHERE task_id = ?
+                """, ("running", task_id))
+                
+                logger.info(f"任务已开始: task_id={task_id}")
+                return True
         except Exception as e:
             logger.error(f"开始任务失败: task_id={task_id}, error={e}")
             return False
@@ -314,28 +303,69 @@ class TaskBusiness:
             bool: 操作成功返回True，失败返回False
         """
         try:
-            conn = get_db_connection()
-            # 计算进度百分比
-            percentage = 0
-            if total > 0:
-                percentage = int((completed + failed) / total * 100)
-            
-            conn.execute("""
-            UPDATE tasks 
-            SET 
-                total = ?, 
-                completed = ?, 
-                failed = ?, 
-                current = ?, 
-                percentage = ?, 
-                updated_at = CURRENT_TIMESTAMP
-            WHERE task_id = ?
-            """, (total, completed, failed, current, percentage, task_id))
+            with db_connection() as conn:
+                # 计算进度百分比
+                percentage = 0
+                if total > 0:
+                    percentage = int((completed + failed) / total * 100)
+                
+                conn.execute("""
+                UPDATE tasks 
+                SET 
+                    total = ?, 
+                    completed = ?, 
+                    failed = ?, 
+                    current = ?, 
+                    percentage = ?, 
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE task_id = ?
+                """, (total, completed, failed, current, percentage, task_id))
+                
+                logger.debug(f"任务进度已更新: task_id={task_id}, current={current}, progress={percentage}%")
+                return True
+        except Exception as e:
+            logger.error(f"更新任务进度失败: task_id={task_id}, error={e}")
+            return False
+    
+    @staticmethod
+    def update_progress_batch(progress: Dict[str, Dict[str, Any]], checkpoints: Optional[List[Tuple[str, str, str]]] = None) -> bool:
+        """在一个事务中批量更新多个任务的进度，并写入新的检查点
+        
+        Args:
+            progress: 任务ID到进度信息的映射，进度信息包含total、completed、failed、current、percentage
+            checkpoints: 新完成的工作单元列表，每项为(任务ID, 时间周期, 交易对)
             
-            logger.debug(f"任务进度已更新: task_id={task_id}, current={current}, progress={percentage}%")
+        Returns:
+            bool: 操作成功返回True，失败返回False
+        """
+        if not progress and not checkpoints:
+            return True
+        try:
+            with db_transaction() as conn:
+                conn.executemany("""
+                UPDATE tasks 
+                SET 
+                    total = ?, 
+                    completed = ?, 
+                    failed = ?, 
+                    current = ?, 
+                    percentage = ?, 
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE task_id = ?
+                """, [
+                    (p["total"], p["completed"], p["failed"], p["current"], p["percentage"], task_id)
+                    for task_id, p in progress.items()
+                ])
+                if checkpoints:
+                    conn.executemany("""
+                    INSERT OR IGNORE INTO task_checkpoints (task_id, interval, symbol)
+                    VALUES (?, ?, ?)
+                    """, checkpoints)
+            
+            logger.debug(f"批量更新任务进度: {len(progress)} 个任务, 检查点: {len(checkpoints or [])} 个")
             return True
         except Exception as e:
-            logger.error(f"更新任务进度失败: task_id={task_id}, error={e}")
+            logger.error(f"批量更新任务进度失败: task_ids={list(progress)}, error={e}")
             return False
     
     @staticmethod
@@ -349,15 +379,15 @@ class TaskBusiness:
             bool: 操作成功返回True，失败返回False
         """
         try:
-            conn = get_db_connection()
-            conn.execute("""
-            UPDATE tasks 
-            SET status = ?, end_time = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
-            WHERE task_id = ?
-            """, ("completed", task_id))
-            
-            logger.info(f"任务已完成: task_id={task_id}")
-            return True
+            with db_connection() as conn:
+                conn.execute("""
+                UPDATE tasks 
+                SET status = ?, end_time = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                WHERE task_id = ?
+                """, ("completed", task_id))
+                
+                logger.info(f"任务已完成: task_id={task_id}")
+                return True
         except Exception as e:
             logger.error(f"完成任务失败: task_id={task_id}, error={e}")
             return False
@@ -374,89 +404,144 @@ class TaskBusiness:
             bool: 操作成功返回True，失败返回False
         """
         try:
-            conn = get_db_connection()
-            conn.execute("""
-            UPDATE tasks 
-            SET 
-                status = ?, 
-                error_message = ?, 
-                end_time = CURRENT_TIMESTAMP, 
-                updated_at = CURRENT_TIMESTAMP
-            WHERE task_id = ?
-            """, ("failed", error_message, task_id))
-            
-            logger.error(f"任务已失败: task_id={task_id}, error={error_message}")
-            return True
+            with db_connection() as conn:
+                conn.execute("""
+                UPDATE tasks 
+                SET 
+                    status = ?, 
+                    error_message = ?, 
+                    end_time = CURRENT_TIMESTAMP, 
+                    updated_at = CURRENT_TIMESTAMP
+                WHERE task_id = ?
+                """, ("failed", error_message, task_id))
+                
+                logger.error(f"任务已失败: task_id={task_id}, error={error_message}")
+                return True
         except Exception as e:
             logger.error(f"标记任务失败: task_id={task_id}, error={e}")
             return False
     
     @staticmethod
-    def get(task_id: str) -> Optional[Dict[str, Any]]:
-        """获取任务信息
+    def cancel(task_id: str) -> bool:
+        """标记任务已取消
         
         Args:
             task_id: 任务ID
             
         Returns:
-            Optional[Dict[str, Any]]: 任务信息，如果不存在则返回None
+            bool: 操作成功返回True，失败返回False
         """
         try:
-            import json
-            conn = get_db_connection()
-            result = conn.execute(
-                "SELECT * FROM tasks WHERE task_id = ?",
-                (task_id,)
-            ).fetchone()
-            
-            if not result:
-                return None
+            with db_connection() as conn:
+                conn.execute("""
+                UPDATE tasks 
+                SET status = ?, end_time = CURRENT_TIMESTAMP, updated_at = CURRENT_TIMESTAMP
+                WHERE task_id = ?
+                """, ("cancelled", task_id))
+                
+                logger.info(f"任务已取消: task_id={task_id}")
+                return True
+        except Exception as e:
+            logger.error(f"取消任务失败: task_id={task_id}, error={e}")
+            return False
+    
+    @staticmethod
+    def interrupt(task_ids: List[str]) -> bool:
+        """标记任务已中断，用于服务重启后遗留的运行中或等待中的任务
+        
+        Args:
+            task_ids: 任务ID列表
             
-            # 解析结果
-            task_info = {
-                "task_id": result[0],
-                "task_type": result[1],
-                "status": result[2],
-                "progress": {
-                    "total": result[3],
-                    "completed": result[4],
-                    "failed": result[5],
-                    "current": result[6],
-                    "percentage": result[7]
-                },
-                "params": json.loads(result[8]),
-                "start_time": result[9],
-                "end_time": result[10],
-                "error_message": result[11],
-                "created_at": result[12],
-                "updated_at": result[13]
-            }
+        Returns:
+            bool: 操作成功返回True，失败返回False
+        """
+        try:
+            with db_connection() as conn:
+                conn.executemany("""
+                UPDATE tasks 
+                SET status = ?, updated_at = CURRENT_TIMESTAMP
+                WHERE task_id = ?
+                """, [("interrupted", task_id) for task_id in task_ids])
+                
+                logger.info(f"任务已标记为中断: task_ids={task_ids}")
+                return True
+        except Exception as e:
+            logger.error(f"标记任务中断失败: task_ids={task_ids}, error={e}")
+            return False
+    
+    @staticmethod
+    def reset(task_id: str) -> bool:
+        """将任务重置为等待状态，用于恢复任务，保留进度和检查点
+        
+        Args:
+            task_id: 任务ID
             
-            return task_info
+        Returns:
+            bool: 操作成功返回True，失败返回False
+        """
+        try:
+            with db_connection() as conn:
+                conn.execute("""
+                UPDATE tasks 
+                SET status = ?, end_time = NULL, error_message = NULL, updated_at = CURRENT_TIMESTAMP
+                WHERE task_id = ?
+                """, ("pending", task_id))
+                
+                logger.info(f"任务已重置为等待状态: task_id={task_id}")
+                return True
         except Exception as e:
-            logger.error(f"获取任务信息失败: task_id={task_id}, error={e}")
-            return None
+            logger.error(f"重置任务失败: task_id={task_id}, error={e}")
+            return False
     
     @staticmethod
-    def get_all() -> Dict[str, Dict[str, Any]]:
+    def get_checkpoints(task_id: str) -> Dict[str, List[str]]:
+        """获取任务已完成的工作单元
+        
+        Args:
+            task_id: 任务ID
+            
+        Returns:
+            Dict[str, List[str]]: 时间周期到已完成交易对列表的映射
         """
-        获取所有任务信息
+        try:
+            with db_connection() as conn:
+                results = conn.execute(
+                    "SELECT interval, symbol FROM task_checkpoints WHERE task_id = ? ORDER BY interval, symbol",
+                    (task_id,)
+                ).fetchall()
+                
+                checkpoints = {}
+                for interval, symbol in results:
+                    checkpoints.setdefault(interval, []).append(symbol)
+                return checkpoints
+        except Exception as e:
+            logger.error(f"获取任务检查点失败: task_id={task_id}, error={e}")
+            return {}
+    
+    @staticmethod
+    def get(task_id: str) -> Optional[Dict[str, Any]]:
+        """获取任务信息
         
+        Args:
+            task_id: 任务ID
+            
         Returns:
-            Dict[str, Dict[str, Any]]: 所有任务信息，键为任务ID
+            Optional[Dict[str, Any]]: 任务信息，如果不存在则返回None
         """
         try:
             import json
-            conn = get_db_connection()
-            results = conn.execute(
-                "SELECT * FROM tasks ORDER BY created_at DESC"
-            ).fetchall()
-            
-            tasks = {}
-            for result in results:
-                task_id = result[0]
-                tasks[task_id] = {
-                    "task_id": task_id,
+            with db_connection() as conn:
+                result = conn.execute(
+                    "SELECT * FROM tasks WHERE task_id = ?",
+                    (task_id,)
+                ).fetchone()
+                
+                if not result:
+                    return None
+                
+                # 解析结果
+                task_info = {
+                    "task_id": result[0],
                     "task_type": result[1],
                     "status": result[2],
                     "progress": {
@@ -473,8 +558,50 @@ class TaskBusiness:
                     "created_at": result[12],
                     "updated_at": result[13]
                 }
-            
-            return tasks
+                
+                return task_info
+        except Exception as e:
+            logger.error(f"获取任务信息失败: task_id={task_id}, error={e}")
+            return None
+    
+    @staticmethod
+    def get_all() -> Dict[str, Dict[str, Any]]:
+        """
+        获取所有任务信息
+        
+        Returns:
+            Dict[str, Dict[str, Any]]: 所有任务信息，键为任务ID
+        """
+        try:
+            import json
+            with db_connection() as conn:
+                results = conn.execute(
+                    "SELECT * FROM tasks ORDER BY created_at DESC"
+                ).fetchall()
+                
+                tasks = {}
+                for result in results:
+                    task_id = result[0]
+                    tasks[task_id] = {
+                        "task_id": task_id,
+                        "task_type": result[1],
+                        "status": result[2],
+                        "progress": {
+                            "total": result[3],
+                            "completed": result[4],
+                            "failed": result[5],
+                            "current": result[6],
+                            "percentage": result[7]
+                        },
+                        "params": json.loads(result[8]),
+                        "start_time": result[9],
+                        "end_time": result[10],
+                        "error_message": result[11],
+                        "created_at": result[12],
+                        "updated_at": result[13]
+                    }
+                
+                return tasks
         except Exception as e:
             logger.error(f"获取所有任务信息失败: error={e}")
             return {}
@@ -496,108 +623,107 @@ class TaskBusiness:
         """
         try:
             import json
-            conn = get_db_connection()
-            
-            # 构建查询条件
-            where_clauses = []
-            params = []
-            
-            if filters:
-                # 任务类型过滤
-                if "task_type" in filters and filters["task_type"]:
-                    where_clauses.append("task_type = ?")
-                    params.append(filters["task_type"])
+            with db_connection() as conn:
+                # 构建查询条件
+                where_clauses = []
+                params = []
                 
-                # 任务状态过滤
-                if "status" in filters and filters["status"]:
-                    where_clauses.append("status = ?")
-                    params.append(filters["status"])
+                if filters:
+                    # 任务类型过滤
+                    if "task_type" in filters and filters["task_type"]:
+                        where_clauses.append("task_type = ?")
+                        params.append(filters["task_type"])
+                    
+                    # 任务状态过滤
+                    if "status" in filters and filters["status"]:
+                        where_clauses.append("status = ?")
+                        params.append(filters["status"])
+                    
+                    # 开始时间过滤
+                    if "start_time" in filters and filters["start_time"]:
+                        where_clauses.append("start_time >= ?")
+                        params.append(filters["start_time"])
+                    
+                    # 结束时间过滤
+                    if "end_time" in filters and filters["end_time"]:
+                        where_clauses.append("end_time <= ?")
+                        params.append(filters["end_time"])
+                    
+                    # 创建时间过滤
+                    if "created_at" in filters and filters["created_at"]:
+                        where_clauses.append("created_at >= ?")
+                        params.append(filters["created_at"])
+                    
+                    # 更新时间过滤
+                    if "updated_at" in filters and filters["updated_at"]:
+                        where_clauses.append("updated_at <= ?")
+                        params.append(filters["updated_at"])
                 
-                # 开始时间过滤
-                if "start_time" in filters and filters["start_time"]:
-                    where_clauses.append("start_time >= ?")
-                    params.append(filters["start_time"])
+                # 构建WHERE子句
+                where_sql = "" if not where_clauses else f"WHERE {' AND '.join(where_clauses)}"  
                 
-                # 结束时间过滤
-                if "end_time" in filters and filters["end_time"]:
-                    where_clauses.append("end_time <= ?")
-                    params.append(filters["end_time"])
+                # 构建排序子句
+                # 验证排序字段，防止SQL注入
+                allowed_sort_fields = ["task_id", "task_type", "status", "start_time", "end_time", "created_at", "updated_at"]
+                if sort_by not in allowed_sort_fields:
+                    sort_by = "created_at"
                 
-                # 创建时间过滤
-                if "created_at" in filters and filters["created_at"]:
-                    where_clauses.append("created_at >= ?")
-                    params.append(filters["created_at"])
+                # 验证排序顺序
+                if sort_order not in ["asc", "desc"]:
+                    sort_order = "desc"
                 
-                # 更新时间过滤
-                if "updated_at" in filters and filters["updated_at"]:
-                    where_clauses.append("updated_at <= ?")
-                    params.append(filters["updated_at"])
-            
-            # 构建WHERE子句
-            where_sql = "" if not where_clauses else f"WHERE {' AND '.join(where_clauses)}"  
-            
-            # 构建排序子句
-            # 验证排序字段，防止SQL注入
-            allowed_sort_fields = ["task_id", "task_type", "status", "start_time", "end_time", "created_at", "updated_at"]
-            if sort_by not in allowed_sort_fields:
-                sort_by = "created_at"
-            
-            # 验证排序顺序
-            if sort_order not in ["asc", "desc"]:
-                sort_order = "desc"
-            
-            order_sql = f"ORDER BY {sort_by} {sort_order}"
-            
-            # 获取总记录数
-            count_sql = f"SELECT COUNT(*) FROM tasks {where_sql}"
-            total = conn.execute(count_sql, params).fetchone()[0]
-            
-            # 计算分页参数
-            offset = (page - 1) * page_size
-            
-            # 构建分页查询SQL
-            paginated_sql = f"SELECT * FROM tasks {where_sql} {order_sql} LIMIT ? OFFSET ?"
-            params.extend([page_size, offset])
-            
-            # 执行查询
-            results = conn.execute(paginated_sql, params).fetchall()
-            
-            # 处理结果
-            tasks = []
-            for result in results:
-                task = {
-                    "task_id": result[0],
-                    "task_type": result[1],
-                    "status": result[2],
-                    "progress": {
-                        "total": result[3],
-                        "completed": result[4],
-                        "failed": result[5],
-                        "current": result[6],
-                        "percentage": result[7]
-                    },
-                    "params": json.loads(result[8]),
-                    "start_time": result[9],
-                    "end_time": result[10],
-                    "error_message": result[11],
-                    "created_at": result[12],
-                    "updated_at": result[13]
-                }
-                tasks.append(task)
-            
-            # 计算总页数
-            pages = (total + page_size - 1) // page_size
-            
-            # 返回结果
-            return {
-                "tasks": tasks,
-                "pagination": {
-                    "page": page,
-                    "page_size": page_size,
-                    "total": total,
-                    "pages": pages
+                order_sql = f"ORDER BY {sort_by} {sort_order}"
+                
+                # 获取总记录数
+                count_sql = f"SELECT COUNT(*) FROM tasks {where_sql}"
+                total = conn.execute(count_sql, params).fetchone()[0]
+                
+                # 计算分页参数
+                offset = (page - 1) * page_size
+                
+                # 构建分页查询SQL
+                paginated_sql = f"SELECT * FROM tasks {where_sql} {order_sql} LIMIT ? OFFSET ?"
+                params.extend([page_size, offset])
+                
+                # 执行查询
+                results = conn.execute(paginated_sql, params).fetchall()
+                
+                # 处理结果
+                tasks = []
+                for result in results:
+                    task = {
+                        "task_id": result[0],
+                        "task_type": result[1],
+                        "status": result[2],
+                        "progress": {
+                            "total": result[3],
+                            "completed": result[4],
+                            "failed": result[5],
+                            "current": result[6],
+                            "percentage": result[7]
+                        },
+                        "params": json.loads(result[8]),
+                        "start_time": result[9],
+                        "end_time": result[10],
+                        "error_message": result[11],
+                        "created_at": result[12],
+                        "updated_at": result[13]
+                    }
+                    tasks.append(task)
+                
+                # 计算总页数
+                pages = (total + page_size - 1) // page_size
+                
+                # 返回结果
+                return {
+                    "tasks": tasks,
+                    "pagination": {
+                        "page": page,
+                        "page_size": page_size,
+                        "total": total,
+                        "pages": pages
+                    }
                 }
-            }
         except Exception as e:
             logger.error(f"获取分页任务列表失败: error={e}")
             return {
@@ -621,8 +747,9 @@ class TaskBusiness:
             bool: 操作成功返回True，失败返回False
         """
         try:
-            conn = get_db_connection()
-            conn.execute("DELETE FROM tasks WHERE task_id = ?", (task_id,))
+            with db_transaction() as conn:
+                conn.execute("DELETE FROM tasks WHERE task_id = ?", (task_id,))
+                conn.execute("DELETE FROM task_checkpoints WHERE task_id = ?", (task_id,))
             
             logger.info(f"任务已删除: task_id={task_id}")
             return True
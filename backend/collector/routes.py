@@ -120,7 +120,8 @@ def convert_data_to_qlib(request: DataConvertRequest):
             symbol_field_name=request.symbol_field_name,
             include_fields=request.include_fields,
             max_workers=request.max_workers,
-            limit_nums=request.limit_nums
+            limit_nums=request.limit_nums,
+            storage_format=request.storage_format
         )
         
         if result:
@@ -131,7 +132,10 @@ def convert_data_to_qlib(request: DataConvertRequest):
                 data={
                     "csv_dir": request.csv_dir,
                     "qlib_dir": request.qlib_dir,
-                    "freq": request.freq
+                    "freq": request.freq,
+                    "mode": result["mode"],
+                    "preprocess_seconds": result["preprocess_seconds"],
+                    "files": result["files"]
                 }
             )
         else:
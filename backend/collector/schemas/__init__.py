@@ -1,7 +1,7 @@
 # Pydantic模型定义，用于数据处理API的请求和响应
 
 from pydantic import BaseModel, Field
-from typing import Optional, List
+from typing import Literal, Optional, List
 from datetime import datetime
 
 
@@ -64,6 +64,7 @@ class DataConvertRequest(BaseModel):
         include_fields: 要转换的字段列表，逗号分隔
         max_workers: 最大工作线程数
         limit_nums: 限制转换的文件数量，用于调试
+        storage_format: 源数据存储格式
     """
     csv_dir: str = Field(..., description="CSV数据目录")
     qlib_dir: str = Field(..., description="QLib数据保存目录")
@@ -74,3 +75,4 @@ class DataConvertRequest(BaseModel):
     include_fields: str = Field(default="date,open,high,low,close,volume", description="要转换的字段列表，逗号分隔")
     max_workers: int = Field(default=16, description="最大工作线程数")
     limit_nums: Optional[int] = Field(None, description="限制转换的文件数量，用于调试")
+    storage_format: Literal["csv", "parquet"] = Field(default="csv", description="源数据存储格式，csv为每个交易对一个文件，parquet按交易对和月份分区")
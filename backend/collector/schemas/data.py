@@ -1,7 +1,7 @@
 # 数据相关的Pydantic模型定义
 
 from pydantic import BaseModel, Field
-from typing import Dict, List, Optional
+from typing import Dict, List, Literal, Optional
 from datetime import datetime
 
 
@@ -113,6 +113,9 @@ class DownloadCryptoRequest(BaseModel):
         max_workers: 最大工作线程数
         candle_type: 蜡烛图类型
         save_dir: 保存目录
+        incremental: 是否增量下载
+        storage_format: 原始数据存储格式
+        priority: 任务优先级
     """
     symbols: List[str] = Field(..., description="品种列表")
     interval: List[str] = Field(..., description="时间间隔列表")
@@ -122,6 +125,9 @@ class DownloadCryptoRequest(BaseModel):
     max_workers: int = Field(default=1, description="最大工作线程数")
     candle_type: str = Field(default="spot", description="蜡烛图类型")
     save_dir: Optional[str] = Field(None, description="保存目录，如果不提供则从系统配置中读取data_download_dir")
+    incremental: bool = Field(default=False, description="是否增量下载，每个品种从已保存数据的最后时间戳开始下载")
+    storage_format: Literal["csv", "parquet"] = Field(default="csv", description="原始数据存储格式，csv为每个品种一个文件，parquet按品种和月份分区")
+    priority: int = Field(default=0, description="任务优先级，数值大的任务在队列中先执行")
 
 
 class TaskStatusResponse(BaseModel):
@@ -129,7 +135,7 @@ class TaskStatusResponse(BaseModel):
     
     Attributes:
         task_id: 任务ID
-        status: 任务状态（pending, running, completed, failed）
+        status: 任务状态（pending, running, completed, failed, cancelled, interrupted）
         progress: 任务进度百分比
         total: 总任务数
         completed: 已完成任务数
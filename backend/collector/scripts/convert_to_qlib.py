@@ -1,11 +1,10 @@
 #!/usr/bin/env python3
 # 加密货币数据转换为QLib格式脚本
 
-import os
 import sys
+import time
 import shutil
-import tempfile
-import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from pathlib import Path
 from loguru import logger
 
@@ -13,12 +12,80 @@ from loguru import logger
 project_root = Path(__file__).parent.parent.parent.parent  # /Users/liupeng/workspace/qbot
 sys.path.append(str(project_root))
 
-# 添加qlib目录到Python路径，以便导入scripts模块
-qlib_dir = project_root / "qlib"
-sys.path.append(str(qlib_dir))
+from backend.collector.base.storage import CsvInstrumentStorage, ParquetInstrumentStorage
+from backend.collector.scripts.qlib_bin import QlibBinWriter, bounded_map, iter_csv_frames, normalize_frame, qlib_freq_name
 
-# 导入QLib的dump_bin模块
-from scripts.dump_bin import DumpDataAll
+
+def incremental_starts(storage, symbols, instruments, freq="day"):
+    """
+    获取增量转换时每个交易对的读取开始时间
+    
+    已转换的交易对从已转换的最后时间开始读取，重复的K线由写入器跳过；
+    新交易对和原始数据早于已转换开始时间（向前补过数据）的交易对读取全部数据
+    
+    :param storage: 原始数据存储，需提供first_timestamp方法
+    :param symbols: 交易对列表
+    :param instruments: 已转换交易对到(开始时间, 结束时间)的字典
+    :param freq: 交易频率，日线只比较日期部分
+    :return: 交易对到开始时间的字典，开始时间为None时读取全部数据
+    """
+    starts = {}
+    for symbol in symbols:
+        converted = instruments.get(symbol.upper())
+        first = storage.first_timestamp(symbol) if converted is not None else None
+        if first is not None and qlib_freq_name(freq) == "day":
+            first = first.normalize()
+        starts[symbol] = converted[1] if first is not None and first >= converted[0] else None
+    return starts
+
+
+def iter_storage_frames(storage, starts, columns=None, freq="day", max_workers=1):
+    """
+    使用线程池从原始数据存储中读取多个交易对的数据并规范化日期字段，按交易对顺序依次返回
+    
+    同时读取的交易对不超过线程数的两倍，内存占用与交易对数量无关
+    
+    :param storage: 原始数据存储，需提供read方法
+    :param starts: 交易对到开始时间的字典，开始时间为None时读取全部数据
+    :param columns: 需要读取的列
+    :param freq: 交易频率
+    :param max_workers: 最大线程数
+    :return: (交易对, 规范化后的DataFrame, 耗时秒数)的生成器
+    """
+    def read(symbol):
+        started = time.perf_counter()
+        df = storage.read(symbol, columns=columns, start=starts[symbol])
+        if storage.date_field_name in df.columns:
+            df = normalize_frame(df, storage.date_field_name, freq)
+        return symbol, df, time.perf_counter() - started
+    
+    workers = max(int(max_workers or 1), 1)
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        yield from bounded_map(executor, read, ((symbol,) for symbol in starts), workers * 2)
+
+
+def load_storage_frames(storage, starts, columns=None, freq="day", max_workers=1):
+    """
+    从原始数据存储中读取多个交易对的数据，用于只读取新增K线的增量转换
+    
+    :param storage: 原始数据存储，需提供read方法
+    :param starts: 交易对到开始时间的字典，开始时间为None时读取全部数据
+    :param columns: 需要读取的列
+    :param freq: 交易频率
+    :param max_workers: 最大线程数
+    :return: (交易对到DataFrame的字典, 交易对到{"rows": 行数, "seconds": 耗时}的字典)
+    """
+    frames, timings = {}, {}
+    for symbol, df, seconds in iter_storage_frames(storage, starts, columns, freq, max_workers):
+        frames[symbol] = df
+        timings[symbol] = {"rows": len(df), "seconds": round(seconds, 4)}
+    return frames, timings
+
+
+def log_timings(timings):
+    """输出每个文件的预处理行数与耗时"""
+    for symbol, timing in timings.items():
+        logger.debug(f"预处理文件: {symbol}，行数: {timing['rows']}，耗时: {timing['seconds']}秒")
 
 
 def convert_crypto_to_qlib(
@@ -31,7 +98,9 @@ def convert_crypto_to_qlib(
     include_fields="date,open,high,low,close,volume",
     max_workers=16,
     limit_nums=None,
-    backup_dir=None
+    backup_dir=None,
+    incremental=False,
+    storage_format="csv"
 ):
     """
     将加密货币CSV数据转换为QLib格式
@@ -43,10 +112,12 @@ def convert_crypto_to_qlib(
     :param file_suffix: CSV文件后缀
     :param symbol_field_name: CSV中的交易对字段名称
     :param include_fields: 要转换的字段列表，逗号分隔
-    :param max_workers: 最大工作线程数
+    :param max_workers: 预处理CSV的最大进程数和写入二进制文件的最大线程数
     :param limit_nums: 限制转换的文件数量，用于调试
     :param backup_dir: 备份目录，如果提供则在转换前备份QLib数据
-    :return: 转换结果
+    :param incremental: 是否增量转换，已转换的交易对只读取并追加新增的K线，QLib目录中没有日历时进行全量转换
+    :param storage_format: 原始数据存储格式，"csv"为每个交易对一个文件，"parquet"为按交易对和月份分区的目录
+    :return: 转换结果字典，包含转换方式和每个文件的预处理行数与耗时，失败时返回False
     """
     try:
         # 检查CSV目录是否存在
@@ -65,60 +136,84 @@ def convert_crypto_to_qlib(
         elif not isinstance(include_fields, str):
             include_fields = str(include_fields)
         
-        # 创建临时目录，用于处理CSV文件
-        with tempfile.TemporaryDirectory() as temp_dir:
-            temp_dir = Path(temp_dir)
-            
-            # 复制CSV文件到临时目录，并确保文件名只包含交易对名称
-            logger.info(f"正在处理CSV文件，源目录: {csv_dir}")
-            csv_files = sorted(csv_dir.glob(f"*{file_suffix}"))
-            
-            if limit_nums is not None:
-                csv_files = csv_files[:int(limit_nums)]
-            
-            for csv_file in csv_files:
-                # 提取交易对名称（文件名去掉后缀）
-                symbol = csv_file.stem
-                # 复制文件到临时目录，确保文件名只包含交易对名称
-                dest_file = temp_dir / f"{symbol}{file_suffix}"
-                
-                # 读取CSV文件，预处理日期字段
-                df = pd.read_csv(csv_file)
-                if date_field_name in df.columns:
-                    # 尝试多种日期解析方式，处理包含时间的日期格式
-                    df[date_field_name] = pd.to_datetime(df[date_field_name], errors='coerce')
-                    # 过滤掉无法解析的日期（NaT值）
-                    df = df.dropna(subset=[date_field_name])
-                    # 如果是日线数据，只保留日期部分
-                    if freq == 'day' and not df.empty:
-                        df[date_field_name] = df[date_field_name].dt.strftime('%Y-%m-%d')
-                
-                # 将预处理后的数据保存到临时目录
-                df.to_csv(dest_file, index=False)
-                logger.debug(f"预处理并保存文件: {csv_file} -> {dest_file}")
-            
-            # 直接调用QLib的DumpDataAll类进行转换
-            logger.info(f"开始转换数据为QLib格式，目标目录: {qlib_dir}")
-            
-            # 创建DumpDataAll实例
-            dump_data = DumpDataAll(
-                data_path=str(temp_dir),
-                qlib_dir=str(qlib_dir),
-                backup_dir=backup_dir,
+        fields = [field for field in include_fields.split(",") if field]
+        writer = QlibBinWriter(
+            qlib_dir, freq=freq, fields=fields, date_field_name=date_field_name
+        )
+        incremental = incremental and writer.calendar_path.exists()
+        
+        if storage_format == "parquet":
+            storage = ParquetInstrumentStorage(csv_dir, date_field_name=date_field_name)
+        else:
+            storage = CsvInstrumentStorage(csv_dir, date_field_name=date_field_name, file_suffix=file_suffix)
+        symbols = storage.symbols()
+        if limit_nums is not None:
+            symbols = symbols[:int(limit_nums)]
+        
+        # 增量转换：已转换的交易对只读取最后时间之后的数据：Parquet按日期过滤月份文件和行组，
+        # CSV根据索引从文件末尾向前定位，读取量只与新增的K线数量有关，已转换的数据保留，新交易对的较早时间插入日历
+        if incremental:
+            logger.info(f"正在读取新增数据，源目录: {csv_dir}，交易对数: {len(symbols)}")
+            started = time.perf_counter()
+            frames, timings = load_storage_frames(
+                storage,
+                incremental_starts(storage, symbols, writer.read_instruments(), freq),
+                columns=fields + [date_field_name],
                 freq=freq,
-                max_workers=max_workers,
+                max_workers=max_workers
+            )
+            log_timings(timings)
+            logger.info(f"开始增量转换数据为QLib格式，目标目录: {qlib_dir}")
+            updated = writer.update(frames, normalized=True, partial=True, rebase=True)
+            logger.info("数据增量转换成功！")
+            return {
+                "mode": "incremental",
+                "files": timings,
+                "preprocess_seconds": round(time.perf_counter() - started, 4),
+                "symbols": updated,
+            }
+        
+        # 全量转换：CSV在进程池中读取，Parquet在线程池中读取，DataFrame直接交给二进制写入器，不再复制临时CSV文件
+        def read_frames(columns):
+            if storage_format == "parquet":
+                return iter_storage_frames(storage, dict.fromkeys(symbols), columns, freq, max_workers)
+            return iter_csv_frames(
+                [storage.get_path(symbol) for symbol in symbols],
                 date_field_name=date_field_name,
-                file_suffix=file_suffix,
-                symbol_field_name=symbol_field_name,
-                include_fields=include_fields,
-                limit_nums=limit_nums
+                freq=freq,
+                usecols=columns,
+                max_workers=max_workers
             )
-            
-            # 执行转换
-            dump_data.dump()
-            
-            logger.info(f"数据转换成功！")
-            return True
+        
+        # 第一遍只读取日期列生成日历，第二遍逐个交易对读取并写入，内存中只保留少量交易对的数据
+        logger.info(f"正在生成日历，源目录: {csv_dir}，交易对数: {len(symbols)}")
+        calendar = set()
+        for _, df, _ in read_frames([date_field_name]):
+            if date_field_name in df.columns:
+                calendar.update(df[date_field_name])
+        
+        timings = {}
+        
+        def timed_frames():
+            for symbol, df, seconds in read_frames(fields + [date_field_name]):
+                timings[symbol] = {"rows": len(df), "seconds": round(seconds, 4)}
+                yield symbol, df
+        
+        # 全量转换前按需备份QLib数据目录
+        if backup_dir is not None:
+            shutil.copytree(str(qlib_dir), str(Path(backup_dir).expanduser().resolve()))
+        
+        logger.info(f"开始转换数据为QLib格式，目标目录: {qlib_dir}")
+        result = writer.dump(timed_frames(), normalized=True, calendar=calendar)
+        log_timings(timings)
+        result.update(
+            mode="full",
+            files=timings,
+            preprocess_seconds=round(sum(timing["seconds"] for timing in timings.values()), 4),
+        )
+        
+        logger.info(f"数据转换成功！")
+        return result
     
     except Exception as e:
         logger.error(f"转换过程中发生错误: {e}")
@@ -136,7 +231,9 @@ def convert_stock_to_qlib(
     include_fields="date,open,high,low,close,volume",
     max_workers=16,
     limit_nums=None,
-    backup_dir=None
+    backup_dir=None,
+    incremental=False,
+    storage_format="csv"
 ):
     """
     将股票CSV数据转换为QLib格式
@@ -151,6 +248,8 @@ def convert_stock_to_qlib(
     :param max_workers: 最大工作线程数
     :param limit_nums: 限制转换的文件数量，用于调试
     :param backup_dir: 备份目录，如果提供则在转换前备份QLib数据
+    :param incremental: 是否增量转换，已转换的交易对只读取并追加新增的K线，QLib目录中没有日历时进行全量转换
+    :param storage_format: 原始数据存储格式，"csv"为每个交易对一个文件，"parquet"为按交易对和月份分区的目录
     :return: 转换结果
     """
     # 股票数据转换与加密货币数据转换逻辑基本相同，直接调用convert_crypto_to_qlib函数
@@ -164,7 +263,9 @@ def convert_stock_to_qlib(
         include_fields=include_fields,
         max_workers=max_workers,
         limit_nums=limit_nums,
-        backup_dir=backup_dir
+        backup_dir=backup_dir,
+        incremental=incremental,
+        storage_format=storage_format
     )
 
 
@@ -179,7 +280,9 @@ def convert_data_to_qlib(
     include_fields="date,open,high,low,close,volume",
     max_workers=16,
     limit_nums=None,
-    backup_dir=None
+    backup_dir=None,
+    incremental=False,
+    storage_format="csv"
 ):
     """
     将数据转换为QLib格式的通用函数
@@ -195,6 +298,8 @@ def convert_data_to_qlib(
     :param max_workers: 最大工作线程数
     :param limit_nums: 限制转换的文件数量，用于调试
     :param backup_dir: 备份目录，如果提供则在转换前备份QLib数据
+    :param incremental: 是否增量转换，已转换的交易对只读取并追加新增的K线，QLib目录中没有日历时进行全量转换
+    :param storage_format: 原始数据存储格式，"csv"为每个交易对一个文件，"parquet"为按交易对和月份分区的目录
     :return: 转换结果
     """
     logger.info(f"开始转换{data_type}数据为QLib格式")
@@ -210,7 +315,9 @@ def convert_data_to_qlib(
             include_fields=include_fields,
             max_workers=max_workers,
             limit_nums=limit_nums,
-            backup_dir=backup_dir
+            backup_dir=backup_dir,
+            incremental=incremental,
+            storage_format=storage_format
         )
     elif data_type == "stock":
         return convert_stock_to_qlib(
@@ -223,7 +330,9 @@ def convert_data_to_qlib(
             include_fields=include_fields,
             max_workers=max_workers,
             limit_nums=limit_nums,
-            backup_dir=backup_dir
+            backup_dir=backup_dir,
+            incremental=incremental,
+            storage_format=storage_format
         )
     else:
         logger.error(f"不支持的数据类型: {data_type}")
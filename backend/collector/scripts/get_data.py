@@ -10,6 +10,7 @@ import fire
 from pathlib import Path
 from loguru import logger
 
+from backend.collector.base.storage import get_instrument_storage
 from backend.collector.crypto.binance.collector import BinanceCollector
 from backend.collector.crypto.okx.collector import OKXCollector
 from backend.collector.db.models import SystemConfig
@@ -38,6 +39,15 @@ class GetData:
         convert_to_qlib=False,
         qlib_dir=None,
         progress_callback=None,
+        instrument_callback=None,
+        use_monthly_archive=False,
+        async_mode=False,
+        incremental=False,
+        cache_dir=None,
+        debug=False,
+        stream_to_qlib=False,
+        save_csv=True,
+        storage_format="csv",
     ):
         """
         从币安交易所下载加密货币数据
@@ -56,6 +66,16 @@ class GetData:
         :param convert_to_qlib: 是否将数据转换为QLib格式，默认False
         :param qlib_dir: QLib数据保存目录，如果为None则自动生成
         :param progress_callback: 进度回调函数，格式为 callback(current, completed, total, failed)
+        :param instrument_callback: 交易对下载成功后的回调函数，格式为 callback(symbol)，用于记录任务检查点
+        :param use_monthly_archive: 是否优先使用月归档下载完整月份，默认False
+        :param async_mode: 是否使用异步收集模式，所有交易对在同一个事件循环中下载，默认False
+        :param incremental: 是否增量下载，每个交易对从已保存数据的最后时间戳开始下载，默认False
+        :param cache_dir: 归档文件本地缓存目录，重复下载相同归档时直接从磁盘读取，默认None（不缓存）
+        :param debug: 是否输出每个交易对时间戳的统计信息，默认False
+        :param stream_to_qlib: 是否在每个交易对下载完成后直接写入QLib二进制格式（写入qlib_dir），无需下载后再转换，默认False
+        :param save_csv: 直接写入QLib格式时是否同时保存原始数据文件，默认True
+        :param storage_format: 原始数据存储格式，可选'csv'或'parquet'（按交易对和月份分区），默认'csv'
+        :return: 每个交易对的下载计划统计，格式为 {symbol: {'monthly': n, 'daily': n, 'monthly_fallback': n}}
         """
         if save_dir is None:
             # 从数据库中读取下载目录配置
@@ -91,6 +111,12 @@ class GetData:
         logger.info(f"交易类型: {candle_type}")
         logger.info(f"交易对数量: {'全量' if symbols is None else len(symbols)}")
         
+        # 直接写入QLib二进制格式时，QLib目录的默认值与下载后转换时一致
+        qlib_sink_dir = None
+        if stream_to_qlib:
+            qlib_sink_dir = Path(qlib_dir) if qlib_dir else Path(save_dir).expanduser().resolve().parent.parent / "qlib_data"
+            logger.info(f"下载时直接写入QLib目录: {qlib_sink_dir}，保存CSV: {save_csv}")
+        
         # 创建收集器实例
         collector = BinanceCollector(
             save_dir=save_dir,
@@ -104,12 +130,35 @@ class GetData:
             limit_nums=limit_nums,
             candle_type=candle_type,
             symbols=symbols,
+            use_monthly_archive=use_monthly_archive,
+            async_mode=async_mode,
+            incremental=incremental,
+            cache_dir=cache_dir,
+            debug=debug,
+            qlib_sink_dir=qlib_sink_dir,
+            save_csv=save_csv,
+            storage_format=storage_format,
         )
         
         # 执行数据收集
-        collector.collect_data(convert_to_qlib=convert_to_qlib, qlib_dir=qlib_dir, progress_callback=progress_callback)
+        collector.collect_data(
+            convert_to_qlib=convert_to_qlib,
+            qlib_dir=qlib_dir,
+            progress_callback=progress_callback,
+            instrument_callback=instrument_callback,
+        )
+        
+        # 汇总本次下载使用的月归档/日归档数量
+        plans = [plan for plan in collector.archive_plans.values() if plan]
+        if plans:
+            logger.info(
+                f"下载计划汇总: 月归档 {sum(plan['monthly'] for plan in plans)} 个，"
+                f"日归档 {sum(plan['daily'] for plan in plans)} 个，"
+                f"月归档回退 {sum(plan['monthly_fallback'] for plan in plans)} 个"
+            )
         
         logger.info("数据下载完成！")
+        return collector.archive_plans
     
     def crypto_okx(
         self,
@@ -127,6 +176,12 @@ class GetData:
         convert_to_qlib=False,
         qlib_dir=None,
         progress_callback=None,
+        instrument_callback=None,
+        async_mode=False,
+        incremental=False,
+        stream_to_qlib=False,
+        save_csv=True,
+        storage_format="csv",
     ):
         """
         从OKX交易所下载加密货币数据
@@ -145,6 +200,12 @@ class GetData:
         :param convert_to_qlib: 是否将数据转换为QLib格式，默认False
         :param qlib_dir: QLib数据保存目录，如果为None则自动生成
         :param progress_callback: 进度回调函数，格式为 callback(current, completed, total, failed)
+        :param instrument_callback: 交易对下载成功后的回调函数，格式为 callback(symbol)，用于记录任务检查点
+        :param async_mode: 是否使用异步收集模式，默认False
+        :param incremental: 是否增量下载，每个交易对从已保存数据的最后时间戳开始下载，默认False
+        :param stream_to_qlib: 是否在每个交易对下载完成后直接写入QLib二进制格式（写入qlib_dir），无需下载后再转换，默认False
+        :param save_csv: 直接写入QLib格式时是否同时保存原始数据文件，默认True
+        :param storage_format: 原始数据存储格式，可选'csv'或'parquet'（按交易对和月份分区），默认'csv'
         """
         if save_dir is None:
             # 从数据库中读取下载目录配置
@@ -180,6 +241,12 @@ class GetData:
         logger.info(f"交易类型: {candle_type}")
         logger.info(f"交易对数量: {'全量' if symbols is None else len(symbols)}")
         
+        # 直接写入QLib二进制格式时，QLib目录的默认值与下载后转换时一致
+        qlib_sink_dir = None
+        if stream_to_qlib:
+            qlib_sink_dir = Path(qlib_dir) if qlib_dir else Path(save_dir).expanduser().resolve().parent.parent / "qlib_data"
+            logger.info(f"下载时直接写入QLib目录: {qlib_sink_dir}，保存CSV: {save_csv}")
+        
         # 创建收集器实例
         collector = OKXCollector(
             save_dir=save_dir,
@@ -193,10 +260,20 @@ class GetData:
             limit_nums=limit_nums,
             candle_type=candle_type,
             symbols=symbols,
+            async_mode=async_mode,
+            incremental=incremental,
+            qlib_sink_dir=qlib_sink_dir,
+            save_csv=save_csv,
+            storage_format=storage_format,
         )
         
         # 执行数据收集
-        collector.collect_data(convert_to_qlib=convert_to_qlib, qlib_dir=qlib_dir, progress_callback=progress_callback)
+        collector.collect_data(
+            convert_to_qlib=convert_to_qlib,
+            qlib_dir=qlib_dir,
+            progress_callback=progress_callback,
+            instrument_callback=instrument_callback,
+        )
         
         logger.info("数据下载完成！")
     
@@ -217,6 +294,11 @@ class GetData:
         convert_to_qlib=False,
         qlib_dir=None,
         progress_callback=None,
+        instrument_callback=None,
+        incremental=False,
+        stream_to_qlib=False,
+        save_csv=True,
+        storage_format="csv",
     ):
         """
         从指定交易所下载加密货币数据
@@ -236,9 +318,14 @@ class GetData:
         :param convert_to_qlib: 是否将数据转换为QLib格式，默认False
         :param qlib_dir: QLib数据保存目录，如果为None则自动生成
         :param progress_callback: 进度回调函数，格式为 callback(current, completed, total, failed)
+        :param instrument_callback: 交易对下载成功后的回调函数，格式为 callback(symbol)，用于记录任务检查点
+        :param incremental: 是否增量下载，每个交易对从已保存数据的最后时间戳开始下载，默认False
+        :param stream_to_qlib: 是否在每个交易对下载完成后直接写入QLib二进制格式（写入qlib_dir），无需下载后再转换，默认False
+        :param save_csv: 直接写入QLib格式时是否同时保存原始数据文件，默认True
+        :param storage_format: 原始数据存储格式，可选'csv'或'parquet'（按交易对和月份分区），默认'csv'
         """
         if exchange == "binance":
-            self.crypto_binance(
+            return self.crypto_binance(
                 save_dir=save_dir,
                 start=start,
                 end=end,
@@ -253,6 +340,11 @@ class GetData:
                 convert_to_qlib=convert_to_qlib,
                 qlib_dir=qlib_dir,
                 progress_callback=progress_callback,
+                instrument_callback=instrument_callback,
+                incremental=incremental,
+                stream_to_qlib=stream_to_qlib,
+                save_csv=save_csv,
+                storage_format=storage_format,
             )
         elif exchange == "okx":
             self.crypto_okx(
@@ -270,10 +362,103 @@ class GetData:
                 convert_to_qlib=convert_to_qlib,
                 qlib_dir=qlib_dir,
                 progress_callback=progress_callback,
+                instrument_callback=instrument_callback,
+                incremental=incremental,
+                stream_to_qlib=stream_to_qlib,
+                save_csv=save_csv,
+                storage_format=storage_format,
             )
         else:
             logger.error(f"不支持的交易所: {exchange}")
     
+    def resample(
+        self,
+        save_dir=None,
+        base_interval="1m",
+        interval="1d",
+        symbols=None,
+        start=None,
+        end=None,
+        convert_to_qlib=False,
+        qlib_dir=None,
+        incremental=False,
+        storage_format="csv",
+    ):
+        """
+        由已下载的细粒度K线合成粗粒度K线，无需再次下载
+        
+        合成的K线按UTC零点对齐，只支持能整除一天的分钟、小时周期和1d，目标周期需为来源周期的整数倍
+        
+        :param save_dir: 数据保存目录，默认 ~/.qlib/crypto_data/source，来源和目标数据分别位于其下的时间间隔子目录
+        :param base_interval: 来源时间间隔，如'1m'，默认'1m'
+        :param interval: 目标时间间隔，如'5m', '1h', '1d'，默认'1d'
+        :param symbols: 交易对列表，如'BTCUSDT,ETHUSDT'，如果为None则合成来源目录下所有交易对
+        :param start: 开始时间，格式为'YYYY-MM-DD'或'YYYY-MM-DD HH:MM:SS'
+        :param end: 结束时间，格式为'YYYY-MM-DD'或'YYYY-MM-DD HH:MM:SS'
+        :param convert_to_qlib: 是否将合成的K线直接写入QLib格式，默认False
+        :param qlib_dir: QLib数据保存目录，如果为None则自动生成
+        :param incremental: 是否增量合成，每个交易对从已合成的最后一根K线之后开始，默认False
+        :param storage_format: 原始数据存储格式，可选'csv'或'parquet'，默认'csv'
+        :return: 合成结果字典
+        """
+        from backend.collector.scripts.resample_bars import derive_interval
+        
+        if save_dir is None:
+            # 与下载时一致，从数据库中读取下载目录配置
+            try:
+                data_download_dir = SystemConfig.get("data_download_dir")
+                save_dir = Path(data_download_dir) if data_download_dir else self.default_save_dir
+            except Exception as e:
+                save_dir = self.default_save_dir
+                logger.warning(f"从数据库读取下载目录失败: {e}，使用默认值: {save_dir}")
+        save_dir = Path(save_dir)
+        if isinstance(symbols, str):
+            symbols = symbols.split(',')
+        
+        if convert_to_qlib and qlib_dir is None:
+            # 与下载后转换时的默认目录一致
+            qlib_dir = save_dir.expanduser().resolve().parent / "qlib_data"
+        
+        return derive_interval(
+            source_dir=save_dir / base_interval,
+            target_dir=save_dir / interval,
+            interval=interval,
+            base_interval=base_interval,
+            symbols=symbols,
+            storage_format=storage_format,
+            qlib_dir=qlib_dir if convert_to_qlib else None,
+            start=start,
+            end=end,
+            incremental=incremental,
+        )
+    
+    def compact(self, save_dir=None, interval="1d", symbols=None, storage_format="csv"):
+        """
+        整理已下载的数据文件，按日期去重并排序
+        
+        数据下载时只追加新数据，不会整理已有文件，需要时通过此命令显式整理
+        
+        :param save_dir: 数据保存目录，默认 ~/.qlib/crypto_data/source
+        :param interval: 时间间隔，用于定位save_dir下的子目录，默认'1d'
+        :param symbols: 交易对列表，如'BTCUSDT,ETHUSDT'，如果为None则整理目录下所有交易对
+        :param storage_format: 原始数据存储格式，可选'csv'或'parquet'，默认'csv'
+        :return: 交易对到整理后行数的字典
+        """
+        if save_dir is None:
+            save_dir = self.default_save_dir
+        save_dir = Path(save_dir) / interval
+        storage = get_instrument_storage(storage_format, save_dir)
+        
+        if symbols is None:
+            result = storage.compact_all()
+        else:
+            if isinstance(symbols, str):
+                symbols = symbols.split(',')
+            result = {symbol: storage.compact(symbol) for symbol in symbols}
+        
+        logger.info(f"数据整理完成，共整理 {len(result)} 个交易对，目录: {save_dir}")
+        return result
+    
     def stock(
         self,
         exchange="",
@@ -332,7 +517,11 @@ class GetData:
         print("   python get_data.py crypto_binance --start 2024-01-01 --end 2024-10-31 --interval 1h --candle_type spot --convert_to_qlib")
         print("\n5. 下载币安期货数据：")
         print("   python get_data.py crypto_binance --start 2024-01-01 --end 2024-10-31 --interval 4h --candle_type futures")
-        print("\n6. 查看详细帮助：")
+        print("\n6. 增量更新已下载的数据（每日定时任务）：")
+        print("   python get_data.py crypto_binance --interval 1d --symbols BTCUSDT,ETHUSDT --incremental")
+        print("\n7. 整理已下载的数据（去重并排序）：")
+        print("   python get_data.py compact --interval 1h")
+        print("\n8. 查看详细帮助：")
         print("   python get_data.py crypto_binance --help")
 
 
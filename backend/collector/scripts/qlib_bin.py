@@ -0,0 +1,651 @@
+# QLib二进制数据增量写入工具
+
+import os
+import re
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, Mapping, Optional, Sequence, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+
+def qlib_freq_name(freq: str) -> str:
+    """
+    获取频率在日历和特征文件名中使用的名称，qlib_integration.custom_freq.CustomFreq.to_file_name也使用该函数
+    
+    - 分钟：1min/1minute/1m -> "1m"，5min -> "5m"
+    - 小时：1hour/1h -> "1h"
+    - 天：1d/day -> "day"
+    - 月：1M/1mon/1month -> "1month"，大写的M为月（与交易所的时间间隔一致），不会与分钟混淆
+    - 其他格式保持不变
+    
+    :param freq: 频率字符串
+    :return: 文件名中使用的频率名称
+    """
+    text = str(freq)
+    match = re.match(r"^([0-9]*)M$", text) or re.match(r"^([0-9]*)(mon|month)$", text.lower())
+    if match is not None:
+        return f"{int(match.group(1)) if match.group(1) else 1}month"
+    match = re.match(r"^([0-9]*)(minute|min|m|hour|h|day|d)$", text.lower())
+    if match is None:
+        return freq
+    count = int(match.group(1)) if match.group(1) else 1
+    base = match.group(2)
+    if base in ("minute", "min", "m"):
+        return f"{count}m"
+    if base in ("hour", "h"):
+        return f"{count}h"
+    return "day" if count == 1 else f"{count}d"
+
+
+def normalize_frame(df: pd.DataFrame, date_field_name: str = "date", freq: str = "day") -> pd.DataFrame:
+    """
+    规范化日期字段：解析日期、过滤无法解析的日期、日线只保留日期部分、去重并排序
+    
+    :param df: 数据DataFrame
+    :param date_field_name: 日期字段名称
+    :param freq: 频率，日线时只保留日期部分
+    :return: 规范化后的DataFrame
+    """
+    df = df.copy()
+    df[date_field_name] = pd.to_datetime(df[date_field_name], errors="coerce")
+    df = df.dropna(subset=[date_field_name])
+    if qlib_freq_name(freq) == "day":
+        df[date_field_name] = df[date_field_name].dt.normalize()
+    return df.drop_duplicates(date_field_name, keep="last").sort_values(date_field_name)
+
+
+def read_csv_frame(
+    csv_file: Union[str, Path],
+    date_field_name: str = "date",
+    freq: str = "day",
+    usecols: Optional[Sequence[str]] = None,
+) -> Tuple[str, pd.DataFrame, float]:
+    """
+    读取单个CSV文件并规范化日期字段，供进程池调用
+    
+    :param csv_file: CSV文件路径，文件名（不含后缀）为标的代码
+    :param date_field_name: 日期字段名称
+    :param freq: 频率
+    :param usecols: 只读取的列，为None时读取全部列，CSV中不存在的列会被忽略
+    :return: (标的代码, 规范化后的DataFrame, 耗时秒数)
+    """
+    started = time.perf_counter()
+    csv_file = Path(csv_file)
+    wanted = set(usecols) if usecols is not None else None
+    df = pd.read_csv(csv_file, usecols=(lambda column: column in wanted) if wanted is not None else None)
+    if date_field_name in df.columns:
+        df = normalize_frame(df, date_field_name, freq)
+    else:
+        df = df.iloc[0:0]
+    return csv_file.stem, df, time.perf_counter() - started
+
+
+def bounded_map(executor, fn, iterable: Iterable, window: int) -> Iterator:
+    """
+    按提交顺序返回执行结果，同时提交的任务不超过window个
+    
+    与Executor.map不同，不会一次性提交全部任务，已完成但尚未取出的结果不会在内存中堆积
+    
+    :param executor: 进程池或线程池
+    :param fn: 执行的函数
+    :param iterable: 参数元组的可迭代对象
+    :param window: 同时提交的任务数量上限
+    :return: 执行结果的生成器
+    """
+    pending = deque()
+    for args in iterable:
+        pending.append(executor.submit(fn, *args))
+        if len(pending) >= window:
+            yield pending.popleft().result()
+    while pending:
+        yield pending.popleft().result()
+
+
+def iter_csv_frames(
+    csv_files: Iterable[Union[str, Path]],
+    date_field_name: str = "date",
+    freq: str = "day",
+    usecols: Optional[Sequence[str]] = None,
+    max_workers: int = 1,
+) -> Iterator[Tuple[str, pd.DataFrame, float]]:
+    """
+    使用进程池并行读取并规范化多个CSV文件，按文件顺序依次返回，不产生中间文件
+    
+    同时读取的文件不超过进程数的两倍，调用方处理完一个文件的数据后即可释放，
+    内存占用与文件数量无关
+    
+    :param csv_files: CSV文件列表
+    :param date_field_name: 日期字段名称
+    :param freq: 频率
+    :param usecols: 只读取的列
+    :param max_workers: 最大进程数，为1时在当前进程中串行读取
+    :return: (标的代码, 规范化后的DataFrame, 耗时秒数)的生成器
+    """
+    csv_files = list(csv_files)
+    usecols = list(usecols) if usecols is not None else None
+    args = ((csv_file, date_field_name, freq, usecols) for csv_file in csv_files)
+    
+    if max_workers and max_workers > 1 and len(csv_files) > 1:
+        workers = min(max_workers, len(csv_files))
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            yield from bounded_map(executor, read_csv_frame, args, workers * 2)
+    else:
+        for arg in args:
+            yield read_csv_frame(*arg)
+
+
+class QlibBinWriter:
+    """
+    按QLib的目录结构写入二进制数据，与scripts.dump_bin.DumpDataAll的输出格式一致：
+    
+    - calendars/{freq}.txt：每行一个时间，每个频率使用独立的日历
+    - instruments/all.txt：每行"标的\\t开始时间\\t结束时间"，多个频率共用，时间范围取各频率的并集
+    - instruments/all.{freq}.ranges：与all.txt格式相同，记录该频率下每个标的的时间范围，QLib不会读取
+    - features/{标的小写}/{字段}.{freq}.bin：float32数组，第一个值为起始时间在对应频率日历中的下标，
+      之后为按日历对齐的字段值
+    
+    update方法只追加日历中新增的时间和每个标的新增的K线，历史发生变化的标的才整体重写
+    """
+    
+    INSTRUMENTS_SEP = "\t"
+    INSTRUMENTS_FILE_NAME = "all.txt"
+    
+    def __init__(
+        self,
+        qlib_dir: Union[str, Path],
+        freq: str = "day",
+        fields: Iterable[str] = ("open", "high", "low", "close", "volume"),
+        date_field_name: str = "date",
+    ):
+        """
+        初始化写入器
+        
+        :param qlib_dir: QLib数据目录
+        :param freq: 频率，如"day"、"1h"、"1m"，决定日历和特征文件名，每个频率使用独立的日历，
+            如1min和1m都写入calendars/1m.txt
+        :param fields: 需要写入的字段
+        :param date_field_name: 数据中的日期字段名称
+        """
+        self.qlib_dir = Path(qlib_dir).expanduser().resolve()
+        self.freq = qlib_freq_name(freq)
+        self.fields = [field for field in fields if field != date_field_name]
+        self.date_field_name = date_field_name
+        self.calendar_path = self.qlib_dir / "calendars" / f"{self.freq}.txt"
+        self.instruments_path = self.qlib_dir / "instruments" / self.INSTRUMENTS_FILE_NAME
+        self.ranges_path = self.instruments_path.with_name(f"{self.instruments_path.stem}.{self.freq}.ranges")
+        self.features_dir = self.qlib_dir / "features"
+    
+    @property
+    def date_format(self) -> str:
+        """日历和标的列表中的时间格式"""
+        return "%Y-%m-%d" if self.freq == "day" else "%Y-%m-%d %H:%M:%S"
+    
+    def get_bin_path(self, symbol: str, field: str) -> Path:
+        """获取标的字段的二进制文件路径"""
+        return self.features_dir / symbol.lower() / f"{field.lower()}.{self.freq}.bin"
+    
+    def read_calendar(self) -> List[pd.Timestamp]:
+        """读取日历，文件不存在时返回空列表"""
+        if not self.calendar_path.exists():
+            return []
+        with open(self.calendar_path, "r") as f:
+            lines = [line.strip() for line in f if line.strip()]
+        return list(pd.to_datetime(lines))
+    
+    def read_instruments(self) -> Dict[str, tuple]:
+        """读取当前频率的标的列表，返回标的到(开始时间, 结束时间)的字典
+        
+        没有该频率的时间范围记录时（旧版本写入的数据）读取共用的all.txt
+        """
+        return self._read_ranges(self.ranges_path if self.ranges_path.exists() else self.instruments_path)
+    
+    def _read_ranges(self, path: Path) -> Dict[str, tuple]:
+        """读取"标的\\t开始时间\\t结束时间"格式的文件"""
+        instruments = {}
+        if not path.exists():
+            return instruments
+        with open(path, "r") as f:
+            for line in f:
+                parts = line.strip().split(self.INSTRUMENTS_SEP)
+                if len(parts) == 3:
+                    instruments[parts[0]] = (pd.Timestamp(parts[1]), pd.Timestamp(parts[2]))
+        return instruments
+    
+    def read_bin_header(self, symbol: str, field: str) -> Optional[tuple]:
+        """
+        读取二进制文件的起始下标和数据长度，只读取文件头
+        
+        :return: (起始下标, 数据长度)，文件不存在时返回None
+        """
+        path = self.get_bin_path(symbol, field)
+        if not path.exists():
+            return None
+        start_index = int(np.fromfile(path, dtype="<f", count=1)[0])
+        length = path.stat().st_size // 4 - 1
+        return start_index, length
+    
+    def normalize(self, df: pd.DataFrame) -> pd.DataFrame:
+        """规范化日期字段：解析日期、日线只保留日期部分、去重并排序"""
+        return normalize_frame(df, self.date_field_name, self.freq)
+    
+    def _prepare(self, frames: Dict[str, pd.DataFrame], normalized: bool) -> Dict[str, pd.DataFrame]:
+        """统一标的代码为大写，按需规范化日期字段并去掉空数据"""
+        frames = {
+            symbol.upper(): df if normalized else self.normalize(df) for symbol, df in frames.items()
+        }
+        return {symbol: df for symbol, df in frames.items() if not df.empty}
+    
+    def _write_values(self, symbol: str, df: pd.DataFrame, calendar: pd.DatetimeIndex, start: int, end: int, mode: str):
+        """
+        将数据按日历[start, end]对齐后写入每个字段，缺失的时间填充NaN
+        
+        :param mode: "wb"为重写（写入起始下标），"ab"为追加
+        """
+        aligned = df.set_index(self.date_field_name).reindex(calendar[start:end + 1])
+        for field in self.fields:
+            path = self.get_bin_path(symbol, field)
+            path.parent.mkdir(parents=True, exist_ok=True)
+            values = aligned[field].to_numpy(dtype="float64") if field in aligned else np.full(len(aligned), np.nan)
+            if mode == "wb":
+                values = np.hstack([[start], values])
+            with open(path, mode) as fp:
+                values.astype("<f").tofile(fp)
+    
+    def _merge_stored(
+        self, symbol: str, df: pd.DataFrame, calendar: pd.DatetimeIndex, headers: List[Optional[tuple]]
+    ) -> pd.DataFrame:
+        """将部分新数据与已保存的二进制数据合并，相同时间以新数据为准"""
+        stored = {}
+        for field, header in zip(self.fields, headers):
+            if header is None:
+                continue
+            stored_start, length = header
+            if stored_start + length > len(calendar):
+                continue
+            values = np.fromfile(self.get_bin_path(symbol, field), dtype="<f")[1:]
+            stored[field] = pd.Series(values, index=calendar[stored_start:stored_start + length])
+        if not stored:
+            return df
+        stored_df = pd.DataFrame(stored).dropna(how="all")
+        stored_df.index.name = self.date_field_name
+        merged = df.set_index(self.date_field_name).combine_first(stored_df)
+        return merged.sort_index().reset_index()
+    
+    def _history_changed(
+        self, symbol: str, df: pd.DataFrame, positions: Dict[pd.Timestamp, int], stored_start: int, stored_last: pd.Timestamp
+    ) -> bool:
+        """
+        比较数据中与已保存区间重叠的K线和二进制文件中的值，只读取重叠的位置
+        
+        :param positions: 时间到日历下标的字典
+        :param stored_start: 已保存数据的起始下标
+        :param stored_last: 已保存数据的最后时间
+        :return: 任一字段的值不一致（按float32比较，NaN视为相同）时返回True
+        """
+        overlap = df[df[self.date_field_name] <= stored_last]
+        if overlap.empty:
+            return False
+        offsets = np.array([positions[date] for date in overlap[self.date_field_name]]) - stored_start + 1
+        for field in self.fields:
+            if field not in overlap:
+                continue
+            stored = np.memmap(self.get_bin_path(symbol, field), dtype="<f", mode="r")[offsets]
+            values = overlap[field].to_numpy(dtype="float64").astype("<f")
+            if not np.array_equal(stored, values, equal_nan=True):
+                return True
+        return False
+    
+    def _write_calendar(self, calendar: List[pd.Timestamp], appended: List[pd.Timestamp]):
+        """写入日历，已有日历时只追加新增的时间"""
+        self.calendar_path.parent.mkdir(parents=True, exist_ok=True)
+        if appended and len(appended) < len(calendar):
+            with open(self.calendar_path, "a") as f:
+                f.writelines(f"{date.strftime(self.date_format)}\n" for date in appended)
+        elif appended:
+            with open(self.calendar_path, "w") as f:
+                f.writelines(f"{date.strftime(self.date_format)}\n" for date in calendar)
+    
+    def _rebase(self, old_calendar: List[pd.Timestamp], calendar: List[pd.Timestamp]):
+        """
+        日历中插入新时间后，按新日历重新对齐已有标的的二进制文件
+        
+        插入的时间都晚于标的的时间区间时文件不变，都不在区间内时只更新文件头的起始下标，
+        否则将数据按新日历重新对齐并重写，新插入的时间填充NaN
+        """
+        calendar_index = pd.DatetimeIndex(calendar)
+        for symbol in self.read_instruments():
+            for field in self.fields:
+                header = self.read_bin_header(symbol, field)
+                if header is None:
+                    continue
+                stored_start, length = header
+                if length <= 0 or stored_start + length > len(old_calendar):
+                    logger.warning(f"{symbol} 的 {field} 与日历不一致，跳过重新对齐")
+                    continue
+                first = calendar_index.get_loc(old_calendar[stored_start])
+                last = calendar_index.get_loc(old_calendar[stored_start + length - 1])
+                path = self.get_bin_path(symbol, field)
+                if last - first + 1 == length and first == stored_start:
+                    continue
+                if last - first + 1 == length:
+                    with open(path, "r+b") as fp:
+                        np.array([first], dtype="<f").tofile(fp)
+                    continue
+                values = pd.Series(
+                    np.fromfile(path, dtype="<f")[1:],
+                    index=pd.DatetimeIndex(old_calendar[stored_start:stored_start + length]),
+                ).reindex(calendar_index[first:last + 1])
+                with open(path, "wb") as fp:
+                    np.hstack([[first], values.to_numpy(dtype="float64")]).astype("<f").tofile(fp)
+    
+    def _write_instruments(self, instruments: Dict[str, tuple]):
+        """写入当前频率的时间范围，并与其他频率的时间范围合并后写入共用的标的列表"""
+        self.instruments_path.parent.mkdir(parents=True, exist_ok=True)
+        self._write_ranges(self.ranges_path, instruments)
+        
+        merged = self._read_ranges(self.instruments_path)
+        for symbol, (start, end) in instruments.items():
+            if symbol in merged:
+                start, end = min(start, merged[symbol][0]), max(end, merged[symbol][1])
+            merged[symbol] = (start, end)
+        self._write_ranges(self.instruments_path, merged)
+    
+    def _write_ranges(self, path: Path, instruments: Dict[str, tuple]):
+        """写入"标的\\t开始时间\\t结束时间"格式的文件，整点日期只保留日期部分"""
+        def format_date(date: pd.Timestamp) -> str:
+            return date.strftime("%Y-%m-%d" if date == date.normalize() else "%Y-%m-%d %H:%M:%S")
+        
+        tmp_path = path.with_name(f"{path.name}.tmp")
+        with open(tmp_path, "w") as f:
+            for symbol in sorted(instruments):
+                start, end = instruments[symbol]
+                f.write(f"{symbol}{self.INSTRUMENTS_SEP}{format_date(start)}{self.INSTRUMENTS_SEP}{format_date(end)}\n")
+        os.replace(tmp_path, path)
+    
+    def dump(
+        self,
+        frames: Union[Mapping[str, pd.DataFrame], Iterable[Tuple[str, pd.DataFrame]]],
+        normalized: bool = False,
+        max_workers: int = 1,
+        calendar: Optional[Iterable[pd.Timestamp]] = None,
+    ) -> dict:
+        """
+        全量写入多个标的的数据，重写日历、标的列表和每个标的的二进制文件
+        
+        提供calendar时frames可以是依次产生(标的代码, DataFrame)的生成器，每个标的写入后即可释放，
+        内存占用与标的数量无关；否则frames需为字典，日历由全部数据生成
+        
+        :param frames: 标的代码到数据DataFrame的字典，或(标的代码, DataFrame)的可迭代对象，数据需包含日期字段
+        :param normalized: 数据是否已经过normalize处理
+        :param max_workers: frames为字典时写入二进制文件的最大线程数，可迭代对象按顺序写入
+        :param calendar: 全部标的的时间，需覆盖frames中的所有时间，为None时由frames生成
+        :return: 写入结果，包含标的数量、日历长度和写入耗时
+        """
+        started = time.perf_counter()
+        if calendar is None:
+            frames = self._prepare(frames, normalized)
+            normalized = True
+            calendar = set()
+            for df in frames.values():
+                calendar.update(df[self.date_field_name])
+        calendar = sorted(set(calendar))
+        self._write_calendar(calendar, calendar)
+        calendar_index = pd.DatetimeIndex(calendar)
+        
+        def write(symbol, df):
+            if not normalized:
+                df = self.normalize(df)
+            if df.empty:
+                return None
+            dates = df[self.date_field_name]
+            first = calendar_index.get_loc(dates.iloc[0])
+            last = calendar_index.get_loc(dates.iloc[-1])
+            self._write_values(symbol.upper(), df, calendar_index, first, last, "wb")
+            return symbol.upper(), (dates.iloc[0], dates.iloc[-1])
+        
+        if isinstance(frames, Mapping) and max_workers and max_workers > 1:
+            with ThreadPoolExecutor(max_workers=max_workers) as executor:
+                results = list(executor.map(write, frames.keys(), frames.values()))
+        else:
+            items = frames.items() if isinstance(frames, Mapping) else frames
+            results = [write(symbol, df) for symbol, df in items]
+        instruments = dict(result for result in results if result is not None)
+        
+        self._write_instruments(instruments)
+        elapsed = time.perf_counter() - started
+        logger.info(f"全量写入完成: 日历 {len(calendar)} 个时间，标的 {len(instruments)} 个，耗时 {elapsed:.2f} 秒")
+        return {"symbols": len(instruments), "calendar": len(calendar), "seconds": round(elapsed, 4)}
+    
+    def update(
+        self,
+        frames: Dict[str, pd.DataFrame],
+        normalized: bool = False,
+        rebase: bool = False,
+        partial: bool = False,
+    ) -> Optional[dict]:
+        """
+        增量写入多个标的的数据
+        
+        日历默认只允许在末尾追加新时间；新增时间早于已有日历的最后时间时，已有标的的下标都会变化，
+        返回None由调用方进行全量转换，rebase为True时则按新日历重新对齐已有标的。对每个标的：
+        
+        - 没有二进制文件的新标的：整体写入
+        - 起始时间与已保存的一致、已保存的最后时间与日历对齐、重叠的K线与已保存的值一致：只追加晚于最后时间的K线
+        - 其他情况（向前补数据、历史K线的值变化、字段缺失、与日历不一致）：重写该标的
+        
+        :param frames: 标的代码到数据DataFrame的字典，数据需包含日期字段
+        :param normalized: 数据是否已经过normalize处理
+        :param rebase: 新时间早于日历最后时间时，是否在日历中插入新时间并重新对齐已有标的
+        :param partial: 数据是否只包含新获取的部分K线，为True时已保存的数据保留，
+            重写标的时与已保存的数据合并（新数据优先）
+        :return: 各类处理的标的列表，需要全量转换时返回None
+        """
+        frames = self._prepare(frames, normalized)
+        
+        calendar = self.read_calendar()
+        last_date = calendar[-1] if calendar else None
+        existing_dates = set(calendar)
+        new_dates = set()
+        for df in frames.values():
+            new_dates.update(df[self.date_field_name])
+        new_dates -= existing_dates
+        
+        if last_date is not None and any(date < last_date for date in new_dates):
+            if not rebase:
+                logger.warning(f"存在早于日历最后时间 {last_date} 的新时间，需要全量转换")
+                return None
+            logger.info(f"日历中插入 {len(new_dates)} 个早于最后时间 {last_date} 的新时间，重新对齐已有标的")
+            old_calendar = calendar
+            calendar = sorted(existing_dates | new_dates)
+            self._rebase(old_calendar, calendar)
+            self._write_calendar(calendar, calendar)
+        else:
+            calendar = calendar + sorted(new_dates)
+            self._write_calendar(calendar, sorted(new_dates))
+        calendar_index = pd.DatetimeIndex(calendar)
+        positions = {date: i for i, date in enumerate(calendar)} if frames else {}
+        
+        instruments = self.read_instruments()
+        result = {"new": [], "appended": [], "rewritten": [], "unchanged": []}
+        for symbol, df in frames.items():
+            dates = df[self.date_field_name]
+            first, last = positions[dates.iloc[0]], positions[dates.iloc[-1]]
+            
+            headers = [self.read_bin_header(symbol, field) for field in self.fields]
+            if all(header is None for header in headers):
+                self._write_values(symbol, df, calendar_index, first, last, "wb")
+                instruments[symbol] = (dates.iloc[0], dates.iloc[-1])
+                result["new"].append(symbol)
+                continue
+            
+            stored_start, stored_length = headers[0] if headers[0] is not None else (None, None)
+            stored_end = stored_start + stored_length - 1 if stored_start is not None else None
+            aligned = (
+                all(header == headers[0] for header in headers)
+                and (stored_start == first or (partial and stored_start < first))
+                and symbol in instruments
+                and stored_end < len(calendar)
+                and calendar[stored_end] == instruments[symbol][1]
+                and not self._history_changed(symbol, df, positions, stored_start, calendar[stored_end])
+            )
+            if not aligned:
+                logger.info(f"{symbol} 的历史数据发生变化或与日历不一致，重写该标的")
+                if partial:
+                    df = self._merge_stored(symbol, df, calendar_index, headers)
+                    dates = df[self.date_field_name]
+                    first, last = positions[dates.iloc[0]], positions[dates.iloc[-1]]
+                self._write_values(symbol, df, calendar_index, first, last, "wb")
+                instruments[symbol] = (dates.iloc[0], dates.iloc[-1])
+                result["rewritten"].append(symbol)
+                continue
+            
+            if last <= stored_end:
+                result["unchanged"].append(symbol)
+                continue
+            
+            self._write_values(symbol, df[dates > calendar[stored_end]], calendar_index, stored_end + 1, last, "ab")
+            instruments[symbol] = (instruments[symbol][0], dates.iloc[-1])
+            result["appended"].append(symbol)
+        
+        self._write_instruments(instruments)
+        logger.info(
+            f"增量写入完成: 日历新增 {len(new_dates)} 个时间，新标的 {len(result['new'])} 个，"
+            f"追加 {len(result['appended'])} 个，重写 {len(result['rewritten'])} 个，"
+            f"无变化 {len(result['unchanged'])} 个"
+        )
+        return result
+
+
+class QlibBinReader:
+    """
+    直接读取QLib二进制文件的只读读取器，不经过D.features和表达式缓存
+    
+    特征文件通过np.memmap映射，按日历下标切片，只读取需要的区间，数据由操作系统页缓存缓存；
+    日历和映射按文件的修改时间和大小缓存，文件被追加或重写后自动重新加载
+    """
+    
+    MAX_OPEN_FILES = 256
+    
+    def __init__(self, qlib_dir: Union[str, Path], max_open_files: int = MAX_OPEN_FILES):
+        """
+        初始化读取器
+        
+        :param qlib_dir: QLib数据目录
+        :param max_open_files: 最多同时保持映射的特征文件数量，超过时关闭最久未使用的映射
+        """
+        self.qlib_dir = Path(qlib_dir).expanduser().resolve()
+        self.max_open_files = max_open_files
+        self._calendars: Dict[str, tuple] = {}
+        self._memmaps: "OrderedDict[Path, tuple]" = OrderedDict()
+        self._lock = threading.Lock()
+    
+    @staticmethod
+    def _signature(path: Path) -> Optional[tuple]:
+        """文件的修改时间和大小，文件不存在时返回None"""
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            return None
+        return stat.st_mtime_ns, stat.st_size
+    
+    def calendar(self, freq: str = "day") -> np.ndarray:
+        """
+        读取频率对应的日历
+        
+        :param freq: 频率，如"day"、"1d"、"1m"
+        :return: datetime64[ns]数组，日历不存在时返回空数组
+        """
+        freq = qlib_freq_name(freq)
+        path = self.qlib_dir / "calendars" / f"{freq}.txt"
+        signature = self._signature(path)
+        with self._lock:
+            cached = self._calendars.get(freq)
+            if cached is not None and cached[0] == signature:
+                return cached[1]
+        if signature is None:
+            dates = np.array([], dtype="datetime64[ns]")
+        else:
+            with open(path, "r") as f:
+                dates = pd.to_datetime([line.strip() for line in f if line.strip()]).values
+        with self._lock:
+            self._calendars[freq] = (signature, dates)
+        return dates
+    
+    def _memmap(self, symbol: str, field: str, freq: str) -> Optional[np.ndarray]:
+        """映射特征文件，返回包含文件头的float32数组，文件不存在时返回None"""
+        path = self.qlib_dir / "features" / symbol.lower() / f"{field.lower()}.{freq}.bin"
+        signature = self._signature(path)
+        with self._lock:
+            cached = self._memmaps.get(path)
+            if cached is not None and cached[0] == signature:
+                self._memmaps.move_to_end(path)
+                return cached[1]
+            if signature is None or signature[1] < 4:
+                self._memmaps.pop(path, None)
+                return None
+            data = np.memmap(path, dtype="<f4", mode="r")
+            self._memmaps[path] = (signature, data)
+            while len(self._memmaps) > self.max_open_files:
+                self._memmaps.popitem(last=False)
+            return data
+    
+    def read(
+        self,
+        symbols: Iterable[str],
+        fields: Iterable[str] = ("open", "high", "low", "close", "volume"),
+        freq: str = "day",
+        start: Optional[Union[str, pd.Timestamp]] = None,
+        end: Optional[Union[str, pd.Timestamp]] = None,
+        limit: Optional[int] = None,
+    ) -> Dict[str, dict]:
+        """
+        读取多个标的在时间窗口内的字段值
+        
+        :param symbols: 标的代码列表
+        :param fields: 字段列表
+        :param freq: 频率，如"day"、"1d"、"1m"
+        :param start: 开始时间（包含），为None时不限制
+        :param end: 结束时间（包含），为None时不限制
+        :param limit: 每个标的最多返回的K线数量，取窗口内最后的limit根，为None时不限制
+        :return: 标的代码（大写）到{"dates": datetime64数组, 字段: float32数组}的字典，没有数据的标的不返回
+        """
+        freq = qlib_freq_name(freq)
+        fields = list(fields)
+        calendar = self.calendar(freq)
+        lo = 0 if start is None else int(np.searchsorted(calendar, np.datetime64(pd.Timestamp(start)), side="left"))
+        hi = len(calendar) if end is None else int(np.searchsorted(calendar, np.datetime64(pd.Timestamp(end)), side="right"))
+        
+        result = {}
+        for symbol in symbols:
+            arrays = {field: self._memmap(symbol, field, freq) for field in fields}
+            ranges = {
+                field: (int(data[0]), int(data[0]) + len(data) - 1)
+                for field, data in arrays.items() if data is not None
+            }
+            if not ranges:
+                continue
+            # 窗口为请求区间与各字段数据区间并集的交集
+            first = max(lo, min(begin for begin, _ in ranges.values()))
+            last = min(hi, max(stop for _, stop in ranges.values()))
+            if limit is not None:
+                first = max(first, last - int(limit))
+            if first >= last:
+                continue
+            
+            bars = {"dates": calendar[first:last]}
+            for field in fields:
+                values = np.full(last - first, np.nan, dtype="<f4")
+                if field in ranges:
+                    begin, stop = ranges[field]
+                    left, right = max(first, begin), min(last, stop)
+                    if left < right:
+                        values[left - first:right - first] = arrays[field][1 + left - begin:1 + right - begin]
+                bars[field] = values
+            result[symbol.upper()] = bars
+        return result
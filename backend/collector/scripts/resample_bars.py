@@ -0,0 +1,219 @@
+# 由细粒度K线合成粗粒度K线的工具
+
+import re
+import time
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from ..base.storage import get_instrument_storage
+from .qlib_bin import QlibBinWriter, qlib_freq_name
+
+
+# 字段的聚合方式，first/last取区间首尾的值，max/min/sum按区间聚合，其他字段不参与合成
+AGGREGATIONS = {
+    "open": "first",
+    "high": "max",
+    "low": "min",
+    "close": "last",
+    "volume": "sum",
+    "amount": "sum",
+    "quote_volume": "sum",
+    "count": "sum",
+    "taker_buy_volume": "sum",
+    "taker_buy_quote_volume": "sum",
+}
+
+ONE_DAY = pd.Timedelta(days=1)
+
+
+def interval_to_timedelta(interval: str) -> Optional[pd.Timedelta]:
+    """
+    将时间间隔转换为Timedelta，只支持分钟、小时和天，如'1m'、'4h'、'1d'
+    
+    :param interval: 时间间隔
+    :return: 对应的Timedelta，周、月等不固定长度或无法识别的间隔返回None
+    """
+    match = re.match(r"^([0-9]+)(m|h|d)$", str(interval))
+    if match is None:
+        return None
+    unit = {"m": "min", "h": "h", "d": "D"}[match.group(2)]
+    return pd.Timedelta(int(match.group(1)), unit=unit)
+
+
+def plan_intervals(intervals: Iterable[str]) -> Tuple[List[str], Dict[str, str]]:
+    """
+    规划多周期下载：只下载最细的周期，能由其合成的周期不再重复下载
+    
+    合成的K线按UTC零点对齐分桶，因此只有能整除一天的周期（以及1d本身）可以合成，
+    且必须是最细周期的整数倍；其他周期（如3d、1w、1M）仍单独下载
+    
+    :param intervals: 请求的时间间隔列表
+    :return: (需要下载的时间间隔列表, 合成周期到来源周期的字典)
+    """
+    intervals = list(dict.fromkeys(intervals))
+    deltas = {interval: interval_to_timedelta(interval) for interval in intervals}
+    known = [interval for interval in intervals if deltas[interval] is not None]
+    if not known:
+        return intervals, {}
+    
+    base = min(known, key=lambda interval: deltas[interval])
+    download, derived = [], {}
+    for interval in intervals:
+        delta = deltas[interval]
+        if (
+            interval != base
+            and delta is not None
+            and delta % deltas[base] == pd.Timedelta(0)
+            and (delta == ONE_DAY or ONE_DAY % delta == pd.Timedelta(0))
+        ):
+            derived[interval] = base
+        else:
+            download.append(interval)
+    return download, derived
+
+
+def resample_bars(
+    df: pd.DataFrame,
+    interval: str,
+    date_field_name: str = "date",
+    base_interval: Optional[str] = None,
+) -> pd.DataFrame:
+    """
+    将K线数据合成为更粗的周期，按UTC零点对齐分桶，使用ufunc.reduceat向量化聚合
+    
+    :param df: 细粒度K线数据，需包含日期字段，字段的聚合方式见AGGREGATIONS
+    :param interval: 目标时间间隔，如'5m'、'1h'、'1d'
+    :param date_field_name: 日期字段名称
+    :param base_interval: 来源数据的时间间隔，提供时丢弃来源数据从中途开始的第一个区间和还没有走完的最后一个区间，
+        因此上市当天等从区间中途开始的数据不会合成K线
+    :return: 合成后的K线数据，日期为每个区间的开始时间
+    """
+    rule = interval_to_timedelta(interval)
+    if rule is None:
+        raise ValueError(f"无法合成时间间隔: {interval}")
+    columns = [column for column in df.columns if column in AGGREGATIONS]
+    if df.empty or date_field_name not in df.columns:
+        return pd.DataFrame(columns=[date_field_name] + columns)
+    
+    dates = df[date_field_name]
+    if not pd.api.types.is_datetime64_any_dtype(dates):
+        dates = pd.to_datetime(dates, errors="coerce")
+    stamps = dates.to_numpy(dtype="datetime64[ns]").view("int64")
+    if dates.hasnans or (np.diff(stamps) <= 0).any():
+        # 已保存的数据通常已按日期去重排序，只有不满足时才整理
+        df = df.assign(**{date_field_name: dates})
+        df = df.dropna(subset=[date_field_name]).drop_duplicates(date_field_name, keep="last")
+        df = df.sort_values(date_field_name)
+        stamps = df[date_field_name].to_numpy(dtype="datetime64[ns]").view("int64")
+    if df.empty:
+        return pd.DataFrame(columns=[date_field_name] + columns)
+    
+    buckets = stamps // rule.value * rule.value
+    starts = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+    ends = np.r_[starts[1:], len(stamps)] - 1
+    
+    result = {date_field_name: buckets[starts].astype("datetime64[ns]")}
+    for column in columns:
+        values = df[column].to_numpy(dtype="float64", na_value=np.nan) if pd.api.types.is_numeric_dtype(df[column]) \
+            else pd.to_numeric(df[column], errors="coerce").to_numpy(dtype="float64")
+        how = AGGREGATIONS[column]
+        if how == "first":
+            result[column] = values[starts]
+        elif how == "last":
+            result[column] = values[ends]
+        elif how == "max":
+            result[column] = np.fmax.reduceat(values, starts)
+        elif how == "min":
+            result[column] = np.fmin.reduceat(values, starts)
+        else:
+            result[column] = np.add.reduceat(np.nan_to_num(values), starts)
+    resampled = pd.DataFrame(result)
+    
+    base_rule = interval_to_timedelta(base_interval) if base_interval else None
+    if base_rule is None:
+        return resampled
+    if stamps[-1] < buckets[-1] + rule.value - base_rule.value:
+        # 最后一个区间的来源K线还没有走完，保存后不会再被覆盖，等下次合成
+        resampled = resampled.iloc[:-1]
+    if stamps[0] > buckets[0]:
+        # 来源数据从第一个区间的中途开始，合成的K线缺少开头的部分，与交易所的K线不一致
+        resampled = resampled.iloc[1:]
+    return resampled.reset_index(drop=True)
+
+
+def _symbol_key(symbol: str) -> str:
+    """用于匹配交易对代码的键，忽略大小写和分隔符"""
+    return re.sub(r"[^0-9A-Z]", "", str(symbol).upper())
+
+
+def derive_interval(
+    source_dir: Union[str, Path],
+    target_dir: Union[str, Path],
+    interval: str,
+    base_interval: str,
+    symbols: Optional[Iterable[str]] = None,
+    storage_format: str = "csv",
+    qlib_dir: Optional[Union[str, Path]] = None,
+    start: Optional[Union[str, pd.Timestamp]] = None,
+    end: Optional[Union[str, pd.Timestamp]] = None,
+    incremental: bool = False,
+    date_field_name: str = "date",
+) -> dict:
+    """
+    读取已下载的细粒度K线，合成目标周期的K线并写入目标周期的存储和QLib二进制文件
+    
+    :param source_dir: 来源周期的数据目录
+    :param target_dir: 目标周期的数据目录
+    :param interval: 目标时间间隔
+    :param base_interval: 来源时间间隔
+    :param symbols: 交易对列表，为None时合成来源目录下所有交易对
+    :param storage_format: 原始数据存储格式，可选'csv'或'parquet'
+    :param qlib_dir: QLib数据目录，为None时不写入QLib二进制文件
+    :param start: 开始时间，为None时不限制
+    :param end: 结束时间，为None时不限制
+    :param incremental: 是否增量合成，每个交易对从目标周期已保存的最后一根K线之后开始
+    :param date_field_name: 日期字段名称
+    :return: 合成结果字典，包含每个交易对合成的K线数量、QLib写入结果和耗时
+    """
+    started = time.perf_counter()
+    rule = interval_to_timedelta(interval)
+    source = get_instrument_storage(storage_format, source_dir, date_field_name)
+    target = get_instrument_storage(storage_format, target_dir, date_field_name)
+    
+    available = source.symbols()
+    if symbols is not None:
+        wanted = {_symbol_key(symbol) for symbol in symbols}
+        available = [symbol for symbol in available if _symbol_key(symbol) in wanted]
+    
+    # 从区间开始读取，避免第一根合成K线只包含部分来源数据
+    read_start = pd.Timestamp(start).floor(rule) if start is not None else None
+    frames, rows = {}, {}
+    for symbol in available:
+        symbol_start = read_start
+        if incremental:
+            last = target.last_timestamp(symbol)
+            if last is not None:
+                symbol_start = last + rule
+        df = source.read(symbol, start=symbol_start, end=end)
+        resampled = resample_bars(df, interval, date_field_name, base_interval=base_interval)
+        rows[symbol] = len(resampled)
+        if resampled.empty:
+            continue
+        target.save(symbol, resampled)
+        frames[symbol] = resampled
+    
+    qlib_result = None
+    if qlib_dir is not None and frames:
+        writer = QlibBinWriter(qlib_dir, freq=qlib_freq_name(interval), date_field_name=date_field_name)
+        qlib_result = writer.update(frames, rebase=True, partial=True)
+    
+    seconds = round(time.perf_counter() - started, 4)
+    logger.info(
+        f"由{base_interval}合成{interval} K线完成: {len(frames)}/{len(available)} 个交易对，"
+        f"共 {sum(rows.values())} 根，耗时 {seconds} 秒"
+    )
+    return {"interval": interval, "base_interval": base_interval, "rows": rows, "qlib": qlib_result, "seconds": seconds}
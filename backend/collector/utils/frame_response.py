@@ -0,0 +1,246 @@
+# 批量数据接口的响应编码，按请求协商返回行式JSON、列式JSON、NDJSON、Arrow IPC流或Parquet
+
+import io
+import json
+from datetime import datetime
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+import pandas as pd
+from fastapi import HTTPException, Request
+from fastapi.responses import Response, StreamingResponse
+from loguru import logger
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+except ImportError:  # pragma: no cover - pyarrow为可选依赖
+    pa = None
+    pq = None
+
+
+# 响应格式对应的媒体类型
+RECORDS = "records"
+COLUMNAR = "columnar"
+ARROW = "arrow"
+PARQUET = "parquet"
+NDJSON = "ndjson"
+
+MEDIA_TYPES = {
+    COLUMNAR: "application/vnd.qbot.columnar+json",
+    NDJSON: "application/x-ndjson",
+    ARROW: "application/vnd.apache.arrow.stream",
+    PARQUET: "application/vnd.apache.parquet",
+}
+
+# Arrow和Parquet响应中保存元数据的schema键
+METADATA_KEY = b"qbot"
+
+# 流式响应每次编码的行数
+CHUNK_ROWS = 10000
+
+
+def negotiate_format(request: Request, format: Optional[str] = None) -> str:
+    """根据format参数或Accept请求头确定响应格式
+    
+    format参数优先；Accept请求头中包含MEDIA_TYPES中的媒体类型时使用对应格式，
+    默认返回行式JSON（原有的ApiResponse格式）
+    
+    Args:
+        request: 请求对象
+        format: 显式指定的格式，可选records、columnar、ndjson、arrow、parquet
+    
+    Returns:
+        str: 响应格式
+    
+    Raises:
+        HTTPException: 格式不支持时返回400，未安装pyarrow时请求Arrow或Parquet返回406
+    """
+    if format:
+        if format != RECORDS and format not in MEDIA_TYPES:
+            raise HTTPException(status_code=400, detail=f"不支持的响应格式: {format}")
+        fmt = format
+    else:
+        accept = request.headers.get("accept", "")
+        fmt = next((fmt for fmt, media_type in MEDIA_TYPES.items() if media_type in accept), RECORDS)
+        if fmt == RECORDS and "application/parquet" in accept:
+            fmt = PARQUET
+    
+    if fmt in (ARROW, PARQUET) and pa is None:
+        raise HTTPException(status_code=406, detail="服务端未安装pyarrow，无法返回Arrow或Parquet格式")
+    return fmt
+
+
+def columnar_json(df: pd.DataFrame) -> str:
+    """将DataFrame编码为列式JSON字符串
+    
+    格式为{"index": {索引名: [...]}, "columns": {列名: [...]}}，每列由pandas一次性编码，
+    缺失值为null，时间为ISO格式字符串
+    
+    Args:
+        df: 数据DataFrame
+    
+    Returns:
+        str: 列式JSON字符串
+    """
+    def encode(values) -> str:
+        return pd.Series(values).to_json(orient="values", date_format="iso", date_unit="s")
+    
+    names = [name if name is not None else f"level_{i}" for i, name in enumerate(df.index.names)]
+    index = ",".join(
+        f"{json.dumps(str(name))}:{encode(df.index.get_level_values(i))}" for i, name in enumerate(names)
+    )
+    columns = ",".join(f"{json.dumps(str(column))}:{encode(df[column].values)}" for column in df.columns)
+    return f'{{"index":{{{index}}},"columns":{{{columns}}}}}'
+
+
+def _arrow_table(df: pd.DataFrame, meta: Dict[str, Any]):
+    """将DataFrame转换为Arrow表，元数据以JSON保存在schema中"""
+    table = pa.Table.from_pandas(df, preserve_index=True)
+    metadata = dict(table.schema.metadata or {})
+    metadata[METADATA_KEY] = json.dumps(meta, ensure_ascii=False, default=str).encode("utf-8")
+    return table.replace_schema_metadata(metadata)
+
+
+def frame_response(
+    df: pd.DataFrame,
+    fmt: str,
+    message: str = "",
+    meta: Optional[Dict[str, Any]] = None,
+    data_key: str = "data",
+) -> Response:
+    """按协商的格式编码DataFrame
+    
+    - columnar：与ApiResponse结构相同的JSON，data中data_key对应列式数据，其他键为meta
+    - ndjson：按行分块编码的流式响应，见stream_response
+    - arrow：Arrow IPC流，meta保存在schema元数据的qbot键中
+    - parquet：Parquet文件，meta同样保存在schema元数据中
+    
+    Args:
+        df: 数据DataFrame，索引会作为列一并返回
+        fmt: 响应格式，不能为records
+        message: 响应消息
+        meta: 附加的元数据，如因子名称、数据形状
+        data_key: 列式JSON中数据所在的键
+    
+    Returns:
+        Response: 编码后的响应
+    """
+    meta = meta or {}
+    if fmt == NDJSON:
+        return stream_response([df], fmt, message=message, meta=meta)
+    if fmt == COLUMNAR:
+        head = json.dumps(
+            {"code": 0, "message": message, "timestamp": datetime.now().isoformat()}, ensure_ascii=False
+        )
+        data = json.dumps(meta, ensure_ascii=False, default=str)
+        data = data[:-1] + ("," if meta else "") + f'"{data_key}":{columnar_json(df)}}}'
+        return Response(content=f'{head[:-1]},"data":{data}}}', media_type=MEDIA_TYPES[COLUMNAR])
+    
+    table = _arrow_table(df, meta)
+    sink = io.BytesIO()
+    if fmt == ARROW:
+        with pa.ipc.new_stream(sink, table.schema) as writer:
+            writer.write_table(table)
+    elif fmt == PARQUET:
+        pq.write_table(table, sink)
+    else:
+        raise ValueError(f"不支持的响应格式: {fmt}")
+    return Response(content=sink.getvalue(), media_type=MEDIA_TYPES[fmt])
+
+
+def iter_chunks(frames: Iterable[pd.DataFrame], chunk_size: int = CHUNK_ROWS) -> Iterator[pd.DataFrame]:
+    """将DataFrame序列按行切分为不超过chunk_size行的分块，切片不复制数据"""
+    for df in frames:
+        for start in range(0, len(df), chunk_size):
+            yield df.iloc[start:start + chunk_size]
+
+
+def _ndjson_stream(chunks: Iterator[pd.DataFrame], message: str, meta: Dict[str, Any]) -> Iterator[bytes]:
+    """NDJSON流：首行为ApiResponse结构的响应头，之后每行一条记录"""
+    head = {"code": 0, "message": message, "timestamp": datetime.now().isoformat(), "data": meta}
+    yield (json.dumps(head, ensure_ascii=False, default=str) + "\n").encode("utf-8")
+    try:
+        for chunk in chunks:
+            lines = chunk.reset_index().to_json(orient="records", lines=True, date_format="iso", date_unit="s")
+            yield (lines if lines.endswith("\n") else lines + "\n").encode("utf-8")
+    except Exception as e:
+        # 响应头已发送，无法再修改状态码，以一行错误信息结束流
+        logger.error(f"流式响应生成失败: {e}")
+        logger.exception(e)
+        yield (json.dumps({"code": 1, "message": str(e)}, ensure_ascii=False) + "\n").encode("utf-8")
+
+
+def _arrow_stream(chunks: Iterator[pd.DataFrame], meta: Dict[str, Any]) -> Iterator[bytes]:
+    """Arrow IPC流：schema取自第一个分块，之后每个分块编码为一个record batch
+    
+    生成过程中出错时记录错误后重新抛出，不写入流结束标记，客户端读取时会因流被截断而报错，
+    不会把已发送的部分数据当作完整结果
+    """
+    sink = io.BytesIO()
+    
+    def drain() -> bytes:
+        data = sink.getvalue()
+        sink.seek(0)
+        sink.truncate()
+        return data
+    
+    writer = None
+    schema = None
+    try:
+        for chunk in chunks:
+            if writer is None:
+                table = _arrow_table(chunk, meta)
+                schema = table.schema
+                writer = pa.ipc.new_stream(sink, schema)
+            else:
+                # 后续分块按第一个分块的schema转换，保证各record batch类型一致
+                table = pa.Table.from_pandas(chunk, schema=schema, preserve_index=True)
+            writer.write_table(table)
+            yield drain()
+    except Exception as e:
+        # 已发送的record batch无法撤回，中断响应而不是以结束标记正常结束
+        logger.error(f"流式响应生成失败: {e}")
+        logger.exception(e)
+        raise
+    if writer is None:
+        writer = pa.ipc.new_stream(sink, _arrow_table(pd.DataFrame(), meta).schema)
+    writer.close()
+    yield drain()
+
+
+def stream_response(
+    frames: Iterable[pd.DataFrame],
+    fmt: str,
+    message: str = "",
+    meta: Optional[Dict[str, Any]] = None,
+    chunk_size: int = CHUNK_ROWS,
+) -> StreamingResponse:
+    """将DataFrame序列编码为流式响应
+    
+    frames可以是生成器，按需逐个计算，每个DataFrame再按chunk_size行分块编码后立即发送，
+    服务端内存只与单个DataFrame和分块大小有关，与数据总量无关
+    
+    - ndjson：首行为{"code", "message", "timestamp", "data": meta}，之后每行一条记录，
+      生成过程中出错时以{"code": 1, "message": 错误信息}结束
+    - arrow：Arrow IPC流，每个分块为一个record batch，meta保存在schema元数据中，
+      生成过程中出错时中断响应，不写入流结束标记
+    
+    Args:
+        frames: DataFrame序列，列和索引需保持一致，索引会作为列一并返回
+        fmt: 响应格式，ndjson或arrow
+        message: 响应消息
+        meta: 附加的元数据，需在发送数据前确定
+        chunk_size: 每个分块的行数
+    
+    Returns:
+        StreamingResponse: 流式响应
+    """
+    meta = meta or {}
+    chunks = iter_chunks(frames, chunk_size)
+    if fmt == NDJSON:
+        body = _ndjson_stream(chunks, message, meta)
+    elif fmt == ARROW:
+        body = _arrow_stream(chunks, meta)
+    else:
+        raise ValueError(f"不支持流式响应的格式: {fmt}")
+    return StreamingResponse(body, media_type=MEDIA_TYPES[fmt])
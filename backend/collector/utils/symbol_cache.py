@@ -0,0 +1,174 @@
+# 交易所交易对列表缓存
+
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from loguru import logger
+
+
+class SymbolCache:
+    """交易所交易对列表缓存
+    
+    按交易所/交易类型缓存交易对列表，过期后先返回旧数据并在后台线程刷新；
+    每次刷新后保存快照到磁盘，进程冷启动时直接从快照加载。
+    分页和过滤在内存中完成，每次查询直接过滤内存中的列表，不缓存过滤结果
+    """
+    
+    DEFAULT_TTL = 3600
+    
+    def __init__(self, ttl: float = DEFAULT_TTL, snapshot_dir: Optional[Path] = None):
+        """初始化交易对缓存
+        
+        Args:
+            ttl: 缓存有效期（秒）
+            snapshot_dir: 快照保存目录，默认 ~/.qlib/crypto_data/symbols
+        """
+        self.ttl = ttl
+        self.snapshot_dir = Path(snapshot_dir) if snapshot_dir else Path.home() / ".qlib" / "crypto_data" / "symbols"
+        self._entries: Dict[str, Dict[str, Any]] = {}
+        self._refreshing = set()
+        self._lock = threading.RLock()
+    
+    def _snapshot_path(self, key: str) -> Path:
+        """获取快照文件路径"""
+        return self.snapshot_dir / f"{key.replace('/', '_')}.json"
+    
+    def _load_snapshot(self, key: str) -> Optional[Dict[str, Any]]:
+        """从磁盘加载快照，不存在或损坏时返回None"""
+        path = self._snapshot_path(key)
+        if not path.exists():
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                entry = json.load(f)
+            logger.info(f"从快照加载交易对列表: {key}，共{len(entry['symbols'])}个")
+            return entry
+        except Exception as e:
+            logger.warning(f"加载交易对快照失败: {path}, 错误: {e}")
+            return None
+    
+    def _save_snapshot(self, key: str, entry: Dict[str, Any]):
+        """原子写入快照"""
+        try:
+            self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+            path = self._snapshot_path(key)
+            tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+            with open(tmp_path, "w", encoding="utf-8") as f:
+                json.dump(entry, f, ensure_ascii=False)
+            os.replace(tmp_path, path)
+        except Exception as e:
+            logger.warning(f"保存交易对快照失败: {key}, 错误: {e}")
+    
+    def _set(self, key: str, symbols: List[Any]):
+        """更新内存中的交易对列表并保存快照"""
+        entry = {"symbols": symbols, "updated_at": time.time()}
+        with self._lock:
+            self._entries[key] = entry
+        self._save_snapshot(key, entry)
+    
+    def refresh(self, key: str, fetcher: Callable[[], List[Any]]) -> List[Any]:
+        """同步刷新交易对列表
+        
+        Args:
+            key: 缓存键，如"binance_spot"
+            fetcher: 获取交易对列表的函数，失败时应抛出异常
+        
+        Returns:
+            List[Any]: 最新的交易对列表
+        """
+        symbols = fetcher()
+        self._set(key, symbols)
+        logger.info(f"刷新交易对列表: {key}，共{len(symbols)}个")
+        return symbols
+    
+    def _refresh_in_background(self, key: str, fetcher: Callable[[], List[Any]]):
+        """在后台线程刷新交易对列表，同一个键同时只有一个刷新线程"""
+        with self._lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+        
+        def run():
+            try:
+                self.refresh(key, fetcher)
+            except Exception as e:
+                logger.warning(f"后台刷新交易对列表失败: {key}, 错误: {e}")
+            finally:
+                with self._lock:
+                    self._refreshing.discard(key)
+        
+        threading.Thread(target=run, name=f"symbol-refresh-{key}", daemon=True).start()
+    
+    def is_refreshing(self, key: str) -> bool:
+        """是否有后台线程正在刷新指定键"""
+        with self._lock:
+            return key in self._refreshing
+    
+    def get(self, key: str, fetcher: Callable[[], List[Any]]) -> List[Any]:
+        """获取交易对列表
+        
+        内存中没有时先尝试加载快照，都没有时同步获取；数据过期时返回旧数据并在后台刷新
+        
+        Args:
+            key: 缓存键，如"binance_spot"
+            fetcher: 获取交易对列表的函数，失败时应抛出异常
+        
+        Returns:
+            List[Any]: 交易对列表
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                entry = self._load_snapshot(key)
+                if entry is not None:
+                    self._entries[key] = entry
+        
+        if entry is None:
+            return self.refresh(key, fetcher)
+        
+        if time.time() - entry["updated_at"] > self.ttl:
+            self._refresh_in_background(key, fetcher)
+        return entry["symbols"]
+    
+    def query(
+        self,
+        key: str,
+        fetcher: Callable[[], List[Any]],
+        filter: Optional[str] = None,
+        offset: int = 0,
+        limit: Optional[int] = None,
+        field: str = "symbol",
+    ) -> Tuple[List[Any], int]:
+        """在内存中过滤并分页查询交易对列表
+        
+        Args:
+            key: 缓存键
+            fetcher: 获取交易对列表的函数
+            filter: 过滤条件，交易对包含该字符串时保留
+            offset: 返回偏移量
+            limit: 返回数量限制，为None时返回全部
+            field: 交易对为字典时用于过滤的字段
+        
+        Returns:
+            Tuple[List[Any], int]: 当前页的交易对列表和符合条件的总数
+        """
+        symbols = self.get(key, fetcher)
+        # 过滤条件由请求任意给出，按条件缓存结果会无限增长；交易对列表只有数千项，每次直接过滤
+        if filter:
+            filtered = [
+                item for item in symbols
+                if filter in (item.get(field) or "" if isinstance(item, dict) else item)
+            ]
+        else:
+            filtered = symbols
+        
+        end = None if limit is None else offset + limit
+        return filtered[offset:end], len(filtered)
+
+
+# 创建全局交易对缓存实例
+symbol_cache = SymbolCache()
@@ -0,0 +1,233 @@
+# 任务执行器，在独立的线程池中按队列和并发限制执行后台任务
+
+import bisect
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Callable, Dict, List, Optional
+from loguru import logger
+
+
+class TaskCancelled(Exception):
+    """任务已被取消，由任务函数在检查点抛出以提前结束
+    """
+
+
+class _QueuedTask:
+    """排队或运行中的任务
+    """
+    
+    def __init__(self, task_id: str, task_type: str, func: Callable, args: tuple, kwargs: dict,
+                 priority: int, resource: Optional[str], seq: int):
+        self.task_id = task_id
+        self.task_type = task_type
+        self.func = func
+        self.args = args
+        self.kwargs = kwargs
+        self.priority = priority
+        self.resource = resource
+        # 优先级高的先执行，同优先级按提交顺序执行
+        self.sort_key = (-priority, seq)
+        self.cancel_event = threading.Event()
+    
+    def __lt__(self, other: "_QueuedTask") -> bool:
+        return self.sort_key < other.sort_key
+    
+    def describe(self) -> Dict[str, Any]:
+        return {
+            "task_id": self.task_id,
+            "task_type": self.task_type,
+            "priority": self.priority,
+            "resource": self.resource,
+        }
+
+
+class TaskExecutor:
+    """任务执行器
+    
+    任务提交后进入优先级队列，同时满足全局并发数、任务类型并发数和资源（如交易所）并发数限制时
+    才会在执行器自己的线程池中开始执行，不占用API请求使用的线程池；
+    排队的任务可以直接移出队列，运行中的任务通过取消标志由任务函数在检查点自行结束
+    """
+    
+    def __init__(
+        self,
+        max_workers: int = 2,
+        type_limits: Optional[Dict[str, int]] = None,
+        resource_limits: Optional[Dict[str, int]] = None,
+    ):
+        """初始化任务执行器
+        
+        Args:
+            max_workers: 同时运行的任务数上限
+            type_limits: 每种任务类型同时运行的任务数上限，未配置的类型只受全局上限限制
+            resource_limits: 每种资源同时运行的任务数上限，如{"binance": 1}限制同一交易所的下载任务
+        """
+        self.max_workers = max(int(max_workers), 1)
+        self.type_limits = dict(type_limits or {})
+        self.resource_limits = dict(resource_limits or {})
+        self._pool = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="task-executor")
+        self._queue: List[_QueuedTask] = []
+        self._running: Dict[str, _QueuedTask] = {}
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+    
+    def submit(
+        self,
+        task_id: str,
+        task_type: str,
+        func: Callable,
+        *args,
+        priority: int = 0,
+        resource: Optional[str] = None,
+        **kwargs
+    ) -> int:
+        """提交任务
+        
+        Args:
+            task_id: 任务ID
+            task_type: 任务类型，用于类型并发限制
+            func: 任务函数
+            *args: 任务函数的位置参数
+            priority: 优先级，数值大的先执行
+            resource: 任务占用的资源，用于资源并发限制
+            **kwargs: 任务函数的关键字参数
+        
+        Returns:
+            int: 提交后任务在队列中的位置，0表示已开始执行
+        """
+        item = _QueuedTask(task_id, task_type, func, args, kwargs, priority, resource, next(self._seq))
+        with self._lock:
+            bisect.insort(self._queue, item)
+            self._dispatch()
+            if task_id in self._running:
+                return 0
+            return self._queue.index(item) + 1
+    
+    def _can_start(self, item: _QueuedTask, type_counts: Dict[str, int], resource_counts: Dict[str, int]) -> bool:
+        """判断任务是否满足类型和资源的并发限制"""
+        type_limit = self.type_limits.get(item.task_type)
+        if type_limit is not None and type_counts.get(item.task_type, 0) >= type_limit:
+            return False
+        resource_limit = self.resource_limits.get(item.resource)
+        if resource_limit is not None and resource_counts.get(item.resource, 0) >= resource_limit:
+            return False
+        return True
+    
+    def _dispatch(self):
+        """在持有锁时按队列顺序启动满足并发限制的任务
+        
+        排在前面但受类型或资源限制的任务不会阻塞后面的其他任务
+        """
+        if len(self._running) >= self.max_workers or not self._queue:
+            return
+        type_counts: Dict[str, int] = {}
+        resource_counts: Dict[str, int] = {}
+        for running in self._running.values():
+            type_counts[running.task_type] = type_counts.get(running.task_type, 0) + 1
+            resource_counts[running.resource] = resource_counts.get(running.resource, 0) + 1
+        
+        for item in list(self._queue):
+            if len(self._running) >= self.max_workers:
+                break
+            if not self._can_start(item, type_counts, resource_counts):
+                continue
+            self._queue.remove(item)
+            self._running[item.task_id] = item
+            type_counts[item.task_type] = type_counts.get(item.task_type, 0) + 1
+            resource_counts[item.resource] = resource_counts.get(item.resource, 0) + 1
+            self._pool.submit(self._run, item)
+    
+    def _run(self, item: _QueuedTask):
+        """在线程池中执行任务，结束后释放名额并启动后续任务"""
+        try:
+            item.func(*item.args, **item.kwargs)
+        except Exception as e:
+            logger.error(f"任务执行异常: task_id={item.task_id}, error={e}")
+            logger.exception(e)
+        finally:
+            with self._lock:
+                self._running.pop(item.task_id, None)
+                self._dispatch()
+    
+    def cancel(self, task_id: str) -> Optional[str]:
+        """取消任务
+        
+        Args:
+            task_id: 任务ID
+        
+        Returns:
+            Optional[str]: 任务在队列中时移出队列并返回"queued"；正在运行时设置取消标志并返回"running"；
+            任务不在执行器中时返回None
+        """
+        with self._lock:
+            for item in self._queue:
+                if item.task_id == task_id:
+                    self._queue.remove(item)
+                    return "queued"
+            item = self._running.get(task_id)
+            if item is not None:
+                item.cancel_event.set()
+                return "running"
+        return None
+    
+    def is_cancelled(self, task_id: str) -> bool:
+        """运行中的任务是否已被请求取消
+        
+        Args:
+            task_id: 任务ID
+        
+        Returns:
+            bool: 已请求取消返回True
+        """
+        item = self._running.get(task_id)
+        return item is not None and item.cancel_event.is_set()
+    
+    def queue_position(self, task_id: str) -> Optional[int]:
+        """任务在队列中的位置
+        
+        Args:
+            task_id: 任务ID
+        
+        Returns:
+            Optional[int]: 从1开始的位置，正在运行时为0，不在执行器中时为None
+        """
+        with self._lock:
+            if task_id in self._running:
+                return 0
+            for index, item in enumerate(self._queue):
+                if item.task_id == task_id:
+                    return index + 1
+        return None
+    
+    def stats(self) -> Dict[str, Any]:
+        """执行器状态
+        
+        Returns:
+            Dict[str, Any]: 并发限制、运行中和排队中的任务
+        """
+        with self._lock:
+            return {
+                "max_workers": self.max_workers,
+                "type_limits": dict(self.type_limits),
+                "resource_limits": dict(self.resource_limits),
+                "running": [item.describe() for item in self._running.values()],
+                "queued": [item.describe() for item in self._queue],
+            }
+    
+    def shutdown(self, wait: bool = False) -> List[str]:
+        """关闭执行器，清空队列并请求运行中的任务取消
+        
+        Args:
+            wait: 是否等待运行中的任务结束
+        
+        Returns:
+            List[str]: 被移出队列的任务ID
+        """
+        with self._lock:
+            dropped = [item.task_id for item in self._queue]
+            self._queue.clear()
+            for item in self._running.values():
+                item.cancel_event.set()
+        self._pool.shutdown(wait=wait)
+        return dropped
@@ -1,11 +1,19 @@
 # 任务管理器，用于管理下载任务和进度追踪
 
 import uuid
+import asyncio
+import threading
 from datetime import datetime
-from typing import Dict, Any, Optional
+from typing import Callable, Dict, Any, List, Optional, Set
 from enum import Enum
 from loguru import logger
 
+from backend.config import get_config
+from .task_executor import TaskCancelled, TaskExecutor
+
+# 进度写入数据库的默认间隔（秒）
+DEFAULT_PROGRESS_FLUSH_INTERVAL = 0.5
+
 
 class TaskStatus(str, Enum):
     """任务状态枚举
@@ -14,13 +22,83 @@ class TaskStatus(str, Enum):
     RUNNING = "running"  # 运行中
     COMPLETED = "completed"  # 已完成
     FAILED = "failed"  # 失败
+    CANCELLED = "cancelled"  # 已取消
+    INTERRUPTED = "interrupted"  # 已中断，服务重启时仍在运行或等待中的任务
+
+
+# 任务结束后不会再变化的状态
+TERMINAL_STATUSES = (TaskStatus.COMPLETED, TaskStatus.FAILED, TaskStatus.CANCELLED)
+
+# 可以从检查点恢复的状态
+RESUMABLE_STATUSES = (TaskStatus.INTERRUPTED, TaskStatus.FAILED, TaskStatus.CANCELLED)
+
+
+class TaskSubscription:
+    """任务事件订阅
+    
+    由TaskManager在任务创建、状态变更、进度更新和删除时推送任务快照，
+    同一任务未被读取的多次更新合并为最新快照，订阅者读取较慢时不会积压
+    """
+    
+    def __init__(self, loop: asyncio.AbstractEventLoop, task_id: Optional[str] = None):
+        """初始化订阅
+        
+        Args:
+            loop: 订阅者所在的事件循环，推送可以来自任意线程
+            task_id: 只订阅指定任务，为None时订阅所有任务
+        """
+        self.loop = loop
+        self.task_id = task_id
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._ready = asyncio.Event()
+    
+    def publish(self, task_id: str, snapshot: Optional[Dict[str, Any]]):
+        """推送任务快照，快照为None表示任务已删除
+        
+        Args:
+            task_id: 任务ID
+            snapshot: 任务快照
+        """
+        if self.task_id is not None and task_id != self.task_id:
+            return
+        with self._lock:
+            wake = not self._pending
+            self._pending[task_id] = snapshot
+        if wake:
+            try:
+                self.loop.call_soon_threadsafe(self._ready.set)
+            except RuntimeError:
+                # 事件循环已关闭，订阅者已不存在
+                pass
+    
+    async def get(self, timeout: Optional[float] = None) -> Dict[str, Optional[Dict[str, Any]]]:
+        """等待并取出所有待读取的任务快照
+        
+        Args:
+            timeout: 最长等待时间（秒），超时返回空字典
+            
+        Returns:
+            Dict[str, Optional[Dict[str, Any]]]: 任务ID到最新快照的映射
+        """
+        try:
+            await asyncio.wait_for(self._ready.wait(), timeout)
+        except asyncio.TimeoutError:
+            return {}
+        self._ready.clear()
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        return pending
 
 
 class TaskManager:
     """任务管理器，用于管理下载任务和进度追踪
     
     实现单例模式，确保全局只有一个任务管理器实例
-    同时更新内存和数据库
+    内存中的任务信息为准，状态变更（创建、开始、完成、失败）立即写入数据库；
+    进度更新和检查点只修改内存并记录为待写入，由后台写入线程按固定间隔将每个任务的最新进度
+    和新的检查点在一个事务中批量写入数据库；
+    服务启动时遗留的运行中或等待中的任务标记为已中断，可通过resume_task从检查点恢复
     """
     
     _instance = None
@@ -35,6 +113,10 @@ class TaskManager:
             cls._instance = super(TaskManager, cls).__new__(cls)
             cls._instance._tasks = {}
             cls._instance._loaded = False  # 添加加载标志
+            cls._instance._subscriptions = []
+            cls._instance._executor = None
+            cls._instance._resume_handlers = {}
+            cls._instance._init_progress_writer()
         return cls._instance
     
     def __init__(self):
@@ -43,6 +125,109 @@ class TaskManager:
         if not hasattr(self, '_tasks'):
             self._tasks = {}
             self._loaded = False
+            self._subscriptions = []
+            self._executor = None
+            self._resume_handlers = {}
+            self._init_progress_writer()
+    
+    def _init_progress_writer(self):
+        """初始化进度写入状态，写入线程在第一次更新进度时启动
+        """
+        self._pending_progress = {}  # 待写入数据库的最新进度，按任务ID合并
+        self._pending_checkpoints = {}  # 待写入数据库的检查点，按任务ID分组
+        self._progress_lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._flush_interval = float(get_config("task_manager.progress_flush_interval", DEFAULT_PROGRESS_FLUSH_INTERVAL))
+        self._writer_stop = threading.Event()
+        self._writer_thread = None
+    
+    def _ensure_progress_writer(self):
+        """确保后台进度写入线程已启动
+        """
+        if self._writer_thread is not None and self._writer_thread.is_alive():
+            return
+        with self._progress_lock:
+            if self._writer_thread is not None and self._writer_thread.is_alive():
+                return
+            self._writer_stop.clear()
+            self._writer_thread = threading.Thread(
+                target=self._progress_writer_loop, name="task-progress-writer", daemon=True
+            )
+            self._writer_thread.start()
+    
+    def _progress_writer_loop(self):
+        """后台写入线程：每隔flush_interval秒写入一次待写入的进度，停止时写入剩余进度
+        """
+        while not self._writer_stop.wait(self._flush_interval):
+            self.flush_progress()
+        self.flush_progress()
+    
+    def flush_progress(self, task_id: Optional[str] = None) -> bool:
+        """将待写入的进度写入数据库
+        
+        Args:
+            task_id: 只写入指定任务的进度，为None时写入所有任务
+            
+        Returns:
+            bool: 成功或没有待写入的进度返回True，写入失败返回False
+        """
+        # 串行写入，保证同一任务较新的进度不会被较早取出的进度覆盖
+        with self._flush_lock:
+            with self._progress_lock:
+                if task_id is None:
+                    pending, self._pending_progress = self._pending_progress, {}
+                    pending_checkpoints, self._pending_checkpoints = self._pending_checkpoints, {}
+                else:
+                    pending = {task_id: self._pending_progress.pop(task_id)} if task_id in self._pending_progress else {}
+                    pending_checkpoints = {task_id: self._pending_checkpoints.pop(task_id, [])}
+            checkpoints = [
+                (checkpoint_task_id, interval, symbol)
+                for checkpoint_task_id, units in pending_checkpoints.items()
+                for interval, symbol in units
+            ]
+            if not pending and not checkpoints:
+                return True
+            
+            try:
+                from ..db.models import TaskBusiness
+                written = TaskBusiness.update_progress_batch(pending, checkpoints)
+            except Exception as e:
+                logger.error(f"批量写入任务进度失败: task_ids={list(pending)}, error={e}")
+                written = False
+            if not written:
+                self._requeue_progress(pending, pending_checkpoints)
+            return written
+    
+    def _requeue_progress(self, pending: Dict[str, dict], pending_checkpoints: Dict[str, list]):
+        """写入失败时将取出的进度和检查点放回待写入，下次写入时重试
+        
+        取出后又更新过的进度较新，保留较新的进度；检查点放在新记录的检查点之前；已删除的任务直接丢弃
+        
+        Args:
+            pending: 取出的进度，按任务ID合并
+            pending_checkpoints: 取出的检查点，按任务ID分组
+        """
+        with self._progress_lock:
+            for task_id, progress in pending.items():
+                if task_id in self._tasks:
+                    self._pending_progress.setdefault(task_id, progress)
+            for task_id, units in pending_checkpoints.items():
+                if units and task_id in self._tasks:
+                    self._pending_checkpoints[task_id] = units + self._pending_checkpoints.get(task_id, [])
+    
+    def shutdown(self):
+        """停止任务执行器和后台写入线程，并写入剩余的进度
+        
+        应用关闭时调用此方法，排队中的任务保持等待状态，运行中的任务收到取消请求
+        """
+        if self._executor is not None:
+            self._executor.shutdown(wait=False)
+            self._executor = None
+        self._writer_stop.set()
+        if self._writer_thread is not None:
+            self._writer_thread.join()
+            self._writer_thread = None
+        self.flush_progress()
     
     def init(self):
         """初始化任务管理器，从数据库加载任务
@@ -64,6 +249,17 @@ class TaskManager:
             # 从数据库获取所有任务
             tasks_from_db = TaskBusiness.get_all()
             
+            # 内存中没有但数据库中仍为运行中或等待中的任务是服务重启前遗留的，执行器中已不存在，标记为已中断
+            interrupted = [
+                task_id for task_id, task in tasks_from_db.items()
+                if task_id not in self._tasks and task["status"] in (TaskStatus.RUNNING, TaskStatus.PENDING)
+            ]
+            for task_id in interrupted:
+                tasks_from_db[task_id]["status"] = TaskStatus.INTERRUPTED
+            if interrupted:
+                TaskBusiness.interrupt(interrupted)
+                logger.warning(f"发现 {len(interrupted)} 个中断的任务，可从检查点恢复: {interrupted}")
+            
             # 更新内存中的任务字典
             self._tasks.update(tasks_from_db)
             
@@ -74,6 +270,45 @@ class TaskManager:
             # 不抛出异常，允许应用继续运行
             logger.debug(f"加载任务失败详情: {e}")
     
+    def subscribe(self, task_id: Optional[str] = None) -> TaskSubscription:
+        """订阅任务事件，需要在事件循环中调用
+        
+        Args:
+            task_id: 只订阅指定任务，为None时订阅所有任务
+            
+        Returns:
+            TaskSubscription: 任务事件订阅，不再使用时需调用unsubscribe
+        """
+        subscription = TaskSubscription(asyncio.get_running_loop(), task_id)
+        with self._progress_lock:
+            self._subscriptions.append(subscription)
+        return subscription
+    
+    def unsubscribe(self, subscription: TaskSubscription):
+        """取消订阅任务事件
+        
+        Args:
+            subscription: subscribe返回的订阅
+        """
+        with self._progress_lock:
+            if subscription in self._subscriptions:
+                self._subscriptions.remove(subscription)
+    
+    def _publish(self, task_id: str):
+        """向订阅者推送任务的当前快照
+        
+        Args:
+            task_id: 任务ID
+        """
+        if not self._subscriptions:
+            return
+        task = self._tasks.get(task_id)
+        snapshot = {**task, "progress": dict(task["progress"])} if task else None
+        with self._progress_lock:
+            subscriptions = list(self._subscriptions)
+        for subscription in subscriptions:
+            subscription.publish(task_id, snapshot)
+    
     def create_task(self, task_type: str, **kwargs) -> str:
         """创建新任务
         
@@ -116,6 +351,7 @@ class TaskManager:
             logger.error(f"保存任务到数据库失败: task_id={task_id}, error={e}")
         
         logger.info(f"创建新任务: {task_id}, 类型: {task_type}")
+        self._publish(task_id)
         
         return task_id
     
@@ -144,6 +380,7 @@ class TaskManager:
             logger.error(f"更新数据库任务状态失败: task_id={task_id}, error={e}")
         
         logger.info(f"开始任务: {task_id}")
+        self._publish(task_id)
         return True
     
     def update_progress(self, task_id: str, current: str, completed: int, total: int, failed: int = 0) -> bool:
@@ -169,24 +406,55 @@ class TaskManager:
             percentage = int((completed + failed) / total * 100)
         
         # 更新内存中的进度信息
-        self._tasks[task_id]["progress"] = {
+        progress = {
             "total": total,
             "completed": completed,
             "failed": failed,
             "current": current,
             "percentage": percentage
         }
+        self._tasks[task_id]["progress"] = progress
         
-        # 更新数据库中的进度信息
-        try:
-            from ..db.models import TaskBusiness
-            TaskBusiness.update_progress(task_id, current, completed, total, failed)
-        except Exception as e:
-            logger.error(f"更新数据库任务进度失败: task_id={task_id}, error={e}")
+        # 记录为待写入，由后台写入线程批量写入数据库，同一任务只保留最新进度
+        with self._progress_lock:
+            self._pending_progress[task_id] = progress
+        self._ensure_progress_writer()
+        self._publish(task_id)
         
         logger.debug(f"更新任务进度: {task_id}, 当前: {current}, 进度: {percentage}%")
         return True
     
+    def add_checkpoint(self, task_id: str, interval: str, symbol: str):
+        """记录任务中已完成的工作单元
+        
+        检查点与进度一起由后台写入线程批量写入数据库，服务异常退出时最多丢失最后一个写入间隔内的检查点
+        
+        Args:
+            task_id: 任务ID
+            interval: 时间周期
+            symbol: 交易对，整个时间周期完成时为"*"
+        """
+        with self._progress_lock:
+            self._pending_checkpoints.setdefault(task_id, []).append((interval, symbol))
+        self._ensure_progress_writer()
+    
+    def get_checkpoints(self, task_id: str) -> Dict[str, Set[str]]:
+        """获取任务已完成的工作单元，包括尚未写入数据库的检查点
+        
+        Args:
+            task_id: 任务ID
+            
+        Returns:
+            Dict[str, Set[str]]: 时间周期到已完成交易对集合的映射
+        """
+        self.flush_progress(task_id)
+        try:
+            from ..db.models import TaskBusiness
+            return {interval: set(symbols) for interval, symbols in TaskBusiness.get_checkpoints(task_id).items()}
+        except Exception as e:
+            logger.error(f"获取任务检查点失败: task_id={task_id}, error={e}")
+            return {}
+    
     def complete_task(self, task_id: str) -> bool:
         """完成任务
         
@@ -204,7 +472,8 @@ class TaskManager:
         self._tasks[task_id]["status"] = TaskStatus.COMPLETED
         self._tasks[task_id]["end_time"] = datetime.now()
         
-        # 更新数据库中的任务状态
+        # 先写入最后的进度，再更新数据库中的任务状态
+        self.flush_progress(task_id)
         try:
             from ..db.models import TaskBusiness
             TaskBusiness.complete(task_id)
@@ -212,6 +481,7 @@ class TaskManager:
             logger.error(f"更新数据库任务状态失败: task_id={task_id}, error={e}")
         
         logger.info(f"任务完成: {task_id}")
+        self._publish(task_id)
         return True
     
     def fail_task(self, task_id: str, error_message: str) -> bool:
@@ -233,7 +503,8 @@ class TaskManager:
         self._tasks[task_id]["end_time"] = datetime.now()
         self._tasks[task_id]["error_message"] = error_message
         
-        # 更新数据库中的任务状态
+        # 先写入最后的进度，再更新数据库中的任务状态
+        self.flush_progress(task_id)
         try:
             from ..db.models import TaskBusiness
             TaskBusiness.fail(task_id, error_message)
@@ -241,8 +512,163 @@ class TaskManager:
             logger.error(f"更新数据库任务状态失败: task_id={task_id}, error={e}")
         
         logger.error(f"任务失败: {task_id}, 错误信息: {error_message}")
+        self._publish(task_id)
         return True
     
+    @property
+    def executor(self) -> TaskExecutor:
+        """任务执行器，第一次使用时按配置task_executor创建
+        """
+        if self._executor is None:
+            with self._progress_lock:
+                if self._executor is None:
+                    self._executor = TaskExecutor(
+                        max_workers=get_config("task_executor.max_workers", 2),
+                        type_limits=get_config("task_executor.type_limits", {}),
+                        resource_limits=get_config("task_executor.resource_limits", {}),
+                    )
+        return self._executor
+    
+    def submit_task(self, task_id: str, func: Callable, *args, priority: int = 0, resource: Optional[str] = None, **kwargs) -> int:
+        """将任务提交到任务执行器排队执行
+        
+        任务在排队期间保持等待状态，由任务函数在开始执行时调用start_task；
+        任务函数抛出TaskCancelled时任务标记为已取消
+        
+        Args:
+            task_id: 任务ID，需先通过create_task创建
+            func: 任务函数
+            *args: 任务函数的位置参数
+            priority: 优先级，数值大的先执行
+            resource: 任务占用的资源，如交易所名称，用于资源并发限制
+            **kwargs: 任务函数的关键字参数
+            
+        Returns:
+            int: 任务在队列中的位置，0表示已开始执行
+        """
+        task_type = self._tasks[task_id]["task_type"]
+        
+        def run():
+            try:
+                func(*args, **kwargs)
+            except TaskCancelled:
+                self._mark_cancelled(task_id)
+        
+        position = self.executor.submit(task_id, task_type, run, priority=priority, resource=resource)
+        logger.info(f"任务已提交: {task_id}, 队列位置: {position}")
+        return position
+    
+    def cancel_task(self, task_id: str) -> Optional[str]:
+        """取消任务
+        
+        排队中的任务立即标记为已取消；运行中的任务设置取消标志，由任务函数在下一个检查点结束
+        
+        Args:
+            task_id: 任务ID
+            
+        Returns:
+            Optional[str]: 已取消返回"cancelled"，等待任务函数结束返回"cancelling"，
+            任务不存在或已结束返回None
+        """
+        task = self.get_task(task_id)
+        if not task or task["status"] in TERMINAL_STATUSES:
+            return None
+        
+        state = self._executor.cancel(task_id) if self._executor is not None else None
+        if state == "running":
+            logger.info(f"已请求取消运行中的任务: {task_id}")
+            return "cancelling"
+        
+        # 排队中的任务，或不在执行器中的任务（如服务重启前遗留的任务）直接标记为已取消
+        self._mark_cancelled(task_id)
+        return "cancelled"
+    
+    def register_resume_handler(self, task_type: str, handler: Callable[[Dict[str, Any]], int]):
+        """注册任务类型的恢复函数
+        
+        Args:
+            task_type: 任务类型
+            handler: 恢复函数，参数为任务信息，负责根据任务参数和检查点重新提交任务，返回队列位置
+        """
+        self._resume_handlers[task_type] = handler
+    
+    def get_resumable_tasks(self) -> List[Dict[str, Any]]:
+        """获取可以恢复的任务，已中断的任务排在前面
+        
+        Returns:
+            List[Dict[str, Any]]: 已注册恢复函数且处于已中断、失败或已取消状态的任务
+        """
+        tasks = [
+            task for task in self.get_all_tasks().values()
+            if task["status"] in RESUMABLE_STATUSES and task["task_type"] in self._resume_handlers
+        ]
+        return sorted(tasks, key=lambda task: task["status"] != TaskStatus.INTERRUPTED)
+    
+    def resume_task(self, task_id: str) -> Optional[int]:
+        """从检查点恢复任务
+        
+        任务重置为等待状态后由注册的恢复函数重新提交，已完成的工作单元不再重复执行
+        
+        Args:
+            task_id: 任务ID
+            
+        Returns:
+            Optional[int]: 任务在队列中的位置，0表示已开始执行；任务不存在、不可恢复或没有恢复函数时返回None
+        """
+        task = self.get_task(task_id)
+        if not task or task["status"] not in RESUMABLE_STATUSES:
+            return None
+        handler = self._resume_handlers.get(task["task_type"])
+        if handler is None:
+            logger.warning(f"任务类型没有注册恢复函数: {task['task_type']}")
+            return None
+        
+        task["status"] = TaskStatus.PENDING
+        task["end_time"] = None
+        task["error_message"] = None
+        try:
+            from ..db.models import TaskBusiness
+            TaskBusiness.reset(task_id)
+        except Exception as e:
+            logger.error(f"更新数据库任务状态失败: task_id={task_id}, error={e}")
+        
+        logger.info(f"恢复任务: {task_id}")
+        self._publish(task_id)
+        return handler(task)
+    
+    def check_cancelled(self, task_id: str):
+        """任务函数的取消检查点，任务已被请求取消时抛出TaskCancelled
+        
+        Args:
+            task_id: 任务ID
+            
+        Raises:
+            TaskCancelled: 任务已被请求取消
+        """
+        if self._executor is not None and self._executor.is_cancelled(task_id):
+            raise TaskCancelled(task_id)
+    
+    def _mark_cancelled(self, task_id: str):
+        """将任务标记为已取消并立即写入数据库
+        
+        Args:
+            task_id: 任务ID
+        """
+        if task_id not in self._tasks:
+            return
+        self._tasks[task_id]["status"] = TaskStatus.CANCELLED
+        self._tasks[task_id]["end_time"] = datetime.now()
+        
+        self.flush_progress(task_id)
+        try:
+            from ..db.models import TaskBusiness
+            TaskBusiness.cancel(task_id)
+        except Exception as e:
+            logger.error(f"更新数据库任务状态失败: task_id={task_id}, error={e}")
+        
+        logger.info(f"任务已取消: {task_id}")
+        self._publish(task_id)
+    
     def get_task(self, task_id: str) -> Optional[Dict[str, Any]]:
         """获取任务信息
         
@@ -274,16 +700,10 @@ class TaskManager:
         Returns:
             Dict[str, Any]: 所有任务信息
         """
-        # 确保任务已加载
+        # 确保任务已加载，之后所有变更都经过任务管理器，内存中的任务即为最新状态
         if not self._loaded:
             self._load_tasks_from_db()
             self._loaded = True
-        # 先从数据库更新最新任务
-        try:
-            self._load_tasks_from_db()
-        except Exception as e:
-            logger.warning(f"更新任务列表失败: {e}")
-            # 继续返回内存中的任务列表，不影响应用运行
         return self._tasks
     
     def delete_task(self, task_id: str) -> bool:
@@ -299,17 +719,21 @@ class TaskManager:
             logger.error(f"任务不存在: {task_id}")
             return False
         
-        # 从内存中删除
+        # 从内存中删除，丢弃待写入的进度和检查点
         del self._tasks[task_id]
+        with self._progress_lock:
+            self._pending_progress.pop(task_id, None)
+            self._pending_checkpoints.pop(task_id, None)
         
-        # 从数据库中删除
+        # 从数据库中删除任务和检查点
         try:
-            from ..db.models import Task
-            Task.delete(task_id)
+            from ..db.models import TaskBusiness
+            TaskBusiness.delete(task_id)
         except Exception as e:
             logger.error(f"从数据库删除任务失败: task_id={task_id}, error={e}")
         
         logger.info(f"删除任务: {task_id}")
+        self._publish(task_id)
         return True
 
 
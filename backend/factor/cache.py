@@ -0,0 +1,258 @@
+# 因子计算结果缓存
+# 内存LRU加磁盘Parquet两级缓存，按特征文件的修改时间和日历长度失效
+
+import os
+import re
+import shutil
+import hashlib
+import threading
+from collections import OrderedDict
+from pathlib import Path
+import numpy as np
+import pandas as pd
+from loguru import logger
+
+from backend.collector.scripts.qlib_bin import QlibBinReader, qlib_freq_name
+
+try:
+    import pyarrow  # noqa: F401 - 磁盘缓存使用Parquet格式
+except ImportError:  # pragma: no cover - pyarrow为可选依赖
+    pyarrow = None
+
+# 表达式中引用的字段，如$close；QLib操作符首字母大写，如$Ref、$MA，不会匹配
+FIELD_PATTERN = re.compile(r"\$([a-z_][a-z0-9_]*)")
+
+
+def qlib_data_dir(freq):
+    """
+    当前QLib初始化时使用的数据目录
+    
+    :param freq: 频率
+    :return: 数据目录，QLib未初始化时返回None
+    """
+    try:
+        from qlib.config import C
+        return Path(C.dpm.get_data_uri(freq)).expanduser().resolve()
+    except Exception:
+        return None
+
+
+class FactorCache:
+    """
+    因子计算结果缓存
+    
+    每个条目为一个因子表达式在一组标的、一个频率和时间范围上的计算结果，键由这四项的哈希组成；
+    条目的数据版本由表达式引用的各标的特征文件的修改时间、大小，以及日历中截至结束时间的长度计算，
+    数据更新后只有涉及这些文件的条目版本改变，在下次读取时失效并重新计算；
+    日历只在结束时间之后追加时不影响已有条目。
+    
+    版本使用整个特征文件的修改时间和大小，不区分追加的K线是否落在条目的时间范围内，
+    因此标的追加K线后，即使结束时间早于新K线，引用该标的的条目也会失效并重新计算。
+    
+    内存中按LRU保留最近使用的max_entries个条目，磁盘上保存为{cache_dir}/{键}/{版本}.parquet，
+    服务重启后仍可命中，按文件的修改时间保留最近使用的max_disk_entries个条目；未安装pyarrow时只使用内存缓存。
+    """
+    
+    def __init__(self, cache_dir=None, max_entries=64, data_dir_resolver=qlib_data_dir, max_disk_entries=1024):
+        """
+        初始化缓存
+        
+        :param cache_dir: 磁盘缓存目录，为None时只使用内存缓存
+        :param max_entries: 内存中保留的最大条目数
+        :param data_dir_resolver: 根据频率返回QLib数据目录的函数，返回None时不使用缓存
+        :param max_disk_entries: 磁盘上保留的最大条目数，超过时删除最久未使用的条目
+        """
+        self.cache_dir = Path(cache_dir) if cache_dir and pyarrow is not None else None
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.data_dir_resolver = data_dir_resolver
+        self._entries = OrderedDict()
+        self._readers = {}
+        self._lock = threading.Lock()
+        self._stats = {"hits": 0, "memory_hits": 0, "disk_hits": 0, "misses": 0, "invalidations": 0}
+    
+    @staticmethod
+    def make_key(expression, instruments, freq, start_time, end_time):
+        """
+        计算缓存键
+        
+        :param expression: 因子表达式
+        :param instruments: 标的列表，顺序不影响结果
+        :param freq: 频率
+        :param start_time: 开始时间
+        :param end_time: 结束时间
+        :return: 缓存键
+        """
+        instruments_hash = hashlib.sha1("\n".join(sorted(instruments)).encode("utf-8")).hexdigest()
+        raw = "\n".join([expression, instruments_hash, qlib_freq_name(freq), str(start_time), str(end_time)])
+        return hashlib.sha1(raw.encode("utf-8")).hexdigest()
+    
+    def data_versions(self, expressions, instruments, freq, end_time=None):
+        """
+        计算各表达式当前的数据版本
+        
+        :param expressions: 因子表达式列表
+        :param instruments: 标的列表
+        :param freq: 频率
+        :param end_time: 结束时间，只有截至该时间的日历长度计入版本
+        :return: {表达式: 版本}，无法确定数据文件时返回None，此时不使用缓存
+        """
+        data_dir = self.data_dir_resolver(freq)
+        if data_dir is None:
+            return None
+        with self._lock:
+            reader = self._readers.get(data_dir)
+            if reader is None:
+                reader = self._readers[data_dir] = QlibBinReader(data_dir)
+        dates = reader.calendar(freq)
+        if len(dates) == 0:
+            return None
+        length = len(dates) if end_time is None else int(
+            np.searchsorted(dates, np.datetime64(pd.Timestamp(end_time)), side="right")
+        )
+        calendar = f"{dates[0]}:{length}"
+        
+        freq_name = qlib_freq_name(freq)
+        signatures = {}
+        versions = {}
+        for expression in expressions:
+            digest = hashlib.sha1(calendar.encode("utf-8"))
+            for field in sorted(set(FIELD_PATTERN.findall(expression))):
+                for instrument in sorted(instruments):
+                    path = data_dir / "features" / instrument.lower() / f"{field}.{freq_name}.bin"
+                    if path not in signatures:
+                        signatures[path] = _signature(path)
+                    digest.update(f"{path}:{signatures[path]}".encode("utf-8"))
+            versions[expression] = digest.hexdigest()[:16]
+        return versions
+    
+    def get(self, key, version):
+        """
+        读取缓存条目，版本不一致的条目视为失效并删除
+        
+        :param key: 缓存键
+        :param version: 当前数据版本
+        :return: 缓存的DataFrame，未命中时返回None
+        """
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == version:
+                self._entries.move_to_end(key)
+                self._stats["hits"] += 1
+                self._stats["memory_hits"] += 1
+                return entry[1]
+            stale = entry is not None
+            if stale:
+                del self._entries[key]
+        
+        data, stale_on_disk = self._read_disk(key, version)
+        with self._lock:
+            if stale or stale_on_disk:
+                self._stats["invalidations"] += 1
+            if data is None:
+                self._stats["misses"] += 1
+                return None
+            self._stats["hits"] += 1
+            self._stats["disk_hits"] += 1
+            self._remember(key, version, data)
+        return data
+    
+    def put(self, key, version, data):
+        """
+        写入缓存条目，同时替换磁盘上该键的旧版本
+        
+        :param key: 缓存键
+        :param version: 计算时的数据版本
+        :param data: 因子值DataFrame
+        """
+        with self._lock:
+            self._remember(key, version, data)
+        if self.cache_dir is None:
+            return
+        try:
+            key_dir = self.cache_dir / key
+            key_dir.mkdir(parents=True, exist_ok=True)
+            tmp_path = key_dir / f"{version}.parquet.tmp"
+            data.to_parquet(tmp_path)
+            tmp_path.replace(key_dir / f"{version}.parquet")
+            for stale in key_dir.glob("*.parquet"):
+                if stale.stem != version:
+                    stale.unlink(missing_ok=True)
+            self._evict_disk()
+        except Exception as e:
+            logger.warning(f"写入因子缓存失败: {e}")
+    
+    def _evict_disk(self):
+        """磁盘条目超过max_disk_entries时，按文件的修改时间删除最久未使用的条目"""
+        used = []
+        for key_dir in self.cache_dir.iterdir():
+            mtimes = [path.stat().st_mtime_ns for path in key_dir.glob("*.parquet")]
+            used.append((max(mtimes) if mtimes else 0, key_dir))
+        if len(used) <= self.max_disk_entries:
+            return
+        used.sort(key=lambda item: item[0])
+        for _, key_dir in used[:len(used) - self.max_disk_entries]:
+            shutil.rmtree(key_dir, ignore_errors=True)
+    
+    def _remember(self, key, version, data):
+        """在持有锁时写入内存LRU"""
+        self._entries[key] = (version, data)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+    
+    def _read_disk(self, key, version):
+        """从磁盘读取条目并删除同一键的旧版本文件，返回(数据, 是否存在旧版本)"""
+        if self.cache_dir is None:
+            return None, False
+        key_dir = self.cache_dir / key
+        if not key_dir.exists():
+            return None, False
+        data = None
+        stale = False
+        for path in key_dir.glob("*.parquet"):
+            if path.stem == version:
+                try:
+                    data = pd.read_parquet(path)
+                    # 更新修改时间，磁盘淘汰时按最近使用时间排序
+                    os.utime(path)
+                except Exception as e:
+                    logger.warning(f"读取因子缓存失败: {path}, {e}")
+                    path.unlink(missing_ok=True)
+            else:
+                path.unlink(missing_ok=True)
+                stale = True
+        return data, stale
+    
+    def stats(self):
+        """
+        缓存统计信息
+        
+        :return: 命中、未命中和失效次数，以及内存中的条目数
+        """
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = len(self._entries)
+            stats["max_entries"] = self.max_entries
+        lookups = stats["hits"] + stats["misses"]
+        stats["hit_rate"] = stats["hits"] / lookups if lookups else 0.0
+        stats["cache_dir"] = str(self.cache_dir) if self.cache_dir else None
+        return stats
+    
+    def clear(self):
+        """清空内存和磁盘缓存，并重置统计信息"""
+        with self._lock:
+            self._entries.clear()
+            for name in self._stats:
+                self._stats[name] = 0
+        if self.cache_dir is not None:
+            shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+
+def _signature(path):
+    """文件的修改时间和大小，文件不存在时返回None"""
+    try:
+        stat = path.stat()
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
@@ -1,7 +1,7 @@
 # 因子计算服务API路由
 
-from fastapi import APIRouter, HTTPException
-from typing import List, Dict, Any
+from fastapi import APIRouter, HTTPException, Query, Request
+from typing import List, Dict, Any, Optional
 from loguru import logger
 
 from .schemas import (
@@ -19,6 +19,9 @@ from .schemas import (
     FactorStabilityRequest
 )
 from .service import FactorService
+from backend.collector.utils.frame_response import (
+    ARROW, NDJSON, RECORDS, frame_response, negotiate_format, stream_response
+)
 
 # 创建API路由实例
 router = APIRouter()
@@ -26,6 +29,12 @@ router = APIRouter()
 # 创建因子服务实例
 factor_service = FactorService()
 
+# 批量计算接口的响应格式参数，也可以通过Accept请求头协商
+FORMAT_QUERY = Query(None, description="响应格式，可选records、columnar、ndjson、arrow、parquet，默认根据Accept请求头确定")
+
+# 流式计算所有因子时每批计算的标的数量
+STREAM_BATCH_INSTRUMENTS = 20
+
 # 创建因子计算API路由子路由
 router_factor = APIRouter(prefix="/api/factor", tags=["factor-calculation"])
 
@@ -56,6 +65,46 @@ def get_factor_list():
         raise HTTPException(status_code=500, detail=str(e))
 
 
+@router_factor.get("/cache/stats", response_model=ApiResponse)
+def get_factor_cache_stats():
+    """
+    获取因子计算结果缓存的统计信息
+    
+    Returns:
+        ApiResponse: API响应，包含命中、未命中、失效次数和缓存条目数
+    """
+    try:
+        return ApiResponse(
+            code=0,
+            message="获取因子缓存统计成功",
+            data=factor_service.get_cache_stats()
+        )
+    except Exception as e:
+        logger.error(f"获取因子缓存统计失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
+@router_factor.delete("/cache", response_model=ApiResponse)
+def clear_factor_cache():
+    """
+    清空因子计算结果缓存
+    
+    Returns:
+        ApiResponse: API响应
+    """
+    try:
+        logger.info("清空因子缓存请求")
+        factor_service.clear_cache()
+        return ApiResponse(
+            code=0,
+            message="清空因子缓存成功",
+            data={}
+        )
+    except Exception as e:
+        logger.error(f"清空因子缓存失败: {e}")
+        raise HTTPException(status_code=500, detail=str(e))
+
+
 @router_factor.get("/expression/{factor_name}", response_model=ApiResponse)
 def get_factor_expression(factor_name: str):
     """
@@ -165,16 +214,21 @@ def delete_factor(factor_name: str):
 
 
 @router_factor.post("/calculate", response_model=ApiResponse)
-def calculate_factor(request: FactorCalculateRequest):
+def calculate_factor(request: FactorCalculateRequest, http_request: Request, format: Optional[str] = FORMAT_QUERY):
     """
     计算指定因子的值
     
     Args:
         request: 因子计算请求参数，包含因子名称、标的列表、时间范围等
+        http_request: HTTP请求对象，用于根据Accept请求头协商响应格式
+        format: 可选，响应格式，columnar为列式JSON，arrow为Arrow IPC流，parquet为Parquet文件
         
     Returns:
         ApiResponse: API响应，包含因子计算结果
     """
+    # 先协商响应格式，不支持的格式直接返回错误，无需计算
+    fmt = negotiate_format(http_request, format)
+    
     try:
         logger.info(f"计算因子请求，因子名称: {request.factor_name}")
         
@@ -188,10 +242,17 @@ def calculate_factor(request: FactorCalculateRequest):
         )
         
         if factor_data is not None:
+            logger.info(f"成功计算因子 {request.factor_name}")
+            
+            if fmt != RECORDS:
+                return frame_response(
+                    factor_data, fmt,
+                    message=f"成功计算因子 {request.factor_name}",
+                    meta={"factor_name": request.factor_name, "shape": list(factor_data.shape)}
+                )
+            
             # 将DataFrame转换为字典格式
             factor_dict = factor_data.reset_index().to_dict(orient="records")
-            
-            logger.info(f"成功计算因子 {request.factor_name}")
             return ApiResponse(
                 code=0,
                 message=f"成功计算因子 {request.factor_name}",
@@ -214,16 +275,21 @@ def calculate_factor(request: FactorCalculateRequest):
 
 
 @router_factor.post("/calculate-multi", response_model=ApiResponse)
-def calculate_factors(request: FactorCalculateMultiRequest):
+def calculate_factors(request: FactorCalculateMultiRequest, http_request: Request, format: Optional[str] = FORMAT_QUERY):
     """
     计算多个因子的值
     
     Args:
         request: 多因子计算请求参数，包含因子名称列表、标的列表、时间范围等
+        http_request: HTTP请求对象，用于根据Accept请求头协商响应格式
+        format: 可选，响应格式，columnar为列式JSON，arrow为Arrow IPC流，parquet为Parquet文件
         
     Returns:
         ApiResponse: API响应，包含多因子计算结果
     """
+    # 先协商响应格式，不支持的格式直接返回错误，无需计算
+    fmt = negotiate_format(http_request, format)
+    
     try:
         logger.info(f"计算多个因子请求，因子数量: {len(request.factor_names)}")
         
@@ -237,10 +303,17 @@ def calculate_factors(request: FactorCalculateMultiRequest):
         )
         
         if factor_data is not None:
+            logger.info(f"成功计算多个因子，共 {len(request.factor_names)} 个因子")
+            
+            if fmt != RECORDS:
+                return frame_response(
+                    factor_data, fmt,
+                    message="成功计算多个因子",
+                    meta={"factor_names": request.factor_names, "shape": list(factor_data.shape)}
+                )
+            
             # 将DataFrame转换为字典格式
             factor_dict = factor_data.reset_index().to_dict(orient="records")
-            
-            logger.info(f"成功计算多个因子，共 {len(request.factor_names)} 个因子")
             return ApiResponse(
                 code=0,
                 message="成功计算多个因子",
@@ -262,17 +335,55 @@ def calculate_factors(request: FactorCalculateMultiRequest):
         raise HTTPException(status_code=500, detail=str(e))
 
 
+def _iter_all_factors(request: FactorCalculateRequest):
+    """
+    按标的分批计算所有因子，每次只保留一批标的的计算结果
+    
+    Args:
+        request: 因子计算请求参数
+    
+    Yields:
+        DataFrame: 一批标的的因子值
+    """
+    instruments = request.instruments
+    for start in range(0, len(instruments), STREAM_BATCH_INSTRUMENTS):
+        batch = instruments[start:start + STREAM_BATCH_INSTRUMENTS]
+        factor_data = factor_service.calculate_all_factors(
+            instruments=batch,
+            start_time=request.start_time,
+            end_time=request.end_time,
+            freq=request.freq
+        )
+        if factor_data is None:
+            raise RuntimeError(f"计算所有因子失败，标的: {batch}")
+        yield factor_data
+
+
 @router_factor.post("/calculate-all", response_model=ApiResponse)
-def calculate_all_factors(request: FactorCalculateRequest):
+def calculate_all_factors(request: FactorCalculateRequest, http_request: Request, format: Optional[str] = FORMAT_QUERY):
     """
     计算所有因子的值
     
     Args:
         request: 因子计算请求参数，包含标的列表、时间范围等
+        http_request: HTTP请求对象，用于根据Accept请求头协商响应格式
+        format: 可选，响应格式，columnar为列式JSON，ndjson为NDJSON流，arrow为Arrow IPC流，parquet为Parquet文件
         
     Returns:
-        ApiResponse: API响应，包含所有因子计算结果
+        ApiResponse: API响应，包含所有因子计算结果；ndjson和arrow格式按标的分批计算并流式返回
     """
+    # 先协商响应格式，不支持的格式直接返回错误，无需计算
+    fmt = negotiate_format(http_request, format)
+    
+    if fmt in (NDJSON, ARROW):
+        logger.info(f"流式计算所有因子请求，标的数量: {len(request.instruments)}")
+        return stream_response(
+            _iter_all_factors(request),
+            fmt,
+            message="成功计算所有因子",
+            meta={"factor_names": factor_service.get_factor_list()}
+        )
+    
     try:
         logger.info("计算所有因子请求")
         
@@ -285,10 +396,17 @@ def calculate_all_factors(request: FactorCalculateRequest):
         )
         
         if factor_data is not None:
+            logger.info(f"成功计算所有因子，共 {len(factor_data.columns)} 个因子")
+            
+            if fmt != RECORDS:
+                return frame_response(
+                    factor_data, fmt,
+                    message="成功计算所有因子",
+                    meta={"factor_names": list(factor_data.columns), "shape": list(factor_data.shape)}
+                )
+            
             # 将DataFrame转换为字典格式
             factor_dict = factor_data.reset_index().to_dict(orient="records")
-            
-            logger.info(f"成功计算所有因子，共 {len(factor_data.columns)} 个因子")
             return ApiResponse(
                 code=0,
                 message="成功计算所有因子",
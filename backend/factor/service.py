@@ -15,6 +15,12 @@ from qlib.data import D
 from qlib.data.dataset.handler import DataHandlerLP
 from qlib.data.ops import *
 
+from backend.config import get_config
+from .cache import FactorCache
+
+# 因子缓存的默认磁盘目录，相对路径基于backend目录
+DEFAULT_CACHE_DIR = "data/factor_cache"
+
 
 class FactorService:
     """
@@ -67,6 +73,18 @@ class FactorService:
             "roa": "$Ref($net_profit, 1) / $Ref($assets, 1)",
             "profit_growth": "$Ref($net_profit, 1) / $Ref($net_profit, 2) - 1",
         }
+        
+        # 因子计算结果缓存，可通过配置factor_cache.enabled关闭
+        self.cache = None
+        if get_config("factor_cache.enabled", True):
+            cache_dir = Path(get_config("factor_cache.dir", DEFAULT_CACHE_DIR))
+            if not cache_dir.is_absolute():
+                cache_dir = Path(__file__).parent.parent / cache_dir
+            self.cache = FactorCache(
+                cache_dir,
+                max_entries=get_config("factor_cache.max_entries", 64),
+                max_disk_entries=get_config("factor_cache.max_disk_entries", 1024)
+            )
     
     def get_factor_list(self):
         """
@@ -130,14 +148,8 @@ class FactorService:
             
             logger.info(f"开始计算因子 {factor_name}，标的数量: {len(instruments)}, 时间范围: {start_time} 至 {end_time}")
             
-            # 使用QLib的D模块计算因子
-            factor_data = D.features(
-                instruments=instruments,
-                fields=[factor_expr],
-                start_time=start_time,
-                end_time=end_time,
-                freq=freq
-            )
+            # 使用QLib的D模块计算因子，优先读取缓存
+            factor_data = self._features([factor_expr], instruments, start_time, end_time, freq)
             
             # 重命名列名为因子名称
             factor_data.columns = [factor_name]
@@ -177,14 +189,8 @@ class FactorService:
             
             logger.info(f"开始计算多个因子，因子数量: {len(factor_exprs)}, 标的数量: {len(instruments)}, 时间范围: {start_time} 至 {end_time}")
             
-            # 使用QLib的D模块计算因子
-            factor_data = D.features(
-                instruments=instruments,
-                fields=factor_exprs,
-                start_time=start_time,
-                end_time=end_time,
-                freq=freq
-            )
+            # 使用QLib的D模块计算因子，已缓存的因子不再重复计算
+            factor_data = self._features(factor_exprs, instruments, start_time, end_time, freq)
             
             # 重命名列为因子名称
             factor_data.columns = [factor_name for factor_name in factor_names if factor_name in self.factors]
@@ -197,6 +203,74 @@ class FactorService:
             logger.exception(e)
             return None
     
+    def _features(self, expressions, instruments, start_time, end_time, freq):
+        """
+        计算因子表达式的值，每个表达式的结果单独缓存
+        
+        已缓存且数据未更新的表达式直接读取缓存，其余表达式通过一次D.features调用计算后写入缓存
+        
+        :param expressions: 因子表达式列表
+        :param instruments: 标的列表
+        :param start_time: 开始时间
+        :param end_time: 结束时间
+        :param freq: 频率
+        :return: 列为因子表达式的DataFrame，返回的是缓存的浅拷贝，可以直接修改列名
+        """
+        versions = self.cache.data_versions(expressions, instruments, freq, end_time) if self.cache else None
+        if versions is None:
+            return D.features(
+                instruments=instruments,
+                fields=expressions,
+                start_time=start_time,
+                end_time=end_time,
+                freq=freq
+            )
+        
+        keys = {expr: FactorCache.make_key(expr, instruments, freq, start_time, end_time) for expr in expressions}
+        columns = {}
+        missing = []
+        for expr in expressions:
+            cached = self.cache.get(keys[expr], versions[expr])
+            if cached is None:
+                if expr not in missing:
+                    missing.append(expr)
+            else:
+                columns[expr] = cached
+        
+        if missing:
+            logger.info(f"因子缓存未命中 {len(missing)}/{len(expressions)} 个表达式，开始计算")
+            computed = D.features(
+                instruments=instruments,
+                fields=missing,
+                start_time=start_time,
+                end_time=end_time,
+                freq=freq
+            )
+            for expr, column in zip(missing, computed.columns):
+                columns[expr] = computed[[column]].set_axis([expr], axis=1)
+                self.cache.put(keys[expr], versions[expr], columns[expr])
+        
+        if len(expressions) == 1:
+            return columns[expressions[0]].copy(deep=False)
+        return pd.concat([columns[expr] for expr in expressions], axis=1)
+    
+    def get_cache_stats(self):
+        """
+        获取因子缓存的统计信息
+        
+        :return: 命中、未命中、失效次数等统计信息，未启用缓存时返回{"enabled": False}
+        """
+        if self.cache is None:
+            return {"enabled": False}
+        return {"enabled": True, **self.cache.stats()}
+    
+    def clear_cache(self):
+        """
+        清空因子缓存
+        """
+        if self.cache is not None:
+            self.cache.clear()
+    
     def calculate_all_factors(self, instruments, start_time, end_time, freq="day"):
         """
         计算所有因子的值
@@ -122,6 +122,14 @@ async def lifespan(app: FastAPI):
     
     # 关闭时的清理工作
     scheduler.shutdown()
+    
+    # 停止任务进度写入线程，写入剩余的进度
+    from collector.utils.task_manager import task_manager
+    task_manager.shutdown()
+    
+    # 关闭连接池中的数据库连接
+    from collector.db.database import engine
+    engine.dispose()
 
 
 
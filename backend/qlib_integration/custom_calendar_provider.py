@@ -3,6 +3,7 @@ from qlib.data.data import LocalCalendarProvider
 
 # 确保先导入自定义Freq类，这样修改load_calendar方法时使用的就是自定义的Freq类
 from backend.qlib_integration import custom_freq
+from backend.qlib_integration.custom_freq import CustomFreq
 
 # 现在导入的Freq就是自定义的Freq类
 from qlib.utils.time import Freq
@@ -13,148 +14,101 @@ from backend.qlib_integration.config import FREQ_MAP, CALENDAR_DIR
 
 def patch_file_storage():
     """
-    使用monkey patching方式修改FileCalendarStorage类，支持自定义日历文件名
+    使用monkey patching方式修改FileCalendarStorage和FileFeatureStorage类，支持按频率区分的日历和特征文件
+    
+    数据转换时每个频率写入独立的日历文件（calendars/1m.txt、calendars/5m.txt、calendars/1h.txt、calendars/day.txt），
+    特征文件的起始下标指向对应频率的日历。读取时按CustomFreq的名称找到对应的日历和特征文件，
+    日内频率直接按下标读取，无需从其他频率的日历重采样
     """
     try:
         import logging
         logging.basicConfig(level=logging.INFO)
         logger = logging.getLogger(__name__)
         
-        # 导入FileCalendarStorage类
-        from qlib.data.storage.file_storage import FileCalendarStorage
+        # 导入FileCalendarStorage和FileFeatureStorage类
+        from qlib.config import C
+        from qlib.data.storage.file_storage import FileCalendarStorage, FileFeatureStorage
         
         logger.info("开始修改FileCalendarStorage类")
         
-        # 保存原始_freq_file属性
-        original_freq_file = FileCalendarStorage._freq_file
+        def available_calendars(storage) -> List[str]:
+            """获取日历目录中的所有频率名称（文件名去掉.txt），不包括future日历"""
+            calendar_dir = storage.dpm.get_data_uri(C.DEFAULT_FREQ).joinpath(CALENDAR_DIR)
+            return sorted(
+                path.stem for path in calendar_dir.glob("*.txt") if not path.stem.endswith("_future")
+            )
+        
+        def parse_freq(freq_name: str):
+            """解析日历文件名中的频率，无法解析时返回None"""
+            try:
+                return Freq(FREQ_MAP.get(freq_name, freq_name))
+            except ValueError:
+                return None
         
         @property
         def custom_freq_file(self) -> str:
             """
-            自定义_freq_file属性，支持动态数字+时间范围的文件名
-            - 当freq='1m'时，返回'1m'
-            - 当freq='1min'时，返回'1m'
+            自定义_freq_file属性，按CustomFreq的名称解析日历文件名
+            - 当freq='1m'或'1min'时，返回'1m'（calendars/1m.txt）
             - 当freq='5m'时，返回'5m'
             - 当freq='1h'时，返回'1h'
-            - 当freq='1d'时，返回'1d'
+            - 当freq='day'或'1d'时，返回'day'
+            
+            日历目录中没有该频率的日历时，返回可以重采样到该频率的最近频率的日历名称
             
             Returns
             -------
             str
-                自定义的频率字符串
+                日历文件名（不含.txt）
             """
-            logger.info(f"调用custom_freq_file，self.freq: {self.freq}")
-            
             # 检查缓存
             if hasattr(self, "_freq_file_cache"):
-                cached_value = getattr(self, "_freq_file_cache")
-                logger.info(f"使用缓存的_freq_file值: {cached_value}")
-                return cached_value
+                return getattr(self, "_freq_file_cache")
             
-            # 获取频率对象
-            freq = self.freq
-            logger.info(f"原始freq: {freq}, 类型: {type(freq)}")
+            freq_obj = Freq(self.freq)
+            freq_name = CustomFreq.to_file_name(freq_obj)
+            calendars = {name: parse_freq(name) for name in available_calendars(self)}
+            calendars = {name: freq for name, freq in calendars.items() if freq is not None}
             
-            if isinstance(freq, str):
-                freq_obj = Freq(freq)
-                logger.info(f"将字符串freq转换为Freq对象: {freq_obj}")
+            if freq_name in calendars:
+                freq_file = freq_name
             else:
-                freq_obj = freq
-            
-            # 获取count和base
-            count = freq_obj.count
-            base = freq_obj.base
-            logger.info(f"freq_obj.count: {count}, freq_obj.base: {base}")
-            
-            # 根据base属性决定使用哪个后缀
-            if base == "min":
-                # 分钟频率使用m作为后缀
-                suffix = "m"
-                logger.info(f"base为min，使用后缀m")
-            elif base == "hour":
-                # 小时频率使用h作为后缀
-                suffix = "h"
-                logger.info(f"base为hour，使用后缀h")
-            elif base == "day":
-                # 天频率使用day作为后缀，因为日历文件名为day.txt
-                suffix = "day"
-                logger.info(f"base为day，使用后缀day")
-            else:
-                # 其他频率使用默认逻辑
-                logger.info(f"未知base: {base}，使用默认逻辑")
-                return original_freq_file.fget(self)
-            
-            # 构建频率字符串，如1m, 5m, 1h, day
-            freq_str = f"{count}{suffix}" if base != "day" else "day"
-            logger.info(f"构建的频率字符串: {freq_str}")
+                # 兼容其他命名方式的同频率日历，如1min.txt
+                same_freq = [name for name, freq in calendars.items() if freq == freq_obj]
+                if same_freq:
+                    freq_file = same_freq[0]
+                else:
+                    recent = Freq.get_recent_freq(freq_obj, list(calendars.values()))
+                    if recent is None:
+                        raise ValueError(f"can't find a freq from {list(calendars)} that can resample to {self.freq}!")
+                    freq_file = next(name for name, freq in calendars.items() if freq == Freq(recent))
+                    logger.info(f"没有频率为{freq_name}的日历，使用{freq_file}的日历重采样")
             
             # 保存到缓存
-            setattr(self, "_freq_file_cache", freq_str)
-            logger.info(f"保存_freq_file到缓存: {freq_str}")
-            return freq_str
+            setattr(self, "_freq_file_cache", freq_file)
+            return freq_file
         
-        # 替换_freq_file属性
+        # 替换_freq_file属性，日历路径由原始uri属性根据_freq_file生成
         FileCalendarStorage._freq_file = custom_freq_file
-        logger.info("✓ 已成功修改FileCalendarStorage._freq_file属性，支持动态数字+时间范围的文件名")
-        print("✓ 已成功修改FileCalendarStorage._freq_file属性，支持动态数字+时间范围的文件名")
+        logger.info("✓ 已成功修改FileCalendarStorage._freq_file属性，按频率读取对应的日历文件")
+        print("✓ 已成功修改FileCalendarStorage._freq_file属性，按频率读取对应的日历文件")
         
-        # 保存原始uri属性
-        original_uri = FileCalendarStorage.uri
+        # 保存原始__init__方法
+        original_feature_init = FileFeatureStorage.__init__
         
-        @property
-        def custom_uri(self):
+        def custom_feature_init(self, instrument: str, field: str, freq: str, provider_uri: dict = None, **kwargs):
             """
-            自定义uri属性，支持从calendars/目录加载日历文件
-            
-            Returns
-            -------
-            Path
-                自定义的日历文件路径
+            自定义FileFeatureStorage的初始化方法，特征文件名使用与日历一致的频率名称，
+            如freq='1min'时读取close.1m.bin
             """
-            logger.info("调用custom_uri")
-            
-            try:
-                # 获取原始uri
-                original_path = original_uri.fget(self)
-                logger.info(f"原始uri路径: {original_path}")
-                logger.info(f"原始uri路径是否存在: {original_path.exists()}")
-                
-                # 获取频率字符串
-                freq_str = self._freq_file
-                logger.info(f"使用_freq_file: {freq_str}")
-                
-                # 直接使用day.txt作为日历文件名，无论频率是什么
-                file_name = "day.txt"
-                logger.info(f"使用固定的文件名: {file_name}")
-                
-                # 构建自定义路径
-                parent_dir = original_path.parent
-                logger.info(f"parent_dir: {parent_dir}")
-                logger.info(f"parent_dir是否存在: {parent_dir.exists()}")
-                
-                custom_path = parent_dir / file_name
-                logger.info(f"构建的自定义路径: {custom_path}")
-                logger.info(f"自定义路径是否存在: {custom_path.exists()}")
-                
-                # 检查目录中的所有文件
-                if parent_dir.exists():
-                    files = list(parent_dir.iterdir())
-                    logger.info(f"目录中的文件: {[f.name for f in files]}")
-                
-                return custom_path
-            except Exception as e:
-                logger.error(f"custom_uri执行失败: {e}")
-                import traceback
-                traceback.print_exc()
-                # 如果出现错误，返回原始路径
-                original_path = original_uri.fget(self)
-                return original_path
-        
-        # 替换uri属性
-        FileCalendarStorage.uri = custom_uri
-        logger.info("✓ 已成功修改FileCalendarStorage.uri属性，支持自定义日历文件路径")
-        print("✓ 已成功修改FileCalendarStorage.uri属性，支持自定义日历文件路径")
+            original_feature_init(self, instrument, field, freq, provider_uri=provider_uri, **kwargs)
+            self.file_name = f"{instrument.lower()}/{field.lower()}.{CustomFreq.to_file_name(freq)}.bin"
         
+        # 替换__init__方法
+        FileFeatureStorage.__init__ = custom_feature_init
+        logger.info("✓ 已成功修改FileFeatureStorage文件名，按频率读取对应的特征文件")
+        print("✓ 已成功修改FileFeatureStorage文件名，按频率读取对应的特征文件")
+    
     except Exception as e:
         logger.error(f"patch_file_storage error: {e}")
         print(f"patch_file_storage error: {e}")
@@ -164,9 +118,3 @@ def patch_file_storage():
 
 # 自动执行monkey patching
 patch_file_storage()
-
-
-
-
-
-
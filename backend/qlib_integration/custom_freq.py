@@ -2,6 +2,8 @@ import re
 from typing import Tuple, Union
 from qlib.utils.time import Freq as QlibFreq
 
+from backend.collector.scripts.qlib_bin import qlib_freq_name
+
 # 保存原始Freq类，以便需要时恢复
 OriginalFreq = QlibFreq
 
@@ -54,6 +56,30 @@ class CustomFreq(QlibFreq):
         }
         return _count, _freq_format_dict[_freq]
     
+    @staticmethod
+    def to_file_name(freq: Union[str, QlibFreq]) -> str:
+        """
+        获取频率对应的日历和特征文件名，与数据转换时写入的文件名一致
+        分钟、小时、天和月的名称由collector.scripts.qlib_bin.qlib_freq_name生成，其他格式使用__str__的结果
+        
+        Parameters
+        ----------
+        freq : Union[str, QlibFreq]
+            频率字符串或Freq对象
+        
+        Returns
+        -------
+        str
+            文件名中使用的频率字符串，如calendars/1m.txt、close.1m.bin中的"1m"
+        """
+        if isinstance(freq, str) and qlib_freq_name(freq).endswith("month"):
+            # 解析时会转换为小写，1M需要在解析前按月处理，否则会被当作1分钟
+            return qlib_freq_name(freq)
+        freq = freq if isinstance(freq, QlibFreq) else CustomFreq(freq)
+        if freq.base in (CustomFreq.NORM_FREQ_MINUTE, "hour", CustomFreq.NORM_FREQ_DAY, CustomFreq.NORM_FREQ_MONTH):
+            return qlib_freq_name(f"{freq.count}{freq.base}")
+        return str(freq)
+    
     def __str__(self) -> str:
         """
         重写__str__方法，确保返回正确的文件名格式
@@ -0,0 +1,179 @@
+#!/usr/bin/env python3
+"""数据库并发读写基准测试脚本
+
+模拟数据下载时的持续写入（在事务中批量更新任务进度），同时多个线程执行任务列表查询，
+对比两种数据库访问方式下读操作的延迟：
+1. legacy：每个线程一个sqlite3连接，默认回滚日志模式（旧的DBConnection）
+2. pooled：collector.db.database的连接池，WAL模式、synchronous=NORMAL
+
+使用示例：
+    python scripts/benchmark_db.py run --duration=5 --readers=4 --batch_rows=20000
+"""
+
+import sys
+import sqlite3
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from pathlib import Path
+import numpy as np
+from loguru import logger
+from sqlalchemy import create_engine
+
+# 添加项目根目录到Python路径
+backend_root = Path(__file__).parent.parent
+project_root = backend_root.parent
+sys.path.append(str(project_root))
+
+from backend.collector.db.database import create_db_engine, db_connection, db_transaction
+from backend.collector.db.models import Task
+
+# 读线程执行的查询，与任务列表接口相同
+READ_SQL = "SELECT * FROM tasks ORDER BY created_at DESC LIMIT 20"
+# 写线程执行的批量进度更新，与任务进度的批量写入相同
+INSERT_SQL = "INSERT INTO tasks (task_id, task_type, status, params) VALUES (?, 'download_crypto', 'running', '{}')"
+WRITE_SQL = "UPDATE tasks SET completed = ?, current = ?, percentage = ?, updated_at = CURRENT_TIMESTAMP WHERE task_id = ?"
+# 超过该时间（毫秒）的读操作视为被写入阻塞
+SLOW_READ_MS = 50
+
+
+class DBBenchmark:
+    """数据库并发读写基准测试
+    """
+    
+    def __init__(self, duration=5.0, readers=4, batch_rows=20000, db_dir=None):
+        """
+        初始化基准测试
+        
+        :param duration: 每种访问方式的测试时长（秒）
+        :param readers: 读线程数量
+        :param batch_rows: 写线程每个事务更新的任务数
+        :param db_dir: 测试数据库所在目录，默认使用临时目录
+        """
+        self.duration = float(duration)
+        self.readers = int(readers)
+        self.batch_rows = int(batch_rows)
+        self.db_dir = db_dir
+    
+    def _legacy_access(self, db_path):
+        """旧的访问方式：每个线程一个自动提交的sqlite3连接，默认日志模式"""
+        local = threading.local()
+        
+        def connect():
+            if not hasattr(local, "conn"):
+                local.conn = sqlite3.connect(str(db_path), check_same_thread=False, timeout=30, isolation_level=None)
+            return local.conn
+        
+        @contextmanager
+        def connection():
+            yield connect()
+        
+        @contextmanager
+        def transaction():
+            conn = connect()
+            conn.execute("BEGIN TRANSACTION")
+            try:
+                yield conn
+            except BaseException:
+                conn.execute("ROLLBACK")
+                raise
+            conn.execute("COMMIT")
+        
+        return connection, transaction, None
+    
+    def _pooled_access(self, db_path):
+        """新的访问方式：连接池，WAL模式"""
+        engine = create_db_engine(db_path)
+        return (lambda: db_connection(engine)), (lambda: db_transaction(engine)), engine
+    
+    def _measure(self, name, access):
+        """执行一种访问方式的并发读写，返回读延迟和写入吞吐统计"""
+        db_path = Path(self.db_dir or self._tmp_dir) / f"{name}.db"
+        db_path.unlink(missing_ok=True)
+        _create_tables(db_path)
+        connection, transaction, engine = access(db_path)
+        
+        # 预先插入任务并生成两组交替写入的进度，写线程只执行数据库操作
+        task_ids = [f"task-{i}" for i in range(self.batch_rows)]
+        with transaction() as conn:
+            conn.executemany(INSERT_SQL, [(task_id,) for task_id in task_ids])
+        updates = [
+            [(step, f"SYM{step}", step % 100, task_id) for task_id in task_ids]
+            for step in range(2)
+        ]
+        
+        stop = threading.Event()
+        latencies = [[] for _ in range(self.readers)]
+        batches = [0]
+        
+        def write():
+            while not stop.is_set():
+                with transaction() as conn:
+                    conn.executemany(WRITE_SQL, updates[batches[0] % 2])
+                batches[0] += 1
+        
+        def read(index):
+            while not stop.is_set():
+                started = time.perf_counter()
+                with connection() as conn:
+                    conn.execute(READ_SQL).fetchall()
+                latencies[index].append(time.perf_counter() - started)
+        
+        threads = [threading.Thread(target=write)] + [
+            threading.Thread(target=read, args=(index,)) for index in range(self.readers)
+        ]
+        for thread in threads:
+            thread.start()
+        time.sleep(self.duration)
+        stop.set()
+        for thread in threads:
+            thread.join()
+        if engine is not None:
+            engine.dispose()
+        
+        values = np.array([value for values in latencies for value in values]) * 1000
+        return {
+            "reads": len(values),
+            "read_p50_ms": float(np.percentile(values, 50)),
+            "read_p99_ms": float(np.percentile(values, 99)),
+            "read_max_ms": float(values.max()),
+            "slow_reads": int((values > SLOW_READ_MS).sum()),
+            "write_batches": batches[0],
+            "rows_per_sec": batches[0] * self.batch_rows / self.duration,
+        }
+    
+    def run(self):
+        """
+        依次执行两种访问方式的基准测试并输出结果
+        
+        :return: {访问方式: 统计结果}
+        """
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            self._tmp_dir = tmp_dir
+            results = {
+                "legacy": self._measure("legacy", self._legacy_access),
+                "pooled": self._measure("pooled", self._pooled_access),
+            }
+        
+        logger.info(f"读线程: {self.readers}，每个写事务更新的任务数: {self.batch_rows}，测试时长: {self.duration}秒")
+        for name, stats in results.items():
+            logger.info(
+                f"{name:>6}: 读 {stats['reads']} 次，p50 {stats['read_p50_ms']:.2f}ms，"
+                f"p99 {stats['read_p99_ms']:.2f}ms，最大 {stats['read_max_ms']:.2f}ms，"
+                f"超过{SLOW_READ_MS}ms {stats['slow_reads']} 次；"
+                f"写入 {stats['rows_per_sec']:.0f} 行/秒"
+            )
+        return results
+
+
+def _create_tables(db_path):
+    """使用默认日志模式的临时引擎建表，日志模式由各访问方式的连接决定"""
+    engine = create_engine(f"sqlite:///{db_path}")
+    Task.__table__.create(engine)
+    engine.dispose()
+
+
+if __name__ == "__main__":
+    import fire
+    fire.Fire(DBBenchmark)
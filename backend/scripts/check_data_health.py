@@ -41,6 +41,9 @@ class DataHealthChecker:
     - 缺失的factor列
     """
     
+    # 从列式存储中读取的列
+    CHECK_COLUMNS = ["date", "open", "high", "low", "close", "volume", "factor"]
+    
     def __init__(
         self,
         csv_path: Optional[str] = None,
@@ -49,6 +52,9 @@ class DataHealthChecker:
         large_step_threshold_price: float = 0.5,
         large_step_threshold_volume: float = 3,
         missing_data_num: int = 0,
+        storage_format: str = "csv",
+        start: Optional[str] = None,
+        end: Optional[str] = None,
     ):
         """初始化数据健康检查类
         
@@ -59,6 +65,9 @@ class DataHealthChecker:
             large_step_threshold_price: 价格大波动的阈值（默认：0.5）
             large_step_threshold_volume: 成交量大波动的阈值（默认：3）
             missing_data_num: 允许的缺失数据数量（默认：0）
+            storage_format: 下载数据的存储格式，csv或parquet（默认：csv）
+            start: 只检查该时间之后的源数据，仅parquet格式按日期范围读取（默认：不限制）
+            end: 只检查该时间之前的源数据，仅parquet格式按日期范围读取（默认：不限制）
         """
         self.csv_path = csv_path
         self.qlib_dir = qlib_dir
@@ -66,6 +75,9 @@ class DataHealthChecker:
         self.large_step_threshold_price = large_step_threshold_price
         self.large_step_threshold_volume = large_step_threshold_volume
         self.missing_data_num = missing_data_num
+        self.storage_format = storage_format
+        self.start = start
+        self.end = end
     
     def check_csv_data(self, csv_path: Optional[str] = None) -> Dict[str, Optional[pd.DataFrame]]:
         """检查CSV文件数据
@@ -90,25 +102,30 @@ class DataHealthChecker:
             logger.error(f"CSV目录不存在: {csv_path}")
             return {}
         
-        # 获取所有CSV文件
-        csv_files = [f for f in os.listdir(csv_path) if f.endswith(".csv")]
-        logger.info(f"找到 {len(csv_files)} 个CSV文件")
-        
-        if not csv_files:
-            logger.warning(f"CSV目录中没有CSV文件: {csv_path}")
-            return {}
-        
-        # 加载CSV文件
-        data = {}
-        for filename in csv_files:
-            file_path = os.path.join(csv_path, filename)
-            try:
-                df = pd.read_csv(file_path)
-                data[filename] = df
-                logger.info(f"成功加载CSV文件: {filename}")
-            except Exception as e:
-                logger.error(f"加载CSV文件失败: {filename}, 错误: {e}")
-                continue
+        if self.storage_format == "parquet":
+            data = self._load_parquet_data(csv_path)
+            if not data:
+                return {}
+        else:
+            # 获取所有CSV文件
+            csv_files = [f for f in os.listdir(csv_path) if f.endswith(".csv")]
+            logger.info(f"找到 {len(csv_files)} 个CSV文件")
+            
+            if not csv_files:
+                logger.warning(f"CSV目录中没有CSV文件: {csv_path}")
+                return {}
+            
+            # 加载CSV文件
+            data = {}
+            for filename in csv_files:
+                file_path = os.path.join(csv_path, filename)
+                try:
+                    df = pd.read_csv(file_path)
+                    data[filename] = df
+                    logger.info(f"成功加载CSV文件: {filename}")
+                except Exception as e:
+                    logger.error(f"加载CSV文件失败: {filename}, 错误: {e}")
+                    continue
         
         # 执行检查
         results = {
@@ -123,6 +140,34 @@ class DataHealthChecker:
         
         return results
     
+    def _load_parquet_data(self, path: str) -> Dict[str, pd.DataFrame]:
+        """从Parquet存储中加载数据，只读取检查需要的列和日期范围
+        
+        Args:
+            path: Parquet存储目录，按交易对和月份分区
+            
+        Returns:
+            Dict[str, pd.DataFrame]: 交易对到数据的字典
+        """
+        from backend.collector.base.storage import ParquetInstrumentStorage
+        
+        storage = ParquetInstrumentStorage(path)
+        symbols = storage.symbols()
+        logger.info(f"找到 {len(symbols)} 个交易对的Parquet数据")
+        if not symbols:
+            logger.warning(f"目录中没有Parquet数据: {path}")
+            return {}
+        
+        data = {}
+        for symbol in symbols:
+            try:
+                df = storage.read(symbol, columns=self.CHECK_COLUMNS, start=self.start, end=self.end)
+                data[symbol] = df.set_index("date") if "date" in df.columns else df
+                logger.info(f"成功加载Parquet数据: {symbol}")
+            except Exception as e:
+                logger.error(f"加载Parquet数据失败: {symbol}, 错误: {e}")
+        return data
+    
     def check_qlib_data(self, qlib_dir: Optional[str] = None, freq: Optional[str] = None) -> Dict[str, Optional[pd.DataFrame]]:
         """检查QLib数据
         
@@ -0,0 +1,334 @@
+import io
+import sys
+import time
+import asyncio
+import random
+import shutil
+import zipfile
+import hashlib
+import unittest
+from pathlib import Path
+from concurrent.futures import ProcessPoolExecutor
+from unittest.mock import patch
+
+import pandas as pd
+
+# 添加项目根目录到Python路径
+sys.path.append('/Users/liupeng/workspace/qbot')
+
+from backend.collector.crypto.binance import downloader as downloader_module
+from backend.collector.crypto.binance.downloader import BinanceDownloader, parse_kline_zip
+from backend.collector.crypto.binance.cache import ArchiveCache
+from backend.collector.crypto.binance.collector import BinanceCollector
+from backend.collector.base.utils import timestamps_to_datetime
+
+
+def make_kline_zip(open_times, header=False):
+    """构造币安归档格式的K线压缩包"""
+    rows = [
+        f"{t},1.0,2.0,0.5,1.5,10.0,{t + 59999},15.0,3,5.0,7.5,0"
+        for t in open_times
+    ]
+    if header:
+        rows.insert(0, ",".join(BinanceDownloader().candle_names))
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w') as zipf:
+        zipf.writestr('klines.csv', "\n".join(rows) + "\n")
+    return buffer.getvalue()
+
+
+class FakeResponse:
+    """模拟aiohttp响应"""
+
+    def __init__(self, status, content=b''):
+        self.status = status
+        self._content = content
+
+    async def read(self):
+        return self._content
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *args):
+        return False
+
+
+class FakeSession:
+    """模拟aiohttp会话，按URL返回预设内容"""
+
+    def __init__(self, contents):
+        self.contents = contents
+        self.requested = []
+
+    def get(self, url):
+        self.requested.append(url)
+        if url in self.contents:
+            return FakeResponse(200, self.contents[url])
+        return FakeResponse(404)
+
+
+class TestBinanceDownloader(unittest.TestCase):
+    """测试BinanceDownloader类的并发下载功能"""
+
+    def test_download_daily_klines_concurrent_and_ordered(self):
+        """测试按日下载的并发与结果顺序
+
+        测试点：
+        1. 同时进行的下载数量不超过max_concurrency
+        2. 所有日期共用同一个会话
+        3. 结果按日期顺序拼接
+        """
+        downloader = BinanceDownloader(candle_type='spot', max_concurrency=3)
+        state = {"running": 0, "peak": 0, "sessions": set()}
+
+        async def fake_fetch(session, url, symbol, timeframe, date):
+            state["sessions"].add(id(session))
+            state["running"] += 1
+            state["peak"] = max(state["peak"], state["running"])
+            await asyncio.sleep(random.uniform(0, 0.02))
+            state["running"] -= 1
+            return pd.DataFrame({"open_time": [date]})
+
+        with patch.object(downloader, '_fetch_klines', side_effect=fake_fetch):
+            df = downloader.download('BTCUSDT', '1d', '2024-01-01', '2024-01-20')
+
+        self.assertEqual(len(df), 20)
+        self.assertEqual(df['open_time'].tolist(), sorted(df['open_time'].tolist()))
+        self.assertLessEqual(state["peak"], 3)
+        self.assertGreater(state["peak"], 1)
+        self.assertEqual(len(state["sessions"]), 1)
+
+    def test_download_daily_klines_skips_missing_days(self):
+        """测试缺失日期（返回None）被跳过"""
+        downloader = BinanceDownloader(candle_type='spot')
+
+        async def fake_fetch(session, url, symbol, timeframe, date):
+            if date.endswith('02'):
+                return None
+            return pd.DataFrame({"open_time": [date]})
+
+        with patch.object(downloader, '_fetch_klines', side_effect=fake_fetch):
+            df = downloader.download('BTCUSDT', '1d', '2024-01-01', '2024-01-03')
+
+        self.assertEqual(df['open_time'].tolist(), ['2024-01-01', '2024-01-03'])
+
+    def test_plan_archive_files(self):
+        """测试月归档优先的下载规划
+
+        测试点：
+        1. 完整且已结束的月份使用月归档
+        2. 范围首尾的不完整月份和当前月份使用日归档
+        3. 规划按时间顺序排列
+        """
+        plan = BinanceDownloader.plan_archive_files(
+            '2024-01-15', '2024-04-10', use_monthly=True, today='2024-04-10'
+        )
+        monthly = [date for period, date in plan if period == 'monthly']
+        daily = [date for period, date in plan if period == 'daily']
+
+        self.assertEqual(monthly, ['2024-02', '2024-03'])
+        self.assertEqual(daily[0], '2024-01-15')
+        self.assertEqual(daily[16], '2024-01-31')
+        self.assertEqual(daily[17], '2024-04-01')
+        self.assertEqual(len(daily), 17 + 10)
+        self.assertEqual(plan[17], ('monthly', '2024-02'))
+
+        # 不使用月归档时全部为日归档
+        plan = BinanceDownloader.plan_archive_files('2024-01-01', '2024-03-31', use_monthly=False)
+        self.assertEqual(len(plan), 91)
+        self.assertTrue(all(period == 'daily' for period, _ in plan))
+
+    def test_download_monthly_fallback_to_daily(self):
+        """测试月归档缺失时回退为逐日下载，并记录下载计划统计"""
+        downloader = BinanceDownloader(candle_type='spot')
+
+        async def fake_fetch(session, url, symbol, timeframe, date):
+            if '/monthly/' in url:
+                # 仅发布了1月的月归档
+                return pd.DataFrame({"open_time": [date]}) if date == '2024-01' else None
+            return pd.DataFrame({"open_time": [date]})
+
+        plan = BinanceDownloader.plan_archive_files(
+            '2024-01-01', '2024-03-01', use_monthly=True, today='2024-03-05'
+        )
+        self.assertEqual(plan, [('monthly', '2024-01'), ('monthly', '2024-02'), ('daily', '2024-03-01')])
+
+        with patch.object(downloader, '_fetch_klines', side_effect=fake_fetch), \
+                patch.object(downloader, 'plan_archive_files', return_value=plan):
+            df = downloader.download('BTCUSDT', '1d', '2024-01-01', '2024-03-01', use_monthly=True)
+
+        self.assertEqual(df['open_time'].iloc[0], '2024-01')
+        self.assertEqual(df['open_time'].iloc[1], '2024-02-01')
+        self.assertEqual(df['open_time'].iloc[-1], '2024-03-01')
+        self.assertEqual(len(df), 1 + 29 + 1)
+        self.assertEqual(df.attrs['archive_plan'], {'monthly': 1, 'daily': 30, 'monthly_fallback': 1})
+
+    def test_parse_in_process_pool(self):
+        """测试设置执行器后在进程池中解析归档文件"""
+        downloader = BinanceDownloader(candle_type='spot')
+        url = downloader.get_zip_url('BTCUSDT', '1m', '2024-01-01')
+        session = FakeSession({url: make_kline_zip([1704067200000, 1704067260000])})
+
+        async def run():
+            with ProcessPoolExecutor(max_workers=1) as executor:
+                downloader.executor = executor
+                return await downloader.get_daily_klines('BTCUSDT', '1m', '2024-01-01', session=session)
+
+        df = asyncio.run(run())
+        self.assertEqual(df.columns.tolist(), downloader.candle_names)
+        self.assertEqual(df['open_time'].tolist(), [1704067200000, 1704067260000])
+
+    def test_parse_selected_columns(self):
+        """测试只解析OHLCV列并使用明确的数据类型
+
+        测试点：
+        1. 只保留指定的列，顺序与指定顺序一致
+        2. 时间列为int64，价格和成交量为float64
+        3. 有表头和无表头的文件均能解析
+        4. pyarrow不可用时回退为pandas解析，结果一致
+        """
+        candle_names = BinanceDownloader().candle_names
+        columns = BinanceDownloader.OHLCV_COLUMNS
+        open_times = [1704067200000, 1704067260000, 1704067320000]
+
+        results = []
+        for header in (False, True):
+            content = make_kline_zip(open_times, header=header)
+            results.append(parse_kline_zip(content, candle_names, columns))
+            with patch.object(downloader_module, 'pa_csv', None):
+                results.append(parse_kline_zip(content, candle_names, columns))
+
+        for df in results:
+            self.assertEqual(df.columns.tolist(), columns)
+            self.assertEqual(df['open_time'].dtype, 'int64')
+            self.assertEqual(df['close'].dtype, 'float64')
+            self.assertEqual(df['open_time'].tolist(), open_times)
+            pd.testing.assert_frame_equal(df, results[0])
+
+
+class TestArchiveCache(unittest.TestCase):
+    """测试归档文件本地缓存"""
+
+    def setUp(self):
+        """设置测试环境"""
+        self.cache_dir = Path('/tmp/test_archive_cache').resolve()
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def tearDown(self):
+        """清理测试环境"""
+        shutil.rmtree(self.cache_dir, ignore_errors=True)
+
+    def test_download_served_from_cache(self):
+        """测试缓存命中
+
+        测试点：
+        1. 首次下载校验CHECKSUM后写入缓存
+        2. 再次下载直接从缓存读取，不发起网络请求
+        """
+        downloader = BinanceDownloader(candle_type='spot', cache_dir=self.cache_dir)
+        url = downloader.get_zip_url('BTCUSDT', '1m', '2024-01-01')
+        content = make_kline_zip([1704067200000])
+        checksum = f"{hashlib.sha256(content).hexdigest()}  BTCUSDT-1m-2024-01-01.zip\n".encode()
+        session = FakeSession({url: content, f"{url}.CHECKSUM": checksum})
+
+        df = asyncio.run(downloader.get_daily_klines('BTCUSDT', '1m', '2024-01-01', session=session))
+        self.assertEqual(len(df), 1)
+        self.assertEqual(session.requested, [url, f"{url}.CHECKSUM"])
+
+        offline = FakeSession({})
+        df = asyncio.run(downloader.get_daily_klines('BTCUSDT', '1m', '2024-01-01', session=offline))
+        self.assertEqual(df['open_time'].tolist(), [1704067200000])
+        self.assertEqual(offline.requested, [])
+        self.assertEqual(downloader.cache.hits, 1)
+
+    def test_checksum_mismatch_not_cached(self):
+        """测试CHECKSUM校验失败时抛出异常且不写入缓存"""
+        downloader = BinanceDownloader(candle_type='spot', cache_dir=self.cache_dir)
+        url = downloader.get_zip_url('BTCUSDT', '1m', '2024-01-01')
+        session = FakeSession({url: make_kline_zip([1704067200000]), f"{url}.CHECKSUM": b"0" * 64})
+
+        with self.assertRaises(ValueError):
+            asyncio.run(downloader._fetch_klines(session, url, 'BTCUSDT', '1m', '2024-01-01'))
+        self.assertIsNone(downloader.cache.get(url))
+        self.assertEqual(downloader.cache.size, 0)
+
+    def test_lru_eviction(self):
+        """测试超过大小上限时淘汰最久未使用的文件"""
+        cache = ArchiveCache(self.cache_dir, max_size=250)
+        cache.put('a', b'a' * 100)
+        time.sleep(0.01)
+        cache.put('b', b'b' * 100)
+        time.sleep(0.01)
+        # 访问a后，b成为最久未使用的文件
+        self.assertEqual(cache.get('a'), b'a' * 100)
+        cache.put('c', b'c' * 100)
+
+        self.assertIsNotNone(cache.get('a'))
+        self.assertIsNone(cache.get('b'))
+        self.assertIsNotNone(cache.get('c'))
+        self.assertEqual(cache.size, 200)
+
+        # 重新打开缓存时恢复大小统计
+        self.assertEqual(ArchiveCache(self.cache_dir, max_size=250).size, 200)
+
+
+class TestProcessKlines(unittest.TestCase):
+    """测试BinanceCollector的K线时间戳处理"""
+
+    def setUp(self):
+        """设置测试环境"""
+        self.save_dir = Path('/tmp/test_process_klines').resolve()
+
+    def tearDown(self):
+        """清理测试环境"""
+        shutil.rmtree(self.save_dir, ignore_errors=True)
+
+    def test_timestamps_to_datetime_mixed_units(self):
+        """测试同一列中混合秒、毫秒、微秒、纳秒的时间戳逐行转换"""
+        expected = pd.Timestamp('2025-01-01')
+        ns = expected.value
+        dates = timestamps_to_datetime(pd.Series([ns // 10 ** 9, ns // 10 ** 6, ns // 10 ** 3, ns, 12345]))
+
+        self.assertTrue((dates[:4] == expected.to_datetime64()).all())
+        self.assertTrue(pd.isna(dates[4]))
+
+        # 字符串和缺失值
+        dates = timestamps_to_datetime(['1735689600000', None, 'abc'])
+        self.assertEqual(pd.Timestamp(dates[0]), expected)
+        self.assertTrue(pd.isna(dates[1:]).all())
+
+    def test_process_klines_mixed_ms_us(self):
+        """测试毫秒与微秒混合的归档数据
+
+        测试点：
+        1. 每行按自身单位转换，不受第一行影响
+        2. 无效时间戳被过滤
+        3. 输出列为date/open/high/low/close/volume，并按时间范围过滤
+        4. 下载计划统计随结果返回，并按交易对记录在收集器中
+        """
+        collector = BinanceCollector(save_dir=self.save_dir, symbols=['BTCUSDT'])
+        df = pd.DataFrame({
+            'open_time': [1735603200000, 1735689600000000, 0, 1735776000000000],
+            'open': [1.0, 2.0, 3.0, 4.0],
+            'high': [1.0, 2.0, 3.0, 4.0],
+            'low': [1.0, 2.0, 3.0, 4.0],
+            'close': [1.0, 2.0, 3.0, 4.0],
+            'volume': [1.0, 2.0, 3.0, 4.0],
+        })
+        df.attrs['archive_plan'] = {'monthly': 0, 'daily': 2, 'monthly_fallback': 0}
+
+        with patch.object(collector.downloader, 'download', return_value=df):
+            result = collector.get_data(
+                'BTCUSDT', '1d', pd.Timestamp('2024-12-31'), pd.Timestamp('2025-01-01')
+            )
+
+        self.assertEqual(result.columns.tolist(), ['date', 'open', 'high', 'low', 'close', 'volume'])
+        self.assertEqual(result['date'].tolist(), [pd.Timestamp('2024-12-31'), pd.Timestamp('2025-01-01')])
+        self.assertEqual(result['close'].tolist(), [1.0, 2.0])
+        self.assertEqual(result.attrs['archive_plan'], df.attrs['archive_plan'])
+        self.assertEqual(collector.archive_plans['BTCUSDT'], df.attrs['archive_plan'])
+
+
+if __name__ == '__main__':
+    unittest.main()
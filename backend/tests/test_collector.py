@@ -2,6 +2,7 @@ import sys
 import os
 import unittest
 from pathlib import Path
+import numpy as np
 import pandas as pd
 from unittest.mock import patch, MagicMock
 
@@ -158,6 +159,66 @@ class TestBaseCollector(unittest.TestCase):
         data_file2 = self.test_dir / 'TEST2.csv'
         self.assertFalse(data_file2.exists())
     
+    def test_save_instrument_incremental(self):
+        """测试增量追加保存与整理功能
+        
+        测试点：
+        1. 与已保存数据重叠的行不会重复写入
+        2. 索引文件记录最后时间戳和行数
+        3. 索引丢失后可根据文件头尾重建
+        4. compact_instruments去重并排序
+        """
+        class TestCollector(BaseCollector):
+            def get_instrument_list(self):
+                return ['TEST1']
+            
+            def normalize_symbol(self, symbol):
+                return symbol
+            
+            def get_data(self, symbol, interval, start_datetime, end_datetime):
+                return pd.DataFrame()
+        
+        collector = TestCollector(save_dir=str(self.test_dir))
+        
+        def make_data(dates):
+            return pd.DataFrame({
+                'date': dates,
+                'open': range(len(dates)),
+                'close': range(len(dates)),
+            })
+        
+        collector.save_instrument('TEST1', make_data(['2023-01-01', '2023-01-02']))
+        collector.save_instrument('TEST1', make_data(['2023-01-02', '2023-01-03', '2023-01-04']))
+        
+        data_file = self.test_dir / 'TEST1.csv'
+        saved_data = pd.read_csv(data_file)
+        self.assertEqual(saved_data['date'].tolist(), ['2023-01-01', '2023-01-02', '2023-01-03', '2023-01-04'])
+        
+        index = collector.storage.read_index('TEST1')
+        self.assertEqual(index['rows'], 4)
+        self.assertEqual(pd.Timestamp(index['last_date']), pd.Timestamp('2023-01-04'))
+        
+        # 删除索引后根据文件头尾重建
+        collector.storage.get_index_path('TEST1').unlink()
+        self.assertEqual(collector.storage.last_timestamp('TEST1'), pd.Timestamp('2023-01-04'))
+        self.assertEqual(collector.storage.read_index('TEST1')['rows'], 4)
+        
+        # 指定开始时间时只解析文件末尾晚于开始时间的行
+        self.assertEqual(collector.storage.read('TEST1', start='2023-01-03')['date'].tolist(), ['2023-01-03', '2023-01-04'])
+        self.assertTrue(collector.storage.read('TEST1', columns=['close'], start='2023-01-05').empty)
+        
+        # 向前补数据时回退为重写，结果仍有序且无重复
+        collector.save_instrument('TEST1', make_data(['2022-12-31', '2023-01-01']))
+        saved_data = pd.read_csv(data_file)
+        self.assertEqual(len(saved_data), 5)
+        self.assertEqual(saved_data['date'].iloc[0], '2022-12-31')
+        
+        # 外部写入重复数据后，compact去重排序
+        make_data(['2023-01-03']).assign(symbol='TEST1').to_csv(data_file, mode='a', header=False, index=False)
+        self.assertEqual(collector.compact_instruments(), {'TEST1': 5})
+        saved_data = pd.read_csv(data_file)
+        self.assertEqual(saved_data['date'].tolist(), sorted(set(saved_data['date'])))
+    
     def test_cache_small_data(self):
         """测试缓存小数据功能
         
@@ -279,6 +340,193 @@ class TestBaseCollector(unittest.TestCase):
         saved_data = pd.read_csv(data_file)
         self.assertEqual(len(saved_data), 2)
 
+    def test_async_collect_data(self):
+        """测试异步收集模式
+        
+        测试点：
+        1. 所有标的在同一个事件循环中收集并保存
+        2. 失败的标的在max_collector_count次重试中重新收集
+        3. 进度回调正常调用
+        """
+        attempts = {}
+        
+        class TestCollector(BaseCollector):
+            def get_instrument_list(self):
+                return ['TEST1', 'TEST2', 'TEST3']
+            
+            def normalize_symbol(self, symbol):
+                return symbol
+            
+            def get_data(self, symbol, interval, start_datetime, end_datetime):
+                return pd.DataFrame()
+            
+            async def async_get_data(self, symbol, interval, start_datetime, end_datetime):
+                attempts[symbol] = attempts.get(symbol, 0) + 1
+                # TEST2第一次收集失败
+                if symbol == 'TEST2' and attempts[symbol] == 1:
+                    raise RuntimeError("network error")
+                return pd.DataFrame({
+                    'date': ['2023-01-01', '2023-01-02'],
+                    'open': [100, 101],
+                    'high': [102, 103],
+                    'low': [99, 100],
+                    'close': [101, 102],
+                    'volume': [1000, 2000]
+                })
+        
+        collector = TestCollector(save_dir=str(self.test_dir), max_workers=2, async_mode=True)
+        progress = []
+        collector.collect_data(progress_callback=lambda *args: progress.append(args))
+        
+        self.assertEqual(attempts, {'TEST1': 1, 'TEST2': 2, 'TEST3': 1})
+        for symbol in ['TEST1', 'TEST2', 'TEST3']:
+            self.assertTrue((self.test_dir / f'{symbol}.csv').exists())
+        # 每个标的每次收集回调两次
+        self.assertEqual(len(progress), 2 * 4)
+    
+    def test_incremental_collect_data(self):
+        """测试增量收集模式
+        
+        测试点：
+        1. 开始时间前移到已保存数据的最后时间戳
+        2. 没有已保存数据的标的使用原开始时间
+        3. 已保存数据覆盖到结束时间的标的不再获取
+        """
+        fetched = {}
+        
+        class TestCollector(BaseCollector):
+            def get_instrument_list(self):
+                return ['TEST1', 'TEST2', 'TEST3']
+            
+            def normalize_symbol(self, symbol):
+                return symbol
+            
+            def get_data(self, symbol, interval, start_datetime, end_datetime):
+                fetched[symbol] = start_datetime
+                dates = pd.date_range(start_datetime, end_datetime, freq='D')
+                return pd.DataFrame({'date': dates.strftime('%Y-%m-%d'), 'close': range(len(dates))})
+        
+        collector = TestCollector(
+            save_dir=str(self.test_dir), start='2023-01-01', end='2023-01-10', incremental=True
+        )
+        collector.save_instrument('TEST1', pd.DataFrame({'date': ['2023-01-01', '2023-01-05'], 'close': [1, 2]}))
+        collector.save_instrument('TEST3', pd.DataFrame({'date': ['2023-01-10'], 'close': [1]}))
+        collector.collect_data()
+        
+        self.assertEqual(fetched, {
+            'TEST1': pd.Timestamp('2023-01-05'),
+            'TEST2': pd.Timestamp('2023-01-01'),
+        })
+        saved_data = pd.read_csv(self.test_dir / 'TEST1.csv')
+        self.assertEqual(len(saved_data), 2 + 5)
+        self.assertEqual(saved_data['date'].iloc[-1], '2023-01-10')
+    
+    def test_collect_data_to_qlib_sink(self):
+        """测试收集时直接写入QLib二进制格式
+        
+        测试点：
+        1. 不保存CSV时只写入QLib目录
+        2. 后完成的标的开始时间更早时，已写入的标的按新日历重新对齐
+        3. 增量收集从QLib目录中的最后时间开始，只追加新的K线
+        """
+        starts = {'TEST1': '2023-01-05', 'TEST2': '2023-01-01'}
+        
+        class TestCollector(BaseCollector):
+            def get_instrument_list(self):
+                return ['TEST1', 'TEST2']
+            
+            def normalize_symbol(self, symbol):
+                return symbol
+            
+            def get_data(self, symbol, interval, start_datetime, end_datetime):
+                dates = pd.date_range(max(start_datetime, pd.Timestamp(starts[symbol])), end_datetime, freq='D')
+                return pd.DataFrame({
+                    'date': dates.strftime('%Y-%m-%d'), 'open': 1.0, 'high': 1.0, 'low': 1.0,
+                    'close': [float(d.day) for d in dates], 'volume': 1.0
+                })
+        
+        qlib_dir = self.test_dir / 'qlib_data'
+        collector = TestCollector(
+            save_dir=str(self.test_dir / 'source'), start='2023-01-01', end='2023-01-08',
+            qlib_sink_dir=qlib_dir, save_csv=False
+        )
+        collector.collect_data()
+        
+        self.assertEqual(list((self.test_dir / 'source').glob('*.csv')), [])
+        calendar = (qlib_dir / 'calendars' / 'day.txt').read_text().split()
+        self.assertEqual(calendar[0], '2023-01-01')
+        self.assertEqual(len(calendar), 8)
+        test1 = np.fromfile(qlib_dir / 'features' / 'test1' / 'close.day.bin', dtype='<f')
+        self.assertEqual(test1.tolist(), [4, 5, 6, 7, 8])
+        
+        collector = TestCollector(
+            save_dir=str(self.test_dir / 'source'), start='2023-01-01', end='2023-01-10',
+            incremental=True, qlib_sink_dir=qlib_dir, save_csv=False
+        )
+        self.assertEqual(collector.get_start_datetime('TEST1'), pd.Timestamp('2023-01-08'))
+        collector.collect_data()
+        test1 = np.fromfile(qlib_dir / 'features' / 'test1' / 'close.day.bin', dtype='<f')
+        self.assertEqual(test1.tolist(), [4, 5, 6, 7, 8, 9, 10])
+        self.assertEqual(len((qlib_dir / 'calendars' / 'day.txt').read_text().split()), 10)
+    
+    def test_parquet_storage(self):
+        """测试Parquet原始数据存储
+        
+        测试点：
+        1. 数据按月份分区保存，日期和数值列为类型化的列
+        2. 重复保存时按日期去重，只重写涉及的月份
+        3. 只读取需要的列和日期范围
+        4. 增量收集从Parquet中的最后时间戳开始
+        """
+        from backend.collector.base.storage import ParquetInstrumentStorage
+        
+        class TestCollector(BaseCollector):
+            def get_instrument_list(self):
+                return ['TEST1']
+            
+            def normalize_symbol(self, symbol):
+                return symbol
+            
+            def get_data(self, symbol, interval, start_datetime, end_datetime):
+                dates = pd.date_range(start_datetime, end_datetime, freq='D')
+                return pd.DataFrame({
+                    'date': dates.strftime('%Y-%m-%d'), 'open': '1.5', 'close': [float(d.day) for d in dates]
+                })
+        
+        collector = TestCollector(
+            save_dir=str(self.test_dir), start='2023-01-20', end='2023-02-10', storage_format='parquet'
+        )
+        self.assertIsInstance(collector.storage, ParquetInstrumentStorage)
+        collector.collect_data()
+        
+        storage = collector.storage
+        self.assertEqual(sorted(p.name for p in (self.test_dir / 'TEST1').iterdir()), ['2023-01.parquet', '2023-02.parquet'])
+        self.assertEqual(storage.last_timestamp('TEST1'), pd.Timestamp('2023-02-10'))
+        
+        df = storage.read('TEST1', columns=['open'], start='2023-02-01', end='2023-02-05')
+        self.assertEqual(list(df.columns), ['date', 'open'])
+        self.assertEqual(len(df), 5)
+        self.assertEqual(df['open'].dtype, 'float64')
+        self.assertTrue(pd.api.types.is_datetime64_any_dtype(df['date']))
+        
+        jan_mtime = (self.test_dir / 'TEST1' / '2023-01.parquet').stat().st_mtime_ns
+        collector = TestCollector(
+            save_dir=str(self.test_dir), start='2023-01-20', end='2023-02-15',
+            storage_format='parquet', incremental=True
+        )
+        self.assertEqual(collector.get_start_datetime('TEST1'), pd.Timestamp('2023-02-10'))
+        collector.collect_data()
+        self.assertEqual(storage.compact('TEST1'), 12 + 15)
+        self.assertEqual((self.test_dir / 'TEST1' / '2023-01.parquet').stat().st_mtime_ns, jan_mtime)
+        
+        # 字符串类型（pandas 3的默认文本类型）的数值列同样转换为浮点类型
+        storage.save('TEST2', pd.DataFrame({
+            'date': ['2023-03-01'], 'open': pd.array(['2.5'], dtype='string'), 'symbol': pd.array(['TEST2'], dtype='string')
+        }))
+        df = storage.read('TEST2')
+        self.assertEqual(df['open'].dtype, 'float64')
+        self.assertEqual(df['symbol'].iloc[0], 'TEST2')
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,112 @@
+import sys
+import sqlite3
+import contextlib
+import tempfile
+import threading
+import time
+import unittest
+from pathlib import Path
+
+from sqlalchemy import text
+from sqlalchemy.orm import Session
+
+# 添加项目根目录到Python路径
+sys.path.append('/Users/liupeng/workspace/qbot')
+
+from backend.collector.db.database import create_db_engine, db_connection, db_transaction
+from backend.collector.db.models import SystemConfig, Task
+
+
+class TestDatabase(unittest.TestCase):
+    """测试统一的连接池数据访问层"""
+    
+    def setUp(self):
+        """使用临时数据库文件"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = Path(self.tmp_dir.name) / 'qbot.db'
+        self.engine = create_db_engine(self.db_path)
+        Task.__table__.create(self.engine)
+        SystemConfig.__table__.create(self.engine)
+    
+    def tearDown(self):
+        """关闭连接池并清理临时文件"""
+        self.engine.dispose()
+        self.tmp_dir.cleanup()
+    
+    def count_tasks(self, conn):
+        return conn.execute('SELECT COUNT(*) FROM tasks').fetchone()[0]
+    
+    def test_connection_settings(self):
+        """测试连接启用WAL和synchronous=NORMAL，借出的连接按列名访问，归还后ORM会话可复用同一连接"""
+        with db_connection(self.engine) as conn:
+            self.assertEqual(conn.execute('PRAGMA journal_mode').fetchone()['journal_mode'], 'wal')
+            self.assertEqual(conn.execute('PRAGMA synchronous').fetchone()[0], 1)
+            self.assertGreater(conn.execute('PRAGMA busy_timeout').fetchone()[0], 0)
+            conn.execute("INSERT INTO system_config (key, value) VALUES ('a', '1')")
+        
+        with Session(self.engine) as session:
+            session.add(SystemConfig(key='b', value='2'))
+            session.commit()
+            self.assertEqual(session.execute(text('SELECT COUNT(*) FROM system_config')).scalar(), 2)
+        self.assertEqual(self.engine.pool.checkedout(), 0)
+    
+    def test_transaction_rollback(self):
+        """测试写事务出错时整体回滚"""
+        with self.assertRaises(RuntimeError):
+            with db_transaction(self.engine) as conn:
+                conn.execute("INSERT INTO tasks (task_id, task_type, status) VALUES ('t1', 'download', 'pending')")
+                raise RuntimeError('写入失败')
+        with db_connection(self.engine) as conn:
+            self.assertEqual(self.count_tasks(conn), 0)
+    
+    def test_read_during_write(self):
+        """测试写事务持有写锁期间读操作不等待，读到已提交的数据；旧的回滚日志模式下读操作被阻塞"""
+        writing = threading.Event()
+        release = threading.Event()
+        
+        def write(transaction):
+            with transaction() as conn:
+                conn.execute("INSERT INTO tasks (task_id, task_type, status) VALUES ('t1', 'download', 'running')")
+                writing.set()
+                release.wait(5)
+        
+        writer = threading.Thread(target=write, args=(lambda: db_transaction(self.engine),))
+        writer.start()
+        self.assertTrue(writing.wait(5))
+        started = time.perf_counter()
+        with db_connection(self.engine) as conn:
+            self.assertEqual(self.count_tasks(conn), 0)
+        self.assertLess(time.perf_counter() - started, 0.5)
+        release.set()
+        writer.join()
+        with db_connection(self.engine) as conn:
+            self.assertEqual(self.count_tasks(conn), 1)
+        
+        # 对照：默认的回滚日志模式下，写事务提交前持有排他锁时读操作失败
+        legacy_path = Path(self.tmp_dir.name) / 'legacy.db'
+        with sqlite3.connect(str(legacy_path)) as conn:
+            conn.execute('CREATE TABLE tasks (task_id TEXT, task_type TEXT, status TEXT)')
+        
+        @contextlib.contextmanager
+        def legacy_transaction():
+            conn = sqlite3.connect(str(legacy_path), isolation_level=None)
+            conn.execute('BEGIN EXCLUSIVE')
+            yield conn
+            conn.execute('COMMIT')
+            conn.close()
+        
+        writing.clear()
+        release.clear()
+        writer = threading.Thread(target=write, args=(legacy_transaction,))
+        writer.start()
+        self.assertTrue(writing.wait(5))
+        reader = sqlite3.connect(str(legacy_path), timeout=0)
+        with self.assertRaises(sqlite3.OperationalError):
+            self.count_tasks(reader)
+        release.set()
+        writer.join()
+        reader.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
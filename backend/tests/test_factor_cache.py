@@ -0,0 +1,112 @@
+import sys
+import time
+import shutil
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 添加项目根目录到Python路径
+sys.path.append('/Users/liupeng/workspace/qbot')
+
+from backend.collector.scripts.qlib_bin import QlibBinWriter
+from backend.factor.cache import FactorCache
+
+
+def make_frame(start, periods):
+    """生成连续日线数据，收盘价为序号"""
+    values = np.arange(periods, dtype='float64')
+    return pd.DataFrame({'date': pd.date_range(start, periods=periods, freq='D'), 'close': values, 'volume': values})
+
+
+def make_result(expression):
+    """生成(instrument, datetime)双重索引的因子计算结果"""
+    index = pd.MultiIndex.from_product(
+        [['BTCUSDT'], pd.date_range('2024-01-01', periods=3)], names=['instrument', 'datetime']
+    )
+    return pd.DataFrame({expression: np.arange(3, dtype='float32')}, index=index)
+
+
+class TestFactorCache(unittest.TestCase):
+    """测试因子计算结果缓存的命中、持久化和失效"""
+    
+    def setUp(self):
+        """设置测试环境"""
+        self.root = Path('/tmp/test_factor_cache').resolve()
+        shutil.rmtree(self.root, ignore_errors=True)
+        self.qlib_dir = self.root / 'qlib_data'
+        self.writer = QlibBinWriter(self.qlib_dir)
+        self.writer.update({'BTCUSDT': make_frame('2024-01-01', 5), 'ETHUSDT': make_frame('2024-01-01', 5)})
+    
+    def tearDown(self):
+        """清理测试环境"""
+        shutil.rmtree(self.root, ignore_errors=True)
+    
+    def make_cache(self):
+        return FactorCache(self.root / 'cache', max_entries=2, data_dir_resolver=lambda freq: self.qlib_dir)
+    
+    def test_hit_and_persist(self):
+        """测试内存命中、LRU淘汰后从磁盘命中，以及标的顺序不影响缓存键"""
+        cache = self.make_cache()
+        expr = '$close / $Ref($close, 1) - 1'
+        key = FactorCache.make_key(expr, ['BTCUSDT', 'ETHUSDT'], 'day', '2024-01-01', '2024-01-03')
+        self.assertEqual(key, FactorCache.make_key(expr, ['ETHUSDT', 'BTCUSDT'], '1d', '2024-01-01', '2024-01-03'))
+        
+        version = cache.data_versions([expr], ['BTCUSDT', 'ETHUSDT'], 'day', '2024-01-03')[expr]
+        self.assertIsNone(cache.get(key, version))
+        cache.put(key, version, make_result(expr))
+        pd.testing.assert_frame_equal(cache.get(key, version), make_result(expr))
+        
+        # 写入更多条目使其被淘汰出内存，仍可从磁盘读取；新实例同样可以命中
+        cache.put('a', version, make_result('a'))
+        cache.put('b', version, make_result('b'))
+        pd.testing.assert_frame_equal(cache.get(key, version), make_result(expr), check_freq=False)
+        pd.testing.assert_frame_equal(self.make_cache().get(key, version), make_result(expr), check_freq=False)
+        
+        stats = cache.stats()
+        self.assertEqual((stats['hits'], stats['memory_hits'], stats['disk_hits'], stats['misses']), (2, 1, 1, 1))
+        self.assertEqual(stats['entries'], 2)
+    
+    def test_disk_eviction(self):
+        """测试磁盘条目超过上限时删除最久未使用的条目，读取会更新使用时间"""
+        cache = FactorCache(self.root / 'cache', max_entries=1, max_disk_entries=2)
+        for key in ['a', 'b']:
+            cache.put(key, 'v1', make_result(key))
+            time.sleep(0.01)
+        # a已被淘汰出内存，从磁盘读取后成为最近使用的条目
+        self.assertIsNotNone(cache.get('a', 'v1'))
+        time.sleep(0.01)
+        cache.put('c', 'v1', make_result('c'))
+        self.assertEqual(sorted(path.name for path in (self.root / 'cache').iterdir()), ['a', 'c'])
+        
+        time.sleep(0.01)
+        cache.put('d', 'v1', make_result('d'))
+        self.assertEqual(sorted(path.name for path in (self.root / 'cache').iterdir()), ['c', 'd'])
+    
+    def test_invalidation(self):
+        """测试只有涉及更新文件的条目失效，日历只在结束时间之后追加时不失效"""
+        cache = self.make_cache()
+        expr = '$MA($close, 2)'
+        before = cache.data_versions([expr, '$volume'], ['BTCUSDT'], 'day', '2024-01-03')
+        eth_before = cache.data_versions([expr], ['ETHUSDT'], 'day')
+        key = FactorCache.make_key(expr, ['BTCUSDT'], 'day', '2024-01-01', '2024-01-03')
+        cache.put(key, before[expr], make_result(expr))
+        
+        # 只追加ETHUSDT的数据，日历在结束时间之后变长
+        self.writer.update({'BTCUSDT': make_frame('2024-01-01', 5), 'ETHUSDT': make_frame('2024-01-01', 6)})
+        self.assertEqual(cache.data_versions([expr, '$volume'], ['BTCUSDT'], 'day', '2024-01-03'), before)
+        self.assertNotEqual(cache.data_versions([expr], ['ETHUSDT'], 'day')[expr], eth_before[expr])
+        self.assertIsNotNone(cache.get(key, before[expr]))
+        
+        # 追加BTCUSDT的数据，引用BTCUSDT特征文件的条目失效
+        self.writer.update({'BTCUSDT': make_frame('2024-01-01', 6)})
+        after = cache.data_versions([expr, '$volume'], ['BTCUSDT'], 'day', '2024-01-03')
+        self.assertNotEqual(after[expr], before[expr])
+        self.assertIsNone(cache.get(key, after[expr]))
+        self.assertEqual(cache.stats()['invalidations'], 1)
+        self.assertEqual(list((self.root / 'cache' / key).glob('*.parquet')), [])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import io
+import sys
+import asyncio
+import json
+import unittest
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from fastapi import HTTPException
+from starlette.requests import Request
+
+# 添加项目根目录到Python路径
+sys.path.append('/Users/liupeng/workspace/qbot')
+
+from backend.collector.utils.frame_response import (
+    ARROW, COLUMNAR, MEDIA_TYPES, NDJSON, PARQUET, RECORDS, frame_response, negotiate_format, stream_response
+)
+
+
+def make_request(accept=None):
+    """构造只包含Accept请求头的请求对象"""
+    headers = [(b'accept', accept.encode())] if accept else []
+    return Request({'type': 'http', 'headers': headers})
+
+
+def make_panel():
+    """生成(instrument, datetime)双重索引的因子数据，包含缺失值"""
+    index = pd.MultiIndex.from_product(
+        [['BTCUSDT', 'ETHUSDT'], pd.date_range('2024-01-01', periods=3)], names=['instrument', 'datetime']
+    )
+    df = pd.DataFrame({'close': np.arange(6, dtype='float64'), 'ma_5d': np.arange(6, dtype='float64')}, index=index)
+    df.iloc[1, 1] = np.nan
+    return df
+
+
+def read_stream(response):
+    """读取流式响应的全部内容"""
+    async def collect():
+        return b''.join([chunk async for chunk in response.body_iterator])
+    return asyncio.run(collect())
+
+
+class TestFrameResponse(unittest.TestCase):
+    """测试批量数据接口的响应格式协商和编码"""
+    
+    def test_negotiate_format(self):
+        """测试format参数优先，其次根据Accept请求头确定格式"""
+        self.assertEqual(negotiate_format(make_request()), RECORDS)
+        self.assertEqual(negotiate_format(make_request('application/json')), RECORDS)
+        self.assertEqual(negotiate_format(make_request(MEDIA_TYPES[ARROW])), ARROW)
+        self.assertEqual(negotiate_format(make_request('application/parquet')), PARQUET)
+        self.assertEqual(negotiate_format(make_request('application/x-ndjson')), NDJSON)
+        self.assertEqual(negotiate_format(make_request(MEDIA_TYPES[ARROW]), 'columnar'), COLUMNAR)
+        with self.assertRaises(HTTPException) as context:
+            negotiate_format(make_request(), 'csv')
+        self.assertEqual(context.exception.status_code, 400)
+    
+    def test_columnar_json(self):
+        """测试列式JSON保留ApiResponse结构，缺失值为null"""
+        response = frame_response(make_panel(), COLUMNAR, message='ok', meta={'factor_names': ['close', 'ma_5d']})
+        body = json.loads(response.body)
+        self.assertEqual(body['code'], 0)
+        self.assertEqual(body['data']['factor_names'], ['close', 'ma_5d'])
+        data = body['data']['data']
+        self.assertEqual(data['index']['instrument'][:3], ['BTCUSDT'] * 3)
+        self.assertEqual(data['index']['datetime'][0], '2024-01-01T00:00:00')
+        self.assertEqual(data['columns']['close'], [0, 1, 2, 3, 4, 5])
+        self.assertIsNone(data['columns']['ma_5d'][1])
+    
+    def test_arrow_and_parquet(self):
+        """测试Arrow IPC流和Parquet还原为原DataFrame，元数据保存在schema中"""
+        df = make_panel()
+        response = frame_response(df, ARROW, meta={'shape': [6, 2]})
+        self.assertEqual(response.media_type, MEDIA_TYPES[ARROW])
+        table = pa.ipc.open_stream(response.body).read_all()
+        pd.testing.assert_frame_equal(table.to_pandas(), df, check_freq=False)
+        self.assertEqual(json.loads(table.schema.metadata[b'qbot']), {'shape': [6, 2]})
+        
+        response = frame_response(df, PARQUET)
+        pd.testing.assert_frame_equal(pq.read_table(io.BytesIO(response.body)).to_pandas(), df, check_freq=False)
+    
+    def test_stream_response(self):
+        """测试多个DataFrame按行分块流式编码，NDJSON首行为响应头，Arrow每个分块为一个record batch"""
+        df = make_panel()
+        frames = (df.loc[[instrument]] for instrument in ['BTCUSDT', 'ETHUSDT'])
+        body = read_stream(stream_response(frames, ARROW, meta={'factor_names': ['close', 'ma_5d']}, chunk_size=2))
+        batches = list(pa.ipc.open_stream(body))
+        self.assertEqual([len(batch) for batch in batches], [2, 1, 2, 1])
+        table = pa.Table.from_batches(batches)
+        pd.testing.assert_frame_equal(table.to_pandas(), df, check_freq=False)
+        self.assertEqual(json.loads(table.schema.metadata[b'qbot']), {'factor_names': ['close', 'ma_5d']})
+        
+        lines = read_stream(stream_response([df], NDJSON, message='ok', chunk_size=4)).decode().splitlines()
+        self.assertEqual(len(lines), 7)
+        self.assertEqual(json.loads(lines[0])['message'], 'ok')
+        self.assertEqual(json.loads(lines[1]), {'instrument': 'BTCUSDT', 'datetime': '2024-01-01T00:00:00', 'close': 0.0, 'ma_5d': 0.0})
+        self.assertIsNone(json.loads(lines[2])['ma_5d'])
+    
+    def test_stream_error(self):
+        """测试生成过程中出错时NDJSON以错误行结束"""
+        def frames():
+            yield make_panel()
+            raise RuntimeError('计算失败')
+        
+        lines = read_stream(stream_response(frames(), NDJSON)).decode().splitlines()
+        self.assertEqual(len(lines), 8)
+        self.assertEqual(json.loads(lines[-1]), {'code': 1, 'message': '计算失败'})
+    
+    def test_arrow_stream_error(self):
+        """测试生成过程中出错时Arrow流重新抛出异常，已发送的record batch之后不写入流结束标记"""
+        def frames():
+            yield make_panel()
+            raise RuntimeError('计算失败')
+        
+        received = []
+        
+        async def collect():
+            async for chunk in stream_response(frames(), ARROW).body_iterator:
+                received.append(chunk)
+        
+        with self.assertRaises(RuntimeError):
+            asyncio.run(collect())
+        body = b''.join(received)
+        self.assertEqual(len(received), 1)
+        self.assertFalse(body.endswith(b'\xff\xff\xff\xff\x00\x00\x00\x00'))
+        
+        complete = read_stream(stream_response([make_panel()], ARROW))
+        self.assertTrue(complete.endswith(b'\xff\xff\xff\xff\x00\x00\x00\x00'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,134 @@
+import sys
+import json
+import time
+import tempfile
+import threading
+import unittest
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from urllib.parse import urlparse, parse_qs
+
+import pandas as pd
+
+# 添加项目根目录到Python路径
+sys.path.append('/Users/liupeng/workspace/qbot')
+
+from backend.collector.base.utils import TokenBucket
+from backend.collector.crypto.okx.collector import OKXCollector
+from backend.collector.crypto.okx.downloader import OKXDownloader
+
+
+# 模拟交易所从2023-12-31开始有1分钟K线数据
+FIRST_TS = int(pd.Timestamp('2023-12-31').timestamp() * 1000)
+LAST_TS = int(pd.Timestamp('2024-01-10').timestamp() * 1000)
+BAR_MS = 60 * 1000
+
+
+class StubOKXHandler(BaseHTTPRequestHandler):
+    """模拟OKX历史K线接口，按after游标倒序分页返回数据"""
+    
+    requests = []
+    
+    def do_GET(self):
+        url = urlparse(self.path)
+        params = {key: values[0] for key, values in parse_qs(url.query).items()}
+        self.requests.append((url.path, params))
+        
+        limit = min(int(params.get('limit', 100)), 100)
+        after = int(params.get('after', LAST_TS + BAR_MS))
+        # 小于after的最新一根K线
+        newest = min(after - 1, LAST_TS) // BAR_MS * BAR_MS
+        data = [
+            [str(ts), '1', '2', '0.5', '1.5', '10', '15', '15', '1']
+            for ts in range(newest, max(newest - limit * BAR_MS, FIRST_TS - BAR_MS), -BAR_MS)
+        ]
+        
+        body = json.dumps({'code': '0', 'msg': '', 'data': data}).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+    
+    def log_message(self, format, *args):
+        pass
+
+
+class TestOKXDownloader(unittest.TestCase):
+    """测试OKXDownloader类的分页下载功能"""
+    
+    @classmethod
+    def setUpClass(cls):
+        """启动本地模拟服务"""
+        cls.server = ThreadingHTTPServer(('127.0.0.1', 0), StubOKXHandler)
+        cls.thread = threading.Thread(target=cls.server.serve_forever, daemon=True)
+        cls.thread.start()
+        cls.base_url = f"http://127.0.0.1:{cls.server.server_port}/api/v5/market"
+    
+    @classmethod
+    def tearDownClass(cls):
+        """关闭本地模拟服务"""
+        cls.server.shutdown()
+        cls.server.server_close()
+    
+    def setUp(self):
+        StubOKXHandler.requests = []
+    
+    def test_download_paginates_full_range(self):
+        """测试分页下载覆盖完整时间范围
+        
+        测试点：
+        1. 多页数据完整拼接，没有缺失和重复
+        2. 结果按时间升序排列
+        3. 请求使用历史K线接口和OKX的bar格式
+        """
+        downloader = OKXDownloader(base_url=self.base_url, rate_limit=(1000, 1.0))
+        df = downloader.download('BTC-USDT', '1m', '2024-01-01', '2024-01-04')
+        
+        expected = pd.date_range('2024-01-01', '2024-01-04', freq='1min')
+        self.assertEqual(len(df), len(expected))
+        self.assertTrue((df['open_time'].values == expected.values).all())
+        self.assertEqual(len(StubOKXHandler.requests), 44)
+        self.assertTrue(all(path.endswith('/history-candles') for path, _ in StubOKXHandler.requests))
+        
+        downloader.download('BTC-USDT', '1d', '2024-01-01', '2024-01-04')
+        self.assertEqual(StubOKXHandler.requests[-1][1]['bar'], '1D')
+    
+    def test_download_stops_at_first_bar(self):
+        """测试开始时间早于交易所最早数据时在数据耗尽后停止"""
+        downloader = OKXDownloader(base_url=self.base_url, rate_limit=(1000, 1.0))
+        df = downloader.download('BTC-USDT', '1m', '2020-01-01', '2023-12-31 01:00:00')
+        
+        self.assertEqual(df['open_time'].iloc[0], pd.Timestamp('2023-12-31'))
+        self.assertEqual(len(df), 61)
+    
+    def test_collector_shares_rate_limit(self):
+        """测试收集器多线程收集多个交易对时共用下载器的频率限制"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            collector = OKXCollector(
+                tmp_dir, start='2023-12-31', end='2024-01-01', interval='1m',
+                max_workers=3, max_collector_count=1, symbols=['BTC-USDT', 'ETH-USDT', 'SOL-USDT']
+            )
+            # 每秒40次，突发容量20次
+            collector.downloader = OKXDownloader(base_url=self.base_url, max_workers=3, rate_limit=(20, 0.5))
+            started = time.monotonic()
+            collector.collect_data()
+            elapsed = time.monotonic() - started
+            
+            for symbol in ('BTCUSDT', 'ETHUSDT', 'SOLUSDT'):
+                self.assertEqual(len(pd.read_csv(Path(tmp_dir) / f'{symbol}.csv')), 1441)
+        # 每个交易对15页共45次请求，突发容量之外的25次至少需要0.625秒
+        self.assertEqual(len(StubOKXHandler.requests), 45)
+        self.assertGreaterEqual(elapsed, 0.6)
+    
+    def test_token_bucket(self):
+        """测试令牌桶在突发容量耗尽后按速率放行"""
+        bucket = TokenBucket(rate=10, per=1.0, capacity=1)
+        started = time.monotonic()
+        for _ in range(4):
+            bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.25)
+
+
+if __name__ == '__main__':
+    unittest.main()
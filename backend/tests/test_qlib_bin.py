@@ -0,0 +1,335 @@
+import sys
+import shutil
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 添加项目根目录到Python路径
+sys.path.append('/Users/liupeng/workspace/qbot')
+
+from backend.collector.scripts.qlib_bin import QlibBinReader, QlibBinWriter, iter_csv_frames, qlib_freq_name
+
+
+def make_frame(start, periods):
+    """生成连续日线数据，收盘价为序号"""
+    dates = pd.date_range(start, periods=periods, freq='D')
+    values = np.arange(periods, dtype='float64')
+    return pd.DataFrame({
+        'date': dates, 'open': values, 'high': values, 'low': values,
+        'close': values, 'volume': values
+    })
+
+
+class TestQlibBinWriter(unittest.TestCase):
+    """测试QlibBinWriter类的增量写入功能"""
+    
+    def setUp(self):
+        """设置测试环境"""
+        self.qlib_dir = Path('/tmp/test_qlib_bin').resolve()
+        shutil.rmtree(self.qlib_dir, ignore_errors=True)
+        self.writer = QlibBinWriter(self.qlib_dir)
+    
+    def tearDown(self):
+        """清理测试环境"""
+        shutil.rmtree(self.qlib_dir, ignore_errors=True)
+    
+    def read_bin(self, symbol, field='close'):
+        return np.fromfile(self.writer.get_bin_path(symbol, field), dtype='<f')
+    
+    def test_first_update_and_append(self):
+        """测试首次写入和追加新K线
+        
+        测试点：
+        1. 首次写入日历、标的列表和带起始下标的二进制文件
+        2. 新增一根K线只在日历和二进制文件末尾追加
+        3. 没有新数据的标的保持不变
+        """
+        result = self.writer.update({'btcusdt': make_frame('2024-01-01', 5), 'ETHUSDT': make_frame('2024-01-03', 3)})
+        self.assertEqual(sorted(result['new']), ['BTCUSDT', 'ETHUSDT'])
+        self.assertEqual(len(self.writer.read_calendar()), 5)
+        self.assertEqual(self.writer.read_bin_header('ETHUSDT', 'close'), (2, 3))
+        self.assertEqual(self.read_bin('BTCUSDT').tolist(), [0, 0, 1, 2, 3, 4])
+        
+        size = self.writer.get_bin_path('BTCUSDT', 'close').stat().st_size
+        result = self.writer.update({'BTCUSDT': make_frame('2024-01-01', 6), 'ETHUSDT': make_frame('2024-01-03', 3)})
+        self.assertEqual(result['appended'], ['BTCUSDT'])
+        self.assertEqual(result['unchanged'], ['ETHUSDT'])
+        self.assertEqual(self.writer.get_bin_path('BTCUSDT', 'close').stat().st_size, size + 4)
+        self.assertEqual(self.read_bin('BTCUSDT')[-1], 5)
+        self.assertEqual(len(self.writer.read_calendar()), 6)
+        self.assertEqual(self.writer.read_instruments()['BTCUSDT'][1], pd.Timestamp('2024-01-06'))
+        
+        # ETHUSDT从已保存的最后时间之后开始按日历追加，包括其他标的新增的2024-01-06
+        result = self.writer.update({'ETHUSDT': make_frame('2024-01-03', 5)})
+        self.assertEqual(result['appended'], ['ETHUSDT'])
+        self.assertEqual(self.read_bin('ETHUSDT').tolist(), [2, 0, 1, 2, 3, 4])
+    
+    def test_backfill_rewrites_symbol(self):
+        """测试向前补数据的标的整体重写"""
+        self.writer.update({'BTCUSDT': make_frame('2024-01-01', 5), 'ETHUSDT': make_frame('2024-01-03', 3)})
+        result = self.writer.update({'ETHUSDT': make_frame('2024-01-02', 4)})
+        self.assertEqual(result['rewritten'], ['ETHUSDT'])
+        self.assertEqual(self.writer.read_bin_header('ETHUSDT', 'close'), (1, 4))
+        self.assertEqual(self.writer.read_instruments()['ETHUSDT'][0], pd.Timestamp('2024-01-02'))
+    
+    def test_dates_before_calendar_end(self):
+        """测试新时间早于日历末尾时返回None，由调用方全量转换"""
+        self.writer.update({'BTCUSDT': make_frame('2024-01-05', 5)})
+        self.assertIsNone(self.writer.update({'ETHUSDT': make_frame('2024-01-01', 2)}))
+        self.assertEqual(len(self.writer.read_calendar()), 5)
+    
+    def test_iter_csv_frames_and_dump(self):
+        """测试进程池预处理CSV后直接全量写入
+        
+        测试点：
+        1. 并行读取结果与串行一致，按文件顺序返回并记录每个文件的耗时
+        2. 无法解析的日期被过滤，日线只保留日期部分
+        3. 全量写入的二进制文件按日历对齐
+        4. 提供日历时逐个标的流式写入，结果与一次性写入一致
+        """
+        csv_dir = self.qlib_dir / 'csv'
+        csv_dir.mkdir(parents=True)
+        for symbol, start, periods in [('BTCUSDT', '2024-01-01', 5), ('ETHUSDT', '2024-01-03', 3)]:
+            df = make_frame(start, periods)
+            df['date'] = df['date'].dt.strftime('%Y-%m-%d 08:00:00')
+            df.loc[len(df)] = ['invalid', 0, 0, 0, 0, 0]
+            df.to_csv(csv_dir / f'{symbol}.csv', index=False)
+        csv_files = sorted(csv_dir.glob('*.csv'))
+        
+        results = list(iter_csv_frames(csv_files, max_workers=2))
+        serial_results = list(iter_csv_frames(csv_files, max_workers=1))
+        self.assertEqual([symbol for symbol, _, _ in results], ['BTCUSDT', 'ETHUSDT'])
+        self.assertEqual(len(results[0][1]), 5)
+        self.assertGreaterEqual(results[1][2], 0)
+        frames = {symbol: df for symbol, df, _ in results}
+        pd.testing.assert_frame_equal(frames['ETHUSDT'], serial_results[1][1])
+        self.assertEqual(frames['ETHUSDT']['date'].iloc[0], pd.Timestamp('2024-01-03'))
+        
+        result = self.writer.dump(frames, normalized=True, max_workers=2)
+        self.assertEqual(result['symbols'], 2)
+        self.assertEqual(result['calendar'], 5)
+        self.assertEqual(self.read_bin('ETHUSDT').tolist(), [2, 0, 1, 2])
+        self.assertEqual(self.writer.read_instruments()['BTCUSDT'][1], pd.Timestamp('2024-01-05'))
+        
+        calendar = set()
+        for _, df, _ in iter_csv_frames(csv_files, usecols=['date'], max_workers=2):
+            self.assertEqual(list(df.columns), ['date'])
+            calendar.update(df['date'])
+        streamed = ((symbol, df) for symbol, df, _ in iter_csv_frames(csv_files, max_workers=2))
+        shutil.rmtree(self.writer.features_dir)
+        result = self.writer.dump(streamed, normalized=True, calendar=calendar)
+        self.assertEqual(result['symbols'], 2)
+        self.assertEqual(result['calendar'], 5)
+        self.assertEqual(self.read_bin('ETHUSDT').tolist(), [2, 0, 1, 2])
+    
+    def test_changed_history_rewritten(self):
+        """测试与已保存区间重叠的K线的值变化时重写，部分数据与已保存的数据合并"""
+        self.writer.update({'BTCUSDT': make_frame('2024-01-01', 5)})
+        df = make_frame('2024-01-01', 6)
+        df.loc[2, 'close'] = 999
+        result = self.writer.update({'BTCUSDT': df})
+        self.assertEqual(result['rewritten'], ['BTCUSDT'])
+        self.assertEqual(self.read_bin('BTCUSDT').tolist(), [0, 0, 1, 999, 3, 4, 5])
+        
+        # 部分数据只包含最后一根已保存的K线和新K线，最后一根K线被修正
+        partial = make_frame('2024-01-06', 2)
+        partial.loc[0, 'close'] = 50
+        result = self.writer.update({'BTCUSDT': partial}, partial=True)
+        self.assertEqual(result['rewritten'], ['BTCUSDT'])
+        self.assertEqual(self.read_bin('BTCUSDT').tolist(), [0, 0, 1, 999, 3, 4, 50, 1])
+        
+        # 重叠的K线没有变化时仍只追加
+        unchanged = make_frame('2024-01-07', 2)
+        unchanged.loc[0, ['open', 'high', 'low', 'close', 'volume']] = 1
+        result = self.writer.update({'BTCUSDT': unchanged}, partial=True)
+        self.assertEqual(result['appended'], ['BTCUSDT'])
+        self.assertEqual(self.read_bin('BTCUSDT')[-2:].tolist(), [1, 1])
+    
+    def test_rebase_and_partial_update(self):
+        """测试插入日历时间后重新对齐，以及部分数据与已保存数据合并
+        
+        测试点：
+        1. 插入的时间落在标的区间内时填充NaN，早于区间时只更新起始下标，晚于区间时文件不变
+        2. 部分数据向前补充时与已保存的数据合并后重写
+        """
+        self.writer.update({
+            'BTCUSDT': make_frame('2024-01-01', 5).drop(index=2), 'ETHUSDT': make_frame('2024-01-04', 2),
+            'XRPUSDT': make_frame('2024-01-01', 2)
+        })
+        xrp_mtime = self.writer.get_bin_path('XRPUSDT', 'close').stat().st_mtime_ns
+        self.writer.update({'SOLUSDT': make_frame('2024-01-03', 1)}, rebase=True)
+        self.assertEqual(self.writer.get_bin_path('XRPUSDT', 'close').stat().st_mtime_ns, xrp_mtime)
+        self.assertEqual(len(self.writer.read_calendar()), 5)
+        btc = self.read_bin('BTCUSDT')
+        self.assertEqual(btc[:3].tolist(), [0, 0, 1])
+        self.assertTrue(np.isnan(btc[3]))
+        self.assertEqual(self.read_bin('ETHUSDT').tolist(), [3, 0, 1])
+        
+        result = self.writer.update({'ETHUSDT': make_frame('2024-01-02', 1)}, partial=True)
+        self.assertEqual(result['rewritten'], ['ETHUSDT'])
+        eth = self.read_bin('ETHUSDT')
+        self.assertEqual(eth[[0, 1, 3, 4]].tolist(), [1, 0, 0, 1])
+        self.assertTrue(np.isnan(eth[2]))
+    
+    def test_qlib_bin_storage_batches_rebase(self):
+        """测试逐个标的写入时，需要插入较早时间的标的缓存后一次性重新对齐
+        
+        测试点：
+        1. 只在日历末尾追加时间的标的立即写入
+        2. 开始时间更早的标的先缓存，最后时间包括缓存的数据
+        3. flush时只重新对齐一次
+        """
+        from unittest.mock import patch
+        from backend.collector.base.storage import QlibBinStorage
+        
+        storage = QlibBinStorage(self.qlib_dir)
+        storage.save('BTCUSDT', make_frame('2024-01-05', 3))
+        self.assertEqual(storage.last_timestamp('BTCUSDT'), pd.Timestamp('2024-01-07'))
+        storage.save('ETHUSDT', make_frame('2024-01-02', 2))
+        storage.save('SOLUSDT', make_frame('2024-01-01', 2))
+        storage.save('SOLUSDT', make_frame('2024-01-03', 1))
+        self.assertEqual(len(self.writer.read_calendar()), 3)
+        self.assertEqual(storage.last_timestamp('SOLUSDT'), pd.Timestamp('2024-01-03'))
+        
+        with patch.object(storage.writer, '_rebase', wraps=storage.writer._rebase) as rebase:
+            storage.flush()
+        self.assertEqual(rebase.call_count, 1)
+        self.assertEqual(len(self.writer.read_calendar()), 6)
+        self.assertEqual(self.read_bin('BTCUSDT').tolist(), [3, 0, 1, 2])
+        self.assertEqual(self.read_bin('SOLUSDT').tolist(), [0, 0, 1, 0])
+        self.assertEqual(self.writer.read_instruments()['ETHUSDT'][1], pd.Timestamp('2024-01-03'))
+    
+    def test_convert_from_parquet_storage(self):
+        """测试从Parquet存储转换，增量转换时只读取最后时间之后的数据"""
+        from backend.collector.base.storage import ParquetInstrumentStorage
+        from backend.collector.scripts.convert_to_qlib import convert_crypto_to_qlib
+        
+        source_dir = self.qlib_dir / 'source'
+        storage = ParquetInstrumentStorage(source_dir)
+        storage.save('BTCUSDT', make_frame('2024-01-01', 5))
+        qlib_dir = self.qlib_dir / 'qlib'
+        
+        result = convert_crypto_to_qlib(source_dir, qlib_dir, storage_format='parquet', max_workers=1)
+        self.assertEqual(result['mode'], 'full')
+        self.assertEqual(result['files']['BTCUSDT']['rows'], 5)
+        
+        storage.save('BTCUSDT', make_frame('2024-01-01', 7))
+        storage.save('ETHUSDT', make_frame('2023-12-30', 3))
+        result = convert_crypto_to_qlib(
+            source_dir, qlib_dir, storage_format='parquet', max_workers=2, incremental=True
+        )
+        self.assertEqual(result['mode'], 'incremental')
+        # 已转换的交易对只读取2024-01-05之后的数据
+        self.assertEqual(result['files']['BTCUSDT']['rows'], 3)
+        self.assertEqual(result['symbols']['appended'], ['BTCUSDT'])
+        self.assertEqual(result['symbols']['new'], ['ETHUSDT'])
+        
+        writer = QlibBinWriter(qlib_dir)
+        self.assertEqual(len(writer.read_calendar()), 9)
+        btc = np.fromfile(writer.get_bin_path('BTCUSDT', 'close'), dtype='<f')
+        self.assertEqual(btc.tolist(), [2, 0, 1, 2, 3, 4, 5, 6])
+    
+    def test_convert_from_csv_storage(self):
+        """测试从CSV存储增量转换
+        
+        测试点：
+        1. 已转换的交易对只读取最后时间之后的数据
+        2. 向前补过数据的交易对读取全部数据并重写
+        """
+        from backend.collector.base.storage import CsvInstrumentStorage
+        from backend.collector.scripts.convert_to_qlib import convert_crypto_to_qlib
+        
+        source_dir = self.qlib_dir / 'source'
+        storage = CsvInstrumentStorage(source_dir)
+        storage.save('BTCUSDT', make_frame('2024-01-01', 5))
+        storage.save('ETHUSDT', make_frame('2024-01-03', 3))
+        qlib_dir = self.qlib_dir / 'qlib'
+        convert_crypto_to_qlib(source_dir, qlib_dir, max_workers=1)
+        
+        storage.save('BTCUSDT', make_frame('2024-01-01', 7))
+        storage.save('ETHUSDT', make_frame('2024-01-01', 5))
+        result = convert_crypto_to_qlib(source_dir, qlib_dir, max_workers=2, incremental=True)
+        self.assertEqual(result['mode'], 'incremental')
+        self.assertEqual(result['files']['BTCUSDT']['rows'], 3)
+        self.assertEqual(result['files']['ETHUSDT']['rows'], 5)
+        self.assertEqual(result['symbols']['appended'], ['BTCUSDT'])
+        self.assertEqual(result['symbols']['rewritten'], ['ETHUSDT'])
+        
+        writer = QlibBinWriter(qlib_dir)
+        btc = np.fromfile(writer.get_bin_path('BTCUSDT', 'close'), dtype='<f')
+        self.assertEqual(btc.tolist(), [0, 0, 1, 2, 3, 4, 5, 6])
+        eth = np.fromfile(writer.get_bin_path('ETHUSDT', 'close'), dtype='<f')
+        self.assertEqual(eth.tolist(), [0, 0, 1, 2, 3, 4])
+    
+    def test_multi_freq(self):
+        """测试多个频率写入同一目录
+        
+        测试点：
+        1. 频率名称统一为QLib读取时使用的名称
+        2. 每个频率使用独立的日历和特征文件，起始下标指向对应频率的日历
+        3. 共用的标的列表取各频率时间范围的并集
+        """
+        self.assertEqual(qlib_freq_name('1min'), '1m')
+        self.assertEqual(qlib_freq_name('5m'), '5m')
+        self.assertEqual(qlib_freq_name('60min'), '60m')
+        self.assertEqual(qlib_freq_name('1h'), '1h')
+        self.assertEqual(qlib_freq_name('1d'), 'day')
+        # 大写的M为月，不能写入分钟的日历和特征文件
+        self.assertEqual(qlib_freq_name('1M'), '1month')
+        self.assertEqual(qlib_freq_name('1month'), '1month')
+        self.assertEqual(QlibBinWriter(self.qlib_dir, freq='1M').freq, '1month')
+        self.assertEqual(QlibBinWriter(self.qlib_dir, freq='1m').freq, '1m')
+        
+        minute = make_frame('2024-01-02', 3)
+        minute['date'] = pd.date_range('2024-01-02 00:00', periods=3, freq='min')
+        minute_writer = QlibBinWriter(self.qlib_dir, freq='1min')
+        minute_writer.update({'BTCUSDT': minute})
+        self.writer.update({'BTCUSDT': make_frame('2024-01-01', 2), 'ETHUSDT': make_frame('2024-01-01', 1)})
+        
+        self.assertTrue((self.qlib_dir / 'calendars' / '1m.txt').exists())
+        self.assertTrue((self.qlib_dir / 'features' / 'btcusdt' / 'close.1m.bin').exists())
+        self.assertEqual(len(minute_writer.read_calendar()), 3)
+        self.assertEqual(minute_writer.read_bin_header('BTCUSDT', 'close'), (0, 3))
+        self.assertEqual(minute_writer.read_instruments()['BTCUSDT'][1], pd.Timestamp('2024-01-02 00:02'))
+        self.assertEqual(self.writer.read_instruments()['BTCUSDT'][1], pd.Timestamp('2024-01-02'))
+        
+        with open(self.qlib_dir / 'instruments' / 'all.txt') as f:
+            lines = f.read().splitlines()
+        self.assertEqual(lines, ['BTCUSDT\t2024-01-01\t2024-01-02 00:02:00', 'ETHUSDT\t2024-01-01\t2024-01-01'])
+        
+        # 分钟线追加只依据分钟线的时间范围
+        minute = make_frame('2024-01-02', 4)
+        minute['date'] = pd.date_range('2024-01-02 00:00', periods=4, freq='min')
+        result = minute_writer.update({'BTCUSDT': minute})
+        self.assertEqual(result['appended'], ['BTCUSDT'])
+    
+    def test_reader(self):
+        """测试内存映射读取器
+        
+        测试点：
+        1. 按时间窗口和数量限制切片，标的起始下标不同时与日历对齐
+        2. 缺失的字段填充NaN，没有数据的标的不返回
+        3. 文件追加后重新映射
+        """
+        self.writer.update({'BTCUSDT': make_frame('2024-01-01', 5), 'ETHUSDT': make_frame('2024-01-03', 3)})
+        reader = QlibBinReader(self.qlib_dir)
+        
+        bars = reader.read(['btcusdt', 'ETHUSDT', 'SOLUSDT'], ['close', 'amount'], freq='1d', start='2024-01-02', end='2024-01-04')
+        self.assertEqual(sorted(bars), ['BTCUSDT', 'ETHUSDT'])
+        self.assertEqual(bars['BTCUSDT']['close'].tolist(), [1, 2, 3])
+        self.assertEqual(bars['ETHUSDT']['close'].tolist(), [0, 1])
+        self.assertEqual(bars['ETHUSDT']['dates'][0], np.datetime64('2024-01-03'))
+        self.assertTrue(np.isnan(bars['BTCUSDT']['amount']).all())
+        
+        bars = reader.read(['BTCUSDT'], ['close'], limit=2)
+        self.assertEqual(bars['BTCUSDT']['close'].tolist(), [3, 4])
+        
+        self.writer.update({'BTCUSDT': make_frame('2024-01-01', 6)})
+        bars = reader.read(['BTCUSDT'], ['close'], start='2024-01-06')
+        self.assertEqual(bars['BTCUSDT']['close'].tolist(), [5])
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,99 @@
+import sys
+import shutil
+import unittest
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+# 添加项目根目录到Python路径
+sys.path.append('/Users/liupeng/workspace/qbot')
+
+from backend.collector.base.storage import CsvInstrumentStorage
+from backend.collector.scripts.qlib_bin import QlibBinWriter
+from backend.collector.scripts.resample_bars import derive_interval, plan_intervals, resample_bars
+
+
+def make_minute_frame(start, periods):
+    """生成连续分钟线数据，价格为随机游走"""
+    rng = np.random.default_rng(0)
+    close = 100 + rng.standard_normal(periods).cumsum()
+    return pd.DataFrame({
+        'date': pd.date_range(start, periods=periods, freq='min'),
+        'open': close + 0.1, 'high': close + 1, 'low': close - 1,
+        'close': close, 'volume': rng.random(periods)
+    })
+
+
+class TestResampleBars(unittest.TestCase):
+    """测试由细粒度K线合成粗粒度K线"""
+    
+    def setUp(self):
+        """设置测试环境"""
+        self.save_dir = Path('/tmp/test_resample_bars').resolve()
+        shutil.rmtree(self.save_dir, ignore_errors=True)
+    
+    def tearDown(self):
+        """清理测试环境"""
+        shutil.rmtree(self.save_dir, ignore_errors=True)
+    
+    def test_plan_intervals(self):
+        """测试只下载最细周期，不能按UTC零点对齐合成的周期仍单独下载"""
+        download, derived = plan_intervals(['1d', '1m', '5m', '1h', '1w', '7m'])
+        self.assertEqual(download, ['1m', '1w', '7m'])
+        self.assertEqual(derived, {'1d': '1m', '5m': '1m', '1h': '1m'})
+        
+        self.assertEqual(plan_intervals(['1d']), (['1d'], {}))
+        self.assertEqual(plan_intervals(['1h', '1d']), (['1h'], {'1d': '1h'}))
+    
+    def test_resample_matches_pandas(self):
+        """测试向量化聚合与pandas resample结果一致，并丢弃未走完的最后一个区间"""
+        df = make_minute_frame('2024-01-01 00:00', 3 * 60 + 30)
+        result = resample_bars(df, '1h', base_interval='1m')
+        
+        expected = df.set_index('date').resample('1h').agg({
+            'open': 'first', 'high': 'max', 'low': 'min', 'close': 'last', 'volume': 'sum'
+        }).iloc[:3].reset_index()
+        self.assertEqual(len(result), 3)
+        pd.testing.assert_frame_equal(result, expected, check_dtype=False, check_freq=False)
+        
+        # 不提供来源周期时保留最后一个区间
+        self.assertEqual(len(resample_bars(df, '1h')), 4)
+    
+    def test_resample_drops_partial_first_bucket(self):
+        """测试来源数据从区间中途开始时丢弃第一个区间，不提供来源周期时保留"""
+        df = make_minute_frame('2024-01-01 00:30', 150)
+        result = resample_bars(df, '1h', base_interval='1m')
+        self.assertEqual(result['date'].tolist(), [pd.Timestamp('2024-01-01 01:00'), pd.Timestamp('2024-01-01 02:00')])
+        self.assertEqual(result['open'].iloc[0], df['open'].iloc[30])
+        self.assertEqual(result.index.tolist(), [0, 1])
+        
+        partial = resample_bars(df, '1h')
+        self.assertEqual(partial['date'].iloc[0], pd.Timestamp('2024-01-01 00:00'))
+        self.assertEqual(partial['volume'].iloc[0], df['volume'].iloc[:30].sum())
+    
+    def test_derive_interval(self):
+        """测试合成结果写入目标周期的存储和QLib二进制文件，增量合成只处理新数据"""
+        source = CsvInstrumentStorage(self.save_dir / '1m')
+        source.save('BTCUSDT', make_minute_frame('2024-01-01 00:00', 2 * 1440 + 10))
+        qlib_dir = self.save_dir / 'qlib_data'
+        
+        result = derive_interval(
+            self.save_dir / '1m', self.save_dir / '1d', '1d', '1m', symbols=['btc-usdt'], qlib_dir=qlib_dir
+        )
+        self.assertEqual(result['rows'], {'BTCUSDT': 2})
+        self.assertEqual(len(CsvInstrumentStorage(self.save_dir / '1d').read('BTCUSDT')), 2)
+        writer = QlibBinWriter(qlib_dir, freq='1d')
+        self.assertEqual(len(writer.read_calendar()), 2)
+        
+        source.save('BTCUSDT', make_minute_frame('2024-01-01 00:00', 3 * 1440))
+        result = derive_interval(
+            self.save_dir / '1m', self.save_dir / '1d', '1d', '1m', qlib_dir=qlib_dir, incremental=True
+        )
+        self.assertEqual(result['rows'], {'BTCUSDT': 1})
+        self.assertEqual(result['qlib']['appended'], ['BTCUSDT'])
+        self.assertEqual(writer.read_instruments()['BTCUSDT'][1], pd.Timestamp('2024-01-03'))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,94 @@
+import sys
+import time
+import shutil
+import unittest
+from pathlib import Path
+
+# 添加项目根目录到Python路径
+sys.path.append('/Users/liupeng/workspace/qbot')
+
+from backend.collector.utils.symbol_cache import SymbolCache
+
+
+class TestSymbolCache(unittest.TestCase):
+    """测试SymbolCache类的缓存、刷新和查询功能"""
+    
+    def setUp(self):
+        """设置测试环境"""
+        self.snapshot_dir = Path('/tmp/test_symbol_cache').resolve()
+        shutil.rmtree(self.snapshot_dir, ignore_errors=True)
+        self.calls = 0
+    
+    def tearDown(self):
+        """清理测试环境"""
+        shutil.rmtree(self.snapshot_dir, ignore_errors=True)
+    
+    def fetcher(self):
+        self.calls += 1
+        return [f"COIN{i}USDT" for i in range(50)] + [f"COIN{i}BTC" for i in range(20)]
+    
+    def wait_refresh(self, cache, key):
+        for _ in range(100):
+            if not cache.is_refreshing(key):
+                return
+            time.sleep(0.01)
+    
+    def test_cache_and_snapshot(self):
+        """测试缓存命中与快照冷启动
+        
+        测试点：
+        1. 有效期内重复获取不会再次请求
+        2. 新实例从磁盘快照加载，不发起请求
+        """
+        cache = SymbolCache(ttl=60, snapshot_dir=self.snapshot_dir)
+        self.assertEqual(len(cache.get('binance_spot', self.fetcher)), 70)
+        cache.get('binance_spot', self.fetcher)
+        self.assertEqual(self.calls, 1)
+        
+        cold = SymbolCache(ttl=60, snapshot_dir=self.snapshot_dir)
+        self.assertEqual(len(cold.get('binance_spot', self.fetcher)), 70)
+        self.assertEqual(self.calls, 1)
+    
+    def test_stale_refresh_in_background(self):
+        """测试过期后返回旧数据并在后台刷新"""
+        cache = SymbolCache(ttl=0, snapshot_dir=self.snapshot_dir)
+        cache.get('binance_spot', self.fetcher)
+        
+        def new_fetcher():
+            self.calls += 1
+            return ['NEWUSDT']
+        
+        # 过期时先返回旧数据
+        self.assertEqual(len(cache.get('binance_spot', new_fetcher)), 70)
+        self.wait_refresh(cache, 'binance_spot')
+        self.assertEqual(self.calls, 2)
+        self.assertEqual(cache.query('binance_spot', new_fetcher)[0][0], 'NEWUSDT')
+        self.wait_refresh(cache, 'binance_spot')
+    
+    def test_query_filter_and_paging(self):
+        """测试在内存中过滤和分页，不发起请求"""
+        cache = SymbolCache(ttl=60, snapshot_dir=self.snapshot_dir)
+        page, total = cache.query('binance_spot', self.fetcher, filter='USDT', offset=40, limit=20)
+        self.assertEqual(total, 50)
+        self.assertEqual(page, [f"COIN{i}USDT" for i in range(40, 50)])
+        
+        page, total = cache.query('binance_spot', self.fetcher, filter='BTC', offset=0, limit=5)
+        self.assertEqual(total, 20)
+        self.assertEqual(len(page), 5)
+        self.assertEqual(self.calls, 1)
+        
+        # 字典形式的交易对按symbol字段过滤
+        markets = [{"symbol": "BTC/USDT"}, {"symbol": "ETH/BTC"}]
+        page, total = cache.query('ccxt_binance', lambda: markets, filter='USDT', offset=0, limit=10)
+        self.assertEqual(page, [{"symbol": "BTC/USDT"}])
+        
+        # 刷新后相同的过滤条件基于新列表过滤
+        markets.append({"symbol": "SOL/USDT"})
+        cache.refresh('ccxt_binance', lambda: list(markets))
+        page, total = cache.query('ccxt_binance', lambda: markets, filter='USDT', offset=0, limit=10)
+        self.assertEqual(total, 2)
+        self.assertEqual(page[-1], {"symbol": "SOL/USDT"})
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,80 @@
+import sys
+import time
+import threading
+import unittest
+
+# 添加项目根目录到Python路径
+sys.path.append('/Users/liupeng/workspace/qbot')
+
+from backend.collector.utils.task_executor import TaskExecutor
+
+
+class TestTaskExecutor(unittest.TestCase):
+    """测试任务执行器的排队、并发限制和取消"""
+    
+    def setUp(self):
+        """记录任务的开始顺序，每个任务运行到各自的释放信号为止"""
+        self.started = []
+        self.releases = {}
+        self.lock = threading.Lock()
+    
+    def make_job(self, name):
+        release = self.releases[name] = threading.Event()
+        
+        def job():
+            with self.lock:
+                self.started.append(name)
+            release.wait(5)
+        return job
+    
+    def release(self, *names):
+        for name in names or list(self.releases):
+            self.releases[name].set()
+    
+    def wait_started(self, count):
+        deadline = time.time() + 5
+        while len(self.started) < count and time.time() < deadline:
+            time.sleep(0.01)
+        return list(self.started)
+    
+    def test_limits_and_priority(self):
+        """测试全局和资源并发限制，排队任务按优先级和提交顺序执行，受限任务不阻塞后续任务"""
+        executor = TaskExecutor(max_workers=2, resource_limits={'binance': 1})
+        self.assertEqual(executor.submit('a', 'download', self.make_job('a'), resource='binance'), 0)
+        # 同一交易所已有任务运行，b排队，c使用其他交易所可以直接运行
+        self.assertEqual(executor.submit('b', 'download', self.make_job('b'), resource='binance'), 1)
+        self.assertEqual(executor.submit('c', 'download', self.make_job('c'), resource='okx'), 0)
+        executor.submit('d', 'download', self.make_job('d'), resource='okx')
+        executor.submit('e', 'download', self.make_job('e'), priority=5)
+        self.assertEqual(self.wait_started(2), ['a', 'c'])
+        self.assertEqual([item['task_id'] for item in executor.stats()['queued']], ['e', 'b', 'd'])
+        
+        # 逐个释放，空出的名额依次分配给排队任务，开始顺序确定
+        self.release('a')
+        self.assertEqual(self.wait_started(3)[2:], ['e'])
+        self.release('c')
+        self.assertEqual(self.wait_started(4)[2:], ['e', 'b'])
+        self.release('e')
+        self.assertEqual(self.wait_started(5)[2:], ['e', 'b', 'd'])
+        self.release()
+        executor.shutdown(wait=True)
+    
+    def test_cancel(self):
+        """测试排队任务直接移出队列，运行中的任务设置取消标志"""
+        executor = TaskExecutor(max_workers=1, type_limits={'download': 1})
+        executor.submit('a', 'download', self.make_job('a'))
+        executor.submit('b', 'download', self.make_job('b'))
+        self.wait_started(1)
+        
+        self.assertEqual(executor.cancel('b'), 'queued')
+        self.assertEqual(executor.cancel('a'), 'running')
+        self.assertTrue(executor.is_cancelled('a'))
+        self.assertIsNone(executor.cancel('missing'))
+        
+        self.release()
+        executor.shutdown(wait=True)
+        self.assertEqual(self.started, ['a'])
+
+
+if __name__ == '__main__':
+    unittest.main()
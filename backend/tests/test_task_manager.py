@@ -0,0 +1,269 @@
+import sys
+import json
+import time
+import asyncio
+import functools
+import tempfile
+import threading
+import unittest
+from pathlib import Path
+from unittest import mock
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+# 添加项目根目录到Python路径
+sys.path.append('/Users/liupeng/workspace/qbot')
+
+from backend.collector.api import data as data_api
+from backend.collector.db import models
+from backend.collector.db.database import create_db_engine, db_connection, db_transaction
+from backend.collector.db.models import Task, TaskBusiness, TaskCheckpoint
+from backend.collector.schemas.data import DownloadCryptoRequest
+from backend.collector.utils.task_executor import TaskExecutor
+from backend.collector.utils.task_manager import TaskManager, TaskStatus
+
+
+class TestTaskProgressWriter(unittest.TestCase):
+    """测试任务进度的合并写入"""
+    
+    def setUp(self):
+        """使用临时数据库和新的任务管理器实例"""
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.db_path = Path(self.tmp_dir.name) / 'tasks.db'
+        self.engine = create_db_engine(self.db_path)
+        Task.__table__.create(self.engine)
+        TaskCheckpoint.__table__.create(self.engine)
+        
+        self.patchers = [
+            mock.patch.object(models, 'db_connection', functools.partial(db_connection, self.engine)),
+            mock.patch.object(models, 'db_transaction', functools.partial(db_transaction, self.engine)),
+        ]
+        for patcher in self.patchers:
+            patcher.start()
+        
+        self.saved_instance = TaskManager._instance
+        TaskManager._instance = None
+        self.manager = TaskManager()
+        self.manager._flush_interval = 0.05
+    
+    def tearDown(self):
+        """停止写入线程并恢复全局实例"""
+        self.manager.shutdown()
+        TaskManager._instance = self.saved_instance
+        for patcher in self.patchers:
+            patcher.stop()
+        self.engine.dispose()
+        self.tmp_dir.cleanup()
+    
+    def read_row(self, task_id):
+        with db_connection(self.engine) as conn:
+            return dict(conn.execute('SELECT * FROM tasks WHERE task_id = ?', (task_id,)).fetchone())
+    
+    def test_progress_coalesced(self):
+        """测试大量进度更新只在内存中生效，由写入线程合并为少量事务写入最新进度"""
+        task_id = self.manager.create_task('crypto_download', exchange='binance')
+        self.manager.start_task(task_id)
+        
+        with mock.patch.object(TaskBusiness, 'update_progress_batch', wraps=TaskBusiness.update_progress_batch) as batch:
+            for i in range(1, 2001):
+                self.manager.update_progress(task_id, f'SYM{i}', i, 2000)
+            self.assertEqual(self.manager.get_task(task_id)['progress']['completed'], 2000)
+            self.manager.shutdown()
+        
+        self.assertLess(batch.call_count, 20)
+        row = self.read_row(task_id)
+        self.assertEqual((row['completed'], row['current'], row['percentage']), (2000, 'SYM2000', 100))
+        self.assertEqual(row['status'], 'running')
+    
+    def test_flush_failure_requeued(self):
+        """测试写入失败时取出的进度和检查点放回待写入，不覆盖失败后更新的较新进度"""
+        self.manager._flush_interval = 60
+        task_id = self.manager.create_task('crypto_download')
+        self.manager.start_task(task_id)
+        self.manager.update_progress(task_id, 'BTCUSDT', 1, 3)
+        self.manager.add_checkpoint(task_id, '1h', 'BTCUSDT')
+        
+        with mock.patch.object(TaskBusiness, 'update_progress_batch', side_effect=RuntimeError('database is locked')):
+            self.assertFalse(self.manager.flush_progress())
+        self.assertEqual(TaskBusiness.get_checkpoints(task_id), {})
+        
+        self.manager.update_progress(task_id, 'ETHUSDT', 2, 3)
+        self.assertTrue(self.manager.flush_progress())
+        row = self.read_row(task_id)
+        self.assertEqual((row['completed'], row['current']), (2, 'ETHUSDT'))
+        self.assertEqual(TaskBusiness.get_checkpoints(task_id), {'1h': ['BTCUSDT']})
+    
+    def test_status_durable(self):
+        """测试完成和失败时立即写入最后的进度和状态"""
+        self.manager._flush_interval = 60
+        done = self.manager.create_task('crypto_download')
+        failed = self.manager.create_task('crypto_download')
+        for task_id in (done, failed):
+            self.manager.start_task(task_id)
+            self.manager.update_progress(task_id, 'ETHUSDT', 3, 4, failed=1)
+        
+        self.manager.complete_task(done)
+        self.manager.fail_task(failed, '网络错误')
+        row = self.read_row(done)
+        self.assertEqual((row['status'], row['completed'], row['failed']), (TaskStatus.COMPLETED.value, 3, 1))
+        row = self.read_row(failed)
+        self.assertEqual((row['status'], row['error_message'], row['percentage']), (TaskStatus.FAILED.value, '网络错误', 100))
+    
+    def test_subscription_coalesced(self):
+        """测试订阅者只收到每个任务的最新快照，订阅单个任务时不收到其他任务的事件"""
+        task_id = self.manager.create_task('crypto_download')
+        other_id = self.manager.create_task('crypto_download')
+        
+        async def watch():
+            subscription = self.manager.subscribe(task_id)
+            everything = self.manager.subscribe()
+            
+            def work():
+                for i in range(1, 101):
+                    self.manager.update_progress(task_id, f'SYM{i}', i, 100)
+                self.manager.update_progress(other_id, 'BTCUSDT', 1, 2)
+            
+            await asyncio.get_running_loop().run_in_executor(None, work)
+            events = await subscription.get(timeout=1)
+            all_events = await everything.get(timeout=1)
+            self.manager.unsubscribe(subscription)
+            self.manager.unsubscribe(everything)
+            return events, all_events
+        
+        events, all_events = asyncio.run(watch())
+        self.assertEqual(list(events), [task_id])
+        self.assertEqual(events[task_id]['progress']['completed'], 100)
+        self.assertEqual(sorted(all_events), sorted([task_id, other_id]))
+        self.assertEqual(self.manager._subscriptions, [])
+    
+    def test_task_event_stream(self):
+        """测试SSE接口推送当前状态和后续进度，任务完成后关闭连接"""
+        task_id = self.manager.create_task('crypto_download')
+        self.manager.start_task(task_id)
+        app = FastAPI()
+        app.include_router(data_api.router)
+        
+        def work():
+            time.sleep(0.2)
+            for i in range(1, 4):
+                self.manager.update_progress(task_id, f'SYM{i}', i, 3)
+                time.sleep(0.05)
+            self.manager.complete_task(task_id)
+        
+        with mock.patch.object(data_api, 'task_manager', self.manager):
+            worker = threading.Thread(target=work)
+            worker.start()
+            with TestClient(app).stream('GET', f'/api/data/task/{task_id}/events') as response:
+                self.assertEqual(response.headers['content-type'].split(';')[0], 'text/event-stream')
+                body = ''.join(response.iter_text())
+            worker.join()
+        
+        events = [json.loads(line[len('data: '):]) for line in body.splitlines() if line.startswith('data: ')]
+        self.assertEqual(events[0]['status'], 'running')
+        self.assertEqual(events[-1]['status'], 'completed')
+        self.assertEqual(events[-1]['progress']['completed'], 3)
+    
+    def test_submit_and_cancel(self):
+        """测试提交的任务排队时保持等待状态，取消排队任务立即生效，运行中的任务在检查点结束"""
+        self.manager._executor = TaskExecutor(max_workers=1)
+        running = self.manager.create_task('crypto_download')
+        queued = self.manager.create_task('crypto_download')
+        started = threading.Event()
+        
+        def work(task_id):
+            self.manager.start_task(task_id)
+            started.set()
+            while True:
+                self.manager.check_cancelled(task_id)
+                time.sleep(0.01)
+        
+        self.assertEqual(self.manager.submit_task(running, work, running), 0)
+        self.assertEqual(self.manager.submit_task(queued, work, queued), 1)
+        self.assertTrue(started.wait(5))
+        self.assertEqual(self.manager.get_task(queued)['status'], TaskStatus.PENDING)
+        
+        self.assertEqual(self.manager.cancel_task(queued), 'cancelled')
+        self.assertEqual(self.read_row(queued)['status'], 'cancelled')
+        self.assertEqual(self.manager.cancel_task(running), 'cancelling')
+        self.manager._executor.shutdown(wait=True)
+        self.assertEqual(self.manager.get_task(running)['status'], TaskStatus.CANCELLED)
+        self.assertEqual(self.read_row(running)['status'], 'cancelled')
+        self.assertIsNone(self.manager.cancel_task(running))
+    
+    def test_interrupted_on_restart(self):
+        """测试服务重启后遗留的运行中和等待中任务标记为已中断，检查点保留并可恢复"""
+        running = self.manager.create_task('download_crypto')
+        pending = self.manager.create_task('download_crypto')
+        done = self.manager.create_task('download_crypto')
+        self.manager.start_task(running)
+        self.manager.add_checkpoint(running, '1h', 'BTCUSDT')
+        self.manager.add_checkpoint(running, '1h', 'ETHUSDT')
+        self.manager.complete_task(done)
+        self.manager.shutdown()
+        
+        # 模拟服务重启
+        TaskManager._instance = None
+        self.manager = TaskManager()
+        self.manager.register_resume_handler('download_crypto', lambda task: 0)
+        self.manager.init()
+        
+        for task_id in (running, pending):
+            self.assertEqual(self.manager.get_task(task_id)['status'], TaskStatus.INTERRUPTED)
+            self.assertEqual(self.read_row(task_id)['status'], 'interrupted')
+        self.assertEqual(self.manager.get_task(done)['status'], TaskStatus.COMPLETED)
+        self.assertEqual(self.manager.get_checkpoints(running), {'1h': {'BTCUSDT', 'ETHUSDT'}})
+        self.assertEqual(sorted(task['task_id'] for task in self.manager.get_resumable_tasks()), sorted([running, pending]))
+        
+        self.assertEqual(self.manager.resume_task(running), 0)
+        self.assertEqual(self.read_row(running)['status'], 'pending')
+        self.assertIsNone(self.manager.resume_task(done))
+        
+        self.manager.delete_task(running)
+        self.assertEqual(TaskBusiness.get_checkpoints(running), {})
+    
+    def test_resume_download(self):
+        """测试下载中断后恢复只下载未完成的交易对，并以增量模式补充中断时的交易对"""
+        self.manager._executor = TaskExecutor(max_workers=1)
+        self.manager.register_resume_handler('download_crypto', data_api._resume_download_crypto)
+        request = DownloadCryptoRequest(symbols=['BTCUSDT', 'ETHUSDT', 'SOLUSDT'], interval=['1h', '1d'])
+        task_id = self.manager.create_task('download_crypto', **request.model_dump())
+        calls = []
+        
+        class FakeGetData:
+            def crypto(self, symbols, interval, progress_callback, instrument_callback, incremental, **kwargs):
+                symbols = symbols.split(',')
+                calls.append(('crypto', interval, symbols, incremental))
+                for index, symbol in enumerate(symbols):
+                    if len(calls) == 1 and symbol == 'ETHUSDT':
+                        raise RuntimeError('连接中断')
+                    instrument_callback(symbol)
+                    progress_callback(symbol, index + 1, len(symbols), 0)
+            
+            def resample(self, interval, **kwargs):
+                calls.append(('resample', interval))
+        
+        with mock.patch.object(data_api, 'task_manager', self.manager), \
+                mock.patch('backend.collector.scripts.get_data.GetData', FakeGetData), \
+                mock.patch('backend.collector.db.SystemConfigBusiness.get', return_value='data/qlib'):
+            data_api.async_download_crypto(task_id, request)
+            self.assertEqual(self.manager.get_task(task_id)['status'], TaskStatus.FAILED)
+            self.assertEqual(self.manager.get_checkpoints(task_id), {'1h': {'BTCUSDT'}})
+            
+            self.assertEqual(self.manager.resume_task(task_id), 0)
+            deadline = time.time() + 5
+            while self.manager.get_task(task_id)['status'] != TaskStatus.COMPLETED and time.time() < deadline:
+                time.sleep(0.01)
+        
+        self.assertEqual(self.manager.get_task(task_id)['status'], TaskStatus.COMPLETED)
+        self.assertEqual(calls[1:], [('crypto', '1h', ['ETHUSDT', 'SOLUSDT'], True), ('resample', '1d')])
+        self.assertEqual(self.read_row(task_id)['total'], 3)
+        self.assertEqual(self.read_row(task_id)['completed'], 3)
+        self.assertEqual(
+            self.manager.get_checkpoints(task_id),
+            {'1h': {'*', 'BTCUSDT', 'ETHUSDT', 'SOLUSDT'}, '1d': {'*'}}
+        )
+
+
+if __name__ == '__main__':
+    unittest.main()